@@ -59,6 +59,8 @@ try {
         print("\n🎯 副本集配置完成！");
         print("主节点: " + status.members.find(m => m.stateStr === "PRIMARY").name);
         print("副本节点数: " + status.members.filter(m => m.stateStr === "SECONDARY").length);
+        print("\n📇 业务集合索引由后端启动时按索引注册表自动创建，");
+        print("   也可在 kk_stock_backend 目录手动执行: python -m api.utils.index_registry --create");
         
     } else {
         print("❌ 副本集初始化失败:");
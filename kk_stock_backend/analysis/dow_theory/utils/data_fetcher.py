@@ -19,6 +19,7 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(o
 sys.path.append(project_root)
 
 from api.db_handler import DBHandler
+from api.market_data_store import get_market_data_store
 
 
 class DataFetcher:
@@ -33,6 +34,14 @@ class DataFetcher:
         """
         self.logger = logging.getLogger(__name__)
         self.db_handler = DBHandler()
+        self.market_data_store = get_market_data_store()
+        
+    def _load_frame(self, collection: str, stock_code: str, start_date: datetime, end_date: datetime) -> pd.DataFrame:
+        """从共享行情仓库读取区间数据，返回与Mongo文档同列的DataFrame（无数据时为空）"""
+        bars = self.market_data_store.get_series(collection, [stock_code], start_date, end_date)[stock_code]
+        if len(bars) == 0:
+            return pd.DataFrame()
+        return bars.to_frame()
         
     def get_daily_data(self, stock_code: str, start_date: datetime, end_date: datetime) -> pd.DataFrame:
         """
@@ -47,32 +56,13 @@ class DataFetcher:
             日线数据DataFrame
         """
         try:
-            # 直接从stock_kline_daily集合获取日线数据
-            collection = self.db_handler.get_collection('stock_kline_daily')
+            # 从共享行情仓库获取stock_kline_daily数据
+            df = self._load_frame('stock_kline_daily', stock_code, start_date, end_date)
             
-            # 构建查询条件
-            start_date_str = start_date.strftime('%Y%m%d')
-            end_date_str = end_date.strftime('%Y%m%d')
-            
-            query = {
-                'ts_code': stock_code,
-                'trade_date': {
-                    '$gte': start_date_str,
-                    '$lte': end_date_str
-                }
-            }
-            
-            # 查询数据
-            cursor = collection.find(query).sort('trade_date', 1)
-            data = list(cursor)
-            
-            if not data:
+            if df.empty:
                 self.logger.debug(f"未找到股票 {stock_code} 的日线数据")
                 return pd.DataFrame()
             
-            # 转换为DataFrame
-            df = pd.DataFrame(data)
-            
             # 数据处理
             df = self._process_daily_data(df)
             
@@ -95,32 +85,13 @@ class DataFetcher:
             周线数据DataFrame
         """
         try:
-            # 尝试从stock_kline_weekly集合获取周线数据
-            collection = self.db_handler.get_collection('stock_kline_weekly')
+            # 从共享行情仓库获取stock_kline_weekly数据
+            df = self._load_frame('stock_kline_weekly', stock_code, start_date, end_date)
             
-            # 构建查询条件
-            start_date_str = start_date.strftime('%Y%m%d')
-            end_date_str = end_date.strftime('%Y%m%d')
-            
-            query = {
-                'ts_code': stock_code,
-                'trade_date': {
-                    '$gte': start_date_str,
-                    '$lte': end_date_str
-                }
-            }
-            
-            # 查询数据
-            cursor = collection.find(query).sort('trade_date', 1)
-            data = list(cursor)
-            
-            if not data:
+            if df.empty:
                 self.logger.debug(f"未找到股票 {stock_code} 的周线数据，尝试从日线数据合成")
                 return self._synthesize_weekly_from_daily(stock_code, start_date, end_date)
             
-            # 转换为DataFrame
-            df = pd.DataFrame(data)
-            
             # 数据处理
             df = self._process_weekly_data(df)
             
@@ -143,32 +114,13 @@ class DataFetcher:
             月线数据DataFrame
         """
         try:
-            # 尝试从stock_kline_monthly集合获取月线数据
-            collection = self.db_handler.get_collection('stock_kline_monthly')
-            
-            # 构建查询条件
-            start_date_str = start_date.strftime('%Y%m%d')
-            end_date_str = end_date.strftime('%Y%m%d')
+            # 从共享行情仓库获取stock_kline_monthly数据
+            df = self._load_frame('stock_kline_monthly', stock_code, start_date, end_date)
             
-            query = {
-                'ts_code': stock_code,
-                'trade_date': {
-                    '$gte': start_date_str,
-                    '$lte': end_date_str
-                }
-            }
-            
-            # 查询数据
-            cursor = collection.find(query).sort('trade_date', 1)
-            data = list(cursor)
-            
-            if not data:
+            if df.empty:
                 self.logger.debug(f"未找到股票 {stock_code} 的月线数据，尝试从日线数据合成")
                 return self._synthesize_monthly_from_daily(stock_code, start_date, end_date)
             
-            # 转换为DataFrame
-            df = pd.DataFrame(data)
-            
             # 数据处理
             df = self._process_monthly_data(df)
             
@@ -191,32 +143,13 @@ class DataFetcher:
             技术因子数据DataFrame
         """
         try:
-            # 直接从stock_factor_pro集合获取技术因子数据
-            collection = self.db_handler.get_collection('stock_factor_pro')
-            
-            # 构建查询条件
-            start_date_str = start_date.strftime('%Y%m%d')
-            end_date_str = end_date.strftime('%Y%m%d')
-            
-            query = {
-                'ts_code': stock_code,
-                'trade_date': {
-                    '$gte': start_date_str,
-                    '$lte': end_date_str
-                }
-            }
-            
-            # 查询数据
-            cursor = collection.find(query).sort('trade_date', 1)
-            data = list(cursor)
+            # 从共享行情仓库获取stock_factor_pro数据
+            df = self._load_frame('stock_factor_pro', stock_code, start_date, end_date)
             
-            if not data:
+            if df.empty:
                 self.logger.debug(f"未找到股票 {stock_code} 的技术因子数据")
                 return pd.DataFrame()
             
-            # 转换为DataFrame
-            df = pd.DataFrame(data)
-            
             # 数据处理
             df = self._process_factor_data(df)
             
@@ -459,23 +392,13 @@ class DataFetcher:
             if end_date is None:
                 end_date = datetime.now()
             
-            query = {
-                'ts_code': index_code,
-                'trade_date': {
-                    '$gte': start_date.strftime('%Y%m%d'),
-                    '$lte': end_date.strftime('%Y%m%d')
-                }
-            }
-            
-            collection = self.db_handler.get_collection('index_kline_daily')
-            data = list(collection.find(query))
+            df = self._load_frame('index_kline_daily', index_code, start_date, end_date)
             
-            if not data:
+            if df.empty:
                 self.logger.warning(f"未找到指数 {index_code} 的数据")
                 return pd.DataFrame()
             
-            # 转换为DataFrame并处理
-            df = pd.DataFrame(data)
+            # 数据处理
             df = self._process_daily_data(df)
             
             return df
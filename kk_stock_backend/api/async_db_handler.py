@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步数据库处理器
+DBHandler 的异步孪生版本，提供相同的 get_collection 接口。
+
+- 安装了 motor 时直接使用 AsyncIOMotorClient，查询不会阻塞事件循环
+- 未安装 motor 时降级为线程池代理：同样的 await 调用方式，底层 pymongo 调用在线程池中执行
+
+路由中的用法与 motor 一致:
+    collection = async_db_handler.get_collection('stock_kline_daily')
+    doc = await collection.find_one({...})
+    docs = await collection.find({...}).sort('trade_date', -1).limit(10).to_list(length=None)
+    async for doc in collection.find({...}): ...
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from api.db_handler import LOCAL_MONGO_URI, DB_NAME
+from api.utils.mongo_monitoring import get_command_listeners
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    HAS_MOTOR = True
+except ImportError:
+    HAS_MOTOR = False
+    AsyncIOMotorClient = None
+
+logger = logging.getLogger(__name__)
+
+# 线程池大小：降级模式下同时在途的同步查询上限
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", 16))
+
+# 降级模式下异步迭代每次从pymongo游标拉取的文档数
+OFFLOAD_FETCH_SIZE = 1000
+
+_db_executor: Optional[ThreadPoolExecutor] = None
+_db_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """获取数据库专用线程池（进程内单例）"""
+    global _db_executor
+    if _db_executor is None:
+        with _db_executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(
+                    max_workers=DB_EXECUTOR_WORKERS,
+                    thread_name_prefix="db_offload"
+                )
+    return _db_executor
+
+
+async def run_sync(func: Callable, *args, **kwargs) -> Any:
+    """
+    在数据库线程池中执行同步函数，避免阻塞事件循环
+
+    适用于尚未迁移到异步接口的同步分析器、pandas计算等调用。
+
+    Args:
+        func: 同步函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    # 复制上下文，使线程池中的查询仍计入当前请求的Mongo统计
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+class OffloadCursor:
+    """pymongo 游标的异步代理，链式方法与 motor 游标保持一致"""
+
+    def __init__(self, cursor_factory: Callable):
+        self._cursor_factory = cursor_factory
+        self._chain: List[tuple] = []
+        self._cursor = None
+        self._buffer: deque = deque()
+        self._exhausted = False
+
+    def _chained(self, method: str, *args, **kwargs) -> "OffloadCursor":
+        self._chain.append((method, args, kwargs))
+        return self
+
+    def sort(self, *args, **kwargs) -> "OffloadCursor":
+        return self._chained("sort", *args, **kwargs)
+
+    def limit(self, *args, **kwargs) -> "OffloadCursor":
+        return self._chained("limit", *args, **kwargs)
+
+    def skip(self, *args, **kwargs) -> "OffloadCursor":
+        return self._chained("skip", *args, **kwargs)
+
+    def batch_size(self, *args, **kwargs) -> "OffloadCursor":
+        return self._chained("batch_size", *args, **kwargs)
+
+    def hint(self, *args, **kwargs) -> "OffloadCursor":
+        return self._chained("hint", *args, **kwargs)
+
+    def _build(self):
+        cursor = self._cursor_factory()
+        for method, args, kwargs in self._chain:
+            cursor = getattr(cursor, method)(*args, **kwargs)
+        return cursor
+
+    def _materialize(self, length: Optional[int]) -> List[Dict]:
+        cursor = self._build()
+        if length is not None and hasattr(cursor, "limit"):
+            cursor = cursor.limit(length)
+        return list(cursor)
+
+    def _fetch_next(self) -> List[Dict]:
+        if self._cursor is None:
+            self._cursor = self._build()
+        return list(itertools.islice(self._cursor, OFFLOAD_FETCH_SIZE))
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        """一次性取回全部结果"""
+        return await run_sync(self._materialize, length)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict:
+        # 分批从游标拉取，大结果集迭代时不会整体载入内存
+        if not self._buffer and not self._exhausted:
+            docs = await run_sync(self._fetch_next)
+            if len(docs) < OFFLOAD_FETCH_SIZE:
+                self._exhausted = True
+            self._buffer.extend(docs)
+        if not self._buffer:
+            raise StopAsyncIteration
+        return self._buffer.popleft()
+
+
+class OffloadCollection:
+    """pymongo 集合的异步代理：所有IO方法都在线程池中执行"""
+
+    _ASYNC_METHODS = (
+        "find_one", "count_documents", "estimated_document_count", "distinct",
+        "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+        "delete_one", "delete_many", "bulk_write", "find_one_and_update",
+        "create_index", "create_indexes", "index_information",
+    )
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    @property
+    def name(self) -> str:
+        return self._collection.name
+
+    def find(self, *args, **kwargs) -> OffloadCursor:
+        return OffloadCursor(lambda: self._collection.find(*args, **kwargs))
+
+    def aggregate(self, pipeline: List[Dict], **kwargs) -> OffloadCursor:
+        return OffloadCursor(lambda: self._collection.aggregate(pipeline, **kwargs))
+
+    def __getattr__(self, item: str):
+        attr = getattr(self._collection, item)
+        if item in self._ASYNC_METHODS:
+            async def _offloaded(*args, **kwargs):
+                return await run_sync(attr, *args, **kwargs)
+            return _offloaded
+        return attr
+
+
+class AsyncDBHandler:
+    """异步数据库处理器，接口与 DBHandler.get_collection 保持一致"""
+
+    def __init__(self):
+        self.client = None
+        self.db = None
+        self.use_motor = HAS_MOTOR
+        self._loop = None
+
+        if not self.use_motor:
+            logger.warning("⚠️ 未安装motor，异步数据库处理器降级为线程池模式")
+
+    def _ensure_motor_client(self):
+        """motor客户端绑定事件循环，需在事件循环内首次使用时创建"""
+        loop = asyncio.get_running_loop()
+        if self.client is None or self._loop is not loop:
+            self.client = AsyncIOMotorClient(
+                LOCAL_MONGO_URI,
+                serverSelectionTimeoutMS=5000,
+                connectTimeoutMS=5000,
+                maxPoolSize=int(os.getenv("ASYNC_MONGO_MAX_POOL", 20)),
+                minPoolSize=1,
+                maxIdleTimeMS=60000,
+                retryWrites=True,
+                w=1,
+                appName="kk_stock_api_async",
+                event_listeners=get_command_listeners()
+            )
+            self.db = self.client[DB_NAME]
+            self._loop = loop
+            logger.info(f"✅ Worker{os.getpid()}: 异步MongoDB客户端初始化成功")
+
+    def get_collection(self, collection_name: str):
+        """获取异步集合对象"""
+        if self.use_motor:
+            self._ensure_motor_client()
+            return self.db[collection_name]
+        from api.global_db import get_global_db_handler
+        return OffloadCollection(get_global_db_handler().get_collection(collection_name))
+
+    def close(self):
+        """关闭连接"""
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.db = None
+
+
+_async_db_handler: Optional[AsyncDBHandler] = None
+
+
+def get_async_db_handler() -> AsyncDBHandler:
+    """获取异步数据库处理器单例"""
+    global _async_db_handler
+    if _async_db_handler is None:
+        _async_db_handler = AsyncDBHandler()
+    return _async_db_handler
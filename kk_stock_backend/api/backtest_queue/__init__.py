@@ -0,0 +1,4 @@
+"""
+回测任务队列模块
+回测在独立的worker进程中执行，API进程只负责入队、查询与取消
+"""
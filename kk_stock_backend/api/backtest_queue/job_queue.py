@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于Redis的回测任务队列
+
+Redis(db=1，与回测任务状态同库)存储布局:
+- backtest_queue:pending        ZSet，待执行任务，分值越小越先执行（优先级 + 入队时间）
+- backtest_job:{task_id}        Hash，任务载荷（user_id、priority、user_limit、config）
+- backtest_job:{task_id}:cancel 取消标记，worker在每个交易日检查
+- backtest_queue:running        Hash，task_id -> 运行信息（worker、心跳时间）
+- backtest_queue:user_running   Hash，user_id -> 正在运行的任务数
+- backtest_queue:wakeup         List，入队时推送，空闲worker阻塞等待
+- backtest_queue:expired        List，排队期间载荷已过期的任务ID，由进程池监管线程标记失败
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "backtest_queue:pending"
+RUNNING_KEY = "backtest_queue:running"
+USER_RUNNING_KEY = "backtest_queue:user_running"
+WAKEUP_KEY = "backtest_queue:wakeup"
+EXPIRED_KEY = "backtest_queue:expired"
+JOB_KEY_PREFIX = "backtest_job:"
+
+# 每个用户同时运行的回测数量上限
+MAX_JOBS_PER_USER = int(os.getenv("BACKTEST_MAX_JOBS_PER_USER", 1))
+MAX_JOBS_PER_ADMIN = int(os.getenv("BACKTEST_MAX_JOBS_PER_ADMIN", 3))
+# 优先级范围 0-9，数值越大越优先
+DEFAULT_PRIORITY = 5
+ADMIN_PRIORITY = 7
+# 任务载荷与取消标记的过期时间
+JOB_TTL = 7200
+
+# 按队列顺序找到第一个未超出用户并发上限的任务，原子地出队并登记运行
+# 载荷已过期的任务移出队列并记入过期列表
+_CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGE', KEYS[1], 0, -1)
+for _, id in ipairs(ids) do
+    local job_key = ARGV[3] .. id
+    local user = redis.call('HGET', job_key, 'user_id')
+    if not user then
+        redis.call('ZREM', KEYS[1], id)
+        redis.call('RPUSH', KEYS[4], id)
+    else
+        local limit = tonumber(redis.call('HGET', job_key, 'user_limit') or ARGV[1])
+        local running = tonumber(redis.call('HGET', KEYS[2], user) or '0')
+        if running < limit then
+            redis.call('ZREM', KEYS[1], id)
+            redis.call('HINCRBY', KEYS[2], user, 1)
+            redis.call('HSET', KEYS[3], id, ARGV[2])
+            return id
+        end
+    end
+end
+return false
+"""
+
+# 释放运行登记与用户并发计数（计数不小于0）
+_RELEASE_SCRIPT = """
+if redis.call('HDEL', KEYS[1], ARGV[1]) == 1 then
+    local left = redis.call('HINCRBY', KEYS[2], ARGV[2], -1)
+    if left <= 0 then
+        redis.call('HDEL', KEYS[2], ARGV[2])
+    end
+    return 1
+end
+return 0
+"""
+
+# 刷新运行登记中的心跳时间，任务已释放（登记不存在）时不重新创建
+_HEARTBEAT_SCRIPT = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then
+    return 0
+end
+local info = cjson.decode(raw)
+info['heartbeat'] = tonumber(ARGV[2])
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(info))
+return 1
+"""
+
+
+class BacktestJobQueue:
+    """回测任务队列"""
+    
+    def __init__(self):
+        try:
+            self.redis_client = redis.Redis(
+                host='localhost',
+                port=6379,
+                db=1,
+                decode_responses=True,
+                socket_timeout=10,
+                socket_connect_timeout=5
+            )
+            self.redis_client.ping()
+            self._claim = self.redis_client.register_script(_CLAIM_SCRIPT)
+            self._release = self.redis_client.register_script(_RELEASE_SCRIPT)
+            self._heartbeat = self.redis_client.register_script(_HEARTBEAT_SCRIPT)
+        except Exception as e:
+            logger.warning(f"⚠️ 回测任务队列Redis连接失败，回测将在API进程内执行: {e}")
+            self.redis_client = None
+    
+    def is_available(self) -> bool:
+        return self.redis_client is not None
+    
+    @staticmethod
+    def _job_key(task_id: str) -> str:
+        return f"{JOB_KEY_PREFIX}{task_id}"
+    
+    @staticmethod
+    def _cancel_key(task_id: str) -> str:
+        return f"{JOB_KEY_PREFIX}{task_id}:cancel"
+    
+    @staticmethod
+    def _score(priority: int, enqueued_at: float) -> float:
+        # 优先级占高位，同优先级按入队时间先后
+        return (9 - priority) * 1e13 + enqueued_at * 1000
+    
+    def enqueue(self, task_id: str, user_id: str, config: Dict[str, Any],
+                priority: int = DEFAULT_PRIORITY, user_limit: int = MAX_JOBS_PER_USER) -> int:
+        """
+        任务入队
+        
+        Returns:
+            排队位置（从1开始）
+        """
+        priority = min(max(int(priority), 0), 9)
+        now = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.hset(self._job_key(task_id), mapping={
+            'task_id': task_id,
+            'user_id': user_id,
+            'priority': priority,
+            'user_limit': user_limit,
+            'config': json.dumps(config, default=str),
+            'enqueued_at': now
+        })
+        pipe.expire(self._job_key(task_id), JOB_TTL)
+        pipe.zadd(PENDING_KEY, {task_id: self._score(priority, now)})
+        pipe.lpush(WAKEUP_KEY, task_id)
+        pipe.ltrim(WAKEUP_KEY, 0, 999)
+        pipe.zrank(PENDING_KEY, task_id)
+        rank = pipe.execute()[-1]
+        return (rank or 0) + 1
+    
+    def wait_for_work(self, timeout: int = 5) -> None:
+        """阻塞等待入队通知（超时后返回，由调用方重试领取）"""
+        try:
+            self.redis_client.brpop(WAKEUP_KEY, timeout=timeout)
+        except redis.exceptions.TimeoutError:
+            pass
+    
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """领取下一个可执行的任务，无可执行任务时返回None"""
+        running_info = json.dumps({'worker': worker_id, 'started_at': time.time(), 'heartbeat': time.time()})
+        task_id = self._claim(
+            keys=[PENDING_KEY, USER_RUNNING_KEY, RUNNING_KEY, EXPIRED_KEY],
+            args=[MAX_JOBS_PER_USER, running_info, JOB_KEY_PREFIX]
+        )
+        if not task_id:
+            return None
+        job = self.redis_client.hgetall(self._job_key(task_id))
+        if not job:
+            self.release(task_id, None)
+            self.redis_client.rpush(EXPIRED_KEY, task_id)
+            return None
+        job['config'] = json.loads(job['config'])
+        job['priority'] = int(job.get('priority', DEFAULT_PRIORITY))
+        return job
+    
+    def heartbeat(self, task_id: str) -> bool:
+        """刷新运行中任务的心跳，任务已释放时返回False（不重新登记）"""
+        return bool(self._heartbeat(keys=[RUNNING_KEY], args=[task_id, time.time()]))
+    
+    def release(self, task_id: str, user_id: Optional[str]) -> None:
+        """任务结束：释放用户并发名额并清理载荷"""
+        if user_id is None:
+            user_id = self.redis_client.hget(self._job_key(task_id), 'user_id') or ''
+        self._release(keys=[RUNNING_KEY, USER_RUNNING_KEY], args=[task_id, user_id])
+        self.redis_client.delete(self._job_key(task_id), self._cancel_key(task_id))
+    
+    def cancel(self, task_id: str) -> str:
+        """
+        取消任务
+        
+        Returns:
+            dequeued: 尚在排队，已直接移出队列
+            cancelling: 正在运行，已设置取消标记，由worker协作退出
+        """
+        if self.redis_client.zrem(PENDING_KEY, task_id):
+            self.redis_client.delete(self._job_key(task_id))
+            return 'dequeued'
+        self.redis_client.setex(self._cancel_key(task_id), JOB_TTL, 1)
+        return 'cancelling'
+    
+    def is_cancelled(self, task_id: str) -> bool:
+        return bool(self.redis_client.exists(self._cancel_key(task_id)))
+    
+    def pending_task_ids(self) -> List[str]:
+        """按执行顺序返回排队中的任务ID"""
+        return self.redis_client.zrange(PENDING_KEY, 0, -1)
+    
+    def recover_stale(self, timeout: float) -> List[str]:
+        """
+        回收心跳超时的运行登记（worker进程异常退出）
+        
+        Returns:
+            被回收的任务ID
+        """
+        stale = []
+        now = time.time()
+        for task_id, raw in self.redis_client.hgetall(RUNNING_KEY).items():
+            try:
+                heartbeat = json.loads(raw).get('heartbeat', 0)
+            except ValueError:
+                heartbeat = 0
+            if now - heartbeat > timeout:
+                self.release(task_id, None)
+                stale.append(task_id)
+        return stale
+    
+    def pop_expired(self) -> List[str]:
+        """
+        取出排队期间载荷已过期的任务
+        
+        Returns:
+            过期的任务ID
+        """
+        pipe = self.redis_client.pipeline()
+        pipe.lrange(EXPIRED_KEY, 0, -1)
+        pipe.delete(EXPIRED_KEY)
+        return pipe.execute()[0]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """队列统计"""
+        return {
+            'pending': self.redis_client.zcard(PENDING_KEY),
+            'running': self.redis_client.hlen(RUNNING_KEY),
+            'user_running': self.redis_client.hgetall(USER_RUNNING_KEY)
+        }
+
+
+_job_queue: Optional[BacktestJobQueue] = None
+
+
+def get_job_queue() -> BacktestJobQueue:
+    """获取回测任务队列单例"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = BacktestJobQueue()
+    return _job_queue
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回测worker进程池
+
+- 嵌入模式：API启动时调用 backtest_worker_pool.start()，多个uvicorn worker通过Redis锁
+  选出一个进程负责拉起并监管worker进程
+- 独立模式：python -m api.backtest_queue.worker --workers 4
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import uuid
+from typing import List, Optional
+
+from .job_queue import get_job_queue
+
+logger = logging.getLogger(__name__)
+
+# worker进程数，默认占用一半CPU核，其余留给API进程
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# 心跳间隔与超时（秒）
+HEARTBEAT_INTERVAL = 10
+STALE_TIMEOUT = 120
+# 进程池监管者锁
+POOL_OWNER_KEY = "backtest_queue:pool_owner"
+POOL_OWNER_TTL = 45
+SUPERVISE_INTERVAL = 15
+
+
+def worker_main(worker_id: str) -> None:
+    """worker进程入口：循环领取并执行回测任务"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    
+    # 任务状态与执行逻辑都在统一回测模块中
+    from api.routers.backtest_unified import execute_backtest_job, publish_queue_positions
+    from api.utils.mongo_monitoring import operation_scope
+    
+    queue = get_job_queue()
+    if not queue.is_available():
+        logger.error(f"❌ {worker_id}: 回测任务队列不可用，worker退出")
+        return
+    logger.info(f"✅ 回测worker已启动: {worker_id} (pid={os.getpid()})")
+    
+    try:
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                queue.wait_for_work(timeout=5)
+                continue
+            
+            task_id = job['task_id']
+            publish_queue_positions()
+            stop_heartbeat = threading.Event()
+            
+            def _heartbeat():
+                while not stop_heartbeat.wait(HEARTBEAT_INTERVAL):
+                    try:
+                        queue.heartbeat(task_id)
+                    except Exception as e:
+                        logger.warning(f"回测任务心跳失败: {e}")
+            
+            heartbeat_thread = threading.Thread(target=_heartbeat, daemon=True)
+            heartbeat_thread.start()
+            try:
+                with operation_scope(f"backtest:{job['config'].get('strategy_name', 'unknown')}"):
+                    execute_backtest_job(
+                        task_id, job['config'], job['user_id'],
+                        should_cancel=lambda: queue.is_cancelled(task_id)
+                    )
+            finally:
+                # 等心跳线程退出后再释放，避免释放后仍有心跳写入运行登记
+                stop_heartbeat.set()
+                heartbeat_thread.join()
+                queue.release(task_id, job['user_id'])
+    except KeyboardInterrupt:
+        logger.info(f"🛑 回测worker退出: {worker_id}")
+
+
+class BacktestWorkerPool:
+    """回测worker进程池（含监管线程）"""
+    
+    def __init__(self, size: int = BACKTEST_WORKERS):
+        self.size = size
+        self.owner_token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.processes: List[multiprocessing.Process] = []
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> None:
+        """后台启动监管线程（嵌入API进程）"""
+        if self._thread and self._thread.is_alive():
+            return
+        if not get_job_queue().is_available():
+            logger.warning("⚠️ 回测任务队列不可用，不启动worker进程池")
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._supervise, name="backtest_pool", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """停止监管线程与worker进程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._terminate_processes()
+        queue = get_job_queue()
+        if queue.is_available() and queue.redis_client.get(POOL_OWNER_KEY) == self.owner_token:
+            queue.redis_client.delete(POOL_OWNER_KEY)
+    
+    def run_forever(self) -> None:
+        """前台运行（独立模式）"""
+        try:
+            self._supervise()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+    
+    def _acquire_ownership(self) -> bool:
+        """获取或续期监管者锁，保证同一时刻只有一个进程池"""
+        client = get_job_queue().redis_client
+        if client.set(POOL_OWNER_KEY, self.owner_token, nx=True, ex=POOL_OWNER_TTL):
+            return True
+        if client.get(POOL_OWNER_KEY) == self.owner_token:
+            client.expire(POOL_OWNER_KEY, POOL_OWNER_TTL)
+            return True
+        return False
+    
+    def _supervise(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                if self._acquire_ownership():
+                    self._ensure_processes()
+                    self._recover_stale_jobs()
+                elif self.processes:
+                    # 锁被其他进程接管（例如本进程长时间阻塞），交出进程池
+                    self._terminate_processes()
+            except Exception as e:
+                logger.error(f"❌ 回测进程池监管失败: {e}")
+            self._stop_event.wait(SUPERVISE_INTERVAL)
+    
+    def _ensure_processes(self) -> None:
+        """拉起或重启worker进程"""
+        alive = [p for p in self.processes if p.is_alive()]
+        for p in self.processes:
+            if not p.is_alive():
+                logger.warning(f"⚠️ 回测worker进程已退出: {p.name} (exitcode={p.exitcode})")
+        self.processes = alive
+        while len(self.processes) < self.size:
+            worker_id = f"{socket.gethostname()}-bt{uuid.uuid4().hex[:6]}"
+            process = self._ctx.Process(target=worker_main, args=(worker_id,), name=worker_id, daemon=True)
+            process.start()
+            self.processes.append(process)
+            logger.info(f"🚀 已启动回测worker进程: {worker_id} (pid={process.pid})")
+    
+    def _recover_stale_jobs(self) -> None:
+        """回收异常退出worker遗留的任务与排队期间载荷过期的任务，并标记失败"""
+        queue = get_job_queue()
+        stale = queue.recover_stale(STALE_TIMEOUT)
+        expired = queue.pop_expired()
+        if not stale and not expired:
+            return
+        from api.routers.backtest_unified import task_manager
+        for task_id in stale:
+            logger.warning(f"⚠️ 回收心跳超时的回测任务: {task_id}")
+            task_manager.update_task(task_id, {
+                'status': 'failed',
+                'message': '回测worker异常退出，任务已终止'
+            })
+            task_manager.expire_task(task_id)
+        for task_id in expired:
+            logger.warning(f"⚠️ 回测任务排队超时，载荷已过期: {task_id}")
+            task_manager.update_task(task_id, {
+                'status': 'failed',
+                'message': '回测任务排队超时，任务已终止',
+                'queue_position': 0
+            })
+            task_manager.expire_task(task_id)
+    
+    def _terminate_processes(self) -> None:
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join(timeout=10)
+        self.processes = []
+    
+    def get_stats(self) -> dict:
+        return {
+            'size': self.size,
+            'alive': len([p for p in self.processes if p.is_alive()]),
+            'is_owner': bool(self.processes)
+        }
+
+
+backtest_worker_pool = BacktestWorkerPool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回测worker进程池")
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS, help="worker进程数")
+    args = parser.parse_args()
+    
+    # 保证worker进程能导入api包
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.path.insert(0, project_root)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    print(f"🚀 启动回测worker进程池: {args.workers} 个进程")
+    BacktestWorkerPool(size=args.workers).run_forever()
@@ -69,6 +69,9 @@ CACHE_TTL = {
     'sector_stats': 30 * 60,       # 板块统计 - 30分钟
     'performance_stats': 1 * 3600, # 性能统计 - 1小时
     
+    # 策略选股 - 缓存键含数据交易日，入库后自动换新
+    'strategy_screening': 4 * 3600, # 策略选股结果 - 4小时
+    
     # 默认TTL
     'default': 1 * 3600            # 默认 - 1小时
 }
@@ -115,7 +118,10 @@ CACHE_KEYS = {
     'chan_analysis': 'chan:analysis',
     'chan_structure': 'chan:structure', 
     'chan_signals': 'chan:signals',
-    'dow_analysis': 'dow:analysis'
+    'dow_analysis': 'dow:analysis',
+    
+    # 策略选股共享结果
+    'strategy_screening': 'strategy:screening'
 }
 
 # 缓存策略配置
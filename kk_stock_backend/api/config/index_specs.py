@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公共行情集合的索引声明
+这些集合被多个路由、分析模块共同读取，查询形状主要是"单只证券按日期区间"和"某交易日全市场截面"两类。
+模块自有集合的索引在各自模块中声明（见 api.utils.index_registry）。
+"""
+
+from api.utils.index_registry import declare_indexes
+
+_SERIES = {"keys": [("ts_code", 1), ("trade_date", -1)], "reason": "单只证券按日期区间/最新一条"}
+_CROSS_SECTION = {"keys": [("trade_date", -1), ("ts_code", 1)], "reason": "某交易日全市场截面、最新交易日"}
+
+for _collection in ("stock_kline_daily", "stock_kline_weekly", "stock_kline_monthly",
+                    "stock_daily", "stock_weekly", "stock_monthly",
+                    "index_daily", "index_factor_pro"):
+    declare_indexes(_collection, [_SERIES, _CROSS_SECTION], owner=__name__)
+
+declare_indexes("stock_basic", [
+    {"keys": [("ts_code", 1)], "reason": "按代码查基本信息"},
+    {"keys": [("industry", 1)], "reason": "按行业筛选"},
+], owner=__name__)
+
+declare_indexes("index_weight", [
+    {"keys": [("index_code", 1), ("trade_date", -1)], "reason": "指数成分股最新权重"},
+    {"keys": [("con_code", 1), ("trade_date", -1)], "reason": "个股所属指数"},
+], owner=__name__)
+
+declare_indexes("infrastructure_trading_calendar", [
+    {"keys": [("exchange", 1), ("cal_date", -1)], "reason": "交易所日历区间/判断交易日"},
+    {"keys": [("exchange", 1), ("is_open", 1), ("cal_date", -1)], "reason": "最近N个开市日"},
+], owner=__name__)
+
+# 选股查询形状所需索引：按交易日截面筛选因子，按股票取最近的财务/两融/资金流数据
+declare_indexes("stock_factor_pro", [
+    {"keys": [("trade_date", -1), ("ts_code", 1)], "reason": "交易日截面因子筛选"},
+    {"keys": [("ts_code", 1), ("trade_date", -1)], "reason": "单股因子序列"},
+], owner=__name__)
+declare_indexes("stock_fina_indicator", [
+    {"keys": [("ts_code", 1), ("end_date", -1)], "reason": "单股最新/指定报告期财务指标"},
+    {"keys": [("end_date", -1)], "reason": "最新报告期"},
+], owner=__name__)
+declare_indexes("margin_detail", [
+    {"keys": [("ts_code", 1), ("trade_date", -1)], "reason": "单股近期两融明细"},
+    {"keys": [("trade_date", -1)], "reason": "交易日两融截面"},
+], owner=__name__)
+declare_indexes("stock_money_flow", [
+    {"keys": [("ts_code", 1), ("trade_date", -1)], "reason": "单股资金流向区间"},
+    {"keys": [("trade_date", -1)], "reason": "交易日资金流向截面/汇总"},
+], owner=__name__)
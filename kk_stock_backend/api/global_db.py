@@ -7,6 +7,7 @@
 
 import logging
 from api.db_handler import get_db_handler
+from api.async_db_handler import get_async_db_handler
 
 logger = logging.getLogger(__name__)
 
@@ -25,4 +26,7 @@ def get_global_db_handler():
     return _global_db_handler
 
 # 向后兼容的全局变量
-db_handler = get_global_db_handler()
\ No newline at end of file
+db_handler = get_global_db_handler()
+
+# 异步数据库处理器 - async路由应使用它，避免同步pymongo调用阻塞事件循环
+async_db_handler = get_async_db_handler()
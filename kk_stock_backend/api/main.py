@@ -1,7 +1,9 @@
 import os
+import time
+_module_started = time.perf_counter()
+
 import asyncio
 import logging
-import os
 from datetime import datetime
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
@@ -11,28 +13,15 @@ from fastapi.responses import JSONResponse
 import uvicorn
 from dotenv import load_dotenv
 
-# 导入路由模块
-from api.routers import user, market, strategy, user_stock_pools, analysis_results, backtest_unified, simulation
-from api.routers import (
-    stock_data, index_data, financial_data,
-    market_flow, margin_data, dragon_tiger,
-    analytics, admin, system, trading_calendar,
-    concept_data, hm_data, futures_data, etf_data,
-    sentiment_analytics, database_config, cache_demo,
-    dow_theory_analysis, macro_data, options_data,
-    limit_data, relative_valuation, margin_trading,
-    market_margin_analysis
-)
+# 路由模块延迟加载（首次请求或服务监听后在后台导入）
+from api.router_loader import router_loader, LazyRouterMiddleware
 
 # 导入缓存管理器
 from cache_manager import init_cache_manager, get_cache_manager
 from cache_config import get_cache_config
 
-# 导入模拟交易调度器
-from api.simulation.scheduler import start_simulation_scheduler, stop_simulation_scheduler
-
 # 导入中间件
-from api.middleware import AdvancedRateLimitMiddleware
+from api.middleware import AdvancedRateLimitMiddleware, MetricsMiddleware
 
 # 加载环境变量
 load_dotenv()
@@ -41,6 +30,10 @@ load_dotenv()
 API_PORT = int(os.getenv("API_PORT", 9001))
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_RELOAD = os.getenv("API_RELOAD", "false").lower() == "true"
+# 关闭后在导入时同步加载全部路由（便于排查导入错误）
+LAZY_ROUTERS = os.getenv("LAZY_ROUTERS", "1") != "0"
+# 服务监听后开始后台预加载路由与启动定时任务的延迟（秒）
+ROUTER_PRELOAD_DELAY = float(os.getenv("ROUTER_PRELOAD_DELAY", 1.0))
 
 # 设置日志
 logging.basicConfig(
@@ -49,11 +42,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _start_background_services(app: FastAPI, delay: float):
+    """
+    服务开始监听后再启动的后台服务：定时任务调度器（APScheduler及各任务模块导入较慢）、索引校验
+    """
+    await asyncio.sleep(delay)
+    started = time.perf_counter()
+    # 先在线程池中完成较慢的导入，再在事件循环中启动调度器
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _import_scheduler_modules)
+    except Exception as e:
+        logger.error(f"❌ 导入定时任务模块失败: {e}")
+    
+    # 启动模拟交易定时任务调度器
+    logger.info("📅 正在启动模拟交易定时任务调度器...")
+    try:
+        from api.simulation.scheduler import start_simulation_scheduler
+        start_simulation_scheduler()
+        logger.info("✅ 模拟交易定时任务调度器启动成功")
+    except Exception as e:
+        logger.error(f"❌ 模拟交易调度器启动失败: {e}")
+    
+    # 启动策略自动化调度器
+    logger.info("🤖 正在启动策略自动化调度器...")
+    try:
+        from api.simulation.strategy_scheduler import strategy_scheduler
+        strategy_scheduler.start()
+        logger.info("✅ 策略自动化调度器启动成功")
+    except Exception as e:
+        logger.error(f"❌ 策略自动化调度器启动失败: {e}")
+    
+    # 启动盘后预计算调度器
+    logger.info("🧮 正在启动盘后预计算调度器...")
+    try:
+        from api.precompute.scheduler import precompute_scheduler
+        precompute_scheduler.start()
+        logger.info("✅ 盘后预计算调度器启动成功")
+    except Exception as e:
+        logger.error(f"❌ 盘后预计算调度器启动失败: {e}")
+    
+    app.state.schedulers_started = True
+    router_loader.record_phase("background_schedulers", time.perf_counter() - started)
+    
+    # 后台校验并补建注册表中声明的索引（全新部署时自动建好热点集合索引）
+    if os.getenv("INDEX_AUTO_VERIFY", "1") != "0":
+        try:
+            from api.global_db import db_handler
+            from api.async_db_handler import run_sync
+            from api.precompute.scheduler import run_exclusive
+            from api.utils.index_registry import verify_indexes_on_startup
+            await run_exclusive('index_registry', lambda: run_sync(verify_indexes_on_startup, db_handler))
+        except Exception as e:
+            logger.error(f"❌ 索引校验失败: {e}")
+
+def _import_scheduler_modules():
+    """导入定时任务模块（在线程池中执行）"""
+    import api.simulation.scheduler  # noqa: F401
+    import api.simulation.strategy_scheduler  # noqa: F401
+    import api.precompute.scheduler  # noqa: F401
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时的初始化
     logger.info("🚀 正在启动量化分析API服务...")
+    lifespan_started = time.perf_counter()
     
     try:
         # 初始化Redis缓存管理器
@@ -99,23 +152,23 @@ async def lifespan(app: FastAPI):
             app.state.cache_manager = None
             app.state.cache_config = cache_config
         
-        # 启动模拟交易定时任务调度器
-        logger.info("📅 正在启动模拟交易定时任务调度器...")
-        try:
-            start_simulation_scheduler()
-            logger.info("✅ 模拟交易定时任务调度器启动成功")
-        except Exception as e:
-            logger.error(f"❌ 模拟交易调度器启动失败: {e}")
-        
-        # 启动策略自动化调度器
-        logger.info("🤖 正在启动策略自动化调度器...")
-        try:
-            from api.simulation.strategy_scheduler import strategy_scheduler
-            strategy_scheduler.start()
-            logger.info("✅ 策略自动化调度器启动成功")
-        except Exception as e:
-            logger.error(f"❌ 策略自动化调度器启动失败: {e}")
-        
+        # 启动回测worker进程池（多个uvicorn worker中只有一个会真正拉起进程）
+        if os.getenv("BACKTEST_EMBEDDED_WORKERS", "1") != "0":
+            try:
+                from api.backtest_queue.worker import backtest_worker_pool
+                backtest_worker_pool.start()
+                logger.info("✅ 回测worker进程池监管已启动")
+            except Exception as e:
+                logger.error(f"❌ 回测worker进程池启动失败: {e}")
+
+        # 服务开始监听后：后台预加载路由、启动定时任务
+        if LAZY_ROUTERS:
+            router_loader.start_preload(ROUTER_PRELOAD_DELAY)
+        app.state.background_services_task = asyncio.create_task(
+            _start_background_services(app, ROUTER_PRELOAD_DELAY)
+        )
+        router_loader.record_phase("lifespan_startup", time.perf_counter() - lifespan_started)
+
         logger.info("🎉 API服务启动完成！")
         
     except Exception as e:
@@ -130,22 +183,44 @@ async def lifespan(app: FastAPI):
     logger.info("🛑 正在关闭API服务...")
     
     try:
-        # 停止模拟交易定时任务调度器
-        logger.info("🛑 正在停止模拟交易定时任务调度器...")
-        try:
-            stop_simulation_scheduler()
-            logger.info("✅ 模拟交易定时任务调度器已停止")
-        except Exception as e:
-            logger.error(f"❌ 停止模拟交易调度器失败: {e}")
+        # 停止后台预加载与尚未完成的后台启动任务
+        await router_loader.stop_preload()
+        background_task = getattr(app.state, 'background_services_task', None)
+        if background_task is not None and not background_task.done():
+            background_task.cancel()
+        
+        if getattr(app.state, 'schedulers_started', False):
+            # 停止模拟交易定时任务调度器
+            logger.info("🛑 正在停止模拟交易定时任务调度器...")
+            try:
+                from api.simulation.scheduler import stop_simulation_scheduler
+                stop_simulation_scheduler()
+                logger.info("✅ 模拟交易定时任务调度器已停止")
+            except Exception as e:
+                logger.error(f"❌ 停止模拟交易调度器失败: {e}")
         
-        # 停止策略自动化调度器
-        logger.info("🛑 正在停止策略自动化调度器...")
+            # 停止策略自动化调度器
+            logger.info("🛑 正在停止策略自动化调度器...")
+            try:
+                from api.simulation.strategy_scheduler import strategy_scheduler
+                strategy_scheduler.stop()
+                logger.info("✅ 策略自动化调度器已停止")
+            except Exception as e:
+                logger.error(f"❌ 停止策略自动化调度器失败: {e}")
+        
+            # 停止盘后预计算调度器
+            try:
+                from api.precompute.scheduler import precompute_scheduler
+                precompute_scheduler.stop()
+            except Exception as e:
+                logger.error(f"❌ 停止盘后预计算调度器失败: {e}")
+        
+        # 停止回测worker进程池
         try:
-            from api.simulation.strategy_scheduler import strategy_scheduler
-            strategy_scheduler.stop()
-            logger.info("✅ 策略自动化调度器已停止")
+            from api.backtest_queue.worker import backtest_worker_pool
+            backtest_worker_pool.stop()
         except Exception as e:
-            logger.error(f"❌ 停止策略自动化调度器失败: {e}")
+            logger.error(f"❌ 停止回测worker进程池失败: {e}")
         
         # 清理缓存连接
         cache_manager = getattr(app.state, 'cache_manager', None)
@@ -153,7 +228,15 @@ async def lifespan(app: FastAPI):
             logger.info("🧹 正在清理Redis连接...")
             # Redis连接池会自动清理，这里只是记录日志
             logger.info("✅ Redis连接已清理")
-        
+
+        # 关闭异步MongoDB客户端
+        try:
+            from api.global_db import async_db_handler
+            async_db_handler.close()
+            logger.info("✅ 异步MongoDB连接已关闭")
+        except Exception as e:
+            logger.error(f"❌ 关闭异步MongoDB连接失败: {e}")
+
         logger.info("👋 API服务已安全关闭")
         
     except Exception as e:
@@ -186,6 +269,9 @@ app = FastAPI(
 )
 
 # 中间件配置
+# 路由延迟加载（最先注册即最内层，在路由匹配前导入对应模块）
+app.add_middleware(LazyRouterMiddleware, loader=router_loader)
+
 app.add_middleware(
     GZipMiddleware,
     minimum_size=1000  # 启用gzip压缩
@@ -202,6 +288,9 @@ app.add_middleware(
 # 启用高级限流中间件
 app.add_middleware(AdvancedRateLimitMiddleware)
 
+# 接口性能指标（最后注册即最外层，统计完整耗时与实际响应大小）
+app.add_middleware(MetricsMiddleware)
+
 
 
 # 全局异常处理器
@@ -290,53 +379,59 @@ async def get_metrics():
             content={"error": str(e)}
         )
 
-# 挂载所有路由模块
+# 登记所有路由模块（延迟加载，按登记顺序挂载）
+# 路由自带前缀的模块需通过 path_prefix 告知请求匹配前缀
 # 用户认证和管理
-app.include_router(user.router, prefix="/user", tags=["用户管理"])
-app.include_router(user_stock_pools.router, prefix="/user", tags=["用户股票池"])
-app.include_router(analysis_results.router, prefix="/user", tags=["分析结果管理"])
+router_loader.register("api.routers.user", prefix="/user", tags=["用户管理"])
+router_loader.register("api.routers.user_stock_pools", prefix="/user", tags=["用户股票池"])
+router_loader.register("api.routers.analysis_results", prefix="/user", tags=["分析结果管理"])
 
 # 核心数据接口
-app.include_router(market.router, prefix="/market", tags=["市场数据"])
-app.include_router(stock_data.router, prefix="/stock", tags=["股票数据"])
-app.include_router(index_data.router, prefix="/index", tags=["指数数据"])
-app.include_router(financial_data.router, prefix="/financial", tags=["财务数据"])
-app.include_router(futures_data.router, prefix="/futures", tags=["期货数据"])
-app.include_router(etf_data.router, prefix="/etf", tags=["ETF数据"])
-app.include_router(options_data.router, prefix="/options", tags=["期权数据"])
-app.include_router(trading_calendar.router, prefix="/calendar", tags=["交易日历"])
-app.include_router(concept_data.router)
-app.include_router(hm_data.router, prefix="/hm", tags=["HM自定义数据"])
-app.include_router(macro_data.router, prefix="/macro", tags=["宏观数据"])
-app.include_router(limit_data.router, prefix="/limit_data", tags=["涨跌停数据"])
+router_loader.register("api.routers.market", prefix="/market", tags=["市场数据"])
+router_loader.register("api.routers.stock_data", prefix="/stock", tags=["股票数据"])
+router_loader.register("api.routers.index_data", prefix="/index", tags=["指数数据"])
+router_loader.register("api.routers.financial_data", prefix="/financial", tags=["财务数据"])
+router_loader.register("api.routers.futures_data", prefix="/futures", tags=["期货数据"])
+router_loader.register("api.routers.etf_data", prefix="/etf", tags=["ETF数据"])
+router_loader.register("api.routers.options_data", prefix="/options", tags=["期权数据"])
+router_loader.register("api.routers.trading_calendar", prefix="/calendar", tags=["交易日历"])
+router_loader.register("api.routers.concept_data", path_prefix="/concept")
+router_loader.register("api.routers.hm_data", prefix="/hm", tags=["HM自定义数据"])
+router_loader.register("api.routers.macro_data", prefix="/macro", tags=["宏观数据"])
+router_loader.register("api.routers.limit_data", prefix="/limit_data", tags=["涨跌停数据"])
 
 # 资金和交易数据
-app.include_router(market_flow.router, prefix="/money_flow", tags=["资金流向"])
-app.include_router(margin_data.router, prefix="/margin", tags=["融资融券"])
-app.include_router(margin_trading.router, tags=["融资融券分析"])
-app.include_router(market_margin_analysis.router, tags=["两市融资融券分析"])
-app.include_router(dragon_tiger.router, prefix="/dragon-tiger", tags=["龙虎榜"])
+router_loader.register("api.routers.market_flow", prefix="/money_flow", tags=["资金流向"])
+router_loader.register("api.routers.margin_data", prefix="/margin", tags=["融资融券"])
+router_loader.register("api.routers.margin_trading", tags=["融资融券分析"], path_prefix="/api/margin-trading")
+router_loader.register("api.routers.market_margin_analysis", tags=["两市融资融券分析"], path_prefix="/api/market-margin")
+router_loader.register("api.routers.dragon_tiger", prefix="/dragon-tiger", tags=["龙虎榜"])
 
 # 分析和策略
-app.include_router(analytics.router, prefix="/analytics", tags=["数据分析"])
-app.include_router(sentiment_analytics.router, prefix="/sentiment", tags=["市场情绪分析"])
-app.include_router(strategy.router, prefix="/strategy", tags=["投资策略"])
-app.include_router(backtest_unified.router, prefix="/backtest", tags=["统一回测接口"])
-app.include_router(dow_theory_analysis.router, tags=["道氏理论分析"])
-app.include_router(relative_valuation.router, tags=["相对估值分析"])
+router_loader.register("api.routers.analytics", prefix="/analytics", tags=["数据分析"])
+router_loader.register("api.routers.sentiment_analytics", prefix="/sentiment", tags=["市场情绪分析"])
+router_loader.register("api.routers.strategy", prefix="/strategy", tags=["投资策略"])
+router_loader.register("api.routers.backtest_unified", prefix="/backtest", tags=["统一回测接口"])
+router_loader.register("api.routers.dow_theory_analysis", tags=["道氏理论分析"], path_prefix="/dow_theory")
+router_loader.register("api.routers.relative_valuation", tags=["相对估值分析"], path_prefix="/relative-valuation")
 
 # 模拟交易
-app.include_router(simulation.router, tags=["模拟交易"])
+router_loader.register("api.routers.simulation", tags=["模拟交易"], path_prefix="/api/simulation")
 
 # 智能内容生成模块已删除
 
 # 系统管理
-app.include_router(admin.router, prefix="/admin", tags=["系统管理"])
-app.include_router(system.router, prefix="/system", tags=["系统监控"])
-app.include_router(database_config.router, prefix="/admin", tags=["数据库配置"])
+router_loader.register("api.routers.admin", prefix="/admin", tags=["系统管理"])
+router_loader.register("api.routers.system", prefix="/system", tags=["系统监控"])
+router_loader.register("api.routers.database_config", prefix="/admin", tags=["数据库配置"])
 
 # 缓存演示和管理
-app.include_router(cache_demo.router, prefix="/cache", tags=["缓存演示"])
+router_loader.register("api.routers.cache_demo", prefix="/cache", tags=["缓存演示"])
+
+router_loader.bind(app)
+if not LAZY_ROUTERS:
+    router_loader.load_all_sync()
+router_loader.record_phase("module_import", time.perf_counter() - _module_started)
 
 if __name__ == "__main__":
     # 先使用单worker确保服务正常启动，后续可以通过环境变量控制
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程级行情数据仓库
+回测、缠论、道氏理论、Qlib 等模块统一从这里按 代码/日期/字段 取K线、因子和截面数据：
+- 列式结果：每只证券一个 BarFrame（日期数组 + 按字段的 numpy 列），按需转换为 DataFrame 或记录列表
+- 共享缓存：按 (集合, 代码) 缓存已取区间与字段，以总单元格数为上限做LRU淘汰，带TTL
+- 批量获取：未命中的代码按 $in 分批一次查询，避免逐只往返
+
+用法:
+    from api.market_data_store import get_market_data_store
+    store = get_market_data_store()
+    bars = store.get_bars(["000001.SZ", "600000.SH"], "20240101", "20241231", fields=["open", "close"])
+    df = bars["000001.SZ"].to_frame()
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 频率到集合的映射
+FREQ_COLLECTIONS = {
+    "daily": "stock_kline_daily",
+    "weekly": "stock_kline_weekly",
+    "monthly": "stock_kline_monthly",
+    "30min": "stock_kline_30min",
+    "5min": "stock_kline_5min",
+    "index_daily": "index_daily",
+}
+FACTOR_COLLECTION = "stock_factor_pro"
+
+# K线分析常用字段（部分集合的成交量字段为 volume，见 BarFrame.volumes）
+KLINE_FIELDS = ["open", "high", "low", "close", "vol", "volume", "amount"]
+
+# 写入时附加的内部字段（DBHandler 的内容哈希等），读取时不返回
+INTERNAL_FIELDS = ("_id", "_content_hash")
+
+# 缓存上限（单元格数 = 行数 × 列数），单个结果超过上限的1/4时不缓存
+MAX_CACHE_CELLS = int(os.getenv("MARKET_DATA_CACHE_CELLS", "5000000"))
+CACHE_TTL_SECONDS = int(os.getenv("MARKET_DATA_CACHE_TTL", "600"))
+# 单次 $in 查询的代码数
+FETCH_BATCH_SIZE = int(os.getenv("MARKET_DATA_BATCH_SIZE", "200"))
+
+# 开放区间的结束标记（大于任何日期字符串）
+OPEN_END = "\uffff"
+
+DateLike = Union[str, date, datetime, None]
+
+
+def is_intraday_collection(collection: str) -> bool:
+    """分钟级集合使用 trade_time（YYYY-MM-DD HH:MM:SS），其余使用 trade_date（YYYYMMDD）"""
+    return collection.endswith("min")
+
+
+def date_field_of(collection: str) -> str:
+    return "trade_time" if is_intraday_collection(collection) else "trade_date"
+
+
+def normalize_date(value: DateLike, intraday: bool = False, end: bool = False) -> Optional[str]:
+    """
+    把日期统一为集合中的存储格式
+
+    日线: 'YYYYMMDD'；分钟线: 'YYYY-MM-DD HH:MM:SS'（只给日期时，起点补00:00:00、终点补23:59:59）
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        if not intraday:
+            return value.strftime("%Y%m%d")
+        if end and value.time() == datetime.min.time():
+            return value.strftime("%Y-%m-%d 23:59:59")
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        if not intraday:
+            return value.strftime("%Y%m%d")
+        return value.strftime("%Y-%m-%d") + (" 23:59:59" if end else " 00:00:00")
+
+    text = str(value).strip()
+    if not intraday:
+        return text[:10].replace("-", "")
+    if len(text) == 8 and text.isdigit():
+        text = f"{text[:4]}-{text[4:6]}-{text[6:]}"
+    if len(text) == 10:
+        text += " 23:59:59" if end else " 00:00:00"
+    return text
+
+
+def _to_column(values: List[Any]) -> np.ndarray:
+    """数值字段转 float64（缺失为NaN），无法转换的保留为 object 数组"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.asarray(values, dtype=object)
+
+
+class BarFrame:
+    """单只证券的列式行情：dates 为升序日期字符串，columns 为 字段 -> numpy数组（与缓存共享，只读）"""
+
+    __slots__ = ("code", "date_field", "dates", "columns")
+
+    def __init__(self, code: str, date_field: str, dates: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.code = code
+        self.date_field = date_field
+        self.dates = dates
+        self.columns = columns
+
+    @classmethod
+    def empty(cls, code: str, date_field: str = "trade_date") -> "BarFrame":
+        return cls(code, date_field, np.asarray([], dtype=object), {})
+
+    @classmethod
+    def from_documents(cls, code: str, date_field: str, docs: Sequence[Dict[str, Any]],
+                       fields: Optional[Sequence[str]] = None) -> "BarFrame":
+        """由按日期升序的Mongo文档构建（fields为空时取文档中出现过的全部字段）"""
+        if not docs:
+            return cls.empty(code, date_field)
+        if fields is None:
+            names: Dict[str, None] = {}
+            for doc in docs:
+                for key in doc:
+                    names.setdefault(key, None)
+            fields = [name for name in names if name not in INTERNAL_FIELDS and name not in ("ts_code", date_field)]
+        dates = np.asarray([doc[date_field] for doc in docs], dtype=object)
+        columns = {field: _to_column([doc.get(field) for doc in docs]) for field in fields}
+        return cls(code, date_field, dates, columns)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def cells(self) -> int:
+        return len(self.dates) * max(len(self.columns), 1)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.columns[field]
+
+    def get(self, field: str, default: Any = None) -> Optional[np.ndarray]:
+        return self.columns.get(field, default)
+
+    def volumes(self) -> np.ndarray:
+        """成交量列：vol 缺失时回退到 volume，均缺失为NaN"""
+        vol = self.columns.get("vol")
+        volume = self.columns.get("volume")
+        if vol is None:
+            return volume if volume is not None else np.full(len(self.dates), np.nan)
+        if volume is None:
+            return vol
+        return np.where(np.isnan(vol), volume, vol)
+
+    def slice(self, start: Optional[str] = None, end: Optional[str] = None) -> "BarFrame":
+        """按存储格式的日期闭区间切片（共享底层数组，不复制）"""
+        lo = int(np.searchsorted(self.dates, start, side="left")) if start else 0
+        hi = int(np.searchsorted(self.dates, end, side="right")) if end else len(self.dates)
+        if lo == 0 and hi == len(self.dates):
+            return self
+        return BarFrame(self.code, self.date_field, self.dates[lo:hi],
+                        {field: values[lo:hi] for field, values in self.columns.items()})
+
+    def tail(self, count: int) -> "BarFrame":
+        if count >= len(self.dates):
+            return self
+        return BarFrame(self.code, self.date_field, self.dates[-count:],
+                        {field: values[-count:] for field, values in self.columns.items()})
+
+    def select(self, fields: Optional[Sequence[str]]) -> "BarFrame":
+        """只保留指定字段（缺失字段填NaN）"""
+        if fields is None:
+            return self
+        columns = {
+            field: self.columns[field] if field in self.columns else np.full(len(self.dates), np.nan)
+            for field in fields
+        }
+        return BarFrame(self.code, self.date_field, self.dates, columns)
+
+    def timestamps(self) -> pd.DatetimeIndex:
+        fmt = "%Y-%m-%d %H:%M:%S" if self.date_field == "trade_time" else "%Y%m%d"
+        return pd.to_datetime(pd.Index(self.dates, dtype=object), format=fmt)
+
+    def to_frame(self, index: Optional[str] = None) -> pd.DataFrame:
+        """
+        转换为DataFrame（数组复制一份，调用方可随意修改）
+
+        Args:
+            index: None 时日期作为普通列（存储格式字符串）并附带 ts_code 列；
+                   给定名称时以解析后的时间戳为索引，索引名为该名称
+        """
+        data = {field: values.copy() for field, values in self.columns.items()}
+        if index is None:
+            frame = pd.DataFrame(data, index=pd.RangeIndex(len(self.dates)))
+            frame.insert(0, self.date_field, self.dates.copy())
+            frame.insert(0, "ts_code", self.code)
+            return frame
+        frame = pd.DataFrame(data, index=self.timestamps())
+        frame.index.name = index
+        return frame
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """转换为记录列表（与原Mongo文档同构，不含_id）"""
+        names = list(self.columns)
+        arrays = [self.columns[name].tolist() for name in names]
+        records = []
+        for row, trade_date in enumerate(self.dates.tolist()):
+            record = {"ts_code": self.code, self.date_field: trade_date}
+            for name, values in zip(names, arrays):
+                record[name] = values[row]
+            records.append(record)
+        return records
+
+
+class CrossSection:
+    """单个交易日的截面数据：codes 为代码数组，columns 为 字段 -> numpy数组"""
+
+    __slots__ = ("trade_date", "codes", "columns")
+
+    def __init__(self, trade_date: str, codes: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.trade_date = trade_date
+        self.codes = codes
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.columns[field]
+
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame({field: values.copy() for field, values in self.columns.items()},
+                             index=pd.Index(self.codes.copy(), name="ts_code"))
+        return frame
+
+
+class _CacheEntry:
+    """缓存项：frame 覆盖 [start, end] 区间（end 为 OPEN_END 表示取到了最新），fields 为 None 表示全部字段"""
+
+    __slots__ = ("frame", "start", "end", "fields", "loaded_at")
+
+    def __init__(self, frame: BarFrame, start: str, end: str, fields: Optional[frozenset]):
+        self.frame = frame
+        self.start = start
+        self.end = end
+        self.fields = fields
+        self.loaded_at = time.time()
+
+    def covers(self, start: str, end: str, fields: Optional[frozenset]) -> bool:
+        if time.time() - self.loaded_at > CACHE_TTL_SECONDS:
+            return False
+        if self.start > start or self.end < end:
+            return False
+        return self.fields is None or (fields is not None and fields <= self.fields)
+
+
+class MarketDataStore:
+    """进程级行情数据仓库（线程安全）"""
+
+    def __init__(self, db_handler=None, max_cells: int = MAX_CACHE_CELLS, batch_size: int = FETCH_BATCH_SIZE):
+        self._db_handler = db_handler
+        self.max_cells = max_cells
+        self.batch_size = batch_size
+        self._cache: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._cells = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "queries": 0, "documents": 0, "evictions": 0}
+
+    @property
+    def db_handler(self):
+        if self._db_handler is None:
+            from api.db_handler import get_db_handler
+            self._db_handler = get_db_handler()
+        return self._db_handler
+
+    # ---------- 公共接口 ----------
+
+    def get_bars(self, codes: Union[str, Iterable[str]], start: DateLike = None, end: DateLike = None,
+                 fields: Optional[Sequence[str]] = None, freq: str = "daily") -> Dict[str, BarFrame]:
+        """
+        获取K线
+
+        Args:
+            codes: 单个或多个 ts_code
+            start/end: 日期（str/date/datetime，闭区间；None 表示不限）
+            fields: 字段列表，None 为全部字段
+            freq: daily/weekly/monthly/30min/5min/index_daily
+
+        Returns:
+            {ts_code: BarFrame}，无数据的代码对应空 BarFrame
+        """
+        collection = FREQ_COLLECTIONS.get(freq)
+        if collection is None:
+            raise ValueError(f"不支持的频率: {freq}")
+        return self.get_series(collection, codes, start, end, fields)
+
+    def get_bar(self, code: str, start: DateLike = None, end: DateLike = None,
+                fields: Optional[Sequence[str]] = None, freq: str = "daily") -> BarFrame:
+        """获取单只证券的K线"""
+        return self.get_bars([code], start, end, fields, freq)[code]
+
+    def get_factors(self, codes: Union[str, Iterable[str]], start: DateLike = None, end: DateLike = None,
+                    fields: Optional[Sequence[str]] = None,
+                    collection: str = FACTOR_COLLECTION) -> Dict[str, BarFrame]:
+        """获取因子数据（默认 stock_factor_pro，同时包含行情与技术指标）"""
+        return self.get_series(collection, codes, start, end, fields)
+
+    def get_latest_bars(self, code: str, count: int, end: DateLike = None,
+                        fields: Optional[Sequence[str]] = None, freq: str = "daily") -> BarFrame:
+        """获取截至 end（默认最新）的最近 count 根K线"""
+        collection = FREQ_COLLECTIONS.get(freq)
+        if collection is None:
+            raise ValueError(f"不支持的频率: {freq}")
+        intraday = is_intraday_collection(collection)
+        end_key = normalize_date(end, intraday, end=True) or OPEN_END
+        wanted = frozenset(fields) if fields is not None else None
+
+        entry = self._lookup(collection, code)
+        if entry is not None and entry.covers(entry.start, end_key, wanted):
+            frame = entry.frame.slice(None, None if end_key == OPEN_END else end_key)
+            # 缓存起点之前可能还有数据，只有缓存内的行数足够（或缓存已覆盖全部历史）时才算命中
+            if len(frame) >= count or entry.start == "":
+                self._count("hits")
+                return frame.tail(count).select(fields)
+        self._count("misses")
+
+        date_field = date_field_of(collection)
+        query: Dict[str, Any] = {"ts_code": code}
+        if end_key != OPEN_END:
+            query[date_field] = {"$lte": end_key}
+        docs = self._find(collection, query, fields, sort=[(date_field, -1)], limit=count)
+        docs.reverse()
+        frame = BarFrame.from_documents(code, date_field, docs, fields)
+        start_key = docs[0][date_field] if len(docs) >= count else ""
+        self._store(collection, code, _CacheEntry(frame, start_key, end_key, wanted))
+        return frame
+
+    def get_cross_section(self, trade_date: DateLike, fields: Sequence[str],
+                          codes: Optional[Iterable[str]] = None,
+                          collection: str = FACTOR_COLLECTION) -> CrossSection:
+        """
+        获取单日截面（不缓存：截面查询本身走 trade_date 索引一次完成）
+
+        Args:
+            trade_date: 交易日
+            fields: 字段列表
+            codes: 限定代码范围，None 为全市场
+            collection: 集合名
+        """
+        date_field = date_field_of(collection)
+        date_key = normalize_date(trade_date, is_intraday_collection(collection))
+        query: Dict[str, Any] = {date_field: date_key}
+        if codes is not None:
+            query["ts_code"] = {"$in": list(codes)}
+        docs = self._find(collection, query, list(fields) + ["ts_code"], sort=[("ts_code", 1)])
+        codes_array = np.asarray([doc["ts_code"] for doc in docs], dtype=object)
+        columns = {field: _to_column([doc.get(field) for doc in docs]) for field in fields}
+        return CrossSection(date_key, codes_array, columns)
+
+    def prefetch(self, codes: Iterable[str], start: DateLike = None, end: DateLike = None,
+                 fields: Optional[Sequence[str]] = None, freq: str = "daily",
+                 collection: Optional[str] = None) -> int:
+        """预先批量加载到缓存（逐只读取前调用，把N次查询合并为 N/batch_size 次），返回加载的代码数"""
+        target = collection or FREQ_COLLECTIONS.get(freq, freq)
+        return len(self.get_series(target, codes, start, end, fields))
+
+    def get_series(self, collection: str, codes: Union[str, Iterable[str]], start: DateLike = None,
+                   end: DateLike = None, fields: Optional[Sequence[str]] = None) -> Dict[str, BarFrame]:
+        """按集合获取多只证券的区间数据：先查缓存，未命中的代码批量 $in 获取"""
+        code_list = [codes] if isinstance(codes, str) else list(dict.fromkeys(codes))
+        intraday = is_intraday_collection(collection)
+        start_key = normalize_date(start, intraday) or ""
+        end_key = normalize_date(end, intraday, end=True) or OPEN_END
+        wanted = frozenset(fields) if fields is not None else None
+
+        result: Dict[str, BarFrame] = {}
+        # 未命中的代码按需要获取的 (区间, 字段) 分组，同组一次批量查询
+        groups: Dict[Tuple[str, str, Optional[frozenset]], List[str]] = {}
+        for code in code_list:
+            entry = self._lookup(collection, code)
+            if entry is not None and entry.covers(start_key, end_key, wanted):
+                self._count("hits")
+                result[code] = self._view(entry.frame, start_key, end_key, fields)
+                continue
+            self._count("misses")
+            fetch_start, fetch_end, fetch_fields = start_key, end_key, wanted
+            if entry is not None and time.time() - entry.loaded_at <= CACHE_TTL_SECONDS:
+                # 与已缓存区间/字段合并，避免相邻请求互相挤出
+                fetch_start = min(fetch_start, entry.start)
+                fetch_end = max(fetch_end, entry.end)
+                if fetch_fields is not None:
+                    fetch_fields = None if entry.fields is None else fetch_fields | entry.fields
+            groups.setdefault((fetch_start, fetch_end, fetch_fields), []).append(code)
+
+        for (fetch_start, fetch_end, fetch_fields), group_codes in groups.items():
+            frames = self._fetch(collection, group_codes, fetch_start, fetch_end, fetch_fields)
+            for code in group_codes:
+                frame = frames.get(code)
+                if frame is None:
+                    frame = BarFrame.empty(code, date_field_of(collection))
+                self._store(collection, code, _CacheEntry(frame, fetch_start, fetch_end, fetch_fields))
+                result[code] = self._view(frame, start_key, end_key, fields)
+
+        return {code: result[code] for code in code_list}
+
+    def invalidate(self, collection: Optional[str] = None, codes: Optional[Iterable[str]] = None) -> int:
+        """使缓存失效（数据更新后调用），返回移除的条目数"""
+        code_set = set(codes) if codes is not None else None
+        with self._lock:
+            keys = [
+                key for key in self._cache
+                if (collection is None or key[0] == collection) and (code_set is None or key[1] in code_set)
+            ]
+            for key in keys:
+                self._cells -= self._cache.pop(key).frame.cells
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._cells = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._cache),
+                "cells": self._cells,
+                "max_cells": self.max_cells,
+            }
+
+    # ---------- 内部实现 ----------
+
+    @staticmethod
+    def _view(frame: BarFrame, start_key: str, end_key: str, fields: Optional[Sequence[str]]) -> BarFrame:
+        return frame.slice(start_key or None, None if end_key == OPEN_END else end_key).select(fields)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def _lookup(self, collection: str, code: str) -> Optional[_CacheEntry]:
+        with self._lock:
+            entry = self._cache.get((collection, code))
+            if entry is not None:
+                self._cache.move_to_end((collection, code))
+            return entry
+
+    def _store(self, collection: str, code: str, entry: _CacheEntry) -> None:
+        if entry.frame.cells > self.max_cells // 4:
+            return
+        with self._lock:
+            previous = self._cache.pop((collection, code), None)
+            if previous is not None:
+                self._cells -= previous.frame.cells
+            self._cache[(collection, code)] = entry
+            self._cells += entry.frame.cells
+            while self._cells > self.max_cells and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cells -= evicted.frame.cells
+                self._stats["evictions"] += 1
+
+    def _find(self, collection: str, query: Dict[str, Any], fields: Optional[Sequence[str]],
+              sort: List[Tuple[str, int]], limit: int = 0) -> List[Dict[str, Any]]:
+        projection: Dict[str, int] = {"_id": 0}
+        if fields is None:
+            projection.update({field: 0 for field in INTERNAL_FIELDS})
+        else:
+            projection.update({field: 1 for field in fields})
+            projection.update({"ts_code": 1, date_field_of(collection): 1})
+        cursor = self.db_handler.get_collection(collection).find(query, projection).sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        docs = list(cursor)
+        self._count("queries")
+        self._count("documents", len(docs))
+        return docs
+
+    def _fetch(self, collection: str, codes: List[str], start_key: str, end_key: str,
+               fields: Optional[frozenset]) -> Dict[str, BarFrame]:
+        """分批 $in 查询多只证券，按 (ts_code, 日期) 排序后切分为各自的 BarFrame"""
+        date_field = date_field_of(collection)
+        date_range: Dict[str, str] = {}
+        if start_key:
+            date_range["$gte"] = start_key
+        if end_key != OPEN_END:
+            date_range["$lte"] = end_key
+        field_list = sorted(fields) if fields is not None else None
+
+        frames: Dict[str, BarFrame] = {}
+        for offset in range(0, len(codes), self.batch_size):
+            batch = codes[offset:offset + self.batch_size]
+            query: Dict[str, Any] = {"ts_code": batch[0] if len(batch) == 1 else {"$in": batch}}
+            if date_range:
+                query[date_field] = date_range
+            docs = self._find(collection, query, field_list, sort=[("ts_code", 1), (date_field, 1)])
+
+            begin = 0
+            for index in range(1, len(docs) + 1):
+                if index == len(docs) or docs[index]["ts_code"] != docs[begin]["ts_code"]:
+                    code = docs[begin]["ts_code"]
+                    frames[code] = BarFrame.from_documents(code, date_field, docs[begin:index], field_list)
+                    begin = index
+        return frames
+
+
+_market_data_store: Optional[MarketDataStore] = None
+_store_lock = threading.Lock()
+
+
+def get_market_data_store() -> MarketDataStore:
+    """获取进程级行情数据仓库单例"""
+    global _market_data_store
+    if _market_data_store is None:
+        with _store_lock:
+            if _market_data_store is None:
+                _market_data_store = MarketDataStore()
+    return _market_data_store
@@ -3,5 +3,6 @@
 """
 
 from .rate_limit import RateLimitMiddleware, AdvancedRateLimitMiddleware
+from .metrics import MetricsMiddleware, metrics_registry
 
-__all__ = ['RateLimitMiddleware', 'AdvancedRateLimitMiddleware']
\ No newline at end of file
+__all__ = ['RateLimitMiddleware', 'AdvancedRateLimitMiddleware', 'MetricsMiddleware', 'metrics_registry']
\ No newline at end of file
@@ -0,0 +1,330 @@
+"""
+接口性能指标中间件
+按路由统计延迟直方图、在途请求数、响应体大小，以及每个请求内的Mongo操作次数与耗时。
+各uvicorn worker定期把增量累加到Redis，/system/metrics 读取汇总后的结果。
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.routing import Match
+
+from api.utils.mongo_monitoring import begin_operation_scope, end_operation_scope
+
+logger = logging.getLogger(__name__)
+
+# 延迟直方图桶上界（秒），与Prometheus默认桶相近
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 各worker向Redis刷新增量的间隔（秒）
+FLUSH_INTERVAL = 10
+REDIS_PREFIX = "stock_api:metrics:"
+ROUTES_KEY = REDIS_PREFIX + "routes"
+INFLIGHT_TTL = FLUSH_INTERVAL * 3
+
+# 计数类字段
+_COUNTER_FIELDS = ("count", "errors", "latency_sum", "bytes_sum", "mongo_ops", "mongo_ms")
+
+
+def _empty_route_stats() -> Dict[str, float]:
+    stats = {field: 0 for field in _COUNTER_FIELDS}
+    for i in range(len(LATENCY_BUCKETS) + 1):
+        stats[f"b{i}"] = 0
+    return stats
+
+
+def _bucket_index(duration: float) -> int:
+    for i, upper in enumerate(LATENCY_BUCKETS):
+        if duration <= upper:
+            return i
+    return len(LATENCY_BUCKETS)
+
+
+class MetricsRegistry:
+    """进程内指标累加器，定期把增量写入Redis"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, float]] = {}
+        self._local: Dict[str, Dict[str, float]] = {}
+        self.in_flight = 0
+        self._flusher_pid: Optional[int] = None
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+        self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        """按进程启动后台刷新线程，Redis同步写入不占用事件循环（fork出的worker各自启动）"""
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+        threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"⚠️ 后台刷新接口指标失败: {e}")
+
+    def request_finished(self, route: str, status_code: int, duration: float,
+                         response_bytes: int, mongo_ops: int, mongo_ms: float) -> None:
+        bucket = f"b{_bucket_index(duration)}"
+        with self._lock:
+            self.in_flight -= 1
+            for target in (self._pending, self._local):
+                stats = target.setdefault(route, _empty_route_stats())
+                stats["count"] += 1
+                stats["errors"] += 1 if status_code >= 500 else 0
+                stats["latency_sum"] += duration
+                stats["bytes_sum"] += response_bytes
+                stats["mongo_ops"] += mongo_ops
+                stats["mongo_ms"] += mongo_ms
+                stats[bucket] += 1
+
+    def _get_redis_client(self):
+        try:
+            from cache_manager import get_cache_manager
+        except ImportError:
+            return None
+        cache_manager = get_cache_manager()
+        if cache_manager and cache_manager.redis_client is not None:
+            return cache_manager.redis_client
+        return None
+
+    def flush(self) -> bool:
+        """把累计增量写入Redis（失败时增量保留到下次）"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            in_flight = self.in_flight
+
+        client = self._get_redis_client()
+        if client is None:
+            self._merge_back(pending)
+            return False
+        try:
+            pipe = client.pipeline(transaction=False)
+            for route, stats in pending.items():
+                key = f"{REDIS_PREFIX}route:{route}"
+                pipe.sadd(ROUTES_KEY, route)
+                for field, value in stats.items():
+                    if not value:
+                        continue
+                    if isinstance(value, float):
+                        pipe.hincrbyfloat(key, field, value)
+                    else:
+                        pipe.hincrby(key, field, value)
+            pipe.setex(f"{REDIS_PREFIX}inflight:{os.getpid()}", INFLIGHT_TTL, in_flight)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ 写入接口指标失败: {e}")
+            self._merge_back(pending)
+            return False
+
+    def _merge_back(self, pending: Dict[str, Dict[str, float]]) -> None:
+        with self._lock:
+            for route, stats in pending.items():
+                target = self._pending.setdefault(route, _empty_route_stats())
+                for field, value in stats.items():
+                    target[field] += value
+
+    def collect(self) -> Tuple[Dict[str, Dict[str, float]], Dict[str, int], str]:
+        """
+        读取汇总指标
+
+        Returns:
+            (按路由的指标, 各worker在途请求数, 数据来源 redis/local)
+        """
+        self.flush()
+        client = self._get_redis_client()
+        if client is not None:
+            try:
+                routes = sorted(client.smembers(ROUTES_KEY))
+                pipe = client.pipeline(transaction=False)
+                for route in routes:
+                    pipe.hgetall(f"{REDIS_PREFIX}route:{route}")
+                replies = pipe.execute()
+                aggregated = {
+                    route: {field: float(value) for field, value in raw.items()}
+                    for route, raw in zip(routes, replies) if raw
+                }
+                in_flight = {}
+                for key in client.scan_iter(match=f"{REDIS_PREFIX}inflight:*", count=100):
+                    value = client.get(key)
+                    if value is not None:
+                        in_flight[key.rsplit(":", 1)[-1]] = int(value)
+                return aggregated, in_flight, "redis"
+            except Exception as e:
+                logger.warning(f"⚠️ 读取接口指标失败，使用本进程数据: {e}")
+        with self._lock:
+            local = {route: dict(stats) for route, stats in self._local.items()}
+            return local, {str(os.getpid()): self.in_flight}, "local"
+
+    def reset(self) -> None:
+        """清空全部指标"""
+        with self._lock:
+            self._pending = {}
+            self._local = {}
+        client = self._get_redis_client()
+        if client is not None:
+            routes = client.smembers(ROUTES_KEY)
+            if routes:
+                client.delete(*[f"{REDIS_PREFIX}route:{route}" for route in routes])
+            client.delete(ROUTES_KEY)
+
+
+metrics_registry = MetricsRegistry()
+
+
+def estimate_quantile(stats: Dict[str, float], quantile: float) -> Optional[float]:
+    """根据直方图桶线性插值估算分位数（秒）"""
+    total = stats.get("count", 0)
+    if not total:
+        return None
+    target = total * quantile
+    cumulative = 0.0
+    lower = 0.0
+    for i, upper in enumerate(LATENCY_BUCKETS):
+        in_bucket = stats.get(f"b{i}", 0)
+        if cumulative + in_bucket >= target and in_bucket > 0:
+            return lower + (upper - lower) * (target - cumulative) / in_bucket
+        cumulative += in_bucket
+        lower = upper
+    # 落在最后一个开放桶中，只能给出下界
+    return LATENCY_BUCKETS[-1]
+
+
+def _to_ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def summarize_routes(aggregated: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+    """把原始计数整理为JSON友好的按路由指标（按p95倒序）"""
+    rows = []
+    for route, stats in aggregated.items():
+        count = stats.get("count", 0)
+        if not count:
+            continue
+        rows.append({
+            "route": route,
+            "count": int(count),
+            "errors": int(stats.get("errors", 0)),
+            "latency_ms": {
+                "avg": _to_ms(stats.get("latency_sum", 0) / count),
+                "p50": _to_ms(estimate_quantile(stats, 0.50)),
+                "p95": _to_ms(estimate_quantile(stats, 0.95)),
+                "p99": _to_ms(estimate_quantile(stats, 0.99))
+            },
+            "avg_response_bytes": int(stats.get("bytes_sum", 0) / count),
+            "mongo": {
+                "avg_ops": round(stats.get("mongo_ops", 0) / count, 2),
+                "avg_time_ms": round(stats.get("mongo_ms", 0) / count, 2),
+                "total_ops": int(stats.get("mongo_ops", 0))
+            }
+        })
+    rows.sort(key=lambda row: row["latency_ms"]["p95"] or 0, reverse=True)
+    return rows
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus(aggregated: Dict[str, Dict[str, float]], in_flight: Dict[str, int]) -> str:
+    """渲染Prometheus文本格式"""
+    lines = [
+        "# HELP kk_api_request_duration_seconds 接口请求延迟",
+        "# TYPE kk_api_request_duration_seconds histogram"
+    ]
+    for route, stats in sorted(aggregated.items()):
+        label = f'route="{_escape_label(route)}"'
+        cumulative = 0
+        for i, upper in enumerate(LATENCY_BUCKETS):
+            cumulative += int(stats.get(f"b{i}", 0))
+            lines.append(f'kk_api_request_duration_seconds_bucket{{{label},le="{upper}"}} {cumulative}')
+        lines.append(f'kk_api_request_duration_seconds_bucket{{{label},le="+Inf"}} {int(stats.get("count", 0))}')
+        lines.append(f'kk_api_request_duration_seconds_sum{{{label}}} {stats.get("latency_sum", 0)}')
+        lines.append(f'kk_api_request_duration_seconds_count{{{label}}} {int(stats.get("count", 0))}')
+
+    counters = (
+        ("kk_api_request_errors_total", "5xx响应数", "errors"),
+        ("kk_api_response_bytes_total", "响应体字节数", "bytes_sum"),
+        ("kk_api_mongo_commands_total", "请求内Mongo命令数", "mongo_ops"),
+        ("kk_api_mongo_duration_milliseconds_total", "请求内Mongo命令耗时", "mongo_ms"),
+    )
+    for name, help_text, field in counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for route, stats in sorted(aggregated.items()):
+            lines.append(f'{name}{{route="{_escape_label(route)}"}} {stats.get(field, 0)}')
+
+    lines.append("# HELP kk_api_requests_in_flight 在途请求数")
+    lines.append("# TYPE kk_api_requests_in_flight gauge")
+    for worker, value in sorted(in_flight.items()):
+        lines.append(f'kk_api_requests_in_flight{{worker="{worker}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def _resolve_route(scope: Dict[str, Any]) -> str:
+    """取路由模板作为指标维度，避免路径参数导致维度爆炸"""
+    method = scope.get("method", "GET")
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return f"{method} {route.path}"
+    app = scope.get("app")
+    for candidate in getattr(app, "routes", []):
+        try:
+            match, _ = candidate.matches(scope)
+        except Exception:
+            continue
+        if match == Match.FULL:
+            return f"{method} {candidate.path}"
+    return f"{method} <unmatched>"
+
+
+class MetricsMiddleware:
+    """纯ASGI指标中间件（需最后注册，作为最外层统计完整耗时与实际响应大小）"""
+
+    def __init__(self, app, exclude_paths: Optional[List[str]] = None):
+        self.app = app
+        self.exclude_paths = set(exclude_paths or ['/docs', '/redoc', '/openapi.json'])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_holder = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                status_holder["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        metrics_registry.request_started()
+        token = begin_operation_scope(scope.get("path", ""))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            operation_scope = end_operation_scope(token)
+            metrics_registry.request_finished(
+                route=_resolve_route(scope),
+                status_code=status_holder["status"],
+                duration=time.perf_counter() - start,
+                response_bytes=status_holder["bytes"],
+                mongo_ops=operation_scope.mongo_ops if operation_scope else 0,
+                mongo_ms=operation_scope.mongo_time_ms if operation_scope else 0.0
+            )
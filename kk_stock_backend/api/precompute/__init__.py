@@ -0,0 +1,4 @@
+"""
+盘后预计算模块
+把高频访问接口依赖的聚合结果按交易日物化到MongoDB，接口只做索引读取
+"""
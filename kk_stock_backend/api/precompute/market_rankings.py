@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+每日排行榜与市场概览预计算
+
+按交易日把涨跌幅榜、成交量榜、市场涨跌家数/成交总额、指数表现榜、资金净流入/流出榜
+物化为 market_rankings_daily 中的紧凑文档（每个 kind × trade_date 一条，榜单只保留前 RANKING_TOP_N 名），
+排行榜接口只需按 (kind, trade_date) 做一次索引读取。
+
+盘后由预计算调度器增量填充；接口读到最新交易日尚未物化时回退实时计算，并在后台触发一次增量物化。
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from api.global_db import async_db_handler
+from api.utils.index_registry import declare_indexes
+
+logger = logging.getLogger(__name__)
+
+MARKET_RANKINGS_COLLECTION = "market_rankings_daily"
+
+declare_indexes(MARKET_RANKINGS_COLLECTION, [
+    {"keys": [("kind", 1), ("trade_date", -1)], "unique": True, "reason": "按榜单类型读取指定/最新交易日"},
+], owner=__name__)
+
+# 每个榜单保留的条数（接口 limit 超过该值时回退实时计算）
+RANKING_TOP_N = 100
+
+# 首次填充时回溯的自然日数
+INITIAL_BACKFILL_DAYS = 30
+
+# 指数多日累计涨跌幅榜的天数
+INDEX_RANKING_DAYS = (1, 5, 10, 20)
+
+# 榜单类型 -> 源集合（与各接口实时计算的数据源一致，也用于判断最新交易日）
+SOURCE_COLLECTIONS = {
+    "stock_gainers": "stock_kline_daily",
+    "stock_losers": "stock_daily",
+    "stock_volume": "stock_daily",
+    "stock_overview": "stock_daily",
+    "money_inflow": "stock_money_flow",
+    "money_outflow": "stock_money_flow",
+    **{f"index_performance_{days}d": "index_daily" for days in INDEX_RANKING_DAYS},
+}
+
+# 个股榜单保留的字段
+STOCK_RANKING_FIELDS = ["ts_code", "trade_date", "open", "high", "low", "close", "pre_close",
+                        "change", "pct_chg", "vol", "amount"]
+
+# 个股榜单类型
+STOCK_RANKING_KINDS = ("stock_gainers", "stock_losers", "stock_volume", "stock_overview")
+
+# 同一榜单最新交易日缺失时，后台触发物化的最小间隔（秒）
+REFRESH_TRIGGER_INTERVAL = 600
+_last_refresh_trigger: Dict[str, float] = {}
+
+
+# ==================== 按日计算 ====================
+
+async def _attach_stock_basic(items: List[Dict[str, Any]], fields: List[str]) -> None:
+    """为榜单条目补充股票名称、行业等基本信息"""
+    ts_codes = list({item["ts_code"] for item in items})
+    if not ts_codes:
+        return
+    stock_basic = async_db_handler.get_collection('infrastructure_stock_basic')
+    projection = {"_id": 0, "ts_code": 1, **{field: 1 for field in fields}}
+    basic_info = {
+        doc["ts_code"]: doc
+        async for doc in stock_basic.find({"ts_code": {"$in": ts_codes}}, projection)
+    }
+    for item in items:
+        if item["ts_code"] in basic_info:
+            item.update(basic_info[item["ts_code"]])
+
+
+def _stock_ranking_facets() -> Dict[str, List[Dict[str, Any]]]:
+    """个股榜单类型 -> $facet 子管道"""
+    projection = {field: 1 for field in STOCK_RANKING_FIELDS}
+    projection["_id"] = 0
+    return {
+        "stock_gainers": [
+            {"$match": {"pct_chg": {"$ne": None}}},
+            {"$sort": {"pct_chg": -1}}, {"$limit": RANKING_TOP_N}, {"$project": projection}
+        ],
+        "stock_losers": [
+            {"$match": {"pct_chg": {"$ne": None}}},
+            {"$sort": {"pct_chg": 1}}, {"$limit": RANKING_TOP_N}, {"$project": projection}
+        ],
+        "stock_volume": [
+            {"$match": {"vol": {"$ne": None}}},
+            {"$sort": {"vol": -1}}, {"$limit": RANKING_TOP_N}, {"$project": projection}
+        ],
+        "stock_overview": [
+            {"$group": {
+                "_id": None,
+                "total_stocks": {"$sum": 1},
+                "rising_stocks": {"$sum": {"$cond": [{"$gt": ["$pct_chg", 0]}, 1, 0]}},
+                # 聚合比较中null小于任何数字，缺失涨跌幅的不计入下跌
+                "falling_stocks": {"$sum": {"$cond": [
+                    {"$and": [{"$ne": ["$pct_chg", None]}, {"$lt": ["$pct_chg", 0]}]}, 1, 0
+                ]}},
+                "unchanged_stocks": {"$sum": {"$cond": [{"$eq": ["$pct_chg", 0]}, 1, 0]}},
+                "total_volume": {"$sum": "$vol"},
+                "total_amount": {"$sum": "$amount"},
+                "avg_pct_chg": {"$avg": "$pct_chg"}
+            }}
+        ],
+    }
+
+
+async def compute_stock_rankings(trade_date: str) -> Dict[str, Dict[str, Any]]:
+    """计算某交易日的个股涨幅榜、跌幅榜、成交量榜与市场概览（每个源集合一次聚合）"""
+    facet_pipelines = _stock_ranking_facets()
+    kinds_by_source: Dict[str, List[str]] = {}
+    for kind in STOCK_RANKING_KINDS:
+        kinds_by_source.setdefault(SOURCE_COLLECTIONS[kind], []).append(kind)
+
+    facets: Dict[str, List[Dict[str, Any]]] = {}
+    for source, kinds in kinds_by_source.items():
+        pipeline = [
+            {"$match": {"trade_date": trade_date}},
+            # 兼容 pct_chg / pct_change 两种字段名
+            {"$addFields": {"pct_chg": {"$ifNull": ["$pct_chg", "$pct_change"]}}},
+            {"$facet": {kind: facet_pipelines[kind] for kind in kinds}}
+        ]
+        collection = async_db_handler.get_collection(source)
+        result = await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+        if result:
+            facets.update(result[0])
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    ranking_items = []
+    for kind in ("stock_gainers", "stock_losers", "stock_volume"):
+        if facets.get(kind):
+            rows[kind] = {"items": facets[kind]}
+            ranking_items.extend(facets[kind])
+    await _attach_stock_basic(ranking_items, ["name", "industry", "market"])
+
+    if facets.get("stock_overview"):
+        overview = facets["stock_overview"][0]
+        overview.pop("_id", None)
+        overview["avg_pct_chg"] = overview.get("avg_pct_chg") or 0
+        rows["stock_overview"] = {"stats": overview}
+    return rows
+
+
+async def compute_money_flow_rankings(trade_date: str) -> Dict[str, Dict[str, Any]]:
+    """计算某交易日的资金净流入/净流出榜及全市场净流入合计"""
+    collection = async_db_handler.get_collection('stock_money_flow')
+    pipeline = [
+        {"$match": {"trade_date": trade_date}},
+        {"$project": {"_id": 0}},
+        {"$facet": {
+            "inflow": [
+                {"$match": {"net_amount": {"$gt": 0}}},
+                {"$sort": {"net_amount": -1}}, {"$limit": RANKING_TOP_N}
+            ],
+            "outflow": [
+                {"$match": {"net_amount": {"$lt": 0}}},
+                {"$sort": {"net_amount": 1}}, {"$limit": RANKING_TOP_N}
+            ],
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_stocks": {"$sum": 1},
+                    "inflow_stocks": {"$sum": {"$cond": [{"$gt": ["$net_amount", 0]}, 1, 0]}},
+                    "outflow_stocks": {"$sum": {"$cond": [{"$lt": ["$net_amount", 0]}, 1, 0]}},
+                    "total_net_amount": {"$sum": "$net_amount"}
+                }}
+            ]
+        }}
+    ]
+    result = await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    if not result or not result[0]["totals"]:
+        return {}
+    facets = result[0]
+    items = facets["inflow"] + facets["outflow"]
+
+    await _attach_stock_basic(items, ["name", "industry"])
+
+    # 补充当日涨跌幅
+    kline_collection = async_db_handler.get_collection('stock_kline_daily')
+    kline_info = {
+        doc["ts_code"]: doc
+        async for doc in kline_collection.find(
+            {"ts_code": {"$in": list({item["ts_code"] for item in items})}, "trade_date": trade_date},
+            {"_id": 0, "ts_code": 1, "pct_change": 1, "pct_chg": 1}
+        )
+    }
+    for item in items:
+        kline = kline_info.get(item["ts_code"])
+        if kline:
+            item["pct_change"] = kline.get("pct_change", kline.get("pct_chg", 0))
+
+    totals = facets["totals"][0]
+    totals.pop("_id", None)
+    return {
+        "money_inflow": {"items": facets["inflow"], "stats": totals},
+        "money_outflow": {"items": facets["outflow"], "stats": totals},
+    }
+
+
+async def compute_index_rankings(trade_date: str) -> Dict[str, Dict[str, Any]]:
+    """计算某交易日的指数当日涨跌幅榜与多日累计涨跌幅榜（口径与 /index/rankings/performance 一致）"""
+    from api.routers.index_data import MAJOR_INDICES, SW_INDICES
+
+    collection = async_db_handler.get_collection('index_daily')
+    rows: Dict[str, Dict[str, Any]] = {}
+
+    if 1 in INDEX_RANKING_DAYS:
+        items = await collection.find(
+            {"trade_date": trade_date, "pct_chg": {"$exists": True}}, {"_id": 0}
+        ).sort("pct_chg", -1).limit(RANKING_TOP_N).to_list(length=None)
+        if items:
+            rows["index_performance_1d"] = {"items": items}
+
+    multi_days = [days for days in INDEX_RANKING_DAYS if days > 1]
+    if multi_days:
+        # 每个指数取截至当日的最近 max_days 条记录，多日榜单共用
+        max_days = max(multi_days)
+        window_start = (datetime.strptime(trade_date, "%Y%m%d") - timedelta(days=max_days * 3)).strftime("%Y%m%d")
+        pipeline = [
+            {"$match": {
+                "ts_code": {"$in": list(MAJOR_INDICES.keys()) + list(SW_INDICES.keys())},
+                "trade_date": {"$gte": window_start, "$lte": trade_date}
+            }},
+            {"$project": {"_id": 0}},
+            {"$sort": {"ts_code": 1, "trade_date": -1}},
+            {"$group": {"_id": "$ts_code", "docs": {"$push": "$$ROOT"}}},
+            {"$project": {"docs": {"$slice": ["$docs", max_days]}}}
+        ]
+        series = await collection.aggregate(pipeline).to_list(length=None)
+        for days in multi_days:
+            rankings = [
+                {
+                    "ts_code": group["_id"],
+                    "cumulative_pct_chg": sum(doc.get("pct_chg", 0) for doc in group["docs"][:days]),
+                    "latest_data": group["docs"][0]
+                }
+                for group in series if group["docs"]
+            ]
+            rankings.sort(key=lambda item: item["cumulative_pct_chg"], reverse=True)
+            if rankings:
+                rows[f"index_performance_{days}d"] = {"items": rankings[:RANKING_TOP_N]}
+
+    return rows
+
+
+async def compute_rankings_for_date(trade_date: str) -> Dict[str, Dict[str, Any]]:
+    """并发计算某交易日的全部榜单，返回 kind -> 文档内容"""
+    results = await asyncio.gather(
+        compute_stock_rankings(trade_date),
+        compute_money_flow_rankings(trade_date),
+        compute_index_rankings(trade_date),
+        return_exceptions=True
+    )
+    merged: Dict[str, Dict[str, Any]] = {}
+    for name, result in zip(["个股榜单", "资金流向榜单", "指数榜单"], results):
+        if isinstance(result, Exception):
+            logger.warning(f"计算{name} {trade_date} 失败: {result}")
+            continue
+        merged.update(result)
+    return merged
+
+
+# ==================== 读取 ====================
+
+async def latest_source_date(kind: str) -> Optional[str]:
+    """榜单源集合中的最新交易日"""
+    collection = async_db_handler.get_collection(SOURCE_COLLECTIONS[kind])
+    latest = await collection.find_one({}, {"_id": 0, "trade_date": 1}, sort=[("trade_date", -1)])
+    return latest["trade_date"] if latest else None
+
+
+async def load_ranking_snapshot(kind: str, trade_date: Optional[str] = None,
+                                limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    读取物化的榜单
+
+    Args:
+        kind: 榜单类型（见 SOURCE_COLLECTIONS）
+        trade_date: 交易日 YYYYMMDD，默认源集合的最新交易日
+        limit: 榜单条数，超过 RANKING_TOP_N 时返回None
+
+    Returns:
+        {"trade_date", "kind", "items", "stats"}；未物化或条数不足时返回None，调用方回退实时计算
+    """
+    if limit is not None and limit > RANKING_TOP_N:
+        return None
+    try:
+        if trade_date is None:
+            trade_date = await latest_source_date(kind)
+            if trade_date is None:
+                return None
+        projection: Dict[str, Any] = {"_id": 0, "updated_at": 0}
+        if limit is not None:
+            projection["items"] = {"$slice": limit}
+        collection = async_db_handler.get_collection(MARKET_RANKINGS_COLLECTION)
+        snapshot = await collection.find_one({"kind": kind, "trade_date": trade_date}, projection)
+    except Exception as e:
+        logger.warning(f"读取物化榜单 {kind} 失败: {e}")
+        return None
+
+    if snapshot is None:
+        _trigger_refresh(kind, trade_date)
+    return snapshot
+
+
+def _trigger_refresh(kind: str, trade_date: str) -> None:
+    """请求的交易日尚未物化时在后台触发一次物化（跨worker由任务锁去重，本进程按间隔节流）"""
+    key = f"{kind}:{trade_date}"
+    now = time.time()
+    if now - _last_refresh_trigger.get(key, 0) < REFRESH_TRIGGER_INTERVAL:
+        return
+    _last_refresh_trigger[key] = now
+
+    from api.precompute.scheduler import run_exclusive
+    task = asyncio.get_running_loop().create_task(
+        run_exclusive('market_rankings', lambda: _refresh_including(trade_date))
+    )
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def _refresh_including(trade_date: str) -> Dict[str, Any]:
+    """增量物化到最新交易日；缺失的交易日早于增量起点（历史日期）时再单独补算该日"""
+    stats = await refresh_market_rankings()
+    if stats.get("success") and trade_date < stats["start_date"]:
+        await refresh_market_rankings(start_date=trade_date, end_date=trade_date)
+    return stats
+
+
+# ==================== 增量物化 ====================
+
+async def refresh_market_rankings(end_date: Optional[str] = None,
+                                  backfill_days: int = INITIAL_BACKFILL_DAYS,
+                                  start_date: Optional[str] = None) -> Dict[str, Any]:
+    """
+    增量刷新 market_rankings_daily
+
+    默认从库中最后一个已物化的交易日（含，盘中写入的数据可能不完整）开始，逐个交易日重算到最新交易日。
+
+    Args:
+        end_date: 结束日期 YYYYMMDD，默认取个股源集合的最新交易日
+        backfill_days: 集合为空时回溯的自然日数
+        start_date: 起始日期 YYYYMMDD，指定时按 [start_date, end_date] 重算（用于补算历史交易日）
+
+    Returns:
+        刷新统计
+    """
+    collection = async_db_handler.get_collection(MARKET_RANKINGS_COLLECTION)
+
+    stock_sources = sorted({SOURCE_COLLECTIONS[kind] for kind in STOCK_RANKING_KINDS})
+    if not end_date:
+        latest_dates = []
+        for source in stock_sources:
+            latest = await async_db_handler.get_collection(source).find_one(
+                {}, {"_id": 0, "trade_date": 1}, sort=[("trade_date", -1)]
+            )
+            if latest:
+                latest_dates.append(latest["trade_date"])
+        if not latest_dates:
+            return {"success": False, "message": f"{', '.join(stock_sources)} 无数据"}
+        end_date = max(latest_dates)
+
+    if not start_date:
+        last_stored = await collection.find_one(
+            {"kind": "stock_overview"}, {"trade_date": 1}, sort=[("trade_date", -1)]
+        )
+        if last_stored:
+            start_date = min(last_stored["trade_date"], end_date)
+        else:
+            start_date = (datetime.strptime(end_date, "%Y%m%d") - timedelta(days=backfill_days)).strftime("%Y%m%d")
+
+    date_range = {"trade_date": {"$gte": start_date, "$lte": end_date}}
+    trade_dates = set()
+    for source in stock_sources:
+        trade_dates.update(await async_db_handler.get_collection(source).distinct("trade_date", date_range))
+    trade_dates = sorted(trade_dates)
+
+    written = 0
+    for trade_date in trade_dates:
+        rows = await compute_rankings_for_date(trade_date)
+        if not rows:
+            continue
+        now = datetime.now()
+        await collection.bulk_write([
+            UpdateOne(
+                {"kind": kind, "trade_date": trade_date},
+                {"$set": {"kind": kind, "trade_date": trade_date, "items": row.get("items", []),
+                          "stats": row.get("stats", {}), "updated_at": now}},
+                upsert=True
+            )
+            for kind, row in rows.items()
+        ], ordered=False)
+        written += len(rows)
+
+    logger.info(f"✅ 排行榜已物化: {start_date} ~ {end_date}, {len(trade_dates)} 个交易日, {written} 份榜单")
+    return {"success": True, "start_date": start_date, "end_date": end_date,
+            "trade_dates": len(trade_dates), "snapshots": written}
@@ -0,0 +1,143 @@
+"""
+盘后预计算定时任务
+
+数据采集在收盘后完成，这里在采集窗口之后增量物化各类按交易日的聚合结果。
+多个uvicorn worker都会启动调度器，任务通过Redis锁保证同一时刻只有一个worker执行。
+"""
+
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from .sentiment_daily import refresh_sentiment_daily
+from .market_rankings import refresh_market_rankings
+from .strategy_screens import refresh_strategy_screens
+from api.utils.mongo_monitoring import operation_scope
+
+logger = logging.getLogger(__name__)
+
+# 任务锁过期时间（秒），防止worker异常退出后锁无法释放
+JOB_LOCK_TTL = 1800
+
+
+def _get_redis_client():
+    """获取全局Redis客户端（不可用时返回None）"""
+    try:
+        from cache_manager import get_cache_manager
+    except ImportError:
+        return None
+    cache_manager = get_cache_manager()
+    if cache_manager and cache_manager.redis_client is not None:
+        return cache_manager.redis_client
+    return None
+
+
+async def run_exclusive(job_name: str, job: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    跨worker互斥执行任务
+
+    Args:
+        job_name: 任务名称，用作锁键
+        job: 无参协程函数
+
+    Returns:
+        任务返回值；其他worker正在执行时返回None
+    """
+    redis_client = _get_redis_client()
+    lock_key = f"stock_api:precompute_lock:{job_name}"
+    if redis_client is not None:
+        try:
+            if not redis_client.set(lock_key, os.getpid(), nx=True, ex=JOB_LOCK_TTL):
+                logger.info(f"预计算任务 {job_name} 正在其他worker执行，跳过")
+                return None
+        except Exception as e:
+            logger.warning(f"获取预计算任务锁失败，直接执行 {job_name}: {e}")
+            redis_client = None
+
+    try:
+        with operation_scope(f"precompute:{job_name}"):
+            return await job()
+    finally:
+        if redis_client is not None:
+            try:
+                redis_client.delete(lock_key)
+            except Exception:
+                pass
+
+
+class PrecomputeScheduler:
+    """盘后预计算调度器"""
+
+    def __init__(self):
+        self.scheduler = AsyncIOScheduler(timezone='Asia/Shanghai')
+        self.is_running = False
+        # 任务名称 -> 协程函数，供定时任务与手动触发共用
+        self.jobs: Dict[str, Callable[[], Awaitable[Any]]] = {
+            'sentiment_daily': refresh_sentiment_daily,
+            'market_rankings': refresh_market_rankings,
+            'strategy_screens': refresh_strategy_screens,
+        }
+
+    def start(self):
+        """启动调度器"""
+        if self.is_running:
+            logger.info("盘后预计算调度器已经在运行中")
+            return
+
+        try:
+            self._add_jobs()
+            self.scheduler.start()
+            self.is_running = True
+            logger.info("盘后预计算调度器已启动")
+        except Exception as e:
+            logger.error(f"启动盘后预计算调度器失败: {e}")
+
+    def stop(self):
+        """停止调度器"""
+        if not self.is_running:
+            return
+
+        try:
+            self.scheduler.shutdown()
+            self.is_running = False
+            logger.info("盘后预计算调度器已停止")
+        except Exception as e:
+            logger.error(f"停止盘后预计算调度器失败: {e}")
+
+    def _add_jobs(self):
+        """添加定时任务"""
+        # 每日收盘后19:45（数据采集完成后）增量物化
+        self.scheduler.add_job(
+            self.run_all,
+            CronTrigger(day_of_week='mon-fri', hour=19, minute=45),
+            id='precompute_daily',
+            name='盘后预计算',
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=3600
+        )
+
+    async def run_job(self, job_name: str) -> Any:
+        """执行单个预计算任务"""
+        job = self.jobs.get(job_name)
+        if job is None:
+            raise ValueError(f"未知的预计算任务: {job_name}")
+        try:
+            return await run_exclusive(job_name, job)
+        except Exception as e:
+            logger.error(f"预计算任务 {job_name} 执行失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    async def run_all(self) -> Dict[str, Any]:
+        """按注册顺序执行全部预计算任务"""
+        results = {}
+        for job_name in self.jobs:
+            results[job_name] = await self.run_job(job_name)
+        return results
+
+
+# 全局调度器实例
+precompute_scheduler = PrecomputeScheduler()
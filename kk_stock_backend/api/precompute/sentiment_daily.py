@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+每日市场情绪指标预计算
+
+按交易日把多空比、恐慌指数、主力资金净流入、股指期货基差写入 market_sentiment_daily，
+Dashboard 情绪面板只需按 trade_date 做一次区间读取。
+盘后由预计算调度器增量填充；库中缺失的日期（如盘中）由 compute_sentiment_rows 实时并发计算。
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from api.global_db import async_db_handler
+from api.utils.index_registry import declare_indexes
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT_DAILY_COLLECTION = "market_sentiment_daily"
+
+declare_indexes(SENTIMENT_DAILY_COLLECTION, [
+    {"keys": [("trade_date", 1)], "unique": True, "reason": "按交易日区间读取与upsert"},
+], owner=__name__)
+
+# 首次填充时回溯的自然日数（情绪面板最多展示90天）
+INITIAL_BACKFILL_DAYS = 180
+
+# 主要股指期货及对应的现货指数
+BASIS_FUTURES_SPOT = {
+    'IF.CFX': '000300.SH',  # 沪深300
+    'IC.CFX': '000905.SH',  # 中证500
+    'IH.CFX': '000016.SH',  # 上证50
+    'IM.CFX': '000852.SH'   # 中证1000
+}
+
+
+# ==================== 按日指标计算 ====================
+
+async def compute_bull_bear_daily(start_date: str, end_date: str) -> Dict[str, Dict[str, Any]]:
+    """按交易日计算多空比（上涨家数/下跌家数）"""
+    daily_collection = async_db_handler.get_collection('stock_kline_daily')
+    pipeline = [
+        {"$match": {"trade_date": {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {
+            "_id": "$trade_date",
+            "total_stocks": {"$sum": 1},
+            "rising_stocks": {"$sum": {"$cond": [{"$gt": ["$pct_change", 0]}, 1, 0]}},
+            "falling_stocks": {"$sum": {"$cond": [{"$lt": ["$pct_change", 0]}, 1, 0]}}
+        }}
+    ]
+    rows = {}
+    for stat in await daily_collection.aggregate(pipeline).to_list(length=None):
+        rising = stat["rising_stocks"]
+        falling = stat["falling_stocks"]
+        if falling > 0:
+            ratio = rising / falling
+        else:
+            ratio = rising if rising > 0 else 0
+        rows[stat["_id"]] = {
+            "bull_bear_ratio": ratio,
+            "total_stocks": stat["total_stocks"],
+            "rising_stocks": rising,
+            "falling_stocks": falling
+        }
+    return rows
+
+
+async def compute_fear_greed_daily(start_date: str, end_date: str) -> Dict[str, Dict[str, Any]]:
+    """按交易日计算恐慌指数（0-100，越高越恐慌）"""
+    daily_collection = async_db_handler.get_collection('stock_kline_daily')
+    pipeline = [
+        {"$match": {"trade_date": {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {
+            "_id": "$trade_date",
+            "avg_pct_chg": {"$avg": "$pct_change"},
+            "std_pct_chg": {"$stdDevPop": "$pct_change"},
+            "strong_rising": {"$sum": {"$cond": [{"$gt": ["$pct_change", 5]}, 1, 0]}},
+            "strong_falling": {"$sum": {"$cond": [{"$lt": ["$pct_change", -5]}, 1, 0]}},
+            "total_stocks": {"$sum": 1}
+        }}
+    ]
+    rows = {}
+    for stat in await daily_collection.aggregate(pipeline).to_list(length=None):
+        volatility = stat.get("std_pct_chg") or 0
+        avg_change = stat.get("avg_pct_chg") or 0
+        strong_ratio = (stat.get("strong_falling", 0) - stat.get("strong_rising", 0)) / max(stat.get("total_stocks", 1), 1)
+        fear_index = min(100, max(0,
+            50 +                  # 基准值
+            volatility * 10 +     # 波动率影响
+            (-avg_change) * 5 +   # 平均跌幅影响
+            strong_ratio * 30     # 强势下跌比例影响
+        ))
+        rows[stat["_id"]] = {"fear_greed_index": fear_index}
+    return rows
+
+
+async def compute_money_flow_daily(start_date: str, end_date: str) -> Dict[str, Dict[str, Any]]:
+    """按交易日计算主力资金净流入（亿元）"""
+    money_flow_collection = async_db_handler.get_collection('stock_money_flow')
+    pipeline = [
+        {"$match": {"trade_date": {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {
+            "_id": "$trade_date",
+            "total_main_net": {"$sum": {"$add": [
+                {"$subtract": ["$buy_lg_amount", "$sell_lg_amount"]},
+                {"$subtract": ["$buy_elg_amount", "$sell_elg_amount"]}
+            ]}}
+        }}
+    ]
+    rows = {}
+    for flow in await money_flow_collection.aggregate(pipeline).to_list(length=None):
+        # 千元转亿元
+        rows[flow["_id"]] = {"main_net_flow": (flow.get("total_main_net") or 0) / 100000}
+    return rows
+
+
+async def compute_basis_daily(start_date: str, end_date: str) -> Dict[str, Dict[str, Any]]:
+    """按交易日计算主要股指期货的平均基差（期货收盘-现货收盘）"""
+    futures_collection = async_db_handler.get_collection('fut_daily')
+    index_collection = async_db_handler.get_collection('index_daily')
+    date_range = {'$gte': start_date, '$lte': end_date}
+    projection = {'_id': 0, 'ts_code': 1, 'trade_date': 1, 'close': 1}
+
+    futures_docs, spot_docs = await asyncio.gather(
+        futures_collection.find(
+            {'ts_code': {'$in': list(BASIS_FUTURES_SPOT.keys())}, 'trade_date': date_range}, projection
+        ).to_list(length=None),
+        index_collection.find(
+            {'ts_code': {'$in': list(BASIS_FUTURES_SPOT.values())}, 'trade_date': date_range}, projection
+        ).to_list(length=None)
+    )
+
+    spot_close = {}
+    for doc in spot_docs:
+        spot_close.setdefault((doc['ts_code'], doc['trade_date']), doc.get('close', 0))
+
+    daily_basis: Dict[str, List[float]] = {}
+    seen = set()
+    for doc in futures_docs:
+        key = (doc['ts_code'], doc['trade_date'])
+        if key in seen:
+            continue
+        seen.add(key)
+        spot_price = spot_close.get((BASIS_FUTURES_SPOT[doc['ts_code']], doc['trade_date']))
+        if spot_price and spot_price > 0:
+            daily_basis.setdefault(doc['trade_date'], []).append(doc.get('close', 0) - spot_price)
+
+    return {
+        trade_date: {"basis": sum(values) / len(values)}
+        for trade_date, values in daily_basis.items()
+    }
+
+
+async def compute_sentiment_rows(start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    """
+    并发计算日期区间内每个交易日的全部情绪指标
+
+    Args:
+        start_date: 开始日期 YYYYMMDD
+        end_date: 结束日期 YYYYMMDD
+
+    Returns:
+        按 trade_date 升序排列的指标行
+    """
+    results = await asyncio.gather(
+        compute_bull_bear_daily(start_date, end_date),
+        compute_fear_greed_daily(start_date, end_date),
+        compute_money_flow_daily(start_date, end_date),
+        compute_basis_daily(start_date, end_date),
+        return_exceptions=True
+    )
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    indicator_names = ["多空比", "恐慌指数", "资金流向", "基差水平"]
+    for name, result in zip(indicator_names, results):
+        if isinstance(result, Exception):
+            logger.warning(f"计算{name}按日数据失败: {result}")
+            continue
+        for trade_date, values in result.items():
+            merged.setdefault(trade_date, {"trade_date": trade_date}).update(values)
+
+    return [merged[trade_date] for trade_date in sorted(merged)]
+
+
+# ==================== 读取与汇总 ====================
+
+async def load_sentiment_rows(start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    """
+    读取日期区间的情绪指标，库中未覆盖的尾部日期实时计算补齐
+
+    Args:
+        start_date: 开始日期 YYYYMMDD
+        end_date: 结束日期 YYYYMMDD
+
+    Returns:
+        按 trade_date 升序排列的指标行
+    """
+    collection = async_db_handler.get_collection(SENTIMENT_DAILY_COLLECTION)
+    rows = await collection.find(
+        {"trade_date": {"$gte": start_date, "$lte": end_date}},
+        {"_id": 0, "updated_at": 0}
+    ).sort("trade_date", 1).to_list(length=None)
+
+    stored_until = rows[-1]["trade_date"] if rows else None
+    if stored_until is None or stored_until < end_date:
+        if stored_until is None:
+            missing_start = start_date
+        else:
+            missing_start = (datetime.strptime(stored_until, "%Y%m%d") + timedelta(days=1)).strftime("%Y%m%d")
+        rows.extend(await compute_sentiment_rows(missing_start, end_date))
+
+    return rows
+
+
+def summarize_series(rows: List[Dict[str, Any]], field: str, digits: int,
+                     bullish_above: float, bearish_below: float,
+                     inverted: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    把按日指标序列汇总为情绪面板格式
+
+    current_value 为区间均值，change 为期末相对期初的变化。
+
+    Args:
+        rows: 按日期升序的指标行
+        field: 指标字段名
+        digits: 保留小数位
+        bullish_above: 均值高于该值判定为 bullish（inverted 时判定为 bearish）
+        bearish_below: 均值低于该值判定为 bearish（inverted 时判定为 bullish）
+        inverted: 指标方向是否与市场情绪相反（如恐慌指数）
+
+    Returns:
+        汇总结果，无数据时返回None
+    """
+    series = [(row["trade_date"], row[field]) for row in rows if row.get(field) is not None]
+    if not series:
+        return None
+
+    values = [value for _, value in series]
+    current_value = round(sum(values) / len(values), digits)
+    change = round(round(values[-1], digits) - round(values[0], digits), digits)
+
+    if current_value > bullish_above:
+        level = "bearish" if inverted else "bullish"
+    elif current_value < bearish_below:
+        level = "bullish" if inverted else "bearish"
+    else:
+        level = "neutral"
+
+    return {
+        "current_value": current_value,
+        "change": change,
+        "level": level,
+        "historical_data": [[trade_date, round(value, digits)] for trade_date, value in series]
+    }
+
+
+def summarize_bull_bear(rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    return summarize_series(rows, "bull_bear_ratio", 2, bullish_above=1.5, bearish_below=0.7)
+
+
+def summarize_fear_greed(rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    return summarize_series(rows, "fear_greed_index", 1, bullish_above=70, bearish_below=30, inverted=True)
+
+
+def summarize_money_flow(rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    return summarize_series(rows, "main_net_flow", 1, bullish_above=100, bearish_below=-100)
+
+
+def summarize_basis(rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    return summarize_series(rows, "basis", 1, bullish_above=20, bearish_below=-20)
+
+
+def summarize_overall(bull_bear_data: Optional[Dict], fear_data: Optional[Dict],
+                      money_flow_data: Optional[Dict]) -> Dict[str, Any]:
+    """根据多空比、恐慌指数、资金流向的汇总值计算综合情绪指数"""
+    sentiment_scores = []
+
+    # 多空比贡献 (30%权重)
+    if bull_bear_data:
+        ratio = bull_bear_data["current_value"]
+        if ratio > 1.5:
+            score = 70
+        elif ratio > 1.2:
+            score = 60
+        elif ratio > 0.8:
+            score = 50
+        elif ratio > 0.5:
+            score = 40
+        else:
+            score = 30
+        sentiment_scores.append((score, 0.3))
+
+    # 恐慌指数贡献 (25%权重，需要反转)
+    if fear_data:
+        sentiment_scores.append((100 - fear_data["current_value"], 0.25))
+
+    # 资金流向贡献 (25%权重)
+    if money_flow_data:
+        flow = money_flow_data["current_value"]
+        if flow > 200:
+            score = 80
+        elif flow > 50:
+            score = 65
+        elif flow > -50:
+            score = 50
+        elif flow > -200:
+            score = 35
+        else:
+            score = 20
+        sentiment_scores.append((score, 0.25))
+
+    if sentiment_scores:
+        total_weight = sum(weight for _, weight in sentiment_scores)
+        weighted_sum = sum(score * weight for score, weight in sentiment_scores)
+        overall_index = round(weighted_sum / total_weight) if total_weight > 0 else 50
+    else:
+        overall_index = 50
+
+    if overall_index >= 70:
+        level = "极度乐观"
+    elif overall_index >= 60:
+        level = "乐观"
+    elif overall_index >= 40:
+        level = "中性"
+    elif overall_index >= 30:
+        level = "悲观"
+    else:
+        level = "极度悲观"
+
+    factors = []
+    if bull_bear_data:
+        factors.append(f"多空比: {bull_bear_data['current_value']:.2f}")
+    if fear_data:
+        factors.append(f"恐慌指数: {fear_data['current_value']:.1f}")
+    if money_flow_data:
+        factors.append(f"资金流向: {money_flow_data['current_value']:.1f}亿")
+
+    return {
+        "index": overall_index,
+        "level": level,
+        "factors": factors if factors else ["数据计算中"]
+    }
+
+
+# ==================== 增量物化 ====================
+
+async def refresh_sentiment_daily(end_date: Optional[str] = None,
+                                  backfill_days: int = INITIAL_BACKFILL_DAYS) -> Dict[str, Any]:
+    """
+    增量刷新 market_sentiment_daily
+
+    从库中最后一个已物化的交易日（含，盘中写入的数据可能不完整）开始重算到最新交易日。
+
+    Args:
+        end_date: 结束日期 YYYYMMDD，默认取 stock_kline_daily 的最新交易日
+        backfill_days: 集合为空时回溯的自然日数
+
+    Returns:
+        刷新统计
+    """
+    collection = async_db_handler.get_collection(SENTIMENT_DAILY_COLLECTION)
+
+    if not end_date:
+        daily_collection = async_db_handler.get_collection('stock_kline_daily')
+        latest_record = await daily_collection.find_one({}, {"trade_date": 1}, sort=[('trade_date', -1)])
+        if not latest_record:
+            return {"success": False, "message": "stock_kline_daily 无数据"}
+        end_date = latest_record["trade_date"]
+
+    last_stored = await collection.find_one({}, {"trade_date": 1}, sort=[('trade_date', -1)])
+    if last_stored:
+        start_date = min(last_stored["trade_date"], end_date)
+    else:
+        start_date = (datetime.strptime(end_date, "%Y%m%d") - timedelta(days=backfill_days)).strftime("%Y%m%d")
+
+    rows = await compute_sentiment_rows(start_date, end_date)
+    if rows:
+        now = datetime.now()
+        await collection.bulk_write([
+            UpdateOne({"trade_date": row["trade_date"]}, {"$set": {**row, "updated_at": now}}, upsert=True)
+            for row in rows
+        ], ordered=False)
+
+    logger.info(f"✅ 市场情绪指标已物化: {start_date} ~ {end_date}, {len(rows)} 个交易日")
+    return {"success": True, "start_date": start_date, "end_date": end_date, "rows": len(rows)}
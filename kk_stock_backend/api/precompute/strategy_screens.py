@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+策略模板选股结果预计算
+
+盘后按 api/config/strategy_templates.py 中的每个模板，以接口默认参数、全市场范围运行对应的策略适配器，
+把排好序的结果写入 strategy_screens_daily（每个 template_id × trade_date 一条）：
+- 默认参数请求直接取预计算结果的前 limit 条
+- 自定义参数只收紧可过滤阈值（如 RSI 区间、量比下限）时，在预计算的超集上过滤
+- 其余情况（指定市值/股票池、放宽阈值、未物化等）返回None，由接口回退实时计算
+"""
+
+import asyncio
+import importlib
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from api.global_db import async_db_handler
+from api.utils.index_registry import declare_indexes
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_SCREENS_COLLECTION = "strategy_screens_daily"
+
+declare_indexes(STRATEGY_SCREENS_COLLECTION, [
+    {"keys": [("template_id", 1), ("trade_date", -1)], "unique": True, "reason": "按模板读取指定/最新交易日的选股结果"},
+], owner=__name__)
+
+# 预计算保留的结果条数（默认参数请求的 limit 不超过该值时直接命中）
+PRECOMPUTE_LIMIT = 200
+
+# 模板ID -> 策略适配器与接口默认参数（与 /strategy/<template> 接口的默认值保持一致）
+#   filters: 可在超集上收紧的参数 -> (结果字段, "min"/"max")
+#   limit_sensitive: 候选集依赖 limit 的适配器，只按接口默认 limit 预计算并精确匹配
+TEMPLATE_SCREENS: Dict[str, Dict[str, Any]] = {
+    "value": {
+        "adapter": "backtrader_strategies.strategy_adapters.value_investment_adapter.ValueInvestmentAdapter",
+        "defaults": {},
+    },
+    "growth": {
+        "adapter": "backtrader_strategies.strategy_adapters.growth_stock_adapter.GrowthStockAdapter",
+        "defaults": {},
+    },
+    "momentum": {
+        "adapter": "backtrader_strategies.strategy_adapters.momentum_breakthrough_adapter.MomentumBreakthroughAdapter",
+        "defaults": {},
+    },
+    "dividend": {
+        "adapter": "backtrader_strategies.strategy_adapters.high_dividend_adapter.HighDividendAdapter",
+        "defaults": {
+            "dividend_yield_min": 2.0,
+            "payout_ratio_min": 20.0,
+            "dividend_fundraising_ratio_min": 30.0,
+            "net_cash_min": -1000000.0,
+        },
+        # 候选池取市值前 limit*5 只，结果不是更大 limit 结果的前缀
+        "limit_sensitive": True,
+        "default_limit": 20,
+    },
+    "technical": {
+        "adapter": "backtrader_strategies.strategy_adapters.technical_breakthrough_adapter.TechnicalBreakthroughAdapter",
+        "defaults": {
+            "rsi_min": 45.0,
+            "rsi_max": 85.0,
+            "volume_ratio_min": 1.2,
+            "require_macd_golden": False,
+            "require_ma_alignment": False,
+        },
+        "filters": {
+            "rsi_min": ("rsi", "min"),
+            "rsi_max": ("rsi", "max"),
+            "volume_ratio_min": ("volume_ratio", "min"),
+        },
+    },
+    "oversold": {
+        "adapter": "backtrader_strategies.strategy_adapters.oversold_rebound_adapter_simple.OversoldReboundAdapter",
+        "defaults": {},
+    },
+    "limit_up": {
+        "adapter": "backtrader_strategies.strategy_adapters.limit_up_leader_adapter_simple.LimitUpLeaderAdapter",
+        "defaults": {},
+    },
+    "fund_flow": {
+        "adapter": "backtrader_strategies.strategy_adapters.fund_flow_tracking_adapter.FundFlowTrackingAdapter",
+        "defaults": {
+            "margin_buy_trend_min": 50.0,
+            "margin_balance_growth_min": 50.0,
+        },
+    },
+}
+
+# 模板结果缺失时，后台触发预计算的最小间隔（秒）
+REFRESH_TRIGGER_INTERVAL = 1800
+_last_refresh_trigger: Dict[str, float] = {}
+
+
+def _create_adapter(path: str):
+    """按 模块路径.类名 创建策略适配器实例"""
+    module_name, class_name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+async def latest_screen_date() -> Optional[str]:
+    """选股数据的最新交易日（各适配器均以 stock_factor_pro 的最新交易日为准）"""
+    collection = async_db_handler.get_collection('stock_factor_pro')
+    latest = await collection.find_one({}, {"_id": 0, "trade_date": 1}, sort=[("trade_date", -1)])
+    return latest["trade_date"] if latest else None
+
+
+# ==================== 读取 ====================
+
+def _resolve_filters(spec: Dict[str, Any], params: Dict[str, Any]) -> Optional[List[Tuple[str, str, Any]]]:
+    """
+    把请求参数转换为超集上的过滤条件
+
+    Returns:
+        过滤条件列表；参数无法由预计算结果满足时返回None
+    """
+    defaults = spec.get("defaults", {})
+    rules = spec.get("filters", {})
+    filters = []
+    for name, value in params.items():
+        if name not in defaults or value == defaults[name]:
+            continue
+        rule = rules.get(name)
+        if rule is None:
+            return None
+        field, kind = rule
+        # 只有收紧阈值时，结果才是预计算超集的子集
+        if (kind == "min" and value < defaults[name]) or (kind == "max" and value > defaults[name]):
+            return None
+        filters.append((field, kind, value))
+    return filters
+
+
+def _passes(stock: Dict[str, Any], filters: List[Tuple[str, str, Any]]) -> bool:
+    for field, kind, value in filters:
+        actual = stock.get(field)
+        if actual is None:
+            return False
+        if kind == "min" and actual < value:
+            return False
+        if kind == "max" and actual > value:
+            return False
+    return True
+
+
+async def load_strategy_screen(template_id: str, market_cap: str = "all", stock_pool: str = "all",
+                               limit: int = 20, **params) -> Optional[Dict[str, Any]]:
+    """
+    读取预计算的模板选股结果
+
+    Args:
+        template_id: 模板ID（见 StrategyTemplateConfig.TEMPLATES）
+        market_cap: 市值范围，非 all 时不使用预计算结果
+        stock_pool: 股票池，非 all 时不使用预计算结果
+        limit: 返回条数
+        **params: 策略参数
+
+    Returns:
+        与策略适配器 screen_stocks 相同结构的结果；无法由预计算结果满足时返回None，调用方回退实时计算
+    """
+    spec = TEMPLATE_SCREENS.get(template_id)
+    if spec is None or market_cap != "all" or stock_pool != "all":
+        return None
+    filters = _resolve_filters(spec, params)
+    if filters is None:
+        return None
+
+    try:
+        trade_date = await latest_screen_date()
+        if trade_date is None:
+            return None
+        collection = async_db_handler.get_collection(STRATEGY_SCREENS_COLLECTION)
+        snapshot = await collection.find_one({"template_id": template_id, "trade_date": trade_date}, {"_id": 0})
+    except Exception as e:
+        logger.warning(f"读取预计算选股结果 {template_id} 失败: {e}")
+        return None
+
+    if snapshot is None:
+        _trigger_refresh(trade_date)
+        return None
+
+    if spec.get("limit_sensitive") and limit != snapshot["limit"]:
+        return None
+
+    stocks = snapshot.get("stocks", [])
+    # 结果条数少于预计算上限说明超集已包含全部符合默认条件的股票
+    exhaustive = len(stocks) < snapshot["limit"]
+    if filters:
+        stocks = [stock for stock in stocks if _passes(stock, filters)]
+    if len(stocks) < limit and not exhaustive:
+        return None
+
+    stocks = stocks[:limit]
+    return {
+        'strategy_name': snapshot.get('strategy_name'),
+        'strategy_type': snapshot.get('strategy_type'),
+        'total_count': len(stocks),
+        'stocks': stocks,
+        'timestamp': snapshot['computed_at'].isoformat(),
+        'trade_date': trade_date,
+        'precomputed': True,
+        'parameters': {
+            'market_cap': market_cap,
+            'stock_pool': stock_pool,
+            'limit': limit,
+            **spec.get("defaults", {}),
+            **params,
+        }
+    }
+
+
+def _trigger_refresh(trade_date: str) -> None:
+    """最新交易日尚未预计算时在后台触发一次（跨worker由任务锁去重，本进程按间隔节流）"""
+    now = time.time()
+    if now - _last_refresh_trigger.get(trade_date, 0) < REFRESH_TRIGGER_INTERVAL:
+        return
+    _last_refresh_trigger[trade_date] = now
+
+    from api.precompute.scheduler import run_exclusive
+    task = asyncio.get_running_loop().create_task(run_exclusive('strategy_screens', refresh_strategy_screens))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+# ==================== 预计算 ====================
+
+async def refresh_strategy_screens(trade_date: Optional[str] = None) -> Dict[str, Any]:
+    """
+    以默认参数运行全部策略模板并保存排序结果
+
+    Args:
+        trade_date: 结果所属交易日，默认 stock_factor_pro 的最新交易日（适配器总是基于最新数据选股）
+
+    Returns:
+        刷新统计
+    """
+    from api.config.strategy_templates import StrategyTemplateConfig
+
+    trade_date = trade_date or await latest_screen_date()
+    if not trade_date:
+        return {"success": False, "message": "stock_factor_pro 无数据"}
+
+    collection = async_db_handler.get_collection(STRATEGY_SCREENS_COLLECTION)
+
+    operations = []
+    summary: Dict[str, Any] = {}
+    for template_id in StrategyTemplateConfig.get_template_ids():
+        spec = TEMPLATE_SCREENS.get(template_id)
+        if spec is None:
+            logger.warning(f"模板 {template_id} 未配置预计算适配器，跳过")
+            continue
+
+        limit = spec["default_limit"] if spec.get("limit_sensitive") else PRECOMPUTE_LIMIT
+        start = time.time()
+        try:
+            adapter = _create_adapter(spec["adapter"])
+            result = await adapter.screen_stocks(market_cap="all", stock_pool="all", limit=limit, **spec["defaults"])
+        except Exception as e:
+            logger.error(f"模板 {template_id} 预计算失败: {e}")
+            summary[template_id] = {"success": False, "error": str(e)}
+            continue
+        if 'error' in result:
+            logger.error(f"模板 {template_id} 预计算失败: {result['error']}")
+            summary[template_id] = {"success": False, "error": result['error']}
+            continue
+
+        stocks = result.get('stocks', [])
+        for stock in stocks:
+            stock.pop('_id', None)
+        operations.append(UpdateOne(
+            {"template_id": template_id, "trade_date": trade_date},
+            {"$set": {
+                "template_id": template_id,
+                "trade_date": trade_date,
+                "strategy_name": result.get('strategy_name'),
+                "strategy_type": result.get('strategy_type'),
+                "limit": limit,
+                "stocks": stocks,
+                "computed_at": datetime.now(),
+            }},
+            upsert=True
+        ))
+        summary[template_id] = {"success": True, "count": len(stocks), "seconds": round(time.time() - start, 2)}
+
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+
+    logger.info(f"✅ 策略模板选股已预计算: {trade_date}, {len(operations)}/{len(summary)} 个模板")
+    return {"success": True, "trade_date": trade_date, "templates": summary}
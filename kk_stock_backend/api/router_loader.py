@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+路由延迟加载
+路由模块（以及它们引入的 pandas、matplotlib、缠论引擎、回测引擎等重量级依赖）不在启动时导入：
+main.py 只登记 模块名/路径前缀，请求首次命中某个前缀时才导入对应模块并挂载路由；
+服务开始监听后，后台再按顺序预加载其余路由，使各worker尽快进入健康状态。
+
+同时记录每个模块的导入耗时和它引入的重量级库，供 /system/startup 查看。
+"""
+
+import asyncio
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+# 统计导入耗时时关注的重量级库
+HEAVY_LIBRARIES = (
+    "pandas", "numpy", "scipy", "matplotlib", "sklearn", "talib", "backtrader",
+    "qlib", "torch", "apscheduler", "pyarrow", "chan_theory_v2", "backtrader_strategies"
+)
+
+# 服务启动后开始后台预加载前的等待时间（秒），让出时间先完成端口监听与健康检查
+DEFAULT_PRELOAD_DELAY = 1.0
+
+
+class RouterSpec:
+    """一个待挂载的路由模块"""
+
+    __slots__ = ("module", "prefix", "tags", "path_prefix", "loaded", "load_seconds",
+                 "new_modules", "heavy_imports", "error", "lock")
+
+    def __init__(self, module: str, prefix: str = "", tags: Optional[List[str]] = None,
+                 path_prefix: Optional[str] = None):
+        self.module = module
+        self.prefix = prefix
+        self.tags = tags
+        # 用于匹配请求的路径前缀：include_router 的prefix，或路由模块自身APIRouter的prefix
+        self.path_prefix = (path_prefix if path_prefix is not None else prefix).rstrip("/")
+        self.loaded = False
+        self.load_seconds: Optional[float] = None
+        self.new_modules = 0
+        self.heavy_imports: List[str] = []
+        self.error: Optional[str] = None
+        self.lock = asyncio.Lock()
+
+    def matches(self, path: str) -> bool:
+        return path == self.path_prefix or path.startswith(self.path_prefix + "/")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "module": self.module,
+            "path_prefix": self.path_prefix,
+            "loaded": self.loaded,
+            "load_ms": round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+            "new_modules": self.new_modules,
+            "heavy_imports": self.heavy_imports,
+            "error": self.error
+        }
+
+
+class LazyRouterLoader:
+    """按需导入路由模块并挂载到应用"""
+
+    def __init__(self):
+        self.app = None
+        self.specs: List[RouterSpec] = []
+        self.phases: Dict[str, float] = {}
+        self._import_lock = threading.Lock()
+        self._preload_task: Optional[asyncio.Task] = None
+
+    def bind(self, app) -> None:
+        self.app = app
+
+    def register(self, module: str, prefix: str = "", tags: Optional[List[str]] = None,
+                 path_prefix: Optional[str] = None) -> None:
+        """
+        登记路由模块（按登记顺序挂载，保证同前缀路由的匹配顺序与直接include一致）
+
+        Args:
+            module: 模块路径，需包含名为 router 的 APIRouter
+            prefix: include_router 的前缀
+            tags: OpenAPI标签
+            path_prefix: 路由自带前缀时用于匹配请求的路径前缀
+        """
+        self.specs.append(RouterSpec(module, prefix, tags, path_prefix))
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        """记录启动阶段耗时"""
+        self.phases[name] = seconds
+
+    @property
+    def all_loaded(self) -> bool:
+        return all(spec.loaded or spec.error for spec in self.specs)
+
+    def pending_for_path(self, scope: Dict[str, Any]) -> List[RouterSpec]:
+        """
+        请求需要的未加载路由：按路径前缀匹配；前缀都不匹配且已挂载路由也无法处理时返回全部未加载路由
+        """
+        pending = [spec for spec in self.specs if not spec.loaded and not spec.error]
+        if not pending:
+            return []
+        path = scope.get("path", "")
+        matched = [spec for spec in self.specs if spec.matches(path)]
+        if matched:
+            return [spec for spec in matched if not spec.loaded and not spec.error]
+        for route in self.app.router.routes:
+            try:
+                match, _ = route.matches(scope)
+            except Exception:
+                continue
+            if match == Match.FULL:
+                return []
+        return pending
+
+    def _import(self, spec: RouterSpec):
+        """导入模块并统计耗时与新引入的重量级库（在线程池中执行）"""
+        with self._import_lock:
+            before = set(sys.modules)
+            started = time.perf_counter()
+            module = importlib.import_module(spec.module)
+            spec.load_seconds = time.perf_counter() - started
+            added = set(sys.modules) - before
+        spec.new_modules = len(added)
+        spec.heavy_imports = sorted(name for name in added if name in HEAVY_LIBRARIES)
+        return module
+
+    def _mount(self, spec: RouterSpec, module) -> None:
+        kwargs: Dict[str, Any] = {}
+        if spec.prefix:
+            kwargs["prefix"] = spec.prefix
+        if spec.tags:
+            kwargs["tags"] = spec.tags
+        self.app.include_router(module.router, **kwargs)
+        # 路由变化后重新生成OpenAPI文档
+        self.app.openapi_schema = None
+        spec.loaded = True
+
+    async def ensure_loaded(self, specs: List[RouterSpec]) -> None:
+        """导入并挂载指定路由（按登记顺序，失败的模块记录错误后跳过）"""
+        loop = asyncio.get_running_loop()
+        for spec in specs:
+            async with spec.lock:
+                if spec.loaded or spec.error:
+                    continue
+                try:
+                    module = await loop.run_in_executor(None, self._import, spec)
+                    self._mount(spec, module)
+                    logger.info(
+                        f"📦 路由已加载 {spec.module} ({spec.load_seconds * 1000:.0f}ms"
+                        f"{', ' + ','.join(spec.heavy_imports) if spec.heavy_imports else ''})"
+                    )
+                except Exception as e:
+                    spec.error = str(e)
+                    logger.error(f"❌ 路由加载失败 {spec.module}: {e}")
+
+    def load_all_sync(self) -> None:
+        """同步加载全部路由（关闭延迟加载时使用，导入失败直接抛出，便于排查）"""
+        for spec in self.specs:
+            if spec.loaded:
+                continue
+            try:
+                self._mount(spec, self._import(spec))
+            except Exception as e:
+                spec.error = str(e)
+                logger.error(f"❌ 路由加载失败 {spec.module}: {e}")
+                raise
+
+    async def _preload(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        await self.ensure_loaded(list(self.specs))
+        self.record_phase("background_preload", time.perf_counter() - started)
+        logger.info(f"✅ 全部路由预加载完成，用时 {time.perf_counter() - started:.2f}s")
+
+    def start_preload(self, delay: float = DEFAULT_PRELOAD_DELAY) -> None:
+        """服务开始监听后在后台依次预加载全部路由"""
+        if self._preload_task is None and not self.all_loaded:
+            self._preload_task = asyncio.create_task(self._preload(delay))
+
+    async def stop_preload(self) -> None:
+        if self._preload_task is not None and not self._preload_task.done():
+            self._preload_task.cancel()
+            try:
+                await self._preload_task
+            except asyncio.CancelledError:
+                pass
+
+    def profile(self) -> Dict[str, Any]:
+        """启动耗时报告：各阶段耗时与各路由模块导入耗时（倒序）"""
+        routers = sorted(
+            (spec.to_dict() for spec in self.specs),
+            key=lambda item: item["load_ms"] or 0, reverse=True
+        )
+        return {
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            "loaded": sum(1 for spec in self.specs if spec.loaded),
+            "total": len(self.specs),
+            "routers": routers
+        }
+
+
+router_loader = LazyRouterLoader()
+
+
+class LazyRouterMiddleware:
+    """
+    纯ASGI中间件：请求到达路由匹配前，确保对应前缀的路由模块已加载
+    （需最先注册，位于最内层）
+    """
+
+    # 需要完整路由表的路径
+    FULL_SCHEMA_PATHS = {"/openapi.json", "/docs", "/redoc"}
+
+    def __init__(self, app, loader: LazyRouterLoader = router_loader):
+        self.app = app
+        self.loader = loader
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and not self.loader.all_loaded:
+            path = scope.get("path", "")
+            if path in self.FULL_SCHEMA_PATHS:
+                pending = [spec for spec in self.loader.specs if not spec.loaded and not spec.error]
+            else:
+                pending = self.loader.pending_for_path(scope)
+            if pending:
+                await self.loader.ensure_loaded(pending)
+        await self.app(scope, receive, send)
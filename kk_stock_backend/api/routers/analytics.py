@@ -6,16 +6,20 @@
 """
 
 from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 import asyncio
+import numpy as np
 
 # 导入缓存装饰器
 from api.cache_middleware import cache_endpoint
 
 import sys
 import os
-from api.global_db import db_handler
+from api.global_db import db_handler, async_db_handler
+from api.async_db_handler import run_sync
+from api.utils import correlation_engine
 
 # 添加项目根目录到sys.path以便导入数据库管理器
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -29,93 +33,155 @@ sys.path.insert(0, project_root)
 router = APIRouter()
 
 
+# 相关性分析支持的股票数量上限（向量化计算，数百只股票仍为毫秒级）
+MAX_CORRELATION_STOCKS = 500
+
+
+class CorrelationRequest(BaseModel):
+    """大股票池相关性分析请求（代码列表较长时使用POST）"""
+    ts_codes: List[str] = Field(..., description="股票代码列表")
+    days: int = Field(30, ge=5, le=250, description="分析天数")
+    field: str = Field("close", description="分析字段: close, pct_chg, vol")
+    method: str = Field("pearson", description="相关性方法: pearson, spearman")
+    rolling_window: Optional[int] = Field(None, ge=5, le=120, description="滚动窗口(交易日)，返回平均相关系数序列")
+    matrix_format: str = Field("dict", description="矩阵格式: dict(嵌套字典) 或 array(二维数组)")
+
+
+async def _resolve_window_start(code_list: List[str], days: int) -> Optional[str]:
+    """确定分析窗口起始交易日：以股票池最新数据日期向前回溯days个交易日"""
+    collection = async_db_handler.get_collection('daily')
+    latest = await collection.find_one(
+        {"ts_code": {"$in": code_list}},
+        {"trade_date": 1, "_id": 0},
+        sort=[("trade_date", -1)]
+    )
+    if not latest:
+        return None
+    latest_date = latest["trade_date"]
+
+    calendar = async_db_handler.get_collection('infrastructure_trading_calendar')
+    open_days = await calendar.find(
+        {"exchange": "SSE", "is_open": {"$in": [1, "1"]}, "cal_date": {"$lte": latest_date}},
+        {"cal_date": 1, "_id": 0}
+    ).sort("cal_date", -1).limit(days).to_list(length=days)
+    if len(open_days) == days:
+        return open_days[-1]["cal_date"]
+
+    # 交易日历缺失时按自然日估算（约每7个自然日5个交易日）
+    latest_dt = datetime.strptime(latest_date, "%Y%m%d")
+    return (latest_dt - timedelta(days=int(days * 7 / 5) + 7)).strftime("%Y%m%d")
+
+
+def _compute_correlation(docs: List[Dict], code_list: List[str], field: str, days: int,
+                         method: str, rolling_window: Optional[int], matrix_format: str) -> Dict[str, Any]:
+    """透视并计算相关系数矩阵（CPU密集，在线程池中执行）"""
+    dates, matrix = correlation_engine.build_panel(docs, code_list, field)
+    # 每只股票最多保留最近days个交易日
+    if len(dates) > days:
+        dates, matrix = dates[-days:], matrix[-days:]
+
+    corr, _ = correlation_engine.pairwise_correlation(matrix, method=method)
+    if matrix_format == "array":
+        correlation_matrix = {"codes": code_list, "matrix": correlation_engine.matrix_to_rows(corr)}
+    else:
+        correlation_matrix = correlation_engine.matrix_to_nested_dict(code_list, corr)
+
+    valid_counts = (~np.isnan(matrix)).sum(axis=0)
+    result = {
+        "correlation_matrix": correlation_matrix,
+        "data_points": {code: int(valid_counts[i]) for i, code in enumerate(code_list)},
+    }
+    if rolling_window:
+        series = correlation_engine.rolling_average_correlation(matrix, rolling_window, method=method)
+        result["rolling_correlation"] = {
+            "window": rolling_window,
+            "series": [
+                {"trade_date": trade_date, "avg_correlation": round(value, 4)}
+                for trade_date, value in zip(dates, series) if value is not None
+            ]
+        }
+    return result
+
+
+async def run_correlation_analysis(code_list: List[str], days: int, field: str, method: str = "pearson",
+                                   rolling_window: Optional[int] = None,
+                                   matrix_format: str = "dict") -> Dict[str, Any]:
+    """
+    相关性分析主流程：一次$in查询取回整个股票池，透视为 日期×股票 矩阵后向量化计算
+    """
+    # 去重并保持顺序
+    code_list = list(dict.fromkeys(code_list))
+    if len(code_list) < 2:
+        raise HTTPException(status_code=400, detail="至少需要2只股票进行相关性分析")
+    if len(code_list) > MAX_CORRELATION_STOCKS:
+        raise HTTPException(status_code=400, detail=f"相关性分析最多支持{MAX_CORRELATION_STOCKS}只股票")
+    if method not in ("pearson", "spearman"):
+        raise HTTPException(status_code=400, detail=f"不支持的相关性方法: {method}")
+    if matrix_format not in ("dict", "array"):
+        raise HTTPException(status_code=400, detail=f"不支持的矩阵格式: {matrix_format}")
+
+    start_date = await _resolve_window_start(code_list, days)
+    docs = []
+    if start_date:
+        collection = async_db_handler.get_collection('daily')
+        docs = await collection.find(
+            {"ts_code": {"$in": code_list}, "trade_date": {"$gte": start_date}},
+            {"ts_code": 1, "trade_date": 1, field: 1, "_id": 0}
+        ).to_list(length=None)
+
+    computed = await run_sync(
+        _compute_correlation, docs, code_list, field, days, method, rolling_window, matrix_format
+    )
+
+    data = {
+        "stocks": code_list,
+        "field": field,
+        "method": method,
+        "analysis_period": f"{days}天",
+        "correlation_matrix": computed["correlation_matrix"],
+        "data_points": computed["data_points"],
+        "timestamp": datetime.now().isoformat()
+    }
+    if "rolling_correlation" in computed:
+        data["rolling_correlation"] = computed["rolling_correlation"]
+    return data
+
+
 @cache_endpoint(data_type='analytics', ttl=1800)  # 缓存30分钟
 @router.get("/correlation")
 async def get_correlation_analysis(
     ts_codes: str = Query(..., description="股票代码列表，逗号分隔"),
     days: int = Query(30, description="分析天数", ge=5, le=250),
-    field: str = Query("close", description="分析字段: close, pct_chg, vol")
+    field: str = Query("close", description="分析字段: close, pct_chg, vol"),
+    method: str = Query("pearson", description="相关性方法: pearson, spearman(秩相关)"),
+    rolling_window: Optional[int] = Query(None, description="滚动窗口(交易日)，返回平均相关系数序列", ge=5, le=120),
+    matrix_format: str = Query("dict", description="矩阵格式: dict(嵌套字典) 或 array(二维数组)")
 ):
     """计算多只股票间的相关性"""
     try:
         code_list = [code.strip() for code in ts_codes.split(",") if code.strip()]
-        if len(code_list) < 2:
-            raise HTTPException(status_code=400, detail="至少需要2只股票进行相关性分析")
-        if len(code_list) > 20:
-            raise HTTPException(status_code=400, detail="相关性分析最多支持20只股票")
-        
-        # 获取所有股票的历史数据
-        results = []
-        for ts_code in code_list:
-            try:
-                collection = db_handler.get_collection('daily')
-                cursor = collection.find(
-                    {"ts_code": ts_code},
-                    {"trade_date": 1, field: 1, "_id": 0}
-                ).sort("trade_date", -1).limit(days)
-                results.append(list(cursor))
-            except Exception as e:
-                results.append([])
-        
-        # 组织数据用于相关性计算
-        stock_data = {}
-        for i, ts_code in enumerate(code_list):
-            if i < len(results) and results[i]:
-                # 将数据按日期排序（从早到晚）
-                data = sorted(results[i], key=lambda x: x["trade_date"])
-                stock_data[ts_code] = {
-                    "dates": [item["trade_date"] for item in data],
-                    "values": [item.get(field, 0) for item in data]
-                }
-        
-        # 简化的相关系数计算（实际应用中建议使用numpy等库）
-        correlation_matrix = {}
-        
-        for i, code1 in enumerate(code_list):
-            correlation_matrix[code1] = {}
-            for j, code2 in enumerate(code_list):
-                if code1 == code2:
-                    correlation_matrix[code1][code2] = 1.0
-                elif code1 in stock_data and code2 in stock_data:
-                    # 获取共同的交易日期
-                    dates1 = set(stock_data[code1]["dates"])
-                    dates2 = set(stock_data[code2]["dates"])
-                    common_dates = dates1.intersection(dates2)
-                    
-                    if len(common_dates) >= 5:  # 至少需要5个共同数据点
-                        # 提取共同日期的数据
-                        values1 = []
-                        values2 = []
-                        
-                        for date in sorted(common_dates):
-                            idx1 = stock_data[code1]["dates"].index(date)
-                            idx2 = stock_data[code2]["dates"].index(date)
-                            values1.append(stock_data[code1]["values"][idx1])
-                            values2.append(stock_data[code2]["values"][idx2])
-                        
-                        # 计算皮尔逊相关系数
-                        if len(values1) > 0:
-                            correlation = calculate_correlation(values1, values2)
-                            correlation_matrix[code1][code2] = round(correlation, 4)
-                        else:
-                            correlation_matrix[code1][code2] = None
-                    else:
-                        correlation_matrix[code1][code2] = None
-                else:
-                    correlation_matrix[code1][code2] = None
-        
-        return {
-            "success": True,
-            "data": {
-                "stocks": code_list,
-                "field": field,
-                "analysis_period": f"{days}天",
-                "correlation_matrix": correlation_matrix,
-                "data_points": {code: len(stock_data.get(code, {}).get("values", [])) for code in code_list},
-                "timestamp": datetime.now().isoformat()
-            }
-        }
-        
+        data = await run_correlation_analysis(code_list, days, field, method, rolling_window, matrix_format)
+        return {"success": True, "data": data}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"相关性分析失败: {str(e)}")
+
+
+@router.post("/correlation")
+async def post_correlation_analysis(request: CorrelationRequest):
+    """计算大股票池的相关性（代码列表放在请求体中）"""
+    try:
+        code_list = [code.strip() for code in request.ts_codes if code and code.strip()]
+        data = await run_correlation_analysis(
+            code_list, request.days, request.field, request.method,
+            request.rolling_window, request.matrix_format
+        )
+        return {"success": True, "data": data}
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"相关性分析失败: {str(e)}")
 
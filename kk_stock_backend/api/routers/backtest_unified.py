@@ -8,19 +8,27 @@
 
 from fastapi import APIRouter, HTTPException, Query, Body, BackgroundTasks, Depends, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Callable
 from pydantic import BaseModel, Field, validator
 from datetime import datetime, date, timedelta
 import logging
 import uuid
 import asyncio
 import json
+import threading
 import os
 import sys
 import jwt
 import redis
 from dotenv import load_dotenv
 
+try:
+    import redis.asyncio as aioredis
+    HAS_ASYNC_REDIS = True
+except ImportError:
+    HAS_ASYNC_REDIS = False
+    aioredis = None
+
 # 添加项目根目录到路径以导入回测模块
 current_dir = os.path.dirname(os.path.abspath(__file__))
 api_dir = os.path.dirname(current_dir)
@@ -51,6 +59,10 @@ except ImportError:
     HAS_DB_HANDLER = False
     db_handler = None
 
+from api.backtest_queue.job_queue import (
+    get_job_queue, DEFAULT_PRIORITY, ADMIN_PRIORITY, MAX_JOBS_PER_USER, MAX_JOBS_PER_ADMIN
+)
+
 try:
     from routers.user import get_current_user
     HAS_USER_AUTH = True
@@ -74,9 +86,36 @@ logger = logging.getLogger(__name__)
 
 # Redis任务状态管理器
 class TaskManager:
-    """跨进程的任务状态管理器"""
+    """
+    跨进程的任务状态管理器
+
+    Redis(db=1)存储布局:
+    - backtest_task:{task_id}          Hash，任务的每个顶层字段单独存放（值为JSON）
+    - backtest_task:{task_id}:result   回测结果（体积大，单独存放，只在查询结果时读取）
+    - backtest_task:{task_id}:series   List，每个交易日一个净值数据点
+    - backtest_task:{task_id}:events   Pub/Sub频道，发布字段增量，供SSE订阅
+    - backtest_task_index              Set，全部任务ID
+    """
+    
+    TASK_TTL = 7200  # 2小时过期
+    FINISHED_TTL = 1800  # 结束后保留30分钟供前端查询
+    SUBSCRIBER_MAX_CONNECTIONS = 200  # SSE订阅共用的异步连接池上限（每个订阅占用一个连接）
+    INDEX_KEY = "backtest_task_index"
+    SERIES_FIELDS = {
+        'date_series': 'date',
+        'portfolio_series': 'portfolio_value',
+        'daily_return_series': 'daily_return',
+        'cumulative_return_series': 'cumulative_return',
+        'drawdown_series': 'drawdown'
+    }
     
     def __init__(self):
+        self._memory_tasks = {}
+        self._memory_results = {}
+        self._memory_series = {}
+        # 内存模式下的进程内订阅者: task_id -> [(事件循环, asyncio.Queue)]
+        self._memory_listeners: Dict[str, List[tuple]] = {}
+        self._async_redis = None
         try:
             self.redis_client = redis.Redis(
                 host='localhost',
@@ -92,89 +131,337 @@ class TaskManager:
         except Exception as e:
             logger.warning(f"⚠️ Redis连接失败，降级到内存模式: {e}")
             self.redis_client = None
-            self._memory_tasks = {}
     
     def _get_task_key(self, task_id: str) -> str:
         """获取任务在Redis中的key"""
         return f"backtest_task:{task_id}"
     
+    def _get_result_key(self, task_id: str) -> str:
+        return f"backtest_task:{task_id}:result"
+    
+    def _get_series_key(self, task_id: str) -> str:
+        return f"backtest_task:{task_id}:series"
+    
+    def get_channel(self, task_id: str) -> str:
+        """任务事件频道"""
+        return f"backtest_task:{task_id}:events"
+    
+    @staticmethod
+    def _encode_fields(fields: Dict[str, Any]) -> Dict[str, str]:
+        return {key: json.dumps(value, default=str) for key, value in fields.items()}
+    
+    @staticmethod
+    def _decode_fields(raw: Dict[str, str]) -> Dict[str, Any]:
+        return {key: json.loads(value) for key, value in raw.items()}
+    
+    def _publish(self, task_id: str, event: Dict[str, Any], pipe=None) -> None:
+        """发布任务增量事件"""
+        if self.redis_client:
+            (pipe or self.redis_client).publish(self.get_channel(task_id), json.dumps(event, default=str))
+            return
+        # 内存模式：投递到同进程的订阅队列（发布方可能在线程池中）
+        message = json.loads(json.dumps(event, default=str))
+        for loop, queue in list(self._memory_listeners.get(task_id, [])):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                pass
+    
     def set_task(self, task_id: str, task_data: Dict[str, Any]) -> None:
-        """设置任务状态"""
+        """设置任务状态（整体覆盖）"""
         try:
+            fields = dict(task_data)
+            result = fields.pop('result', None)
             if self.redis_client:
-                # 序列化任务数据
-                task_json = json.dumps(task_data, default=str)
-                self.redis_client.setex(
-                    self._get_task_key(task_id),
-                    7200,  # 2小时过期
-                    task_json
-                )
+                pipe = self.redis_client.pipeline()
+                key = self._get_task_key(task_id)
+                pipe.delete(key)
+                pipe.hset(key, mapping=self._encode_fields(fields))
+                pipe.expire(key, self.TASK_TTL)
+                if result is not None:
+                    pipe.setex(self._get_result_key(task_id), self.TASK_TTL, json.dumps(result, default=str))
+                pipe.sadd(self.INDEX_KEY, task_id)
+                self._publish(task_id, {"type": "update", "fields": fields}, pipe)
+                pipe.execute()
             else:
                 # 降级到内存模式
-                self._memory_tasks[task_id] = task_data
+                self._memory_tasks[task_id] = fields
+                if result is not None:
+                    self._memory_results[task_id] = result
+                self._publish(task_id, {"type": "update", "fields": fields})
         except Exception as e:
             logger.error(f"设置任务状态失败: {e}")
     
-    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """获取任务状态"""
+    def get_task(self, task_id: str, include_result: bool = True,
+                 include_series: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        获取任务状态
+        
+        Args:
+            task_id: 任务ID
+            include_result: 是否附带回测结果（体积大，仅结果查询接口需要）
+            include_series: 是否附带净值时序数据
+        """
         try:
             if self.redis_client:
-                task_json = self.redis_client.get(self._get_task_key(task_id))
-                if task_json:
-                    return json.loads(task_json)
-                return None
+                raw = self.redis_client.hgetall(self._get_task_key(task_id))
+                if not raw:
+                    return None
+                task_data = self._decode_fields(raw)
+                if include_result:
+                    result_json = self.redis_client.get(self._get_result_key(task_id))
+                    task_data['result'] = json.loads(result_json) if result_json else None
+                if include_series:
+                    points = [json.loads(p) for p in self.redis_client.lrange(self._get_series_key(task_id), 0, -1)]
+                    task_data.update(self._points_to_series(points))
+                return task_data
             else:
-                return self._memory_tasks.get(task_id)
+                task = self._memory_tasks.get(task_id)
+                if task is None:
+                    return None
+                task_data = dict(task)
+                if include_result:
+                    task_data['result'] = self._memory_results.get(task_id)
+                if include_series:
+                    task_data.update(self._points_to_series(self._memory_series.get(task_id, [])))
+                return task_data
         except Exception as e:
             logger.error(f"获取任务状态失败: {e}")
             return None
     
+    def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """只读取回测结果"""
+        try:
+            if self.redis_client:
+                result_json = self.redis_client.get(self._get_result_key(task_id))
+                return json.loads(result_json) if result_json else None
+            return self._memory_results.get(task_id)
+        except Exception as e:
+            logger.error(f"获取回测结果失败: {e}")
+            return None
+    
     def update_task(self, task_id: str, updates: Dict[str, Any]) -> bool:
-        """更新任务状态"""
+        """更新任务字段（只写变化的Hash字段），并在任务频道发布增量"""
         try:
-            task_data = self.get_task(task_id)
-            if task_data:
-                task_data.update(updates)
-                self.set_task(task_id, task_data)
+            fields = dict(updates)
+            result = fields.pop('result', None)
+            if self.redis_client:
+                key = self._get_task_key(task_id)
+                if not self.redis_client.exists(key):
+                    return False
+                pipe = self.redis_client.pipeline()
+                if fields:
+                    pipe.hset(key, mapping=self._encode_fields(fields))
+                pipe.expire(key, self.TASK_TTL)
+                if result is not None:
+                    pipe.setex(self._get_result_key(task_id), self.TASK_TTL, json.dumps(result, default=str))
+                self._publish(task_id, {"type": "update", "fields": fields}, pipe)
+                pipe.execute()
+                return True
+            else:
+                if task_id not in self._memory_tasks:
+                    return False
+                self._memory_tasks[task_id].update(fields)
+                if result is not None:
+                    self._memory_results[task_id] = result
+                self._publish(task_id, {"type": "update", "fields": fields})
                 return True
-            return False
         except Exception as e:
             logger.error(f"更新任务状态失败: {e}")
             return False
     
+    def append_series_point(self, task_id: str, point: Dict[str, Any], replace_last: bool = False) -> None:
+        """追加（或替换最后一个）净值数据点，并发布增量"""
+        try:
+            if self.redis_client:
+                series_key = self._get_series_key(task_id)
+                pipe = self.redis_client.pipeline()
+                if replace_last:
+                    pipe.lset(series_key, -1, json.dumps(point, default=str))
+                else:
+                    pipe.rpush(series_key, json.dumps(point, default=str))
+                pipe.expire(series_key, self.TASK_TTL)
+                self._publish(task_id, {"type": "series", "point": point, "replace_last": replace_last}, pipe)
+                pipe.execute()
+            else:
+                series = self._memory_series.setdefault(task_id, [])
+                if replace_last and series:
+                    series[-1] = point
+                else:
+                    series.append(point)
+                self._publish(task_id, {"type": "series", "point": point, "replace_last": replace_last})
+        except Exception as e:
+            logger.error(f"追加净值数据失败: {e}")
+    
+    @classmethod
+    def _points_to_series(cls, points: List[Dict[str, Any]]) -> Dict[str, List]:
+        """净值数据点列表转为按字段分组的时序数组"""
+        return {
+            series_name: [point.get(point_key) for point in points]
+            for series_name, point_key in cls.SERIES_FIELDS.items()
+        }
+    
+    def expire_task(self, task_id: str, ttl: Optional[int] = None) -> None:
+        """任务结束后缩短保留时间，到期自动清理"""
+        ttl = ttl or self.FINISHED_TTL
+        try:
+            if self.redis_client:
+                pipe = self.redis_client.pipeline()
+                for key in (self._get_task_key(task_id), self._get_result_key(task_id), self._get_series_key(task_id)):
+                    pipe.expire(key, ttl)
+                pipe.execute()
+            else:
+                timer = threading.Timer(ttl, self.delete_task, args=(task_id,))
+                timer.daemon = True
+                timer.start()
+        except Exception as e:
+            logger.error(f"设置任务过期失败: {e}")
+    
     def delete_task(self, task_id: str) -> bool:
         """删除任务"""
         try:
             if self.redis_client:
-                return bool(self.redis_client.delete(self._get_task_key(task_id)))
+                pipe = self.redis_client.pipeline()
+                pipe.delete(self._get_task_key(task_id))
+                pipe.delete(self._get_result_key(task_id), self._get_series_key(task_id))
+                pipe.srem(self.INDEX_KEY, task_id)
+                self._publish(task_id, {"type": "deleted"}, pipe)
+                return bool(pipe.execute()[0])
             else:
-                return self._memory_tasks.pop(task_id, None) is not None
+                self._memory_results.pop(task_id, None)
+                self._memory_series.pop(task_id, None)
+                existed = self._memory_tasks.pop(task_id, None) is not None
+                self._publish(task_id, {"type": "deleted"})
+                return existed
         except Exception as e:
             logger.error(f"删除任务失败: {e}")
             return False
     
     def task_exists(self, task_id: str) -> bool:
         """检查任务是否存在"""
-        return self.get_task(task_id) is not None
+        try:
+            if self.redis_client:
+                return bool(self.redis_client.exists(self._get_task_key(task_id)))
+            return task_id in self._memory_tasks
+        except Exception as e:
+            logger.error(f"检查任务失败: {e}")
+            return False
     
-    def get_all_tasks(self) -> Dict[str, Dict[str, Any]]:
+    def get_all_tasks(self, include_result: bool = True) -> Dict[str, Dict[str, Any]]:
         """获取所有任务（用于列表查询）"""
         try:
             if self.redis_client:
-                pattern = "backtest_task:*"
-                keys = self.redis_client.keys(pattern)
+                task_ids = sorted(self.redis_client.smembers(self.INDEX_KEY))
+                pipe = self.redis_client.pipeline()
+                for task_id in task_ids:
+                    pipe.hgetall(self._get_task_key(task_id))
+                    if include_result:
+                        pipe.get(self._get_result_key(task_id))
+                replies = pipe.execute()
+                step = 2 if include_result else 1
+                
                 tasks = {}
-                for key in keys:
-                    task_id = key.replace("backtest_task:", "")
-                    task_data = self.get_task(task_id)
-                    if task_data:
-                        tasks[task_id] = task_data
+                expired = []
+                for i, task_id in enumerate(task_ids):
+                    raw = replies[i * step]
+                    if not raw:
+                        expired.append(task_id)
+                        continue
+                    task_data = self._decode_fields(raw)
+                    if include_result:
+                        result_json = replies[i * step + 1]
+                        task_data['result'] = json.loads(result_json) if result_json else None
+                    tasks[task_id] = task_data
+                # 清理已过期任务的索引
+                if expired:
+                    self.redis_client.srem(self.INDEX_KEY, *expired)
                 return tasks
             else:
-                return self._memory_tasks.copy()
+                return {
+                    task_id: self.get_task(task_id, include_result=include_result)
+                    for task_id in list(self._memory_tasks)
+                }
         except Exception as e:
             logger.error(f"获取所有任务失败: {e}")
             return {}
+    
+    def get_async_redis(self):
+        """SSE订阅共用的异步Redis客户端（进程内共享一个连接池）"""
+        if self._async_redis is None:
+            pool = aioredis.ConnectionPool(host='localhost', port=6379, db=1, decode_responses=True,
+                                           max_connections=self.SUBSCRIBER_MAX_CONNECTIONS)
+            self._async_redis = aioredis.Redis(connection_pool=pool)
+        return self._async_redis
+    
+    def subscribe(self, task_id: str) -> "TaskEventSubscription":
+        """订阅任务事件频道"""
+        return TaskEventSubscription(self, task_id)
+
+
+class TaskEventSubscription:
+    """
+    单个任务事件频道的异步订阅（async with 使用）
+    
+    Redis模式下使用redis.asyncio订阅频道；内存模式下使用进程内队列。
+    """
+    
+    def __init__(self, manager: TaskManager, task_id: str):
+        self.manager = manager
+        self.task_id = task_id
+        self._async = False
+        self._pubsub = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._listener = None
+    
+    async def __aenter__(self) -> "TaskEventSubscription":
+        if self.manager.redis_client and HAS_ASYNC_REDIS:
+            self._async = True
+            self._pubsub = self.manager.get_async_redis().pubsub()
+            await self._pubsub.subscribe(self.manager.get_channel(self.task_id))
+        elif self.manager.redis_client:
+            # redis-py版本过旧，没有asyncio接口：同步订阅，等待放到线程池
+            self._pubsub = self.manager.redis_client.pubsub()
+            self._pubsub.subscribe(self.manager.get_channel(self.task_id))
+        else:
+            self._queue = asyncio.Queue()
+            self._listener = (asyncio.get_running_loop(), self._queue)
+            self.manager._memory_listeners.setdefault(self.task_id, []).append(self._listener)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if self._async:
+                await self._pubsub.unsubscribe()
+                # redis-py 5.x 起 close() 更名为 aclose()；只释放订阅连接，共享的客户端不关闭
+                await getattr(self._pubsub, 'aclose', self._pubsub.close)()
+            elif self._pubsub is not None:
+                self._pubsub.close()
+            elif self._listener is not None:
+                listeners = self.manager._memory_listeners.get(self.task_id, [])
+                if self._listener in listeners:
+                    listeners.remove(self._listener)
+                if not listeners:
+                    self.manager._memory_listeners.pop(self.task_id, None)
+        except Exception as e:
+            logger.warning(f"关闭任务事件订阅失败: {e}")
+    
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待下一条事件，超时返回None"""
+        if self._queue is not None:
+            try:
+                return await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        
+        if self._async:
+            message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        else:
+            loop = asyncio.get_running_loop()
+            message = await loop.run_in_executor(None, lambda: self._pubsub.get_message(True, timeout))
+        if message and message.get('type') == 'message':
+            return json.loads(message['data'])
+        return None
 
 # 创建全局任务管理器实例
 task_manager = TaskManager()
@@ -189,18 +476,21 @@ class ActiveTasksCompat:
     def __setitem__(self, task_id: str, task_data: Dict[str, Any]):
         task_manager.set_task(task_id, task_data)
     
+    def __delitem__(self, task_id: str):
+        task_manager.delete_task(task_id)
+    
     def __contains__(self, task_id: str):
         return task_manager.task_exists(task_id)
     
     def __len__(self):
-        return len(task_manager.get_all_tasks())
+        return len(task_manager.get_all_tasks(include_result=False))
     
     def get(self, task_id: str, default=None):
         task = task_manager.get_task(task_id)
         return task if task is not None else default
     
     def keys(self):
-        return task_manager.get_all_tasks().keys()
+        return task_manager.get_all_tasks(include_result=False).keys()
     
     def values(self):
         return task_manager.get_all_tasks().values()
@@ -418,15 +708,15 @@ async def get_current_user_sse(token: Optional[str] = Query(None, description="
         raise HTTPException(status_code=401, detail="缺少认证Token")
     
     try:
-        # 导入MongoDB连接配置
-        from .user import users_col
+        # 复用用户模块的认证主体缓存，避免每次SSE重连都查询MongoDB
+        from .user import load_active_user
         
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Token无效")
         
-        user = users_col.find_one({"user_id": user_id, "status": 1})
+        user = load_active_user(user_id)
         if not user:
             raise HTTPException(status_code=401, detail="用户不存在或已禁用")
         return user
@@ -455,13 +745,16 @@ class FallbackBacktestEngine:
 try:
     # 尝试导入实际的回测模块
     sys.path.append('/Users/libing/kk_Projects/kk_Stock/kk_stock_backend')
-    from backtrader_strategies.backtest.backtest_engine import run_strategy_backtest
+    from backtrader_strategies.backtest.backtest_engine import run_strategy_backtest, BacktestCancelled
     HAS_BACKTEST_ENGINE = True
     logger.info("回测引擎模块加载成功")
 except Exception as e:
     logger.warning(f"回测引擎模块加载失败: {e}")
     HAS_BACKTEST_ENGINE = False
     run_strategy_backtest = FallbackBacktestEngine().run_strategy_backtest
+    
+    class BacktestCancelled(Exception):
+        """回测被取消"""
 
 # 创建路由器
 router = APIRouter(tags=["统一回测接口"])
@@ -751,15 +1044,90 @@ def calculate_benchmark_returns(benchmark_data: List[Dict[str, Any]]) -> List[fl
 # 回测任务管理
 # =============================================================================
 
-async def run_backtest_task(task_id: str, config: BacktestConfig, user_id: str):
-    """运行回测任务的后台函数"""
+def make_realtime_callback(task_id: str, config: BacktestConfig):
+    """
+    创建回测引擎的实时数据回调：只写变化的Hash字段、追加净值点，并发布增量事件
+    """
+    start = datetime.strptime(str(config.start_date).replace('-', '')[:8], '%Y%m%d')
+    end = datetime.strptime(str(config.end_date).replace('-', '')[:8], '%Y%m%d')
+    total_days = max((end - start).days, 1)
+    state = {'last_date': None, 'last_trades': 0}
+    
+    def _callback(current_date: str, portfolio_data: Dict[str, Any], trades_data: List[Dict]):
+        try:
+            try:
+                elapsed = (datetime.strptime(str(current_date).replace('-', '')[:8], '%Y%m%d') - start).days
+                progress = min(max(elapsed / total_days, 0.0), 0.99)
+            except ValueError:
+                progress = None
+            
+            total_trades = len(trades_data) if trades_data else 0
+            updates = {
+                'current_date': current_date,
+                'current_portfolio_value': portfolio_data.get('total_value', 0.0),
+                'current_cash': portfolio_data.get('cash', 0.0),
+                'current_positions_value': portfolio_data.get('positions_value', 0.0),
+                'current_positions': portfolio_data.get('positions', []),
+                'daily_return': portfolio_data.get('daily_return', 0.0),
+                'total_return': portfolio_data.get('total_return', 0.0),
+                'current_drawdown': portfolio_data.get('drawdown', 0.0),
+                'total_trades': total_trades,
+                'last_update': current_date
+            }
+            if progress is not None:
+                updates['progress'] = progress
+            # 最近成交只在有新成交时写入
+            if total_trades != state['last_trades']:
+                updates['recent_trades'] = trades_data[-10:]
+                state['last_trades'] = total_trades
+            task_manager.update_task(task_id, updates)
+            
+            task_manager.append_series_point(task_id, {
+                'date': current_date,
+                'portfolio_value': portfolio_data.get('total_value', 0.0),
+                'daily_return': portfolio_data.get('daily_return', 0.0),
+                'cumulative_return': portfolio_data.get('total_return', 0.0),
+                'drawdown': portfolio_data.get('drawdown', 0.0)
+            }, replace_last=(state['last_date'] == current_date))
+            state['last_date'] = current_date
+        except Exception as e:
+            # 确保不影响回测继续执行
+            logger.error(f"更新实时数据失败: {e}")
+    
+    return _callback
+
+def publish_queue_positions() -> None:
+    """把排队位置写入各排队任务，经任务频道推送到进度流"""
+    queue = get_job_queue()
+    if not queue.is_available():
+        return
+    for index, queued_task_id in enumerate(queue.pending_task_ids()):
+        task_manager.update_task(queued_task_id, {
+            'queue_position': index + 1,
+            'message': f'排队中，前方还有{index}个任务' if index else '排队中，即将开始执行'
+        })
+
+
+def execute_backtest_job(task_id: str, config_data: Dict[str, Any], user_id: str,
+                         should_cancel: Optional[Callable[[], bool]] = None):
+    """
+    执行回测任务（同步，在回测worker进程中运行；队列不可用时在API线程池中运行）
+    
+    Args:
+        task_id: 任务ID
+        config_data: 回测配置字典
+        user_id: 用户ID
+        should_cancel: 取消检查函数，回测引擎每个交易日调用一次
+    """
+    config = BacktestConfig(**config_data)
     try:
         # 更新任务状态为运行中
         task_manager.update_task(task_id, {
             'status': 'running',
             'started_at': datetime.now(),
             'message': '回测开始执行',
-            'progress': 0.0
+            'progress': 0.0,
+            'queue_position': 0
         })
         
         # 创建策略配置
@@ -777,7 +1145,8 @@ async def run_backtest_task(task_id: str, config: BacktestConfig, user_id: str):
             strategy=strategy_instance,
             config=strategy_config,
             task_id=task_id,
-            active_tasks=active_tasks  # 传递给回测引擎用于实时更新
+            progress_callback=make_realtime_callback(task_id, config),  # 实时数据写入Redis并发布增量
+            cancel_checker=should_cancel
         )
         
         # 获取基准指数数据并添加到结果中
@@ -827,19 +1196,10 @@ async def run_backtest_task(task_id: str, config: BacktestConfig, user_id: str):
             'result': result,
             'auto_cleanup_at': completed_time + timedelta(minutes=30)  # 30分钟后自动清理
         })
+        # 30分钟后由Redis过期自动清理
+        task_manager.expire_task(task_id)
         logger.info(f"🎯 任务 {task_id} 状态已更新为completed，30分钟后自动清理")
         
-        # 安排30分钟后自动清理任务
-        def cleanup_task():
-            if task_id in active_tasks and active_tasks[task_id].get('status') == 'completed':
-                logger.info(f"🗑️ 自动清理已完成任务: {task_id}")
-                task_manager.delete_task(task_id)
-        
-        # 使用线程定时器延迟清理
-        import threading
-        cleanup_timer = threading.Timer(1800.0, cleanup_task)  # 30分钟 = 1800秒
-        cleanup_timer.start()
-        
         # 尝试从结果中提取和存储结果目录路径信息
         try:
                 if 'chart_data' in result and result['chart_data']:
@@ -876,7 +1236,7 @@ async def run_backtest_task(task_id: str, config: BacktestConfig, user_id: str):
                             # 验证该目录是否包含交易文件
                             trades_file = os.path.join(result_dir_path, f"{strategy_name}_trades.csv")
                             if os.path.exists(trades_file):
-                                active_tasks[task_id]['result_dir'] = result_dir_path
+                                task_manager.update_task(task_id, {'result_dir': result_dir_path})
                                 logger.info(f"📁 存储结果目录路径: {result_dir_path}")
                             
         except Exception as e:
@@ -884,212 +1244,227 @@ async def run_backtest_task(task_id: str, config: BacktestConfig, user_id: str):
         
         logger.info(f"回测任务 {task_id} 完成")
         
+    except BacktestCancelled:
+        logger.info(f"🛑 回测任务 {task_id} 已取消")
+        cancelled_time = datetime.now()
+        task_manager.update_task(task_id, {
+            'status': 'cancelled',
+            'completed_at': cancelled_time,
+            'message': '回测已取消',
+            'auto_cleanup_at': cancelled_time + timedelta(minutes=30)
+        })
+        task_manager.expire_task(task_id)
     except Exception as e:
         logger.error(f"回测任务 {task_id} 失败: {e}")
         if task_id in active_tasks:
             failed_time = datetime.now()
-            active_tasks[task_id].update({
+            task_manager.update_task(task_id, {
                 'status': 'failed',
                 'completed_at': failed_time,
                 'progress': 0.0,
                 'message': f'回测失败: {str(e)}',
                 'auto_cleanup_at': failed_time + timedelta(minutes=30)  # 30分钟后自动清理
             })
-            
-            # 安排30分钟后自动清理失败的任务
-            def cleanup_failed_task():
-                if task_id in active_tasks and active_tasks[task_id].get('status') == 'failed':
-                    logger.info(f"🗑️ 自动清理失败任务: {task_id}")
-                    del active_tasks[task_id]
-            
-            import threading
-            cleanup_timer = threading.Timer(1800.0, cleanup_failed_task)  # 30分钟 = 1800秒
-            cleanup_timer.start()
+            task_manager.expire_task(task_id)
+
+
+async def run_backtest_task(task_id: str, config: BacktestConfig, user_id: str):
+    """任务队列不可用时的降级执行：在线程池中运行，避免阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, execute_backtest_job, task_id, config.dict(), user_id)
 
 # =============================================================================
 # 实时数据推送 (SSE)
 # =============================================================================
 
+# SSE心跳间隔（秒）：无事件时发送注释行保持连接，并顺带检查任务是否仍存在
+SSE_HEARTBEAT_SECONDS = 15.0
+
+# 触发各类SSE事件的任务字段
+PROGRESS_EVENT_FIELDS = {'progress', 'status', 'current_date', 'message', 'completed_days',
+                         'processing_speed', 'estimated_remaining', 'queue_position'}
+PORTFOLIO_EVENT_FIELDS = {'current_portfolio_value', 'current_cash', 'current_positions_value',
+                          'current_positions', 'daily_return', 'total_return', 'current_drawdown'}
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _build_progress_event(task_id: str, task_info: Dict[str, Any]) -> str:
+    return _sse_event("progress", {
+        "type": "progress",
+        "task_id": task_id,
+        "status": task_info.get('status', 'pending'),
+        "progress": task_info.get('progress', 0.0),
+        "message": task_info.get('message', ''),
+        "current_date": task_info.get('current_date'),
+        "queue_position": task_info.get('queue_position'),
+        "timestamp": datetime.now().isoformat(),
+        "processing_speed": task_info.get('processing_speed', 0),
+        "estimated_remaining": task_info.get('estimated_remaining', 0)
+    })
+
+
+def _build_portfolio_event(task_id: str, task_info: Dict[str, Any]) -> str:
+    return _sse_event("portfolio", {
+        "type": "portfolio",
+        "task_id": task_id,
+        "timestamp": datetime.now().isoformat(),
+        "current_date": task_info.get('current_date', ''),
+        "portfolio": {
+            "total_value": task_info.get('current_portfolio_value',
+                                         (task_info.get('config') or {}).get('initial_cash', 1000000.0)),
+            "cash": task_info.get('current_cash', 0.0),
+            "positions_value": task_info.get('current_positions_value', 0.0),
+            "positions": task_info.get('current_positions', []),
+            "daily_return": task_info.get('daily_return', 0.0),
+            "total_return": task_info.get('total_return', 0.0),
+            "drawdown": task_info.get('current_drawdown', 0.0)
+        }
+    })
+
+
+def _build_trades_event(task_id: str, task_info: Dict[str, Any]) -> str:
+    return _sse_event("trades", {
+        "type": "trades",
+        "task_id": task_id,
+        "timestamp": datetime.now().isoformat(),
+        "current_date": task_info.get('current_date', ''),
+        "recent_trades": task_info.get('recent_trades', []),
+        "trade_stats": {
+            "total_trades": task_info.get('total_trades', 0),
+            "buy_trades": task_info.get('buy_trades', 0),
+            "sell_trades": task_info.get('sell_trades', 0),
+            "win_trades": task_info.get('win_trades', 0),
+            "lose_trades": task_info.get('lose_trades', 0),
+            "win_rate": task_info.get('win_rate', 0.0),
+            "total_pnl": task_info.get('total_pnl', 0.0),
+            "avg_win": task_info.get('avg_win', 0.0),
+            "avg_loss": task_info.get('avg_loss', 0.0),
+            "profit_factor": task_info.get('profit_factor', 0.0)
+        }
+    })
+
+
+def _build_chart_event(task_id: str, task_info: Dict[str, Any]) -> str:
+    return _sse_event("chart", {
+        "type": "chart",
+        "task_id": task_id,
+        "timestamp": datetime.now().isoformat(),
+        "current_date": task_info.get('current_date', ''),
+        "data": {
+            "dates": task_info.get('date_series', []),
+            "portfolio_values": task_info.get('portfolio_series', []),
+            "daily_returns": task_info.get('daily_return_series', []),
+            "cumulative_returns": task_info.get('cumulative_return_series', []),
+            "drawdowns": task_info.get('drawdown_series', [])
+        }
+    })
+
+
+def _apply_series_point(task_info: Dict[str, Any], point: Dict[str, Any], replace_last: bool) -> None:
+    """
+    把净值增量合并到本地时序数组
+    
+    订阅后、读取快照前发布的数据点已包含在快照中，频道里还会再收到一次：
+    追加日期不晚于当前最后一个日期的数据点视为重复并跳过（替换最后一个点本身是幂等的）。
+    """
+    dates = task_info.get('date_series') or []
+    point_date = point.get(TaskManager.SERIES_FIELDS['date_series'])
+    if not replace_last and dates and point_date is not None and str(point_date) <= str(dates[-1]):
+        return
+    for series_name, point_key in TaskManager.SERIES_FIELDS.items():
+        series = task_info.setdefault(series_name, [])
+        if replace_last and series:
+            series[-1] = point.get(point_key)
+        else:
+            series.append(point.get(point_key))
+
+
 async def sse_generator(task_id: str, data_type: str = "realtime"):
-    """SSE数据流生成器"""
+    """
+    SSE数据流生成器
+    
+    先订阅任务事件频道再读取一次快照，之后只等待频道中的增量消息，
+    不再轮询Redis；图表时序在本地按增量累积。
+    """
     logger.info(f"开始SSE流推送 for task {task_id}, data_type: {data_type}")
     
-    # 初始化状态跟踪
-    last_progress_data = None
-    last_portfolio_data = None
-    last_chart_data = None
-    last_trades_count = 0
+    def want(kind: str) -> bool:
+        return data_type == kind or data_type == "realtime"
     
     try:
-        while True:
-            if task_id not in active_tasks:
-                # 任务不存在，发送错误并结束
-                yield f"event: error\ndata: {json.dumps({'error': '任务不存在', 'task_id': task_id})}\n\n"
-                break
-                
-            task_info = active_tasks[task_id]
-            current_time = datetime.now().isoformat()
-            has_new_data = False
+        async with task_manager.subscribe(task_id) as subscription:
+            task_info = task_manager.get_task(task_id, include_result=False, include_series=True)
+            if task_info is None:
+                yield _sse_event("error", {'error': '任务不存在', 'task_id': task_id})
+                return
             
-            if data_type == "progress" or data_type == "realtime":
-                # 进度数据 - 只在发生变化时推送
-                current_progress = {
-                    "progress": task_info.get('progress', 0.0),
-                    "status": task_info.get('status', 'pending'),
-                    "current_date": task_info.get('current_date'),
-                    "message": task_info.get('message', ''),
-                    "completed_days": task_info.get('completed_days', 0)
-                }
-                
-                # 检查进度是否有变化
-                if not last_progress_data or current_progress != last_progress_data:
-                    progress_data = {
-                        "type": "progress",
-                        "task_id": task_id,
-                        "status": current_progress['status'],
-                        "progress": current_progress['progress'],
-                        "message": current_progress['message'],
-                        "current_date": current_progress['current_date'],
-                        "timestamp": current_time,
-                        "processing_speed": task_info.get('processing_speed', 0),
-                        "estimated_remaining": task_info.get('estimated_remaining', 0)
-                    }
-                    yield f"event: progress\ndata: {json.dumps(progress_data)}\n\n"
-                    last_progress_data = current_progress
-                    has_new_data = True
+            # 初始快照
+            if want("progress"):
+                yield _build_progress_event(task_id, task_info)
+            if want("portfolio") and task_info.get('current_date'):
+                yield _build_portfolio_event(task_id, task_info)
+            if want("trades") and task_info.get('total_trades', 0) > 0:
+                yield _build_trades_event(task_id, task_info)
+            if want("chart"):
+                yield _build_chart_event(task_id, task_info)
             
-            if data_type == "portfolio" or data_type == "realtime":
-                # 组合数据 - 检查是否有新的日期数据
-                current_portfolio = {
-                    "current_date": task_info.get('current_date', ''),
-                    "total_value": task_info.get('current_portfolio_value', task_info.get('config', {}).get('initial_cash', 1000000.0)),
-                    "total_return": task_info.get('total_return', 0.0),
-                    "daily_return": task_info.get('daily_return', 0.0),
-                    "drawdown": task_info.get('current_drawdown', 0.0)
-                }
+            while task_info.get('status', 'pending') not in ('completed', 'failed', 'cancelled'):
+                event = await subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if event is None:
+                    if not task_manager.task_exists(task_id):
+                        yield _sse_event("error", {'error': '任务不存在', 'task_id': task_id})
+                        return
+                    yield ": keepalive\n\n"
+                    continue
                 
-                # 检查是否有新数据：日期变化或数据更新标志
-                data_updated_flag = task_info.get('data_updated', False)
-                date_changed = (current_portfolio['current_date'] and 
-                               (not last_portfolio_data or 
-                                current_portfolio['current_date'] != last_portfolio_data.get('current_date')))
+                if event.get('type') == 'deleted':
+                    yield _sse_event("error", {'error': '任务已删除', 'task_id': task_id})
+                    return
                 
-                if date_changed or data_updated_flag:
-                    logger.info(f"🔍 检测到数据变化: date_changed={date_changed}, data_updated_flag={data_updated_flag}, current_date={current_portfolio['current_date']}")
-                    
-                    portfolio_data = {
-                        "type": "portfolio",
-                        "task_id": task_id,
-                        "timestamp": current_time,
-                        "current_date": current_portfolio['current_date'],
-                        "portfolio": {
-                            "total_value": current_portfolio['total_value'],
-                            "cash": task_info.get('current_cash', 0.0),
-                            "positions_value": task_info.get('current_positions_value', 0.0),
-                            "positions": task_info.get('current_positions', []),
-                            "daily_return": current_portfolio['daily_return'],
-                            "total_return": current_portfolio['total_return'],
-                            "drawdown": current_portfolio['drawdown']
-                        }
-                    }
-                    yield f"event: portfolio\ndata: {json.dumps(portfolio_data)}\n\n"
-                    logger.info(f"🔄 SSE推送Portfolio数据: {current_portfolio['current_date']}, 组合价值: {current_portfolio['total_value']:,.2f}")
-                    last_portfolio_data = current_portfolio
-                    has_new_data = True
-                    # 重置数据更新标志
-                    if 'data_updated' in task_info:
-                        task_info['data_updated'] = False
-            
-            if data_type == "trades" or data_type == "realtime":
-                # 交易数据 - 只在有新交易时推送
-                current_trades_count = task_info.get('total_trades', 0)
-                recent_trades = task_info.get('recent_trades', [])
+                if event.get('type') == 'series':
+                    _apply_series_point(task_info, event.get('point', {}), event.get('replace_last', False))
+                    if want("chart"):
+                        yield _build_chart_event(task_id, task_info)
+                    continue
                 
-                if current_trades_count > last_trades_count and recent_trades:
-                    trades_data = {
-                        "type": "trades",
-                        "task_id": task_id,
-                        "timestamp": current_time,
-                        "current_date": task_info.get('current_date', ''),
-                        "recent_trades": recent_trades,
-                        "trade_stats": {
-                            "total_trades": current_trades_count,
-                            "buy_trades": task_info.get('buy_trades', 0),
-                            "sell_trades": task_info.get('sell_trades', 0),
-                            "win_trades": task_info.get('win_trades', 0),
-                            "lose_trades": task_info.get('lose_trades', 0),
-                            "win_rate": task_info.get('win_rate', 0.0),
-                            "total_pnl": task_info.get('total_pnl', 0.0),
-                            "avg_win": task_info.get('avg_win', 0.0),
-                            "avg_loss": task_info.get('avg_loss', 0.0),
-                            "profit_factor": task_info.get('profit_factor', 0.0)
-                        }
-                    }
-                    yield f"event: trades\ndata: {json.dumps(trades_data)}\n\n"
-                    last_trades_count = current_trades_count
-                    has_new_data = True
-            
-            if data_type == "chart" or data_type == "realtime":
-                # 图表数据 - 检查是否有新的日期数据点
-                current_chart_data = {
-                    "current_date": task_info.get('current_date', ''),
-                    "dates_count": len(task_info.get('date_series', [])),
-                    "latest_portfolio_value": task_info.get('portfolio_series', [])[-1] if task_info.get('portfolio_series') else 0
-                }
+                fields = event.get('fields', {})
+                previous_trades = task_info.get('total_trades', 0)
+                task_info.update(fields)
                 
-                if not last_chart_data or current_chart_data['dates_count'] > last_chart_data.get('dates_count', 0):
-                    chart_data = {
-                        "type": "chart",
-                        "task_id": task_id,
-                        "timestamp": current_time,
-                        "current_date": current_chart_data['current_date'],
-                        "data": {
-                            "dates": task_info.get('date_series', []),
-                            "portfolio_values": task_info.get('portfolio_series', []),
-                            "daily_returns": task_info.get('daily_return_series', []),
-                            "cumulative_returns": task_info.get('cumulative_return_series', []),
-                            "drawdowns": task_info.get('drawdown_series', [])
-                        }
-                    }
-                    yield f"event: chart\ndata: {json.dumps(chart_data)}\n\n"
-                    last_chart_data = current_chart_data
-                    has_new_data = True
+                if want("progress") and PROGRESS_EVENT_FIELDS.intersection(fields):
+                    yield _build_progress_event(task_id, task_info)
+                if want("portfolio") and PORTFOLIO_EVENT_FIELDS.intersection(fields):
+                    yield _build_portfolio_event(task_id, task_info)
+                if (want("trades") and task_info.get('total_trades', 0) > previous_trades
+                        and task_info.get('recent_trades')):
+                    yield _build_trades_event(task_id, task_info)
             
-            # 检查任务完成状态
-            status = task_info.get('status', 'pending')
-            if status in ['completed', 'failed']:
-                # 发送最终完成事件
-                final_data = {
-                    "type": "final",
-                    "task_id": task_id,
-                    "status": status,
-                    "timestamp": current_time,
-                    "message": task_info.get('message', ''),
-                    "result_available": True
-                }
-                yield f"event: final\ndata: {json.dumps(final_data)}\n\n"
-                
-                # 等待客户端处理，然后优雅关闭
-                await asyncio.sleep(3)
-                logger.info(f"SSE stream gracefully ended for {status} task {task_id}")
-                break
+            # 发送最终完成事件
+            yield _sse_event("final", {
+                "type": "final",
+                "task_id": task_id,
+                "status": task_info.get('status'),
+                "timestamp": datetime.now().isoformat(),
+                "message": task_info.get('message', ''),
+                "result_available": task_info.get('status') == 'completed'
+            })
             
-            # 动态调整推送频率：有新数据时频繁推送，无新数据时降低频率
-            if has_new_data:
-                await asyncio.sleep(0.05)  # 有新数据时每0.05秒检查一次，确保实时性
-            else:
-                await asyncio.sleep(0.5)   # 无新数据时每0.5秒检查一次
+            # 等待客户端处理，然后优雅关闭
+            await asyncio.sleep(3)
+            logger.info(f"SSE stream gracefully ended for {task_info.get('status')} task {task_id}")
             
     except asyncio.CancelledError:
         logger.info(f"SSE stream cancelled for task {task_id}")
     except Exception as e:
         logger.error(f"SSE stream error for task {task_id}: {e}")
-        yield f"event: error\ndata: {json.dumps({'error': str(e), 'task_id': task_id})}\n\n"
+        yield _sse_event("error", {'error': str(e), 'task_id': task_id})
 
 def update_task_realtime_data(task_id: str, update_data: Dict[str, Any]):
     """更新任务的实时数据"""
-    if task_id in active_tasks:
-        active_tasks[task_id].update(update_data)
+    task_manager.update_task(task_id, update_data)
 
 # =============================================================================
 # API 端点定义 - 基础管理接口
@@ -1207,9 +1582,10 @@ async def get_config_templates():
 async def run_backtest(
     config: BacktestConfig = Body(...),
     background_tasks: BackgroundTasks = BackgroundTasks(),
+    priority: Optional[int] = Query(None, ge=0, le=9, description="任务优先级(0-9，越大越优先)，普通用户不超过默认值"),
     current_user: dict = get_user_dependency()
 ):
-    """启动回测任务"""
+    """启动回测任务（进入回测任务队列，由独立worker进程执行）"""
     if not HAS_BACKTEST_ENGINE:
         raise HTTPException(status_code=503, detail="回测引擎暂时不可用")
     
@@ -1245,14 +1621,24 @@ async def run_backtest(
         'result': None
     }
     
-    # 调试：确认任务已添加到active_tasks
     logger.info(f"✅ 任务已添加到active_tasks: {task_id}")
-    logger.info(f"📊 添加后active_tasks数量: {len(active_tasks)}")
-    logger.info(f"📋 active_tasks中的任务列表: {list(active_tasks.keys())}")
-    logger.info(f"📝 验证任务是否存在: {task_id in active_tasks}")
     
-    # 添加后台任务
-    background_tasks.add_task(run_backtest_task, task_id, config, user_id)
+    job_queue = get_job_queue()
+    if job_queue.is_available():
+        # 管理员任务默认更高优先级、更高并发上限
+        is_admin = current_user.get('role') == 'admin'
+        default_priority = ADMIN_PRIORITY if is_admin else DEFAULT_PRIORITY
+        job_priority = default_priority if priority is None else (priority if is_admin else min(priority, DEFAULT_PRIORITY))
+        position = job_queue.enqueue(
+            task_id, user_id, config.dict(),
+            priority=job_priority,
+            user_limit=MAX_JOBS_PER_ADMIN if is_admin else MAX_JOBS_PER_USER
+        )
+        publish_queue_positions()
+        task.message = f'任务已进入队列，排队位置: {position}'
+    else:
+        # 队列不可用时降级为API进程内执行
+        background_tasks.add_task(run_backtest_task, task_id, config, user_id)
     
     logger.info(f"创建回测任务: {task_id}")
     return task
@@ -1289,9 +1675,9 @@ async def get_user_tasks(
     user_id = current_user.get('user_id', 'anonymous')
     is_admin = current_user.get('role') == 'admin'
     
-    # 过滤用户的任务
+    # 过滤用户的任务（列表不读取回测结果，只为当前页补充）
     user_tasks = []
-    for task in active_tasks.values():
+    for task in task_manager.get_all_tasks(include_result=False).values():
         if is_admin or task['user_id'] == user_id:
             if not status or task['status'] == status:
                 user_tasks.append(task)
@@ -1310,6 +1696,9 @@ async def get_user_tasks(
     
     # 分页
     paginated_tasks = user_tasks[offset:offset + limit]
+    for task in paginated_tasks:
+        if task['status'] == 'completed':
+            task['result'] = task_manager.get_result(task['task_id'])
     
     return {
         'tasks': [BacktestTask(**task) for task in paginated_tasks],
@@ -1320,23 +1709,31 @@ async def get_user_tasks(
 
 @router.delete("/task/{task_id}")
 async def delete_task(task_id: str, current_user: dict = get_user_dependency()):
-    """删除任务"""
-    if task_id not in active_tasks:
+    """删除任务；排队中的任务直接出队，运行中的任务协作式取消"""
+    task = task_manager.get_task(task_id, include_result=False)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    task = active_tasks[task_id]
     user_id = current_user.get('user_id', 'anonymous')
     
     # 检查权限
     if task['user_id'] != user_id and current_user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail="无权删除此任务")
     
-    # 不能删除正在运行的任务
-    if task['status'] == 'running':
+    job_queue = get_job_queue()
+    if task['status'] in ('pending', 'running') and job_queue.is_available():
+        outcome = job_queue.cancel(task_id)
+        if outcome == 'cancelling':
+            # worker在下一个交易日检查到取消标记后退出，并把状态更新为cancelled
+            task_manager.update_task(task_id, {'message': '正在取消回测'})
+            return {"message": "任务取消中", "task_id": task_id}
+        publish_queue_positions()
+    elif task['status'] == 'running':
+        # 队列不可用时任务在API进程内执行，无法取消
         raise HTTPException(status_code=400, detail="不能删除正在运行的任务")
     
     # 删除任务
-    del active_tasks[task_id]
+    task_manager.delete_task(task_id)
     
     return {"message": "任务已删除", "task_id": task_id}
 
@@ -1779,80 +2176,80 @@ async def get_benchmark_index_data(
 #         }
 #     )
 
-# @router.get("/sse/progress/{task_id}")
-# async def stream_progress(task_id: str, user: dict = Depends(get_current_user_sse)):
-#     """推送进度数据"""
-#     _ = user  # 用户验证已通过，此处暂不使用
-#     return StreamingResponse(
-#         sse_generator(task_id, "progress"),
-#         media_type="text/event-stream",
-#         headers={
-#             "Cache-Control": "no-cache",
-#             "Connection": "keep-alive",
-#             "Access-Control-Allow-Origin": "*",
-#             "Access-Control-Allow-Headers": "Cache-Control"
-#         }
-#     )
+@router.get("/sse/progress/{task_id}")
+async def stream_progress(task_id: str, user: dict = Depends(get_current_user_sse)):
+    """推送进度数据"""
+    _ = user  # 用户验证已通过，此处暂不使用
+    return StreamingResponse(
+        sse_generator(task_id, "progress"),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control"
+        }
+    )
 
-# @router.get("/sse/portfolio/{task_id}")
-# async def stream_portfolio(task_id: str, user: dict = Depends(get_current_user_sse)):
-#     """推送组合数据"""
-#     _ = user  # 用户验证已通过，此处暂不使用
-#     return StreamingResponse(
-#         sse_generator(task_id, "portfolio"),
-#         media_type="text/event-stream",
-#         headers={
-#             "Cache-Control": "no-cache",
-#             "Connection": "keep-alive",
-#             "Access-Control-Allow-Origin": "*",
-#             "Access-Control-Allow-Headers": "Cache-Control"
-#         }
-#     )
+@router.get("/sse/portfolio/{task_id}")
+async def stream_portfolio(task_id: str, user: dict = Depends(get_current_user_sse)):
+    """推送组合数据"""
+    _ = user  # 用户验证已通过，此处暂不使用
+    return StreamingResponse(
+        sse_generator(task_id, "portfolio"),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control"
+        }
+    )
 
-# @router.get("/sse/trades/{task_id}")
-# async def stream_trades(task_id: str, user: dict = Depends(get_current_user_sse)):
-#     """推送交易数据"""
-#     _ = user  # 用户验证已通过，此处暂不使用
-#     return StreamingResponse(
-#         sse_generator(task_id, "trades"),
-#         media_type="text/event-stream",
-#         headers={
-#             "Cache-Control": "no-cache",
-#             "Connection": "keep-alive",
-#             "Access-Control-Allow-Origin": "*",
-#             "Access-Control-Allow-Headers": "Cache-Control"
-#         }
-#     )
+@router.get("/sse/trades/{task_id}")
+async def stream_trades(task_id: str, user: dict = Depends(get_current_user_sse)):
+    """推送交易数据"""
+    _ = user  # 用户验证已通过，此处暂不使用
+    return StreamingResponse(
+        sse_generator(task_id, "trades"),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control"
+        }
+    )
 
-# @router.get("/sse/chart/{task_id}")
-# async def stream_chart(task_id: str, user: dict = Depends(get_current_user_sse)):
-#     """推送图表数据"""
-#     _ = user  # 用户验证已通过，此处暂不使用
-#     return StreamingResponse(
-#         sse_generator(task_id, "chart"),
-#         media_type="text/event-stream",
-#         headers={
-#             "Cache-Control": "no-cache",
-#             "Connection": "keep-alive",
-#             "Access-Control-Allow-Origin": "*",
-#             "Access-Control-Allow-Headers": "Cache-Control"
-#         }
-#     )
+@router.get("/sse/chart/{task_id}")
+async def stream_chart(task_id: str, user: dict = Depends(get_current_user_sse)):
+    """推送图表数据"""
+    _ = user  # 用户验证已通过，此处暂不使用
+    return StreamingResponse(
+        sse_generator(task_id, "chart"),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control"
+        }
+    )
 
-# @router.get("/sse/realtime/{task_id}")
-# async def stream_realtime(task_id: str, user: dict = Depends(get_current_user_sse)):
-#     """推送实时综合数据（推荐使用）"""
-#     _ = user  # 用户验证已通过，此处暂不使用
-#     return StreamingResponse(
-#         sse_generator(task_id, "realtime"),
-#         media_type="text/event-stream",
-#         headers={
-#             "Cache-Control": "no-cache",
-#             "Connection": "keep-alive",
-#             "Access-Control-Allow-Origin": "*",
-#             "Access-Control-Allow-Headers": "Cache-Control"
-#         }
-#     )
+@router.get("/sse/realtime/{task_id}")
+async def stream_realtime(task_id: str, user: dict = Depends(get_current_user_sse)):
+    """推送实时综合数据（推荐使用）"""
+    _ = user  # 用户验证已通过，此处暂不使用
+    return StreamingResponse(
+        sse_generator(task_id, "realtime"),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control"
+        }
+    )
 
 # =============================================================================
 # 辅助查询接口
@@ -1902,6 +2299,7 @@ async def backtest_health_check():
         "has_db_handler": HAS_DB_HANDLER,
         "has_user_auth": HAS_USER_AUTH,
         "active_tasks_count": len(active_tasks),
+        "job_queue": get_job_queue().get_stats() if get_job_queue().is_available() else None,
         "timestamp": datetime.now().isoformat()
     }
 
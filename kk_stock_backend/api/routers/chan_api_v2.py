@@ -20,11 +20,15 @@ sys.path.append(current_dir)
 
 # 导入缠论v2核心组件
 from chan_theory_v2.core.chan_engine import ChanEngine, ChanAnalysisResult, AnalysisLevel, quick_analyze, multi_level_analyze
+from chan_theory_v2.core.result_cache import ChanResultCache, data_fingerprint
 from chan_theory_v2.models.enums import TimeLevel, BiDirection, SegDirection, ZhongShuType
 from chan_theory_v2.models.dynamics import BuySellPointType, BackChi, DynamicsConfig
 from chan_theory_v2.config.chan_config import ChanConfig
 from chan_theory_v2.strategies.backchi_stock_selector import SimpleBackchiStockSelector
 from api.db_handler import get_db_handler
+from api.market_data_store import get_market_data_store, KLINE_FIELDS
+from cache_manager import get_cache_manager
+from cache_config import get_ttl_for_data_type, get_cache_key_prefix
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
@@ -39,8 +43,12 @@ class ChanDataAPIv2:
         self.db_handler = get_db_handler()
         self.db = self.db_handler.db
         
-        # 初始化缠论引擎
-        self.chan_engine = ChanEngine()
+        # 初始化缠论引擎（分析结果：进程内有界LRU + Redis共享的紧凑结果）
+        self.chan_engine = ChanEngine(result_cache=ChanResultCache(
+            store_provider=get_cache_manager,
+            persistent_ttl=get_ttl_for_data_type('chan_analysis'),
+            key_prefix=get_cache_key_prefix('chan_analysis')
+        ))
         
         # 初始化选股器
         self.stock_selector = SimpleBackchiStockSelector()
@@ -121,6 +129,15 @@ class ChanDataAPIv2:
             }
             analysis_level_enum = level_mapping.get(analysis_level, AnalysisLevel.COMPLETE)
             
+            # 同一份K线数据（末根K线未变）的结果直接复用
+            result_cache = self.chan_engine.result_cache
+            fingerprint = data_fingerprint(data)
+            cache_scope = f"complete:{days}"
+            cached_data = result_cache.get_payload(cache_scope, symbol, time_level, analysis_level_enum, fingerprint)
+            if cached_data is not None:
+                logger.info(f"✅ {symbol} 缠论v2分析命中缓存")
+                return cached_data
+            
             # 执行缠论分析
             result = self.chan_engine.analyze(
                 data=data,
@@ -131,6 +148,7 @@ class ChanDataAPIv2:
             
             # 转换为前端标准格式
             frontend_data = self._convert_to_frontend_format(result, timeframe, days)
+            result_cache.put_payload(cache_scope, symbol, time_level, analysis_level_enum, fingerprint, frontend_data)
             
             logger.info(f"✅ {symbol} 缠论v2分析完成")
             return frontend_data
@@ -174,11 +192,22 @@ class ChanDataAPIv2:
                 logger.warning(f"⚠️ 无任何级别数据可用于 {symbol}")
                 return self._generate_empty_multi_level_result(symbol, levels)
             
+            # 各级别数据指纹都未变化时直接复用
+            result_cache = self.chan_engine.result_cache
+            fingerprint = "|".join(f"{level.value}={data_fingerprint(data)}" for level, data in level_data.items())
+            cache_scope = f"multi:{days}"
+            cache_level = "+".join(levels)
+            cached_data = result_cache.get_payload(cache_scope, symbol, cache_level, AnalysisLevel.STANDARD, fingerprint)
+            if cached_data is not None:
+                logger.info(f"✅ {symbol} 多级别分析命中缓存")
+                return cached_data
+            
             # 执行多级别分析
             results = self.chan_engine.analyze_multi_level(level_data, symbol)
             
             # 转换为前端格式
             frontend_data = self._convert_multi_level_to_frontend(results, symbol, levels, days)
+            result_cache.put_payload(cache_scope, symbol, cache_level, AnalysisLevel.STANDARD, fingerprint, frontend_data)
             
             logger.info(f"✅ {symbol} 多级别分析完成，共{len(results)}个级别")
             return frontend_data
@@ -211,6 +240,13 @@ class ChanDataAPIv2:
             if not data:
                 return {"signals": [], "summary": {"total": 0, "buy": 0, "sell": 0}}
             
+            result_cache = self.chan_engine.result_cache
+            fingerprint = data_fingerprint(data)
+            cache_scope = f"signals:{days}"
+            cached_signals = result_cache.get_payload(cache_scope, symbol, time_level, AnalysisLevel.STANDARD, fingerprint)
+            if cached_signals is not None:
+                return cached_signals
+            
             result = self.chan_engine.analyze(
                 data=data,
                 symbol=symbol,
@@ -223,6 +259,7 @@ class ChanDataAPIv2:
             
             # 转换为前端格式
             frontend_signals = self._convert_signals_to_frontend(signals)
+            result_cache.put_payload(cache_scope, symbol, time_level, AnalysisLevel.STANDARD, fingerprint, frontend_signals)
             
             logger.info(f"✅ 获取到 {len(signals['signals'])} 个交易信号")
             return frontend_signals
@@ -234,18 +271,15 @@ class ChanDataAPIv2:
     def _fetch_stock_data(self, symbol: str, time_level: TimeLevel, days: int) -> List[Dict]:
         """获取股票数据"""
         try:
-            # 根据时间级别选择集合
-            collection_mapping = {
-                TimeLevel.MIN_5: "stock_kline_5min",
-                TimeLevel.MIN_30: "stock_kline_30min", 
-                TimeLevel.DAILY: "stock_kline_daily"
+            # 根据时间级别选择K线频率（数据统一从共享行情仓库读取）
+            freq_mapping = {
+                TimeLevel.MIN_5: "5min",
+                TimeLevel.MIN_30: "30min", 
+                TimeLevel.DAILY: "daily"
             }
             
-            collection_name = collection_mapping.get(time_level, "stock_kline_daily")
-            collection = self.db[collection_name]
-            
-            # 构建查询
-            query = {"ts_code": symbol}
+            freq = freq_mapping.get(time_level, "daily")
+            store = get_market_data_store()
             
             # 计算数据量（根据级别调整）
             if time_level == TimeLevel.MIN_5:
@@ -283,14 +317,6 @@ class ChanDataAPIv2:
                     end_date_str = end_date.strftime('%Y%m%d')
                     start_date_str = start_date.strftime('%Y%m%d')
                     
-                    # 确保使用字符串格式的日期进行查询，与数据库中的格式匹配
-                    query.update({
-                        'trade_date': {
-                            '$gte': start_date_str,
-                            '$lte': end_date_str
-                        }
-                    })
-                    
                     logger.info(f"📅 日K查询范围: {start_date_str} 至 {end_date_str} (交易日总数: {len(trading_dates)})")                
                 else:
                     # 如果无法获取交易日，则使用自然日作为备选
@@ -301,24 +327,15 @@ class ChanDataAPIv2:
                     end_date_str = end_date.strftime('%Y%m%d')
                     start_date_str = start_date.strftime('%Y%m%d')
                     
-                    query.update({
-                        'trade_date': {
-                            '$gte': start_date_str,
-                            '$lte': end_date_str
-                        }
-                    })
-                    
                     logger.info(f"📅 日K查询范围(自然日): {start_date_str} 至 {end_date_str}")
                 
-                # 按日期升序排序，获取指定日期范围内的数据
-                cursor = collection.find(query).sort("trade_date", 1)
+                # 获取指定日期范围内的数据（按日期升序）
+                bars = store.get_bar(symbol, start_date_str, end_date_str, fields=KLINE_FIELDS, freq=freq)
             else:
-                cursor = collection.find(query).sort("trade_time", -1).limit(limit)
+                # 分钟数据取最近limit根（升序）
+                bars = store.get_latest_bars(symbol, limit, fields=KLINE_FIELDS, freq=freq)
                 
-            raw_data = list(cursor)
-            
-            if time_level != TimeLevel.DAILY:
-                raw_data.reverse()  # 分钟数据转为升序
+            raw_data = bars.to_records()
             
             # 转换数据格式
             converted_data = self._convert_data_format(raw_data, time_level)
@@ -351,13 +368,20 @@ class ChanDataAPIv2:
                     trade_time_str = str(item['trade_time'])
                     timestamp = datetime.strptime(trade_time_str, '%Y-%m-%d %H:%M:%S')
                 
+                # 成交量优先取 vol，缺失（NaN）时回退到 volume
+                volume = item.get('vol')
+                if volume is None or volume != volume:
+                    volume = item.get('volume')
+                if volume is None or volume != volume:
+                    volume = 1
+                
                 converted_item = {
                     'timestamp': timestamp,
                     'open': float(item['open']),
                     'high': float(item['high']),
                     'low': float(item['low']),
                     'close': float(item['close']),
-                    'volume': int(float(item.get('vol', item.get('volume', 1)))),
+                    'volume': int(float(volume)),
                     'amount': float(item.get('amount', 0)),
                     'symbol': item['ts_code']
                 }
@@ -1194,16 +1218,22 @@ class ChanDataAPIv2:
         try:
             logger.info(f"🎯 开始执行缠论多级别背驰选股，最大结果数: {max_results}")
             
-            # 如果有自定义配置，更新选股器配置
+            # 自定义配置只作用于本次选股（使用选股器副本，不影响共享配置与其他请求）
             if custom_config:
-                self.stock_selector.config.update(custom_config)
-                logger.info(f"📝 已更新选股配置: {custom_config}")
+                # 只接受已有的选股参数，进程数等资源参数不允许由请求指定
+                ignored = sorted(set(custom_config) - set(self.stock_selector.config))
+                if ignored:
+                    logger.warning(f"⚠️ 忽略未知的选股配置项: {ignored}")
+                custom_config = {key: value for key, value in custom_config.items()
+                                 if key in self.stock_selector.config}
+                logger.info(f"📝 本次选股使用自定义配置: {custom_config}")
+            selector = self.stock_selector.with_config(custom_config)
             
             # 执行选股
-            signals = self.stock_selector.run_stock_selection(max_results)
+            signals = selector.run_stock_selection(max_results)
             
             # 转换为前端格式
-            frontend_data = self._convert_stock_selection_to_frontend(signals, max_results)
+            frontend_data = self._convert_stock_selection_to_frontend(signals, max_results, selector.config)
             
             logger.info(f"✅ 选股完成，筛选出 {len(signals)} 个信号")
             return frontend_data
@@ -1359,8 +1389,11 @@ class ChanDataAPIv2:
             "message": "历史记录功能待实现，可结合数据库存储选股结果"
         }
     
-    def _convert_stock_selection_to_frontend(self, signals: List, max_results: int) -> Dict[str, Any]:
-        """转换选股结果为前端格式（基于新的StockSignal结构）"""
+    def _convert_stock_selection_to_frontend(self, signals: List, max_results: int,
+                                             config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """转换选股结果为前端格式（基于新的StockSignal结构），config为本次选股使用的配置"""
+        if config is None:
+            config = self.stock_selector.config
         try:
             # 统计买入和卖出信号
             buy_signals = [s for s in signals if s.signal_type == "买入"]
@@ -1372,9 +1405,9 @@ class ChanDataAPIv2:
                     "max_results": max_results,
                     "actual_results": len(signals),
                     "selection_criteria": {
-                        "min_backchi_strength": self.stock_selector.config.get('min_backchi_strength', 0.3),
-                        "require_macd_golden_cross": self.stock_selector.config.get('require_macd_golden_cross', True),
-                        "analysis_days_30min": self.stock_selector.config.get('days_30min', 30)
+                        "min_backchi_strength": config.get('min_backchi_strength', 0.3),
+                        "require_macd_golden_cross": config.get('require_macd_golden_cross', True),
+                        "analysis_days_30min": config.get('days_30min', 30)
                     }
                 },
                 
@@ -1395,7 +1428,7 @@ class ChanDataAPIv2:
                     "recommendation_distribution": {}
                 },
                 
-                "config_used": self.stock_selector.config.copy()
+                "config_used": dict(config)
             }
             
             # 转换买入信号
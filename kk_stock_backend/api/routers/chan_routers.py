@@ -5,6 +5,7 @@ API路由定义
 直接使用现有的chan_api_v2业务逻辑
 """
 
+import asyncio
 import os
 import sys
 from datetime import datetime
@@ -131,12 +132,17 @@ async def get_stock_selection(
     if death_cross_confirm_days is not None:
         custom_config['death_cross_confirm_days'] = death_cross_confirm_days
     
-    return chan_api.run_stock_selection(max_results, custom_config if custom_config else None)
+    # 全市场选股耗时较长，放到线程池执行，避免阻塞事件循环
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, chan_api.run_stock_selection, max_results,
+                                      custom_config if custom_config else None)
 
 @router.post("/stock-selection")
 async def post_stock_selection(request: StockSelectionRequest):
     """POST方式执行缠论多级别背驰选股"""
-    return chan_api.run_stock_selection(request.max_results, request.custom_config)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, chan_api.run_stock_selection, request.max_results,
+                                      request.custom_config)
 
 @router.get("/stock-selection/config")
 async def get_stock_selection_config():
@@ -23,7 +23,7 @@ sys.path.insert(0, project_root)
 
 sys.path.insert(0, project_root)
 from api.cache_middleware import cache_endpoint
-from api.global_db import db_handler
+from api.global_db import async_db_handler
 
 router = APIRouter()
 
@@ -99,7 +99,7 @@ async def get_futures_list(
     支持按交易所、期货类型筛选
     """
     try:
-        collection = db_handler.get_collection('infrastructure_fut_basic')
+        collection = async_db_handler.get_collection('infrastructure_fut_basic')
         
         # 构建查询条件
         query = {}
@@ -116,7 +116,7 @@ async def get_futures_list(
             {"_id": 0}
         ).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -138,9 +138,9 @@ async def get_futures_info(
     获取单个期货的基本信息
     """
     try:
-        collection = db_handler.get_collection('infrastructure_fut_basic')
+        collection = async_db_handler.get_collection('infrastructure_fut_basic')
         
-        result = collection.find_one(
+        result = await collection.find_one(
             {"ts_code": ts_code},
             {"_id": 0}
         )
@@ -175,7 +175,7 @@ async def get_futures_daily(
     获取期货日线数据
     """
     try:
-        collection = db_handler.get_collection('fut_daily')
+        collection = async_db_handler.get_collection('fut_daily')
         
         # 构建查询条件
         query = {"ts_code": ts_code}
@@ -193,7 +193,7 @@ async def get_futures_daily(
             {"_id": 0}
         ).sort("trade_date", -1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -221,7 +221,7 @@ async def get_futures_holding_summary(
     返回指定品种前20大机构的持仓汇总信息，用于Dashboard概览面板
     """
     try:
-        collection = db_handler.get_collection('fut_holding')
+        collection = async_db_handler.get_collection('fut_holding')
         
         # 处理品种列表
         symbol_list = [s.strip() for s in symbols.split(',') if s.strip()]
@@ -235,7 +235,7 @@ async def get_futures_holding_summary(
         if not trade_date:
             # 构建查询条件，匹配任意一个品种的合约
             symbol_regex_list = [{"symbol": {"$regex": f"^{symbol}\\d+$"}} for symbol in symbol_list]
-            latest_doc = collection.find_one(
+            latest_doc = await collection.find_one(
                 {"$or": symbol_regex_list},
                 {"trade_date": 1},
                 sort=[("trade_date", -1)]
@@ -279,7 +279,7 @@ async def get_futures_holding_summary(
                 }
             ]
             
-            top20_result = list(collection.aggregate(top20_pipeline))
+            top20_result = await collection.aggregate(top20_pipeline).to_list(length=None)
             
             if not top20_result:
                 # 如果没有数据，添加空数据并继续处理下一个品种
@@ -339,7 +339,7 @@ async def get_futures_holding_summary(
                 }
             ]
             
-            result = list(collection.aggregate(pipeline))
+            result = await collection.aggregate(pipeline).to_list(length=None)
             
             if result:
                 # 初始化数据结构
@@ -475,7 +475,7 @@ async def get_futures_top20_holdings(
     返回各品种前20大机构的详细持仓排名和历史趋势数据，用于图表化展示
     """
     try:
-        collection = db_handler.get_collection('fut_holding')
+        collection = async_db_handler.get_collection('fut_holding')
         
         # 处理品种列表
         symbol_list = [s.strip() for s in symbols.split(',') if s.strip()]
@@ -485,7 +485,7 @@ async def get_futures_top20_holdings(
         # 如果没有指定日期，获取最新交易日
         if not trade_date:
             symbol_regex_list = [{"symbol": {"$regex": f"^{symbol}\\d+$"}} for symbol in symbol_list]
-            latest_doc = collection.find_one(
+            latest_doc = await collection.find_one(
                 {"$or": symbol_regex_list},
                 {"trade_date": 1},
                 sort=[("trade_date", -1)]
@@ -540,7 +540,7 @@ async def get_futures_top20_holdings(
                 }
             ]
             
-            result = list(collection.aggregate(pipeline))
+            result = await collection.aggregate(pipeline).to_list(length=None)
             
             # 为机构数据添加排名
             top20_institutions = []
@@ -580,7 +580,7 @@ async def get_futures_top20_holdings(
                     }
                 ]
                 
-                trend_result = list(collection.aggregate(trend_pipeline))
+                trend_result = await collection.aggregate(trend_pipeline).to_list(length=None)
                 if trend_result:
                     data = trend_result[0]
                     daily_trends.append({
@@ -639,7 +639,7 @@ async def get_futures_holding(
     获取期货持仓数据
     """
     try:
-        collection = db_handler.get_collection('fut_holding')
+        collection = async_db_handler.get_collection('fut_holding')
         
         # 构建查询条件
         query = {"symbol": ts_code.split('.')[0]}  # 期货持仓数据使用symbol字段
@@ -657,7 +657,7 @@ async def get_futures_holding(
             {"_id": 0}
         ).sort("trade_date", -1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -685,7 +685,7 @@ async def get_futures_warehouse(
     获取期货仓单数据
     """
     try:
-        collection = db_handler.get_collection('fut_wm')
+        collection = async_db_handler.get_collection('fut_wm')
         
         # 构建查询条件
         query = {"symbol": symbol}
@@ -703,7 +703,7 @@ async def get_futures_warehouse(
             {"_id": 0}
         ).sort("trade_date", -1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -750,7 +750,7 @@ async def get_batch_futures_daily(
         # 异步并发查询
         async def fetch_single_futures_data(ts_code: str):
             try:
-                collection = db_handler.get_collection('fut_daily')
+                collection = async_db_handler.get_collection('fut_daily')
                 
                 query = {"ts_code": ts_code}
                 if start_date or end_date:
@@ -768,7 +768,7 @@ async def get_batch_futures_daily(
                 
                 return {
                     "ts_code": ts_code,
-                    "data": list(cursor),
+                    "data": await cursor.to_list(length=None),
                     "success": True
                 }
                 
@@ -820,13 +820,13 @@ async def get_active_futures_summary(
         if not symbol_list:
             symbol_list = ['IH', 'IF', 'IC', 'IM']
         
-        holding_collection = db_handler.get_collection('fut_holding')
+        holding_collection = async_db_handler.get_collection('fut_holding')
         
         # 如果没有指定日期，获取最新交易日
         if not trade_date:
             # 构建查询条件，匹配任意一个品种的合约
             symbol_regex_list = [{"symbol": {"$regex": f"^{symbol}\\d+$"}} for symbol in symbol_list]
-            latest_doc = holding_collection.find_one(
+            latest_doc = await holding_collection.find_one(
                 {"$or": symbol_regex_list},
                 {"trade_date": 1},
                 sort=[("trade_date", -1)]
@@ -883,7 +883,7 @@ async def get_active_futures_summary(
                 }
             ]
             
-            result = list(holding_collection.aggregate(pipeline))
+            result = await holding_collection.aggregate(pipeline).to_list(length=None)
             
             if result:
                 data = result[0]
@@ -982,7 +982,7 @@ async def get_futures_calendar(
     获取期货交易日历
     """
     try:
-        collection = db_handler.get_collection('fut_trade_cal')
+        collection = async_db_handler.get_collection('fut_trade_cal')
         
         # 构建查询条件
         query = {}
@@ -1003,7 +1003,7 @@ async def get_futures_calendar(
             {"_id": 0}
         ).sort("cal_date", 1)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -1035,8 +1035,8 @@ async def get_contango_analysis(
         
         # 获取最新交易日期
         if not trade_date:
-            fut_daily_collection = db_handler.get_collection('fut_daily')
-            latest_record = fut_daily_collection.find_one(
+            fut_daily_collection = async_db_handler.get_collection('fut_daily')
+            latest_record = await fut_daily_collection.find_one(
                 sort=[('trade_date', -1)],
                 projection={'trade_date': 1}
             )
@@ -1053,8 +1053,8 @@ async def get_contango_analysis(
             spot_index_code = FUTURES_SPOT_MAPPING[symbol]
             
             # 获取现货指数数据
-            index_collection = db_handler.get_collection('index_daily')
-            spot_data = index_collection.find_one({
+            index_collection = async_db_handler.get_collection('index_daily')
+            spot_data = await index_collection.find_one({
                 'ts_code': spot_index_code,
                 'trade_date': trade_date
             })
@@ -1065,7 +1065,7 @@ async def get_contango_analysis(
             spot_price = float(spot_data.get('close', 0))
             
             # 获取该品种的期货合约数据
-            fut_daily_collection = db_handler.get_collection('fut_daily')
+            fut_daily_collection = async_db_handler.get_collection('fut_daily')
             futures_cursor = fut_daily_collection.find({
                 'ts_code': {'$regex': f'^{symbol}'},
                 'trade_date': trade_date
@@ -1074,7 +1074,7 @@ async def get_contango_analysis(
             contracts = []
             term_structure = {}
             
-            for fut_data in futures_cursor:
+            async for fut_data in futures_cursor:
                 ts_code = fut_data['ts_code']
                 futures_price = float(fut_data.get('close', 0))
                 settle_price = float(fut_data.get('settle', futures_price))
@@ -1172,14 +1172,14 @@ async def get_symbol_contango_analysis(
             query_condition['trade_date'] = date_query
             
         # 获取期货数据
-        fut_daily_collection = db_handler.get_collection('fut_daily')
+        fut_daily_collection = async_db_handler.get_collection('fut_daily')
         futures_cursor = fut_daily_collection.find({
             'ts_code': {'$regex': f'^{symbol}'},
             **query_condition
         }).sort('trade_date', -1).limit(limit * 10)  # 多取一些数据用于分析
         
         # 获取对应的现货指数数据
-        index_collection = db_handler.get_collection('index_daily')
+        index_collection = async_db_handler.get_collection('index_daily')
         index_cursor = index_collection.find({
             'ts_code': spot_index_code,
             **query_condition
@@ -1187,12 +1187,12 @@ async def get_symbol_contango_analysis(
         
         # 构建现货价格字典
         spot_prices = {}
-        for spot_data in index_cursor:
+        async for spot_data in index_cursor:
             spot_prices[spot_data['trade_date']] = float(spot_data.get('close', 0))
         
         # 分析期货数据
         daily_analysis = {}
-        for fut_data in futures_cursor:
+        async for fut_data in futures_cursor:
             trade_date = fut_data['trade_date']
             if trade_date not in spot_prices:
                 continue
@@ -14,7 +14,8 @@ import os
 
 # 导入缓存装饰器
 from api.cache_middleware import cache_endpoint
-from api.global_db import db_handler
+from api.global_db import async_db_handler
+from api.precompute.market_rankings import load_ranking_snapshot, INDEX_RANKING_DAYS
 
 # 添加项目根目录到sys.path以便导入数据库管理器
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -94,7 +95,7 @@ async def get_index_list(
     支持按市场、分类筛选
     """
     try:
-        collection = db_handler.get_collection('index_basic')
+        collection = async_db_handler.get_collection('index_basic')
         
         # 构建查询条件
         query = {}
@@ -111,10 +112,10 @@ async def get_index_list(
             {"_id": 0}
         ).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         # 统计信息
-        total_count = collection.count_documents(query)
+        total_count = await collection.count_documents(query)
         
         return {
             "success": True,
@@ -143,7 +144,7 @@ async def search_indices(
     支持按指数代码、名称搜索
     """
     try:
-        collection = db_handler.get_collection('index_basic')
+        collection = async_db_handler.get_collection('index_basic')
         
         # 构建搜索条件
         search_query = {
@@ -160,7 +161,7 @@ async def search_indices(
             {"_id": 0}
         ).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -183,15 +184,15 @@ async def get_index_detail(ts_code: str):
     """
     try:
         # 获取指数基本信息
-        index_basic = db_handler.get_collection('index_basic')
-        basic_info = index_basic.find_one({"ts_code": ts_code}, {"_id": 0})
+        index_basic = async_db_handler.get_collection('index_basic')
+        basic_info = await index_basic.find_one({"ts_code": ts_code}, {"_id": 0})
         
         if not basic_info:
             raise HTTPException(status_code=404, detail="指数不存在")
         
         # 获取最新日线行情
-        daily_collection = db_handler.get_collection('index_daily')
-        latest_daily = daily_collection.find_one(
+        daily_collection = async_db_handler.get_collection('index_daily')
+        latest_daily = await daily_collection.find_one(
             {"ts_code": ts_code},
             {"_id": 0},
             sort=[("trade_date", -1)]
@@ -231,7 +232,7 @@ async def get_major_indices(
         }
         
         collection_name = collection_map.get(period, 'index_daily')
-        collection = db_handler.get_collection(collection_name)
+        collection = async_db_handler.get_collection(collection_name)
         
         # 获取所有主要指数的最新数据
         indices_data = []
@@ -242,7 +243,7 @@ async def get_major_indices(
                 {'_id': 0}
             ).sort('trade_date', -1).limit(limit)
             
-            data_list = list(cursor)
+            data_list = await cursor.to_list(length=None)
             if data_list:
                 latest_data = data_list[0]
                 indices_data.append({
@@ -286,7 +287,7 @@ async def get_index_kline(
         
         if is_sw_index:
             # 申万行业指数只支持日线数据，使用sw_daily集合
-            collection = db_handler.get_collection('sw_daily')
+            collection = async_db_handler.get_collection('sw_daily')
         else:
             # 根据周期选择集合
             collection_map = {
@@ -299,7 +300,7 @@ async def get_index_kline(
             if not collection_name:
                 raise HTTPException(status_code=400, detail="无效的数据周期")
             
-            collection = db_handler.get_collection(collection_name)
+            collection = async_db_handler.get_collection(collection_name)
         
         # 构建查询条件
         query = {"ts_code": ts_code}
@@ -318,7 +319,7 @@ async def get_index_kline(
             {"_id": 0}
         ).sort("trade_date", -1).limit(limit)
         
-        kline_data = list(cursor)
+        kline_data = await cursor.to_list(length=None)
         
         # 计算统计指标
         if kline_data:
@@ -372,7 +373,7 @@ async def get_shenwan_industries():
     从index_member_all集合中获取一级行业信息
     """
     try:
-        collection = db_handler.get_collection('index_member_all')
+        collection = async_db_handler.get_collection('index_member_all')
         
         # 使用聚合查询获取所有一级行业的唯一值
         pipeline = [
@@ -404,7 +405,7 @@ async def get_shenwan_industries():
             }
         ]
         
-        industries = list(collection.aggregate(pipeline))
+        industries = await collection.aggregate(pipeline).to_list(length=None)
         
         # 为每个行业添加颜色配置（与前端现有配置保持一致）
         color_map = {
@@ -470,7 +471,7 @@ async def get_shenwan_indices(
         }
         
         collection_name = collection_map.get(period, 'index_daily')
-        collection = db_handler.get_collection(collection_name)
+        collection = async_db_handler.get_collection(collection_name)
         
         # 获取申万行业指数数据
         sw_data = []
@@ -480,7 +481,7 @@ async def get_shenwan_indices(
                 {'_id': 0}
             ).sort('trade_date', -1).limit(limit)
             
-            data_list = list(cursor)
+            data_list = await cursor.to_list(length=None)
             if data_list:
                 latest_data = data_list[0]
                 sw_data.append({
@@ -518,7 +519,7 @@ async def get_index_performance(
     包括涨跌幅统计、波动率等
     """
     try:
-        collection = db_handler.get_collection('index_daily')
+        collection = async_db_handler.get_collection('index_daily')
         
         # 获取指定天数的数据
         cursor = collection.find(
@@ -526,7 +527,7 @@ async def get_index_performance(
             {"_id": 0, "trade_date": 1, "close": 1, "high": 1, "low": 1, "pct_chg": 1, "amount": 1}
         ).sort("trade_date", -1).limit(days)
         
-        data = list(cursor)
+        data = await cursor.to_list(length=None)
         
         if not data:
             raise HTTPException(status_code=404, detail="未找到该指数的数据")
@@ -593,11 +594,27 @@ async def get_index_performance_ranking(
     按涨跌幅排序
     """
     try:
+        # 日线周期优先读取盘后物化的榜单
+        if period == "daily" and days in INDEX_RANKING_DAYS:
+            snapshot = await load_ranking_snapshot(f"index_performance_{days}d", limit=limit)
+            if snapshot is not None:
+                return {
+                    "success": True,
+                    "data": {
+                        "period": period,
+                        "days": days,
+                        "trade_date": snapshot["trade_date"],
+                        "count": len(snapshot["items"]),
+                        "rankings": snapshot["items"],
+                        "timestamp": datetime.now().isoformat()
+                    }
+                }
+        
         collection_name = f'index_{period}'
-        collection = db_handler.get_collection(collection_name)
+        collection = async_db_handler.get_collection(collection_name)
         
         # 获取最新交易日期
-        latest_record = collection.find_one(
+        latest_record = await collection.find_one(
             sort=[('trade_date', -1)],
             projection={'trade_date': 1}
         )
@@ -615,7 +632,7 @@ async def get_index_performance_ranking(
                 {"_id": 0}
             ).sort("pct_chg", -1).limit(limit)
             
-            rankings = list(cursor)
+            rankings = await cursor.to_list(length=None)
             
         else:
             # 多日累计涨跌幅，需要聚合计算
@@ -629,7 +646,7 @@ async def get_index_performance_ranking(
                     {"_id": 0}
                 ).sort("trade_date", -1).limit(days)
                 
-                data_list = list(cursor)
+                data_list = await cursor.to_list(length=None)
                 if data_list:
                     cumulative_change = sum(item.get("pct_chg", 0) for item in data_list)
                     rankings.append({
@@ -668,10 +685,10 @@ async def get_index_market_overview():
     统计主要指数的整体表现
     """
     try:
-        collection = db_handler.get_collection('index_daily')
+        collection = async_db_handler.get_collection('index_daily')
         
         # 获取最新交易日期
-        latest_record = collection.find_one(
+        latest_record = await collection.find_one(
             sort=[('trade_date', -1)],
             projection={'trade_date': 1}
         )
@@ -684,7 +701,7 @@ async def get_index_market_overview():
         # 获取主要指数的最新数据
         major_indices_data = []
         for ts_code, info in MAJOR_INDICES.items():
-            latest_data = collection.find_one(
+            latest_data = await collection.find_one(
                 {"ts_code": ts_code, "trade_date": latest_date},
                 {"_id": 0}
             )
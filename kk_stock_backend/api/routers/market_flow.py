@@ -11,7 +11,8 @@ from datetime import datetime
 
 import sys
 import os
-from api.global_db import db_handler
+from api.global_db import async_db_handler
+from api.precompute.market_rankings import load_ranking_snapshot
 
 # 添加项目根目录到sys.path以便导入数据库管理器
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -38,7 +39,7 @@ async def get_stock_money_flow(
     获取个股资金流向数据
     """
     try:
-        collection = db_handler.get_collection('stock_money_flow')
+        collection = async_db_handler.get_collection('stock_money_flow')
         
         # 构建查询条件
         query = {"ts_code": ts_code}
@@ -56,7 +57,7 @@ async def get_stock_money_flow(
             {"_id": 0}
         ).sort("trade_date", -1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -82,11 +83,11 @@ async def get_industry_money_flow(
     获取行业资金流向数据
     """
     try:
-        collection = db_handler.get_collection('money_flow_industry')
+        collection = async_db_handler.get_collection('money_flow_industry')
         
         # 如果没有指定日期，获取最新交易日期
         if not trade_date:
-            latest_record = collection.find_one(
+            latest_record = await collection.find_one(
                 sort=[('trade_date', -1)],
                 projection={'trade_date': 1}
             )
@@ -101,7 +102,7 @@ async def get_industry_money_flow(
         
         # 获取所有数据用于统计
         all_cursor = collection.find({"trade_date": trade_date}, {"_id": 0})
-        all_results = list(all_cursor)
+        all_results = await all_cursor.to_list(length=None)
         
         # 统计正负值数量
         positive_count = len([item for item in all_results if item.get('net_amount', 0) > 0])
@@ -112,7 +113,7 @@ async def get_industry_money_flow(
         
         # 返回所有数据，不限制limit，让前端处理
         cursor = collection.find({"trade_date": trade_date}, {"_id": 0}).sort("net_amount", -1)
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -142,7 +143,7 @@ async def get_market_money_flow(
     获取大盘资金流向数据
     """
     try:
-        collection = db_handler.get_collection('money_flow_market')
+        collection = async_db_handler.get_collection('money_flow_market')
         
         # 构建查询条件
         query = {}
@@ -160,7 +161,7 @@ async def get_market_money_flow(
             {"_id": 0}
         ).sort("trade_date", -1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         # 计算汇总统计
         if results:
@@ -203,11 +204,25 @@ async def get_money_flow_inflow_ranking(
     获取资金净流入排行榜
     """
     try:
-        collection = db_handler.get_collection('stock_money_flow')
+        # 优先读取盘后物化的榜单
+        snapshot = await load_ranking_snapshot("money_inflow", trade_date, limit)
+        if snapshot is not None:
+            return {
+                "success": True,
+                "data": {
+                    "trade_date": snapshot["trade_date"],
+                    "type": "inflow",
+                    "rankings": snapshot["items"],
+                    "count": len(snapshot["items"]),
+                    "timestamp": datetime.now().isoformat()
+                }
+            }
+        
+        collection = async_db_handler.get_collection('stock_money_flow')
         
         # 如果没有指定日期，获取最新交易日期
         if not trade_date:
-            latest_record = collection.find_one(
+            latest_record = await collection.find_one(
                 sort=[('trade_date', -1)],
                 projection={'trade_date': 1}
             )
@@ -221,27 +236,27 @@ async def get_money_flow_inflow_ranking(
             {"_id": 0}
         ).sort("net_amount", -1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         # 添加股票基本信息和涨跌幅
         if results:
             ts_codes = [item["ts_code"] for item in results]
             
             # 获取股票基本信息
-            stock_basic = db_handler.get_collection('infrastructure_stock_basic')
+            stock_basic = async_db_handler.get_collection('infrastructure_stock_basic')
             basic_info = {
                 item["ts_code"]: item 
-                for item in stock_basic.find(
+                async for item in stock_basic.find(
                     {"ts_code": {"$in": ts_codes}},
                     {"_id": 0, "ts_code": 1, "name": 1, "industry": 1}
                 )
             }
             
             # 获取当日K线数据（涨跌幅）
-            kline_collection = db_handler.get_collection('stock_kline_daily')
+            kline_collection = async_db_handler.get_collection('stock_kline_daily')
             kline_info = {
                 item["ts_code"]: item 
-                for item in kline_collection.find(
+                async for item in kline_collection.find(
                     {"ts_code": {"$in": ts_codes}, "trade_date": trade_date},
                     {"_id": 0, "ts_code": 1, "pct_change": 1}
                 )
@@ -276,11 +291,25 @@ async def get_money_flow_outflow_ranking(
     获取资金净流出排行榜
     """
     try:
-        collection = db_handler.get_collection('stock_money_flow')
+        # 优先读取盘后物化的榜单
+        snapshot = await load_ranking_snapshot("money_outflow", trade_date, limit)
+        if snapshot is not None:
+            return {
+                "success": True,
+                "data": {
+                    "trade_date": snapshot["trade_date"],
+                    "type": "outflow",
+                    "rankings": snapshot["items"],
+                    "count": len(snapshot["items"]),
+                    "timestamp": datetime.now().isoformat()
+                }
+            }
+        
+        collection = async_db_handler.get_collection('stock_money_flow')
         
         # 如果没有指定日期，获取最新交易日期
         if not trade_date:
-            latest_record = collection.find_one(
+            latest_record = await collection.find_one(
                 sort=[('trade_date', -1)],
                 projection={'trade_date': 1}
             )
@@ -294,27 +323,27 @@ async def get_money_flow_outflow_ranking(
             {"_id": 0}
         ).sort("net_amount", 1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         # 添加股票基本信息和涨跌幅
         if results:
             ts_codes = [item["ts_code"] for item in results]
             
             # 获取股票基本信息
-            stock_basic = db_handler.get_collection('infrastructure_stock_basic')
+            stock_basic = async_db_handler.get_collection('infrastructure_stock_basic')
             basic_info = {
                 item["ts_code"]: item 
-                for item in stock_basic.find(
+                async for item in stock_basic.find(
                     {"ts_code": {"$in": ts_codes}},
                     {"_id": 0, "ts_code": 1, "name": 1, "industry": 1}
                 )
             }
             
             # 获取当日K线数据（涨跌幅）
-            kline_collection = db_handler.get_collection('stock_kline_daily')
+            kline_collection = async_db_handler.get_collection('stock_kline_daily')
             kline_info = {
                 item["ts_code"]: item 
-                for item in kline_collection.find(
+                async for item in kline_collection.find(
                     {"ts_code": {"$in": ts_codes}, "trade_date": trade_date},
                     {"_id": 0, "ts_code": 1, "pct_change": 1}
                 )
@@ -351,10 +380,10 @@ async def get_money_flow_analysis(
     获取资金流向综合分析
     """
     try:
-        collection = db_handler.get_collection('stock_money_flow')
+        collection = async_db_handler.get_collection('stock_money_flow')
         
         # 获取最近的交易日期列表
-        all_dates = collection.distinct('trade_date')
+        all_dates = await collection.distinct('trade_date')
         all_dates.sort(reverse=True)
         
         if not trade_date:
@@ -370,7 +399,7 @@ async def get_money_flow_analysis(
                 {"trade_date": date},
                 {"_id": 0, "trade_date": 1, "net_amount": 1, "net_mf_amount": 1}
             )
-            daily_data = list(daily_cursor)
+            daily_data = await daily_cursor.to_list(length=None)
             
             if daily_data:
                 # 兼容两种字段名：net_amount 和 net_mf_amount
@@ -396,7 +425,7 @@ async def get_money_flow_analysis(
             {"_id": 0}
         )
         
-        all_data = list(cursor)
+        all_data = await cursor.to_list(length=None)
         
         if not all_data:
             raise HTTPException(status_code=404, detail="未找到该交易日的资金流向数据")
@@ -15,7 +15,7 @@ import os
 
 # 导入缓存装饰器
 from api.cache_middleware import cache_endpoint
-from api.global_db import db_handler
+from api.global_db import async_db_handler
 
 # 添加项目根目录到sys.path以便导入数据库管理器
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -79,7 +79,7 @@ async def get_options_list(
     支持按交易所、期权类型筛选
     """
     try:
-        collection = db_handler.get_collection('opt_basic')
+        collection = async_db_handler.get_collection('opt_basic')
         
         # 构建查询条件
         query = {}
@@ -99,7 +99,7 @@ async def get_options_list(
             {"_id": 0}
         ).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -122,9 +122,9 @@ async def get_options_info(
     获取单个期权的基本信息
     """
     try:
-        collection = db_handler.get_collection('opt_basic')
+        collection = async_db_handler.get_collection('opt_basic')
         
-        result = collection.find_one(
+        result = await collection.find_one(
             {"ts_code": ts_code},
             {"_id": 0}
         )
@@ -159,7 +159,7 @@ async def get_options_daily(
     获取期权日线数据
     """
     try:
-        collection = db_handler.get_collection('opt_daily')
+        collection = async_db_handler.get_collection('opt_daily')
         
         # 构建查询条件
         query = {"ts_code": ts_code}
@@ -177,7 +177,7 @@ async def get_options_daily(
             {"_id": 0}
         ).sort("trade_date", -1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -206,7 +206,7 @@ async def get_options_chain(
     """
     try:
         # 首先从基本信息中查找相关期权
-        basic_collection = db_handler.get_collection('opt_basic')
+        basic_collection = async_db_handler.get_collection('opt_basic')
         
         # 构建查询条件
         query = {"opt_code": {"$regex": underlying, "$options": "i"}}
@@ -220,7 +220,7 @@ async def get_options_chain(
             {"_id": 0}
         )
         
-        basic_results = list(basic_cursor)
+        basic_results = await basic_cursor.to_list(length=None)
         
         if not basic_results:
             return {
@@ -235,7 +235,7 @@ async def get_options_chain(
         
         # 如果指定了交易日期，获取对应的行情数据
         if trade_date:
-            daily_collection = db_handler.get_collection('opt_daily')
+            daily_collection = async_db_handler.get_collection('opt_daily')
             ts_codes = [item['ts_code'] for item in basic_results]
             
             daily_cursor = daily_collection.find(
@@ -246,7 +246,7 @@ async def get_options_chain(
                 {"_id": 0}
             )
             
-            daily_results = {item['ts_code']: item for item in daily_cursor}
+            daily_results = {item['ts_code']: item async for item in daily_cursor}
             
             # 合并基本信息和行情数据
             for basic_item in basic_results:
@@ -300,7 +300,7 @@ async def get_batch_options_daily(
         # 异步并发查询
         async def fetch_single_options_data(ts_code: str):
             try:
-                collection = db_handler.get_collection('opt_daily')
+                collection = async_db_handler.get_collection('opt_daily')
                 
                 query = {"ts_code": ts_code}
                 if start_date or end_date:
@@ -318,7 +318,7 @@ async def get_batch_options_daily(
                 
                 return {
                     "ts_code": ts_code,
-                    "data": list(cursor),
+                    "data": await cursor.to_list(length=None),
                     "success": True
                 }
                 
@@ -365,7 +365,7 @@ async def search_options(
     搜索期权（按名称或代码）
     """
     try:
-        collection = db_handler.get_collection('opt_basic')
+        collection = async_db_handler.get_collection('opt_basic')
         
         # 构建搜索条件（支持代码和名称模糊搜索）
         query = {
@@ -381,7 +381,7 @@ async def search_options(
             {"_id": 0}
         ).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -409,8 +409,8 @@ async def get_options_stats(
     获取期权统计摘要信息
     """
     try:
-        basic_collection = db_handler.get_collection('opt_basic')
-        daily_collection = db_handler.get_collection('opt_daily')
+        basic_collection = async_db_handler.get_collection('opt_basic')
+        daily_collection = async_db_handler.get_collection('opt_daily')
         
         # 构建基本查询条件
         basic_query = {}
@@ -421,11 +421,11 @@ async def get_options_stats(
             basic_query["call_put"] = call_put
             
         # 统计总合约数
-        total_contracts = basic_collection.count_documents(basic_query)
+        total_contracts = await basic_collection.count_documents(basic_query)
         
         # 确定查询日期
         if not trade_date:
-            latest_result = daily_collection.find_one(
+            latest_result = await daily_collection.find_one(
                 {},
                 {"trade_date": 1},
                 sort=[("trade_date", -1)]
@@ -440,14 +440,14 @@ async def get_options_stats(
         
         # 如果有筛选条件，需要通过基本信息表获取对应的ts_code列表
         if underlying or call_put:
-            basic_codes = list(basic_collection.find(basic_query, {"ts_code": 1}))
+            basic_codes = await basic_collection.find(basic_query, {"ts_code": 1}).to_list(length=None)
             if basic_codes:
                 daily_query["ts_code"] = {"$in": [item["ts_code"] for item in basic_codes]}
             else:
                 daily_query["ts_code"] = {"$in": []}  # 空结果
         
         # 统计活跃合约数（有交易量的合约）
-        active_contracts = daily_collection.count_documents({
+        active_contracts = await daily_collection.count_documents({
             **daily_query,
             "vol": {"$gt": 0}
         })
@@ -464,7 +464,7 @@ async def get_options_stats(
             }}
         ]
         
-        stats_result = list(daily_collection.aggregate(pipeline))
+        stats_result = await daily_collection.aggregate(pipeline).to_list(length=None)
         
         if stats_result:
             stats = stats_result[0]
@@ -511,7 +511,7 @@ async def get_options_by_expiry(
     按到期日查询期权
     """
     try:
-        collection = db_handler.get_collection('opt_basic')
+        collection = async_db_handler.get_collection('opt_basic')
         
         # 构建查询条件
         query = {}
@@ -529,7 +529,7 @@ async def get_options_by_expiry(
             {"_id": 0}
         ).sort("maturity_date", 1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -559,8 +559,8 @@ async def get_latest_options_data(
     """
     try:
         # 获取最新交易日期
-        daily_collection = db_handler.get_collection('opt_daily')
-        latest_date_result = daily_collection.find_one(
+        daily_collection = async_db_handler.get_collection('opt_daily')
+        latest_date_result = await daily_collection.find_one(
             {},
             {"trade_date": 1},
             sort=[("trade_date", -1)]
@@ -575,7 +575,7 @@ async def get_latest_options_data(
         query = {"trade_date": latest_date}
         
         # 获取基本信息用于筛选
-        basic_collection = db_handler.get_collection('opt_basic')
+        basic_collection = async_db_handler.get_collection('opt_basic')
         basic_query = {}
         
         if underlying:
@@ -587,7 +587,7 @@ async def get_latest_options_data(
         # 如果有筛选条件，先获取符合条件的ts_code
         if basic_query:
             basic_cursor = basic_collection.find(basic_query, {"ts_code": 1})
-            ts_codes = [item['ts_code'] for item in basic_cursor]
+            ts_codes = [item['ts_code'] async for item in basic_cursor]
             if ts_codes:
                 query["ts_code"] = {"$in": ts_codes}
             else:
@@ -607,7 +607,7 @@ async def get_latest_options_data(
             {"_id": 0}
         ).sort("vol", -1).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         # 补充基本信息
         if results:
@@ -616,7 +616,7 @@ async def get_latest_options_data(
                 {"ts_code": {"$in": ts_codes}},
                 {"_id": 0, "ts_code": 1, "name": 1, "opt_code": 1, "call_put": 1, "exercise_price": 1}
             )
-            basic_info = {item['ts_code']: item for item in basic_cursor}
+            basic_info = {item['ts_code']: item async for item in basic_cursor}
             
             for item in results:
                 ts_code = item['ts_code']
@@ -654,11 +654,11 @@ async def get_options_activity(
     获取期权活跃度数据
     """
     try:
-        daily_collection = db_handler.get_collection('opt_daily')
+        daily_collection = async_db_handler.get_collection('opt_daily')
         
         # 确定查询日期
         if not trade_date:
-            latest_result = daily_collection.find_one(
+            latest_result = await daily_collection.find_one(
                 {},
                 {"trade_date": 1},
                 sort=[("trade_date", -1)]
@@ -672,7 +672,7 @@ async def get_options_activity(
         
         # 如果有筛选条件，需要通过基本信息表获取对应的ts_code列表
         if underlying or call_put:
-            basic_collection = db_handler.get_collection('opt_basic')
+            basic_collection = async_db_handler.get_collection('opt_basic')
             basic_query = {}
             
             if underlying:
@@ -680,7 +680,7 @@ async def get_options_activity(
             if call_put:
                 basic_query["call_put"] = call_put
             
-            basic_codes = list(basic_collection.find(basic_query, {"ts_code": 1}))
+            basic_codes = await basic_collection.find(basic_query, {"ts_code": 1}).to_list(length=None)
             if basic_codes:
                 query["ts_code"] = {"$in": [item["ts_code"] for item in basic_codes]}
             else:
@@ -716,7 +716,7 @@ async def get_options_activity(
             }
         ]
         
-        stats_result = list(daily_collection.aggregate(pipeline))
+        stats_result = await daily_collection.aggregate(pipeline).to_list(length=None)
         stats = stats_result[0] if stats_result else {
             "total_volume": 0,
             "total_amount": 0,
@@ -725,16 +725,16 @@ async def get_options_activity(
         }
         
         # 获取按交易量排序的前N个合约
-        top_by_volume = list(daily_collection.find(
+        top_by_volume = await daily_collection.find(
             query,
             {"_id": 0, "ts_code": 1, "vol": 1, "amount": 1, "oi": 1, "close": 1}
-        ).sort("vol", -1).limit(limit))
+        ).sort("vol", -1).limit(limit).to_list(length=None)
         
         # 获取按持仓量排序的前N个合约
-        top_by_oi = list(daily_collection.find(
+        top_by_oi = await daily_collection.find(
             query,
             {"_id": 0, "ts_code": 1, "vol": 1, "amount": 1, "oi": 1, "close": 1}
-        ).sort("oi", -1).limit(limit))
+        ).sort("oi", -1).limit(limit).to_list(length=None)
         
         return {
             "success": True,
@@ -766,11 +766,11 @@ async def get_options_activity_analysis(
     获取期权活跃度分析
     """
     try:
-        daily_collection = db_handler.get_collection('opt_daily')
+        daily_collection = async_db_handler.get_collection('opt_daily')
         
         # 确定查询日期
         if not trade_date:
-            latest_result = daily_collection.find_one(
+            latest_result = await daily_collection.find_one(
                 {},
                 {"trade_date": 1},
                 sort=[("trade_date", -1)]
@@ -784,13 +784,13 @@ async def get_options_activity_analysis(
         
         # 如果有筛选条件，需要通过基本信息表获取对应的ts_code列表
         if underlying:
-            basic_collection = db_handler.get_collection('opt_basic')
+            basic_collection = async_db_handler.get_collection('opt_basic')
             basic_query = {}
             
             if underlying:
                 basic_query["opt_code"] = {"$regex": underlying, "$options": "i"}
             
-            basic_codes = list(basic_collection.find(basic_query, {"ts_code": 1}))
+            basic_codes = await basic_collection.find(basic_query, {"ts_code": 1}).to_list(length=None)
             if basic_codes:
                 query["ts_code"] = {"$in": [item["ts_code"] for item in basic_codes]}
             else:
@@ -812,7 +812,7 @@ async def get_options_activity_analysis(
         
         # 获取当日所有交易数据
         cursor = daily_collection.find(query, {"_id": 0})
-        all_data = list(cursor)
+        all_data = await cursor.to_list(length=None)
         
         if not all_data:
             raise HTTPException(status_code=404, detail=f"未找到{trade_date}的期权交易数据")
@@ -830,13 +830,13 @@ async def get_options_activity_analysis(
         sorted_by_oi = sorted(all_data, key=lambda x: x.get('oi', 0), reverse=True)[:top_n]
         
         # 补充基本信息
-        basic_collection = db_handler.get_collection('opt_basic')
+        basic_collection = async_db_handler.get_collection('opt_basic')
         all_ts_codes = list(set([item['ts_code'] for item in sorted_by_volume + sorted_by_oi]))
         basic_cursor = basic_collection.find(
             {"ts_code": {"$in": all_ts_codes}},
             {"_id": 0, "ts_code": 1, "name": 1, "opt_code": 1, "call_put": 1, "exercise_price": 1}
         )
-        basic_info = {item['ts_code']: item for item in basic_cursor}
+        basic_info = {item['ts_code']: item async for item in basic_cursor}
         
         # 为活跃合约添加基本信息
         for item in sorted_by_volume:
@@ -887,8 +887,8 @@ async def get_options_price_trend(
     支持 ts_code 或 opt_code 格式
     """
     try:
-        basic_collection = db_handler.get_collection('opt_basic')
-        daily_collection = db_handler.get_collection('opt_daily')
+        basic_collection = async_db_handler.get_collection('opt_basic')
+        daily_collection = async_db_handler.get_collection('opt_daily')
         
         # 判断输入的是 ts_code 还是 opt_code
         if code.startswith('IO'):
@@ -896,7 +896,7 @@ async def get_options_price_trend(
             ts_code = code
         else:
             # 输入的是 opt_code，需要转换为 ts_code
-            basic_info = basic_collection.find_one(
+            basic_info = await basic_collection.find_one(
                 {"opt_code": code},
                 {"ts_code": 1}
             )
@@ -919,7 +919,7 @@ async def get_options_price_trend(
             {"_id": 0, "trade_date": 1, "close": 1, "settle": 1, "vol": 1, "oi": 1, "amount": 1}
         ).sort("trade_date", -1)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         if not results:
             raise HTTPException(status_code=404, detail=f"期权代码 {code} 无交易数据")
@@ -954,8 +954,8 @@ async def get_options_price_trend(
             avg_value = max_value = min_value = latest_value = change_rate = 0
         
         # 获取基本信息
-        basic_collection = db_handler.get_collection('opt_basic')
-        basic_info = basic_collection.find_one(
+        basic_collection = async_db_handler.get_collection('opt_basic')
+        basic_info = await basic_collection.find_one(
             {"ts_code": ts_code},
             {"_id": 0, "name": 1, "opt_code": 1, "call_put": 1, "exercise_price": 1}
         )
@@ -1008,11 +1008,11 @@ async def get_options_oi_analysis(
     获取期权持仓量分析
     """
     try:
-        daily_collection = db_handler.get_collection('opt_daily')
+        daily_collection = async_db_handler.get_collection('opt_daily')
         
         # 确定查询日期
         if not trade_date:
-            latest_result = daily_collection.find_one(
+            latest_result = await daily_collection.find_one(
                 {},
                 {"trade_date": 1},
                 sort=[("trade_date", -1)]
@@ -1026,12 +1026,12 @@ async def get_options_oi_analysis(
         
         # 如果指定标的，需要先从基本信息获取相关合约
         if underlying:
-            basic_collection = db_handler.get_collection('opt_basic')
+            basic_collection = async_db_handler.get_collection('opt_basic')
             basic_cursor = basic_collection.find(
                 {"opt_code": {"$regex": underlying, "$options": "i"}},
                 {"ts_code": 1}
             )
-            ts_codes = [item['ts_code'] for item in basic_cursor]
+            ts_codes = [item['ts_code'] async for item in basic_cursor]
             if ts_codes:
                 query["ts_code"] = {"$in": ts_codes}
         
@@ -1055,7 +1055,7 @@ async def get_options_oi_analysis(
             }
         ]
         
-        oi_stats = list(daily_collection.aggregate(pipeline))
+        oi_stats = await daily_collection.aggregate(pipeline).to_list(length=None)
         
         if not oi_stats:
             raise HTTPException(status_code=404, detail=f"未找到{trade_date}的期权数据")
@@ -1078,7 +1078,7 @@ async def get_options_oi_analysis(
             }
         ]
         
-        distribution_raw = list(daily_collection.aggregate(distribution_pipeline))
+        distribution_raw = await daily_collection.aggregate(distribution_pipeline).to_list(length=None)
         
         # 转换分布数据格式，使其更易于前端处理
         distribution = []
@@ -1112,17 +1112,17 @@ async def get_options_oi_analysis(
             {"_id": 0}
         ).sort("oi", -1).limit(20)
         
-        top_oi_contracts = list(top_oi_cursor)
+        top_oi_contracts = await top_oi_cursor.to_list(length=None)
         
         # 补充基本信息
         if top_oi_contracts:
-            basic_collection = db_handler.get_collection('opt_basic')
+            basic_collection = async_db_handler.get_collection('opt_basic')
             ts_codes = [item['ts_code'] for item in top_oi_contracts]
             basic_cursor = basic_collection.find(
                 {"ts_code": {"$in": ts_codes}},
                 {"_id": 0, "ts_code": 1, "name": 1, "opt_code": 1, "call_put": 1, "exercise_price": 1}
             )
-            basic_info = {item['ts_code']: item for item in basic_cursor}
+            basic_info = {item['ts_code']: item async for item in basic_cursor}
             
             for item in top_oi_contracts:
                 ts_code = item['ts_code']
@@ -8,12 +8,17 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
-import asyncio
-import numpy as np
+import logging
 
 import sys
 import os
-from api.global_db import db_handler
+from api.global_db import async_db_handler
+from api.precompute.sentiment_daily import (
+    load_sentiment_rows, refresh_sentiment_daily,
+    summarize_bull_bear, summarize_fear_greed, summarize_money_flow,
+    summarize_basis, summarize_overall
+)
+from api.precompute.scheduler import run_exclusive
 
 # 添加项目根目录到sys.path以便导入数据库管理器
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -22,6 +27,8 @@ project_root = os.path.dirname(api_dir)
 sys.path.insert(0, project_root)
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 sys.path.insert(0, project_root)
@@ -40,8 +47,8 @@ async def get_dashboard_sentiment_summary(
         # 确定分析日期范围
         if not trade_date:
             # 获取最新交易日期 - 修正集合名称
-            daily_collection = db_handler.get_collection('stock_kline_daily')
-            latest_record = daily_collection.find_one(
+            daily_collection = async_db_handler.get_collection('stock_kline_daily')
+            latest_record = await daily_collection.find_one(
                 {},
                 {"trade_date": 1},
                 sort=[('trade_date', -1)]
@@ -64,36 +71,13 @@ async def get_dashboard_sentiment_summary(
         end_date = trade_date
         start_date = (datetime.strptime(trade_date, "%Y%m%d") - timedelta(days=days-1)).strftime("%Y%m%d")
         
-        # 并行计算各项指标
-        tasks = [
-            calculate_bull_bear_ratio(start_date, end_date),
-            calculate_fear_greed_index(start_date, end_date),
-            calculate_money_flow_indicator(start_date, end_date),
-            calculate_basis_level(start_date, end_date),
-            calculate_overall_sentiment(start_date, end_date)
-        ]
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # 处理结果
-        bull_bear_data = results[0] if not isinstance(results[0], Exception) else None
-        fear_greed_data = results[1] if not isinstance(results[1], Exception) else None
-        money_flow_data = results[2] if not isinstance(results[2], Exception) else None
-        basis_data = results[3] if not isinstance(results[3], Exception) else None
-        overall_data = results[4] if not isinstance(results[4], Exception) else None
-        
-        # 添加调试信息
-        print(f"DEBUG - 多空比数据: {bull_bear_data is not None}")
-        print(f"DEBUG - 恐慌指数数据: {fear_greed_data is not None}")
-        print(f"DEBUG - 资金流向数据: {money_flow_data is not None}")
-        print(f"DEBUG - 基差水平数据: {basis_data is not None}")
-        print(f"DEBUG - 综合情绪数据: {overall_data is not None}")
-        
-        # 打印异常信息
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                indicator_names = ["多空比", "恐慌指数", "资金流向", "基差水平", "综合情绪"]
-                print(f"DEBUG - {indicator_names[i]}计算异常: {result}")
+        # 一次区间读取预计算的按日指标（未物化的尾部日期会并发实时计算）
+        rows = await load_sentiment_rows(start_date, end_date)
+        bull_bear_data = summarize_bull_bear(rows)
+        fear_greed_data = summarize_fear_greed(rows)
+        money_flow_data = summarize_money_flow(rows)
+        basis_data = summarize_basis(rows)
+        overall_data = summarize_overall(bull_bear_data, fear_greed_data, money_flow_data)
         
         # 构建响应数据
         sentiment_indicators = []
@@ -174,85 +158,9 @@ async def calculate_bull_bear_ratio(start_date: str, end_date: str) -> Dict[str,
     基于股票涨跌比例计算市场多空力量对比
     """
     try:
-        # 修正集合名称
-        daily_collection = db_handler.get_collection('stock_kline_daily')
-        
-        # 获取指定日期范围的股票数据
-        pipeline = [
-            {
-                "$match": {
-                    "trade_date": {"$gte": start_date, "$lte": end_date}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$trade_date",
-                    "total_stocks": {"$sum": 1},
-                    "rising_stocks": {
-                        "$sum": {
-                            "$cond": [{"$gt": ["$pct_change", 0]}, 1, 0]
-                        }
-                    },
-                    "falling_stocks": {
-                        "$sum": {
-                            "$cond": [{"$lt": ["$pct_change", 0]}, 1, 0]
-                        }
-                    }
-                }
-            },
-            {"$sort": {"_id": 1}}
-        ]
-        
-        daily_stats = list(daily_collection.aggregate(pipeline))
-        
-        if not daily_stats:
-            return None
-        
-        # 计算多空比历史数据
-        historical_data = []
-        bull_bear_ratios = []
-        
-        for stat in daily_stats:
-            total = stat["total_stocks"]
-            rising = stat["rising_stocks"]
-            falling = stat["falling_stocks"]
-            
-            if falling > 0:
-                ratio = rising / falling
-            else:
-                ratio = rising if rising > 0 else 0
-            
-            bull_bear_ratios.append(ratio)
-            historical_data.append([stat["_id"], round(ratio, 2)])
-        
-        # 计算当前值和变化
-        # current_value是时间范围内的均值
-        current_value = round(sum(bull_bear_ratios) / len(bull_bear_ratios), 2) if bull_bear_ratios else 0
-        
-        # change是期末相对于期初的变化
-        period_end_value = round(bull_bear_ratios[-1], 2) if len(bull_bear_ratios) > 0 else 0
-        period_start_value = round(bull_bear_ratios[0], 2) if len(bull_bear_ratios) > 0 else 0
-        change = round(period_end_value - period_start_value, 2)
-        
-        # print(f"DEBUG - 多空比计算: 数据点={len(bull_bear_ratios)}, 期初={period_start_value}, 期末={period_end_value}, 均值={current_value}, 变化={change}")
-        
-        # 判断情绪等级（基于均值）
-        if current_value > 1.5:
-            level = "bullish"
-        elif current_value < 0.7:
-            level = "bearish"
-        else:
-            level = "neutral"
-        
-        return {
-            "current_value": current_value,
-            "change": change,
-            "level": level,
-            "historical_data": historical_data
-        }
-        
+        return summarize_bull_bear(await load_sentiment_rows(start_date, end_date))
     except Exception as e:
-        # print(f"计算多空比失败: {e}")
+        logger.warning(f"计算多空比失败: {e}")
         return None
 
 
@@ -262,92 +170,9 @@ async def calculate_fear_greed_index(start_date: str, end_date: str) -> Dict[str
     基于市场波动率、涨跌幅分布等计算
     """
     try:
-        # 修正集合名称
-        daily_collection = db_handler.get_collection('stock_kline_daily')
-        
-        # 获取市场整体数据
-        pipeline = [
-            {
-                "$match": {
-                    "trade_date": {"$gte": start_date, "$lte": end_date}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$trade_date",
-                    "avg_pct_chg": {"$avg": "$pct_change"},
-                    "std_pct_chg": {"$stdDevPop": "$pct_change"},
-                    "total_amount": {"$sum": "$amount"},
-                    "strong_rising": {
-                        "$sum": {
-                            "$cond": [{"$gt": ["$pct_change", 5]}, 1, 0]
-                        }
-                    },
-                    "strong_falling": {
-                        "$sum": {
-                            "$cond": [{"$lt": ["$pct_change", -5]}, 1, 0]
-                        }
-                    },
-                    "total_stocks": {"$sum": 1}
-                }
-            },
-            {"$sort": {"_id": 1}}
-        ]
-        
-        daily_stats = list(daily_collection.aggregate(pipeline))
-        
-        if not daily_stats:
-            return None
-        
-        # 计算恐慌指数历史数据
-        historical_data = []
-        fear_indices = []
-        
-        for stat in daily_stats:
-            # 恐慌指数计算逻辑
-            volatility = stat.get("std_pct_chg", 0)
-            avg_change = stat.get("avg_pct_chg", 0)
-            strong_ratio = (stat.get("strong_falling", 0) - stat.get("strong_rising", 0)) / max(stat.get("total_stocks", 1), 1)
-            
-            # 综合计算恐慌指数 (0-100, 数值越高越恐慌)
-            fear_index = min(100, max(0, 
-                50 +  # 基准值
-                volatility * 10 +  # 波动率影响
-                (-avg_change) * 5 +  # 平均跌幅影响
-                strong_ratio * 30  # 强势下跌比例影响
-            ))
-            
-            fear_indices.append(fear_index)
-            historical_data.append([stat["_id"], round(fear_index, 1)])
-        
-        # 计算当前值和变化
-        # current_value是时间范围内的均值
-        current_value = round(sum(fear_indices) / len(fear_indices), 1) if fear_indices else 50
-        
-        # change是期末相对于期初的变化
-        period_end_value = round(fear_indices[-1], 1) if len(fear_indices) > 0 else 50
-        period_start_value = round(fear_indices[0], 1) if len(fear_indices) > 0 else 50
-        change = round(period_end_value - period_start_value, 1)
-        
-        # print(f"DEBUG - 恐慌指数计算: 数据点={len(fear_indices)}, 期初={period_start_value}, 期末={period_end_value}, 均值={current_value}, 变化={change}")
-        
-        # 判断情绪等级（基于均值）
-        if current_value > 70:
-            level = "bearish"  # 高恐慌
-        elif current_value < 30:
-            level = "bullish"  # 低恐慌(贪婪)
-        else:
-            level = "neutral"
-        
-        return {
-            "current_value": current_value,
-            "change": change,
-            "level": level,
-            "historical_data": historical_data
-        }
-        
+        return summarize_fear_greed(await load_sentiment_rows(start_date, end_date))
     except Exception as e:
-        # print(f"计算恐慌指数失败: {e}")
+        logger.warning(f"计算恐慌指数失败: {e}")
         return None
 
 
@@ -357,80 +182,9 @@ async def calculate_money_flow_indicator(start_date: str, end_date: str) -> Dict
     基于个股资金流向数据汇总计算
     """
     try:
-        # 使用正确的集合名称
-        money_flow_collection = db_handler.get_collection('stock_money_flow')
-        
-        # 获取资金流向汇总数据 - 兼容net_amount和net_mf_amount字段
-        pipeline = [
-            {
-                "$match": {
-                    "trade_date": {"$gte": start_date, "$lte": end_date}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$trade_date",
-                    "total_net_amount": {
-                        "$sum": {
-                            "$ifNull": ["$net_amount", "$net_mf_amount"]
-                        }
-                    },
-                    "total_main_net": {
-                        "$sum": {
-                            "$add": [
-                                {"$subtract": ["$buy_lg_amount", "$sell_lg_amount"]},
-                                {"$subtract": ["$buy_elg_amount", "$sell_elg_amount"]}
-                            ]
-                        }
-                    }
-                }
-            },
-            {"$sort": {"_id": 1}}
-        ]
-        
-        daily_flow = list(money_flow_collection.aggregate(pipeline))
-        
-        if not daily_flow:
-            return None
-        
-        # 计算资金流向历史数据(转换为亿元)
-        historical_data = []
-        flow_values = []
-        
-        for flow in daily_flow:
-            # 主力资金净流入(千元转亿元)
-            main_net_flow = flow.get("total_main_net", 0) / 100000
-            flow_values.append(main_net_flow)
-            historical_data.append([flow["_id"], round(main_net_flow, 1)])
-        
-        # 计算当前值和变化
-        # current_value是时间范围内的均值
-        current_value = round(sum(flow_values) / len(flow_values), 1) if flow_values else 0
-        
-        # change是期末相对于期初的变化
-        period_end_value = round(flow_values[-1], 1) if len(flow_values) > 0 else 0
-        period_start_value = round(flow_values[0], 1) if len(flow_values) > 0 else 0
-        change = round(period_end_value - period_start_value, 1)
-        
-        # print(f"DEBUG - 资金流向计算: 数据点={len(flow_values)}, 期初={period_start_value}, 期末={period_end_value}, 均值={current_value}, 变化={change}")
-        
-        # 判断情绪等级（基于均值）
-        if current_value > 100:
-            level = "bullish"  # 大幅净流入
-        elif current_value < -100:
-            level = "bearish"  # 大幅净流出
-        else:
-            level = "neutral"
-        
-        return {
-            "current_value": current_value,
-            "change": change,
-            "level": level,
-            "historical_data": historical_data
-        }
-        
+        return summarize_money_flow(await load_sentiment_rows(start_date, end_date))
     except Exception as e:
-        print(f"计算资金流向指标失败: {e}")
+        logger.warning(f"计算资金流向指标失败: {e}")
         return None
 
 
@@ -440,95 +194,9 @@ async def calculate_basis_level(start_date: str, end_date: str) -> Dict[str, Any
     基于期货和现货价格差异计算
     """
     try:
-        # 修正集合名称
-        futures_collection = db_handler.get_collection('fut_daily')
-        index_collection = db_handler.get_collection('index_daily')
-        
-        # 主要股指期货代码
-        main_futures = ['IF.CFX', 'IC.CFX', 'IH.CFX', 'IM.CFX']
-        # 对应的现货指数
-        spot_indices = {
-            'IF.CFX': '000300.SH',  # 沪深300
-            'IC.CFX': '000905.SH',  # 中证500
-            'IH.CFX': '000016.SH',  # 上证50
-            'IM.CFX': '000852.SH'   # 中证1000
-        }
-        
-        # 计算基差数据
-        historical_data = []
-        basis_values = []
-        
-        # 获取交易日期列表
-        trade_dates = futures_collection.distinct('trade_date', {
-            'trade_date': {'$gte': start_date, '$lte': end_date}
-        })
-        trade_dates.sort()
-        
-        for trade_date in trade_dates:
-            daily_basis = []
-            
-            for future_code in main_futures:
-                spot_code = spot_indices.get(future_code)
-                if not spot_code:
-                    continue
-                
-                # 获取期货价格
-                future_data = futures_collection.find_one({
-                    'ts_code': future_code,
-                    'trade_date': trade_date
-                })
-                
-                # 获取现货价格
-                spot_data = index_collection.find_one({
-                    'ts_code': spot_code,
-                    'trade_date': trade_date
-                })
-                
-                if future_data and spot_data:
-                    future_price = future_data.get('close', 0)
-                    spot_price = spot_data.get('close', 0)
-                    
-                    if spot_price > 0:
-                        basis = future_price - spot_price
-                        daily_basis.append(basis)
-            
-            # 计算当日平均基差
-            if daily_basis:
-                avg_basis = sum(daily_basis) / len(daily_basis)
-                basis_values.append(avg_basis)
-                historical_data.append([trade_date, round(avg_basis, 1)])
-        
-        if not basis_values:
-            return None
-        
-        # 计算当前值和变化
-        # current_value是时间范围内的均值
-        current_value = round(sum(basis_values) / len(basis_values), 1) if basis_values else 0
-        
-        # change是期末相对于期初的变化
-        period_end_value = round(basis_values[-1], 1) if len(basis_values) > 0 else 0
-        period_start_value = round(basis_values[0], 1) if len(basis_values) > 0 else 0
-        change = round(period_end_value - period_start_value, 1)
-        
-        # print(f"DEBUG - 基差水平计算: 数据点={len(basis_values)}, 期初={period_start_value}, 期末={period_end_value}, 均值={current_value}, 变化={change}")
-        
-        # 判断情绪等级（基于均值）
-        if current_value > 20:
-            level = "bullish"  # 期货升水较多
-        elif current_value < -20:
-            level = "bearish"  # 期货贴水较多
-        else:
-            level = "neutral"
-        
-        return {
-            "current_value": current_value,
-            "change": change,
-            "level": level,
-            "historical_data": historical_data
-        }
-        
+        return summarize_basis(await load_sentiment_rows(start_date, end_date))
     except Exception as e:
-        print(f"计算基差水平失败: {e}")
+        logger.warning(f"计算基差水平失败: {e}")
         return None
 
 
@@ -538,87 +206,10 @@ async def calculate_overall_sentiment(start_date: str, end_date: str) -> Dict[st
     综合多个指标计算整体市场情绪
     """
     try:
-        # 获取各项指标数据
-        bull_bear_data = await calculate_bull_bear_ratio(start_date, end_date)
-        fear_data = await calculate_fear_greed_index(start_date, end_date)
-        money_flow_data = await calculate_money_flow_indicator(start_date, end_date)
-        
-        # 计算综合指数
-        sentiment_scores = []
-        
-        # 多空比贡献 (30%权重)
-        if bull_bear_data:
-            ratio = bull_bear_data["current_value"]
-            if ratio > 1.5:
-                score = 70
-            elif ratio > 1.2:
-                score = 60
-            elif ratio > 0.8:
-                score = 50
-            elif ratio > 0.5:
-                score = 40
-            else:
-                score = 30
-            sentiment_scores.append((score, 0.3))
-        
-        # 恐慌指数贡献 (25%权重，需要反转)
-        if fear_data:
-            fear_index = fear_data["current_value"]
-            sentiment_score = 100 - fear_index  # 恐慌指数反转
-            sentiment_scores.append((sentiment_score, 0.25))
-        
-        # 资金流向贡献 (25%权重)
-        if money_flow_data:
-            flow = money_flow_data["current_value"]
-            if flow > 200:
-                score = 80
-            elif flow > 50:
-                score = 65
-            elif flow > -50:
-                score = 50
-            elif flow > -200:
-                score = 35
-            else:
-                score = 20
-            sentiment_scores.append((score, 0.25))
-        
-        # 计算加权平均
-        if sentiment_scores:
-            total_weight = sum(weight for _, weight in sentiment_scores)
-            weighted_sum = sum(score * weight for score, weight in sentiment_scores)
-            overall_index = round(weighted_sum / total_weight) if total_weight > 0 else 50
-        else:
-            overall_index = 50
-        
-        # 确定情绪等级
-        if overall_index >= 70:
-            level = "极度乐观"
-        elif overall_index >= 60:
-            level = "乐观"
-        elif overall_index >= 40:
-            level = "中性"
-        elif overall_index >= 30:
-            level = "悲观"
-        else:
-            level = "极度悲观"
-        
-        # 生成影响因素
-        factors = []
-        if bull_bear_data:
-            factors.append(f"多空比: {bull_bear_data['current_value']:.2f}")
-        if fear_data:
-            factors.append(f"恐慌指数: {fear_data['current_value']:.1f}")
-        if money_flow_data:
-            factors.append(f"资金流向: {money_flow_data['current_value']:.1f}亿")
-        
-        return {
-            "index": overall_index,
-            "level": level,
-            "factors": factors if factors else ["数据计算中"]
-        }
-        
+        rows = await load_sentiment_rows(start_date, end_date)
+        return summarize_overall(summarize_bull_bear(rows), summarize_fear_greed(rows), summarize_money_flow(rows))
     except Exception as e:
-        print(f"计算综合情绪指数失败: {e}")
+        logger.warning(f"计算综合情绪指数失败: {e}")
         return {
             "index": 50,
             "level": "中性",
@@ -626,6 +217,22 @@ async def calculate_overall_sentiment(start_date: str, end_date: str) -> Dict[st
         }
 
 
+@router.post("/daily/refresh")
+async def refresh_sentiment_daily_data(
+    trade_date: Optional[str] = Query(None, description="物化截止交易日期(YYYYMMDD)，默认最新交易日")
+):
+    """
+    手动触发每日情绪指标的增量物化（数据采集完成后调用）
+    """
+    try:
+        result = await run_exclusive('sentiment_daily', lambda: refresh_sentiment_daily(end_date=trade_date))
+        if result is None:
+            return {"success": True, "message": "物化任务正在其他进程执行"}
+        return {"success": result.get("success", False), "data": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"情绪指标物化失败: {str(e)}")
+
+
 @router.get("/indicators/{indicator_name}")
 async def get_sentiment_indicator_detail(
     indicator_name: str,
@@ -639,8 +246,8 @@ async def get_sentiment_indicator_detail(
     try:
         # 确定分析日期范围
         if not trade_date:
-            daily_collection = db_handler.get_collection('stock_kline_daily')
-            latest_record = daily_collection.find_one({}, {"trade_date": 1}, sort=[('trade_date', -1)])
+            daily_collection = async_db_handler.get_collection('stock_kline_daily')
+            latest_record = await daily_collection.find_one({}, {"trade_date": 1}, sort=[('trade_date', -1)])
             trade_date = latest_record["trade_date"] if latest_record else datetime.now().strftime("%Y%m%d")
         
         end_date = trade_date
@@ -6,11 +6,21 @@
 """
 
 from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 import asyncio
+import io
+import json
 from pydantic import BaseModel
 
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+    pa = None
+
 import sys
 import os
 
@@ -22,7 +32,8 @@ sys.path.insert(0, project_root)
 
 from api.routers.user import get_current_user
 from api.cache_middleware import cache_endpoint
-from api.global_db import db_handler
+from api.global_db import async_db_handler
+from api.precompute.market_rankings import load_ranking_snapshot
 
 router = APIRouter()
 
@@ -61,6 +72,23 @@ class KlineRequest(BaseModel):
     start_date: Optional[str] = None
     end_date: Optional[str] = None
     period: str = "daily"
+    # 返回字段，为空时行式返回全部字段、列式/流式返回 KLINE_DEFAULT_FIELDS
+    fields: Optional[List[str]] = None
+    # rows: 行式字典列表; columnar: 列式数组; ndjson/arrow: 仅流式接口
+    format: str = "rows"
+
+# 批量K线周期与集合映射
+KLINE_COLLECTION_MAP = {
+    'daily': 'stock_daily',
+    'weekly': 'stock_weekly',
+    'monthly': 'stock_monthly'
+}
+KLINE_DEFAULT_FIELDS = ["open", "high", "low", "close", "vol"]
+# Arrow流按float64输出的数值字段
+KLINE_NUMERIC_FIELDS = ["open", "high", "low", "close", "pre_close", "change", "pct_chg", "vol", "amount"]
+# 一次性JSON响应与流式响应的股票数量上限
+KLINE_BATCH_MAX_CODES = 200
+KLINE_STREAM_MAX_CODES = 6000
 
 # ==================== 股票基本信息 ====================
 
@@ -75,7 +103,7 @@ async def search_stocks(
     支持按股票代码、简称、全称搜索
     """
     try:
-        collection = db_handler.get_collection('infrastructure_stock_basic')
+        collection = async_db_handler.get_collection('infrastructure_stock_basic')
         
         # 构建搜索条件
         search_query = {
@@ -93,7 +121,7 @@ async def search_stocks(
             {"_id": 0}
         ).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         return {
             "success": True,
@@ -122,7 +150,7 @@ async def get_stock_list(
     支持按市场、行业、沪深港通标的筛选
     """
     try:
-        collection = db_handler.get_collection('stock_basic')
+        collection = async_db_handler.get_collection('stock_basic')
         
         # 构建查询条件
         query = {"list_status": list_status}
@@ -142,10 +170,10 @@ async def get_stock_list(
             {"_id": 0}
         ).limit(limit)
         
-        results = list(cursor)
+        results = await cursor.to_list(length=None)
         
         # 统计信息
-        total_count = collection.count_documents(query)
+        total_count = await collection.count_documents(query)
         
         return {
             "success": True,
@@ -175,19 +203,19 @@ async def get_stock_detail(ts_code: str):
     """
     try:
         # 获取股票基本信息
-        stock_basic = db_handler.get_collection('infrastructure_stock_basic')
-        basic_info = stock_basic.find_one({"ts_code": ts_code}, {"_id": 0})
+        stock_basic = async_db_handler.get_collection('infrastructure_stock_basic')
+        basic_info = await stock_basic.find_one({"ts_code": ts_code}, {"_id": 0})
         
         if not basic_info:
             raise HTTPException(status_code=404, detail="股票不存在")
         
         # 获取公司基本信息
-        stock_company = db_handler.get_collection('infrastructure_stock_company')
-        company_info = stock_company.find_one({"ts_code": ts_code}, {"_id": 0})
+        stock_company = async_db_handler.get_collection('infrastructure_stock_company')
+        company_info = await stock_company.find_one({"ts_code": ts_code}, {"_id": 0})
         
         # 获取最新日线行情
-        daily_collection = db_handler.get_collection('stock_kline_daily')
-        latest_daily = daily_collection.find_one(
+        daily_collection = async_db_handler.get_collection('stock_kline_daily')
+        latest_daily = await daily_collection.find_one(
             {"ts_code": ts_code},
             {"_id": 0},
             sort=[("trade_date", -1)]
@@ -235,7 +263,7 @@ async def get_stock_kline(
         if not collection_name:
             raise HTTPException(status_code=400, detail="无效的数据周期")
         
-        collection = db_handler.get_collection(collection_name)
+        collection = async_db_handler.get_collection(collection_name)
         
         # 构建查询条件
         query = {"ts_code": ts_code}
@@ -254,7 +282,7 @@ async def get_stock_kline(
             {"_id": 0}
         ).sort("trade_date", -1).limit(limit)
         
-        kline_data = list(cursor)
+        kline_data = await cursor.to_list(length=None)
         
         # 计算简单技术指标
         if kline_data:
@@ -304,57 +332,38 @@ async def get_stock_kline(
 async def get_batch_kline(request: KlineRequest):
     """
     批量获取多只股票的K线数据
-    最多支持50只股票同时查询
+    最多支持200只股票同时查询；format=columnar 时按股票返回列式数组，
+    更大的请求请使用 /kline/batch/stream 流式接口
     """
     try:
-        if len(request.ts_codes) > 50:
-            raise HTTPException(status_code=400, detail="批量查询最多支持50只股票")
-        
-        # 根据周期选择集合
-        collection_map = {
-            'daily': 'stock_daily',
-            'weekly': 'stock_weekly',
-            'monthly': 'stock_monthly'
-        }
+        if len(request.ts_codes) > KLINE_BATCH_MAX_CODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"批量查询最多支持{KLINE_BATCH_MAX_CODES}只股票，更多股票请使用流式接口"
+            )
+        if request.format not in ("rows", "columnar"):
+            raise HTTPException(status_code=400, detail="无效的返回格式，支持: rows, columnar")
         
-        collection_name = collection_map.get(request.period)
-        if not collection_name:
-            raise HTTPException(status_code=400, detail="无效的数据周期")
+        collection_name = _resolve_kline_collection(request.period)
+        collection = async_db_handler.get_collection(collection_name)
         
-        collection = db_handler.get_collection(collection_name)
-        
-        # 构建查询条件
-        query = {"ts_code": {"$in": request.ts_codes}}
-        
-        if request.start_date or request.end_date:
-            date_query = {}
-            if request.start_date:
-                date_query["$gte"] = request.start_date
-            if request.end_date:
-                date_query["$lte"] = request.end_date
-            query["trade_date"] = date_query
-        
-        # 查询数据
-        cursor = collection.find(query, {"_id": 0})
-        all_data = list(cursor)
+        cursor = collection.find(
+            _build_kline_query(request),
+            _build_kline_projection(request)
+        ).sort([("ts_code", 1), ("trade_date", -1)])
         
-        # 按股票代码分组
+        # 游标已按 (ts_code, trade_date降序) 排序，逐条分组即可
+        fields = _resolve_kline_fields(request)
         stock_data = {}
-        for item in all_data:
-            ts_code = item["ts_code"]
-            if ts_code not in stock_data:
-                stock_data[ts_code] = []
-            stock_data[ts_code].append(item)
-        
-        # 对每只股票的数据按日期排序
-        for ts_code in stock_data:
-            stock_data[ts_code].sort(key=lambda x: x["trade_date"], reverse=True)
+        async for ts_code, rows in _iter_grouped_kline(cursor):
+            stock_data[ts_code] = _to_columnar(rows, fields) if request.format == "columnar" else rows
         
         return {
             "success": True,
             "data": {
                 "ts_codes": request.ts_codes,
                 "period": request.period,
+                "format": request.format,
                 "date_range": {
                     "start_date": request.start_date,
                     "end_date": request.end_date
@@ -370,6 +379,145 @@ async def get_batch_kline(request: KlineRequest):
             raise e
         raise HTTPException(status_code=500, detail=f"批量获取K线数据失败: {str(e)}")
 
+
+@router.post("/kline/batch/stream")
+async def stream_batch_kline(request: KlineRequest):
+    """
+    流式批量获取K线数据（列式，逐只股票输出）
+    format=ndjson: 每行一只股票的JSON对象
+    format=arrow: Arrow IPC 流，每只股票一个RecordBatch（需安装pyarrow）
+    """
+    if len(request.ts_codes) > KLINE_STREAM_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"流式查询最多支持{KLINE_STREAM_MAX_CODES}只股票")
+    stream_format = request.format if request.format in ("ndjson", "arrow") else "ndjson"
+    if stream_format == "arrow" and not HAS_PYARROW:
+        raise HTTPException(status_code=400, detail="服务端未安装pyarrow，不支持Arrow格式")
+    
+    collection_name = _resolve_kline_collection(request.period)
+    collection = async_db_handler.get_collection(collection_name)
+    fields = _resolve_kline_fields(request)
+    if stream_format == "arrow":
+        # 响应开始后再出错只能中断流，非数值字段在此提前拒绝
+        invalid = [f for f in fields if f not in KLINE_NUMERIC_FIELDS]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Arrow格式仅支持数值字段: {', '.join(KLINE_NUMERIC_FIELDS)}，不支持: {', '.join(invalid)}"
+            )
+    cursor = collection.find(
+        _build_kline_query(request),
+        _build_kline_projection(request, fields)
+    ).sort([("ts_code", 1), ("trade_date", -1)])
+    
+    if stream_format == "arrow":
+        return StreamingResponse(
+            _arrow_kline_stream(cursor, fields),
+            media_type="application/vnd.apache.arrow.stream"
+        )
+    return StreamingResponse(_ndjson_kline_stream(cursor, fields), media_type="application/x-ndjson")
+
+
+def _resolve_kline_collection(period: str) -> str:
+    """根据周期选择集合"""
+    collection_name = KLINE_COLLECTION_MAP.get(period)
+    if not collection_name:
+        raise HTTPException(status_code=400, detail="无效的数据周期")
+    return collection_name
+
+
+def _resolve_kline_fields(request: KlineRequest) -> List[str]:
+    """列式/流式输出的字段列表（不含 ts_code、trade_date）"""
+    fields = request.fields or KLINE_DEFAULT_FIELDS
+    return [f for f in dict.fromkeys(fields) if f not in ("ts_code", "trade_date", "_id")]
+
+
+def _build_kline_query(request: KlineRequest) -> Dict[str, Any]:
+    """构建批量K线查询条件"""
+    query = {"ts_code": {"$in": request.ts_codes}}
+    if request.start_date or request.end_date:
+        date_query = {}
+        if request.start_date:
+            date_query["$gte"] = request.start_date
+        if request.end_date:
+            date_query["$lte"] = request.end_date
+        query["trade_date"] = date_query
+    return query
+
+
+def _build_kline_projection(request: KlineRequest, fields: Optional[List[str]] = None) -> Dict[str, int]:
+    """只投影需要的字段；未指定字段的行式请求保持返回全部字段"""
+    if fields is None:
+        if request.format == "columnar":
+            fields = _resolve_kline_fields(request)
+        elif request.fields:
+            fields = request.fields
+        else:
+            return {"_id": 0}
+    projection = {"_id": 0, "ts_code": 1, "trade_date": 1}
+    projection.update({f: 1 for f in fields})
+    return projection
+
+
+async def _iter_grouped_kline(cursor):
+    """按 ts_code 分组迭代已排序游标，每次产出一只股票的全部行"""
+    current_code = None
+    rows: List[Dict] = []
+    async for doc in cursor:
+        ts_code = doc["ts_code"]
+        if ts_code != current_code:
+            if rows:
+                yield current_code, rows
+            current_code, rows = ts_code, []
+        rows.append(doc)
+    if rows:
+        yield current_code, rows
+
+
+def _to_columnar(rows: List[Dict], fields: List[str]) -> Dict[str, List]:
+    """行式K线转列式数组"""
+    columns = {"trade_date": [row["trade_date"] for row in rows]}
+    for f in fields:
+        columns[f] = [row.get(f) for row in rows]
+    return columns
+
+
+async def _ndjson_kline_stream(cursor, fields: List[str]):
+    """NDJSON流：每只股票一行"""
+    async for ts_code, rows in _iter_grouped_kline(cursor):
+        line = {"ts_code": ts_code}
+        line.update(_to_columnar(rows, fields))
+        yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+
+async def _arrow_kline_stream(cursor, fields: List[str]):
+    """Arrow IPC流：每只股票写一个RecordBatch后立即输出（fields 须为 KLINE_NUMERIC_FIELDS 中的数值字段）"""
+    schema = pa.schema(
+        [("ts_code", pa.string()), ("trade_date", pa.string())] +
+        [(f, pa.float64()) for f in fields]
+    )
+    buffer = io.BytesIO()
+    writer = pa.ipc.new_stream(buffer, schema)
+    
+    def _drain() -> bytes:
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+    
+    # schema消息在创建writer时写入，随第一个分块输出
+    yield _drain()
+    async for ts_code, rows in _iter_grouped_kline(cursor):
+        columns = _to_columnar(rows, fields)
+        batch = pa.record_batch(
+            [pa.array([ts_code] * len(rows), pa.string()), pa.array(columns["trade_date"], pa.string())] +
+            [pa.array(columns[f], pa.float64()) for f in fields],
+            schema=schema
+        )
+        writer.write_batch(batch)
+        yield _drain()
+    writer.close()
+    yield _drain()
+
 # ==================== 技术分析 ====================
 
 @router.get("/technical/{ts_code}")
@@ -383,7 +531,7 @@ async def get_technical_analysis(
     包括移动平均线、RSI、布林带等
     """
     try:
-        collection = db_handler.get_collection('stock_kline_daily')
+        collection = async_db_handler.get_collection('stock_kline_daily')
         
         # 获取指定天数的数据
         cursor = collection.find(
@@ -391,7 +539,7 @@ async def get_technical_analysis(
             {"_id": 0, "trade_date": 1, "close": 1, "high": 1, "low": 1, "vol": 1, "pct_chg": 1}
         ).sort("trade_date", -1).limit(days)
         
-        data = list(cursor)
+        data = await cursor.to_list(length=None)
         
         if not data:
             raise HTTPException(status_code=404, detail="未找到该股票的数据")
@@ -454,6 +602,19 @@ async def get_technical_analysis(
 
 # ==================== 排行榜 ====================
 
+def _ranking_response(snapshot: Dict[str, Any], ranking_type: str) -> Dict[str, Any]:
+    """物化榜单转为排行榜接口的返回格式"""
+    return {
+        "success": True,
+        "data": {
+            "trade_date": snapshot["trade_date"],
+            "type": ranking_type,
+            "count": len(snapshot["items"]),
+            "rankings": snapshot["items"],
+            "timestamp": datetime.now().isoformat()
+        }
+    }
+
 @router.get("/rankings/gainers")
 @cache_endpoint(data_type="stock_gainers", ttl=600)
 async def get_top_gainers(
@@ -464,10 +625,15 @@ async def get_top_gainers(
     获取涨幅榜
     """
     try:
-        collection = db_handler.get_collection('stock_kline_daily')
+        # 优先读取盘后物化的榜单
+        snapshot = await load_ranking_snapshot("stock_gainers", limit=limit)
+        if snapshot is not None:
+            return _ranking_response(snapshot, "gainers")
+        
+        collection = async_db_handler.get_collection('stock_kline_daily')
         
         # 获取最新交易日期
-        latest_record = collection.find_one(
+        latest_record = await collection.find_one(
             sort=[('trade_date', -1)],
             projection={'trade_date': 1}
         )
@@ -486,15 +652,15 @@ async def get_top_gainers(
             {"_id": 0}
         ).sort("pct_chg", -1).limit(limit)
         
-        gainers = list(cursor)
+        gainers = await cursor.to_list(length=None)
         
         # 如果需要，添加股票基本信息
         if gainers:
             ts_codes = [item["ts_code"] for item in gainers]
-            stock_basic = db_handler.get_collection('infrastructure_stock_basic')
+            stock_basic = async_db_handler.get_collection('infrastructure_stock_basic')
             basic_info = {
                 item["ts_code"]: item 
-                for item in stock_basic.find(
+                async for item in stock_basic.find(
                     {"ts_code": {"$in": ts_codes}},
                     {"_id": 0, "ts_code": 1, "name": 1, "industry": 1, "market": 1}
                 )
@@ -530,10 +696,15 @@ async def get_top_losers(
     获取跌幅榜
     """
     try:
-        collection = db_handler.get_collection('stock_daily')
+        # 优先读取盘后物化的榜单
+        snapshot = await load_ranking_snapshot("stock_losers", limit=limit)
+        if snapshot is not None:
+            return _ranking_response(snapshot, "losers")
+        
+        collection = async_db_handler.get_collection('stock_daily')
         
         # 获取最新交易日期
-        latest_record = collection.find_one(
+        latest_record = await collection.find_one(
             sort=[('trade_date', -1)],
             projection={'trade_date': 1}
         )
@@ -549,15 +720,15 @@ async def get_top_losers(
             {"_id": 0}
         ).sort("pct_chg", 1).limit(limit)
         
-        losers = list(cursor)
+        losers = await cursor.to_list(length=None)
         
         # 添加股票基本信息
         if losers:
             ts_codes = [item["ts_code"] for item in losers]
-            stock_basic = db_handler.get_collection('stock_basic')
+            stock_basic = async_db_handler.get_collection('stock_basic')
             basic_info = {
                 item["ts_code"]: item 
-                for item in stock_basic.find(
+                async for item in stock_basic.find(
                     {"ts_code": {"$in": ts_codes}},
                     {"_id": 0, "ts_code": 1, "name": 1, "industry": 1, "market": 1}
                 )
@@ -592,10 +763,15 @@ async def get_top_volume(
     获取成交量排行榜
     """
     try:
-        collection = db_handler.get_collection('stock_daily')
+        # 优先读取盘后物化的榜单
+        snapshot = await load_ranking_snapshot("stock_volume", limit=limit)
+        if snapshot is not None:
+            return _ranking_response(snapshot, "volume")
+        
+        collection = async_db_handler.get_collection('stock_daily')
         
         # 获取最新交易日期
-        latest_record = collection.find_one(
+        latest_record = await collection.find_one(
             sort=[('trade_date', -1)],
             projection={'trade_date': 1}
         )
@@ -611,15 +787,15 @@ async def get_top_volume(
             {"_id": 0}
         ).sort("vol", -1).limit(limit)
         
-        volume_leaders = list(cursor)
+        volume_leaders = await cursor.to_list(length=None)
         
         # 添加股票基本信息
         if volume_leaders:
             ts_codes = [item["ts_code"] for item in volume_leaders]
-            stock_basic = db_handler.get_collection('stock_basic')
+            stock_basic = async_db_handler.get_collection('stock_basic')
             basic_info = {
                 item["ts_code"]: item 
-                for item in stock_basic.find(
+                async for item in stock_basic.find(
                     {"ts_code": {"$in": ts_codes}},
                     {"_id": 0, "ts_code": 1, "name": 1, "industry": 1, "market": 1}
                 )
@@ -647,6 +823,33 @@ async def get_top_volume(
 
 # ==================== 市场概览 ====================
 
+def _market_overview_response(latest_date: str, market_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """市场统计转为市场概览接口的返回格式"""
+    return {
+        "success": True,
+        "data": {
+            "trade_date": latest_date,
+            "market_statistics": {
+                "total_stocks": market_stats.get("total_stocks", 0),
+                "rising_stocks": market_stats.get("rising_stocks", 0),
+                "falling_stocks": market_stats.get("falling_stocks", 0),
+                "unchanged_stocks": market_stats.get("unchanged_stocks", 0),
+                "total_volume": market_stats.get("total_volume", 0),
+                "total_amount": market_stats.get("total_amount", 0),
+                "average_change": round(market_stats.get("avg_pct_chg", 0), 2)
+            },
+            "market_sentiment": {
+                "bullish_ratio": round(
+                    market_stats.get("rising_stocks", 0) / max(market_stats.get("total_stocks", 1), 1) * 100, 2
+                ),
+                "bearish_ratio": round(
+                    market_stats.get("falling_stocks", 0) / max(market_stats.get("total_stocks", 1), 1) * 100, 2
+                )
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+    }
+
 @router.get("/market/overview")
 @cache_endpoint(data_type="market_overview", ttl=300)
 async def get_market_overview():
@@ -655,10 +858,15 @@ async def get_market_overview():
     包括涨跌家数、成交金额等统计信息
     """
     try:
-        collection = db_handler.get_collection('stock_daily')
+        # 优先读取盘后物化的市场概览
+        snapshot = await load_ranking_snapshot("stock_overview")
+        if snapshot is not None:
+            return _market_overview_response(snapshot["trade_date"], snapshot["stats"])
+        
+        collection = async_db_handler.get_collection('stock_daily')
         
         # 获取最新交易日期
-        latest_record = collection.find_one(
+        latest_record = await collection.find_one(
             sort=[('trade_date', -1)],
             projection={'trade_date': 1}
         )
@@ -689,37 +897,14 @@ async def get_market_overview():
             }}
         ]
         
-        result = list(collection.aggregate(pipeline))
+        result = await collection.aggregate(pipeline).to_list(length=None)
         
         if not result:
             raise HTTPException(status_code=404, detail="未找到市场数据")
         
         market_stats = result[0]
         
-        return {
-            "success": True,
-            "data": {
-                "trade_date": latest_date,
-                "market_statistics": {
-                    "total_stocks": market_stats.get("total_stocks", 0),
-                    "rising_stocks": market_stats.get("rising_stocks", 0),
-                    "falling_stocks": market_stats.get("falling_stocks", 0),
-                    "unchanged_stocks": market_stats.get("unchanged_stocks", 0),
-                    "total_volume": market_stats.get("total_volume", 0),
-                    "total_amount": market_stats.get("total_amount", 0),
-                    "average_change": round(market_stats.get("avg_pct_chg", 0), 2)
-                },
-                "market_sentiment": {
-                    "bullish_ratio": round(
-                        market_stats.get("rising_stocks", 0) / max(market_stats.get("total_stocks", 1), 1) * 100, 2
-                    ),
-                    "bearish_ratio": round(
-                        market_stats.get("falling_stocks", 0) / max(market_stats.get("total_stocks", 1), 1) * 100, 2
-                    )
-                },
-                "timestamp": datetime.now().isoformat()
-            }
-        }
+        return _market_overview_response(latest_date, market_stats)
         
     except Exception as e:
         if isinstance(e, HTTPException):
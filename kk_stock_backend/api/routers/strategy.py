@@ -16,6 +16,8 @@ from api.cache_middleware import cache_endpoint
 
 from api.config.strategy_templates import StrategyTemplateConfig
 from api.global_db import db_handler
+from api.precompute.strategy_screens import load_strategy_screen
+from api.utils.screening_cache import screening_cache
 
 # 初始化日志记录器
 logger = logging.getLogger(__name__)
@@ -380,6 +382,22 @@ async def _save_to_stock_pool(user_id: str, pool_name: str, stock_codes: List[st
     except Exception:
         return False
 
+# 选股接口中与用户相关、不参与共享缓存键的参数
+SCREENING_USER_PARAMS = ("current_user", "save_to_pool", "pool_name")
+
+
+async def _stock_pool_overlay(result: ScreeningResponse, user_args: Dict[str, Any]) -> ScreeningResponse:
+    """在共享选股结果之上叠加用户操作：按需保存到该用户的股票池"""
+    if not user_args.get("save_to_pool") or not isinstance(result, ScreeningResponse) or not result.results:
+        return result
+    current_user = user_args.get("current_user") or {}
+    pool_name = user_args.get("pool_name") or f"{result.strategy_name}-{datetime.now().strftime('%Y%m%d')}"
+    saved = await _save_to_stock_pool(
+        current_user.get("user_id"), pool_name,
+        [stock.ts_code for stock in result.results], result.strategy_name
+    )
+    return result.model_copy(update={"saved_to_pool": saved, "pool_name": pool_name if saved else None})
+
 # 添加策略模板应用接口
 
 async def _get_template_by_id(template_id: str) -> Optional[Dict[str, Any]]:
@@ -453,25 +471,30 @@ async def _get_template_by_id(template_id: str) -> Optional[Dict[str, Any]]:
 # ==================== 8大策略模板接口 ====================
 
 @router.post("/value-investment")
-@cache_endpoint(data_type="value_investment", ttl=300)
+@screening_cache("value_investment", user_params=SCREENING_USER_PARAMS, overlay=_stock_pool_overlay)
 async def value_investment_screening(
     market_cap: str = "all",  # 市值范围：large/mid/small/all
     stock_pool: str = "all",  # 股票池：all/main/gem/star/shenwan_value (改为全市场)
     limit: int = 50,  # 增加默认数量
+    save_to_pool: bool = False,  # 是否把结果保存到当前用户的股票池
+    pool_name: Optional[str] = None,  # 股票池名称，默认按策略名生成
     current_user: dict = Depends(get_current_user)
 ) -> ScreeningResponse:
     """价值投资策略专门接口 - 全市场价值投资选股，基于专业评分机制，使用策略适配器实现"""
     try:
-        # 导入价值投资策略适配器
-        from backtrader_strategies.strategy_adapters.value_investment_adapter import ValueInvestmentAdapter
-        
-        # 创建适配器实例并执行选股
-        adapter = ValueInvestmentAdapter()
-        adapter_result = await adapter.screen_stocks(
-            market_cap=market_cap,
-            stock_pool=stock_pool,
-            limit=limit
-        )
+        # 默认参数优先读取盘后预计算结果，无法命中时实时选股
+        adapter_result = await load_strategy_screen("value", market_cap, stock_pool, limit)
+        if adapter_result is None:
+            # 导入价值投资策略适配器
+            from backtrader_strategies.strategy_adapters.value_investment_adapter import ValueInvestmentAdapter
+        
+            # 创建适配器实例并执行选股
+            adapter = ValueInvestmentAdapter()
+            adapter_result = await adapter.screen_stocks(
+                market_cap=market_cap,
+                stock_pool=stock_pool,
+                limit=limit
+            )
         
         # 检查是否有错误
         if 'error' in adapter_result:
@@ -531,25 +554,30 @@ async def value_investment_screening(
         raise HTTPException(status_code=500, detail=f"价值投资策略筛选失败: {str(e)}")
 
 @router.post("/growth-stock")
-@cache_endpoint(data_type="growth_stock", ttl=300)
+@screening_cache("growth_stock", user_params=SCREENING_USER_PARAMS, overlay=_stock_pool_overlay)
 async def growth_stock_screening(
     market_cap: str = "all",
     stock_pool: str = "all",
     limit: int = 20,
+    save_to_pool: bool = False,  # 是否把结果保存到当前用户的股票池
+    pool_name: Optional[str] = None,  # 股票池名称，默认按策略名生成
     current_user: dict = Depends(get_current_user)
 ) -> ScreeningResponse:
     """成长股策略专门接口 - 高质量成长股筛选，使用策略适配器实现"""
     try:
-        # 导入成长股策略适配器
-        from backtrader_strategies.strategy_adapters.growth_stock_adapter import GrowthStockAdapter
-        
-        # 创建适配器实例并执行选股
-        adapter = GrowthStockAdapter()
-        adapter_result = await adapter.screen_stocks(
-            market_cap=market_cap,
-            stock_pool=stock_pool,
-            limit=limit
-        )
+        # 默认参数优先读取盘后预计算结果，无法命中时实时选股
+        adapter_result = await load_strategy_screen("growth", market_cap, stock_pool, limit)
+        if adapter_result is None:
+            # 导入成长股策略适配器
+            from backtrader_strategies.strategy_adapters.growth_stock_adapter import GrowthStockAdapter
+        
+            # 创建适配器实例并执行选股
+            adapter = GrowthStockAdapter()
+            adapter_result = await adapter.screen_stocks(
+                market_cap=market_cap,
+                stock_pool=stock_pool,
+                limit=limit
+            )
         
         # 检查是否有错误
         if 'error' in adapter_result:
@@ -598,7 +626,7 @@ async def growth_stock_screening(
         raise HTTPException(status_code=500, detail=f"成长股策略筛选失败: {str(e)}")
 
 @router.post("/momentum-breakthrough")
-@cache_endpoint(data_type="momentum_breakthrough", ttl=300)
+@screening_cache("momentum_breakthrough", user_params=SCREENING_USER_PARAMS, overlay=_stock_pool_overlay)
 async def momentum_breakthrough_screening(
     market_cap: str = "all",
     stock_pool: str = "all",
@@ -609,22 +637,27 @@ async def momentum_breakthrough_screening(
     rsi_max: float = 70,  # RSI最大值
     volume_ratio_min: float = 1.5,  # 量比最小值
     require_macd_golden: bool = True,  # 是否要求MACD金叉
+    save_to_pool: bool = False,  # 是否把结果保存到当前用户的股票池
+    pool_name: Optional[str] = None,  # 股票池名称，默认按策略名生成
     current_user: dict = Depends(get_current_user)
 ) -> ScreeningResponse:
     "动量突破策略专门接口 - 使用策略适配器实现"
     try:
-        # 导入动量突破策略适配器
-        from backtrader_strategies.strategy_adapters.momentum_breakthrough_adapter import MomentumBreakthroughAdapter
-        
-        # 创建适配器实例并执行选股
-        adapter = MomentumBreakthroughAdapter()
-        
-        # 传递参数给适配器（注意：适配器可能不支持所有参数，需要在适配器中实现）
-        adapter_result = await adapter.screen_stocks(
-            market_cap=market_cap,
-            stock_pool=stock_pool,
-            limit=limit
-        )
+        # 默认参数优先读取盘后预计算结果，无法命中时实时选股
+        adapter_result = await load_strategy_screen("momentum", market_cap, stock_pool, limit)
+        if adapter_result is None:
+            # 导入动量突破策略适配器
+            from backtrader_strategies.strategy_adapters.momentum_breakthrough_adapter import MomentumBreakthroughAdapter
+        
+            # 创建适配器实例并执行选股
+            adapter = MomentumBreakthroughAdapter()
+        
+            # 传递参数给适配器（注意：适配器可能不支持所有参数，需要在适配器中实现）
+            adapter_result = await adapter.screen_stocks(
+                market_cap=market_cap,
+                stock_pool=stock_pool,
+                limit=limit
+            )
         
         # 检查是否有错误
         if 'error' in adapter_result:
@@ -675,7 +708,7 @@ async def momentum_breakthrough_screening(
 
 
 @router.post("/high-dividend")
-@cache_endpoint(data_type="high_dividend", ttl=300)
+@screening_cache("high_dividend", user_params=SCREENING_USER_PARAMS, overlay=_stock_pool_overlay)
 async def high_dividend_screening(
     market_cap: str = "all",
     stock_pool: str = "all",
@@ -684,25 +717,35 @@ async def high_dividend_screening(
     payout_ratio_min: float = 20.0,
     dividend_fundraising_ratio_min: float = 30.0,
     net_cash_min: float = -1000000.0,
+    save_to_pool: bool = False,  # 是否把结果保存到当前用户的股票池
+    pool_name: Optional[str] = None,  # 股票池名称，默认按策略名生成
     current_user: dict = Depends(get_current_user)
 ) -> ScreeningResponse:
     """高股息策略专门接口 - 使用策略适配器实现"""
     try:
-        
-        # 导入高股息策略适配器
-        from backtrader_strategies.strategy_adapters.high_dividend_adapter import HighDividendAdapter
-        
-        # 创建适配器实例并执行选股
-        adapter = HighDividendAdapter()
-        adapter_result = await adapter.screen_stocks(
-            market_cap=market_cap,
-            stock_pool=stock_pool,
-            limit=limit,
+        # 默认参数优先读取盘后预计算结果，无法命中时实时选股
+        adapter_result = await load_strategy_screen(
+            "dividend", market_cap, stock_pool, limit,
             dividend_yield_min=dividend_yield_min,
             payout_ratio_min=payout_ratio_min,
             dividend_fundraising_ratio_min=dividend_fundraising_ratio_min,
             net_cash_min=net_cash_min
         )
+        if adapter_result is None:
+            # 导入高股息策略适配器
+            from backtrader_strategies.strategy_adapters.high_dividend_adapter import HighDividendAdapter
+        
+            # 创建适配器实例并执行选股
+            adapter = HighDividendAdapter()
+            adapter_result = await adapter.screen_stocks(
+                market_cap=market_cap,
+                stock_pool=stock_pool,
+                limit=limit,
+                dividend_yield_min=dividend_yield_min,
+                payout_ratio_min=payout_ratio_min,
+                dividend_fundraising_ratio_min=dividend_fundraising_ratio_min,
+                net_cash_min=net_cash_min
+            )
         
         # 检查是否有错误
         if 'error' in adapter_result:
@@ -760,7 +803,7 @@ async def high_dividend_screening(
         raise HTTPException(status_code=500, detail=f"高股息策略筛选失败: {str(e)}")
 
 @router.post("/technical-breakthrough")
-@cache_endpoint(data_type="technical_breakthrough", ttl=300)
+@screening_cache("technical_breakthrough", user_params=SCREENING_USER_PARAMS, overlay=_stock_pool_overlay)
 async def technical_breakthrough_screening(
     market_cap: str = "all",
     stock_pool: str = "all",
@@ -771,25 +814,37 @@ async def technical_breakthrough_screening(
     macd_requirement: bool = False,   # 是否要求MACD金叉
     ma_alignment: bool = False,       # 是否要求均线多头排列
     bollinger_position: str = "upper", # 布林带位置
+    save_to_pool: bool = False,  # 是否把结果保存到当前用户的股票池
+    pool_name: Optional[str] = None,  # 股票池名称，默认按策略名生成
     current_user: dict = Depends(get_current_user)
 ) -> ScreeningResponse:
     """技术突破策略专门接口 - 使用策略适配器实现"""
     try:
-        # 导入技术突破策略适配器
-        from backtrader_strategies.strategy_adapters.technical_breakthrough_adapter import TechnicalBreakthroughAdapter
-        
-        # 创建适配器实例并执行选股
-        adapter = TechnicalBreakthroughAdapter()
-        adapter_result = await adapter.screen_stocks(
-            market_cap=market_cap,
-            stock_pool=stock_pool,
-            limit=limit,
+        # 默认参数优先读取盘后预计算结果，无法命中时实时选股
+        adapter_result = await load_strategy_screen(
+            "technical", market_cap, stock_pool, limit,
             rsi_min=rsi_min,
             rsi_max=rsi_max,
             volume_ratio_min=volume_ratio_min,
             require_macd_golden=macd_requirement,
             require_ma_alignment=ma_alignment
         )
+        if adapter_result is None:
+            # 导入技术突破策略适配器
+            from backtrader_strategies.strategy_adapters.technical_breakthrough_adapter import TechnicalBreakthroughAdapter
+        
+            # 创建适配器实例并执行选股
+            adapter = TechnicalBreakthroughAdapter()
+            adapter_result = await adapter.screen_stocks(
+                market_cap=market_cap,
+                stock_pool=stock_pool,
+                limit=limit,
+                rsi_min=rsi_min,
+                rsi_max=rsi_max,
+                volume_ratio_min=volume_ratio_min,
+                require_macd_golden=macd_requirement,
+                require_ma_alignment=ma_alignment
+            )
         
         # 检查是否有错误
         if 'error' in adapter_result:
@@ -837,25 +892,30 @@ async def technical_breakthrough_screening(
 
 
 @router.post("/oversold-rebound")
-@cache_endpoint(data_type="oversold_rebound", ttl=300)
+@screening_cache("oversold_rebound", user_params=SCREENING_USER_PARAMS, overlay=_stock_pool_overlay)
 async def oversold_rebound_screening(
     market_cap: str = "all",
     stock_pool: str = "all",
     limit: int = 20,
+    save_to_pool: bool = False,  # 是否把结果保存到当前用户的股票池
+    pool_name: Optional[str] = None,  # 股票池名称，默认按策略名生成
     current_user: dict = Depends(get_current_user)
 ) -> ScreeningResponse:
     """超跌反弹策略专门接口 - 使用策略适配器实现"""
     try:
-        # 导入超跌反弹策略适配器
-        from backtrader_strategies.strategy_adapters.oversold_rebound_adapter_simple import OversoldReboundAdapter
-        
-        # 创建适配器实例并执行选股
-        adapter = OversoldReboundAdapter()
-        adapter_result = await adapter.screen_stocks(
-            market_cap=market_cap,
-            stock_pool=stock_pool,
-            limit=limit
-        )
+        # 默认参数优先读取盘后预计算结果，无法命中时实时选股
+        adapter_result = await load_strategy_screen("oversold", market_cap, stock_pool, limit)
+        if adapter_result is None:
+            # 导入超跌反弹策略适配器
+            from backtrader_strategies.strategy_adapters.oversold_rebound_adapter_simple import OversoldReboundAdapter
+        
+            # 创建适配器实例并执行选股
+            adapter = OversoldReboundAdapter()
+            adapter_result = await adapter.screen_stocks(
+                market_cap=market_cap,
+                stock_pool=stock_pool,
+                limit=limit
+            )
         
         # 检查是否有错误
         if 'error' in adapter_result:
@@ -900,25 +960,30 @@ async def oversold_rebound_screening(
 
 
 @router.post("/limit-up-leader")
-@cache_endpoint(data_type="limit_up_leader", ttl=300)
+@screening_cache("limit_up_leader", user_params=SCREENING_USER_PARAMS, overlay=_stock_pool_overlay)
 async def limit_up_leader_screening(
     market_cap: str = "all",
     stock_pool: str = "all",
     limit: int = 20,
+    save_to_pool: bool = False,  # 是否把结果保存到当前用户的股票池
+    pool_name: Optional[str] = None,  # 股票池名称，默认按策略名生成
     current_user: dict = Depends(get_current_user)
 ) -> ScreeningResponse:
     """连板龙头策略专门接口 - 使用策略适配器实现"""
     try:
-        # 导入连板龙头策略适配器
-        from backtrader_strategies.strategy_adapters.limit_up_leader_adapter_simple import LimitUpLeaderAdapter
-        
-        # 创建适配器实例并执行选股
-        adapter = LimitUpLeaderAdapter()
-        adapter_result = await adapter.screen_stocks(
-            market_cap=market_cap,
-            stock_pool=stock_pool,
-            limit=limit
-        )
+        # 默认参数优先读取盘后预计算结果，无法命中时实时选股
+        adapter_result = await load_strategy_screen("limit_up", market_cap, stock_pool, limit)
+        if adapter_result is None:
+            # 导入连板龙头策略适配器
+            from backtrader_strategies.strategy_adapters.limit_up_leader_adapter_simple import LimitUpLeaderAdapter
+        
+            # 创建适配器实例并执行选股
+            adapter = LimitUpLeaderAdapter()
+            adapter_result = await adapter.screen_stocks(
+                market_cap=market_cap,
+                stock_pool=stock_pool,
+                limit=limit
+            )
         
         # 检查是否有错误
         if 'error' in adapter_result:
@@ -965,29 +1030,38 @@ async def limit_up_leader_screening(
 
 
 @router.post("/fund-flow-tracking")
-@cache_endpoint(data_type="fund_flow_tracking", ttl=300)
+@screening_cache("fund_flow_tracking", user_params=SCREENING_USER_PARAMS, overlay=_stock_pool_overlay)
 async def fund_flow_tracking_screening(
     market_cap: str = "all",
     stock_pool: str = "all",
     limit: int = 20,
     margin_buy_trend_min: float = 50.0,
     margin_balance_growth_min: float = 50.0,
+    save_to_pool: bool = False,  # 是否把结果保存到当前用户的股票池
+    pool_name: Optional[str] = None,  # 股票池名称，默认按策略名生成
     current_user: dict = Depends(get_current_user)
 ) -> ScreeningResponse:
     """资金追踪策略专门接口 - 使用策略适配器实现，基于融资融券数据"""
     try:
-        # 导入资金追踪策略适配器
-        from backtrader_strategies.strategy_adapters.fund_flow_tracking_adapter import FundFlowTrackingAdapter
-        
-        # 创建适配器实例并执行选股
-        adapter = FundFlowTrackingAdapter()
-        adapter_result = await adapter.screen_stocks(
-            market_cap=market_cap,
-            stock_pool=stock_pool,
-            limit=limit,
+        # 默认参数优先读取盘后预计算结果，无法命中时实时选股
+        adapter_result = await load_strategy_screen(
+            "fund_flow", market_cap, stock_pool, limit,
             margin_buy_trend_min=margin_buy_trend_min,
             margin_balance_growth_min=margin_balance_growth_min
         )
+        if adapter_result is None:
+            # 导入资金追踪策略适配器
+            from backtrader_strategies.strategy_adapters.fund_flow_tracking_adapter import FundFlowTrackingAdapter
+        
+            # 创建适配器实例并执行选股
+            adapter = FundFlowTrackingAdapter()
+            adapter_result = await adapter.screen_stocks(
+                market_cap=market_cap,
+                stock_pool=stock_pool,
+                limit=limit,
+                margin_buy_trend_min=margin_buy_trend_min,
+                margin_balance_growth_min=margin_balance_growth_min
+            )
         
         # 检查是否有错误
         if 'error' in adapter_result:
@@ -1095,7 +1169,14 @@ async def apply_strategy_template(
         logger.info(f"   - limit: {limit}")
         
         # 调用对应的策略函数
-        result = await strategy_func(market_cap, stock_pool, limit, current_user)
+        result = await strategy_func(
+            market_cap=market_cap,
+            stock_pool=stock_pool,
+            limit=limit,
+            save_to_pool=bool((additional_params or {}).get("save_to_pool", False)),
+            pool_name=(additional_params or {}).get("pool_name"),
+            current_user=current_user
+        )
         
         logger.info(f"🎉 [模板应用] 策略函数执行完成:")
         logger.info(f"   - 返回类型: {type(result)}")
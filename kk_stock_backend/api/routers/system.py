@@ -5,7 +5,8 @@
 支持健康检查、性能监控等功能
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from typing import Dict, Any
 from datetime import datetime
 import time
@@ -16,6 +17,15 @@ from api.cache_middleware import cache_endpoint
 import sys
 import os
 from api.global_db import db_handler
+from api.async_db_handler import run_sync
+from api.middleware.metrics import metrics_registry, summarize_routes, render_prometheus
+from api.utils.mongo_monitoring import (
+    command_metrics_listener, query_insights, capture_explains,
+    EXPLAIN_COLLECTION, SLOW_QUERY_MS, N_PLUS_ONE_THRESHOLD
+)
+from api.utils.index_registry import ensure_indexes, collscan_report, set_profiling
+from api.router_loader import router_loader
+from api.routers.user import require_roles
 
 # 添加项目根目录到sys.path以便导入数据库管理器
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -65,26 +75,42 @@ async def health_check():
             }
         }
 
-@cache_endpoint(data_type='system_metrics', ttl=600)  # 缓存10分钟
 @router.get("/metrics")
-async def get_system_metrics():
+async def get_system_metrics(
+    format: str = Query("json", description="输出格式: json 或 prometheus")
+):
     """
     获取系统性能指标
+    按路由的延迟分位数(p50/p95/p99)、在途请求数、响应体大小与Mongo开销，跨worker汇总
     """
     try:
-        # 获取数据库统计
+        aggregated, in_flight, source = await run_sync(metrics_registry.collect)
+        
+        if format == "prometheus":
+            return PlainTextResponse(
+                render_prometheus(aggregated, in_flight),
+                media_type="text/plain; version=0.0.4"
+            )
+        
+        # 集合规模使用元数据估算，避免全表计数
         stats = {}
         for collection_name in ['stock_basic', 'daily', 'weekly', 'monthly']:
             try:
                 collection = db_handler.get_collection(collection_name)
-                count = collection.count_documents({})
-                stats[collection_name] = count
-            except:
+                stats[collection_name] = collection.estimated_document_count()
+            except Exception:
                 stats[collection_name] = 0
         
         return {
             "success": True,
             "data": {
+                "routes": summarize_routes(aggregated),
+                "in_flight": {
+                    "total": sum(in_flight.values()),
+                    "by_worker": in_flight
+                },
+                "mongo_commands": command_metrics_listener.get_stats(),
+                "source": source,
                 "database_stats": stats,
                 "timestamp": datetime.now().isoformat()
             }
@@ -93,6 +119,198 @@ async def get_system_metrics():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取系统指标失败: {str(e)}")
 
+@router.delete("/metrics", dependencies=[Depends(require_roles(["super_admin", "admin"]))])
+async def reset_system_metrics():
+    """
+    清空接口性能指标
+    """
+    try:
+        await run_sync(metrics_registry.reset)
+        return {"success": True, "message": "接口性能指标已清空"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"清空系统指标失败: {str(e)}")
+
+@router.get("/startup")
+async def get_startup_profile():
+    """
+    启动耗时报告：各启动阶段耗时、各路由模块导入耗时及其引入的重量级库（本worker）
+    """
+    return {
+        "success": True,
+        "data": {
+            "worker": os.getpid(),
+            **router_loader.profile(),
+            "timestamp": datetime.now().isoformat()
+        }
+    }
+
+def _index_db():
+    """索引管理使用的数据库（本地优先）"""
+    db = db_handler.local_db if db_handler.local_available else db_handler.cloud_db
+    if db is None:
+        raise HTTPException(status_code=503, detail="数据库不可用")
+    return db
+
+@router.get("/indexes")
+async def get_index_status():
+    """
+    校验索引注册表中声明的索引是否存在（不创建）
+    """
+    try:
+        report = await run_sync(ensure_indexes, _index_db(), False)
+        return {
+            "success": True,
+            "data": {
+                "summary": {status: len(items) for status, items in report.items()},
+                **report
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"校验索引失败: {str(e)}")
+
+@router.post("/indexes/ensure", dependencies=[Depends(require_roles(["super_admin", "admin"]))])
+async def ensure_registered_indexes():
+    """
+    创建索引注册表中缺失的索引
+    """
+    try:
+        report = await run_sync(ensure_indexes, _index_db(), True)
+        return {
+            "success": not report["failed"],
+            "data": {
+                "summary": {status: len(items) for status, items in report.items()},
+                **report
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"创建索引失败: {str(e)}")
+
+@router.post("/indexes/profiler", dependencies=[Depends(require_roles(["super_admin", "admin"]))])
+async def set_index_profiler(
+    level: int = Query(1, ge=0, le=1, description="profiler级别（1: 记录慢操作，0: 关闭）"),
+    slowms: int = Query(100, ge=0, description="profiler慢操作阈值（毫秒）")
+):
+    """
+    开启或关闭数据库profiler（全表扫描报告的数据来源）
+    """
+    try:
+        profiler = await run_sync(set_profiling, _index_db(), level, slowms)
+        return {"success": True, "data": profiler}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"设置profiler失败: {str(e)}")
+
+@router.get("/indexes/collscans")
+async def get_collscan_report(
+    limit: int = Query(50, ge=1, le=500, description="返回条数")
+):
+    """
+    从数据库profiler中汇总全表扫描的查询形状（需先通过 POST /indexes/profiler 开启profiler）
+    """
+    try:
+        rows = await run_sync(collscan_report, _index_db(), limit)
+        return {"success": True, "data": {"collscans": rows}}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取全表扫描报告失败: {str(e)}")
+
+@router.get("/queries/report")
+async def get_query_report(
+    limit: int = Query(20, ge=1, le=200, description="每类返回条数")
+):
+    """
+    慢查询与N+1报告
+    慢查询按过滤条件形状聚合（取值替换为占位符），N+1为同一请求/任务内重复执行同形状查询
+    """
+    try:
+        report = await run_sync(query_insights.report, limit)
+        return {
+            "success": True,
+            "data": {
+                "slow_query_threshold_ms": SLOW_QUERY_MS,
+                "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+                **report,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取查询报告失败: {str(e)}")
+
+@router.post("/queries/explain", dependencies=[Depends(require_roles(["super_admin", "admin"]))])
+async def capture_query_explains(
+    top: int = Query(5, ge=1, le=50, description="处理累计耗时最高的形状数量")
+):
+    """
+    对本进程记录的最慢查询形状执行explain，执行计划保存到本地集合 system_query_explains
+    """
+    try:
+        if not db_handler.local_available:
+            raise HTTPException(status_code=503, detail="本地数据库不可用")
+        captured = await run_sync(capture_explains, db_handler.local_db, top)
+        return {"success": True, "data": {"count": len(captured), "explains": captured}}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"采集执行计划失败: {str(e)}")
+
+@router.get("/queries/explains")
+async def get_query_explains(
+    collscan_only: bool = Query(False, description="只返回全表扫描的计划")
+):
+    """
+    查看已保存的执行计划摘要
+    """
+    try:
+        collection = db_handler.get_local_collection(EXPLAIN_COLLECTION)
+        if collection is None:
+            raise HTTPException(status_code=503, detail="本地数据库不可用")
+        query = {"collscan": True} if collscan_only else {}
+        docs = await run_sync(
+            lambda: list(collection.find(query, {"_id": 0, "raw_plan": 0}).sort("sample_duration_ms", -1))
+        )
+        for doc in docs:
+            if isinstance(doc.get("captured_at"), datetime):
+                doc["captured_at"] = doc["captured_at"].isoformat()
+        return {"success": True, "data": docs}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取执行计划失败: {str(e)}")
+
+@router.delete("/queries/report", dependencies=[Depends(require_roles(["super_admin", "admin"]))])
+async def reset_query_report():
+    """
+    清空慢查询与N+1记录
+    """
+    try:
+        await run_sync(query_insights.reset)
+        return {"success": True, "message": "查询记录已清空"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"清空查询记录失败: {str(e)}")
+
+@router.get("/market-data/cache")
+async def get_market_data_cache_stats():
+    """
+    查看进程级行情数据仓库的缓存命中与占用（仅当前worker）
+    """
+    from api.market_data_store import get_market_data_store
+    return {"success": True, "data": get_market_data_store().stats()}
+
+@router.delete("/market-data/cache")
+async def clear_market_data_cache():
+    """
+    清空当前worker的行情数据仓库缓存
+    """
+    from api.market_data_store import get_market_data_store
+    get_market_data_store().clear()
+    return {"success": True, "message": "行情缓存已清空"}
+
 @cache_endpoint(data_type='system_status', ttl=300)  # 缓存5分钟
 @router.get("/status")
 async def get_system_status():
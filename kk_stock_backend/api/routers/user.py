@@ -33,6 +33,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # 导入模拟交易相关模块
 from api.simulation.init import init_simulation_account_for_user
 from api.global_db import db_handler
+from api.utils.principal_cache import principal_cache
 
 # 密码加密上下文
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -174,13 +175,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def load_active_user(user_id: str) -> Optional[dict]:
+    """按user_id获取启用状态的用户，优先命中认证主体缓存"""
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+    user = users_col.find_one({"user_id": user_id, "status": 1})
+    if not user:
+        return None
+    return principal_cache.set(user_id, user)
+
 def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Token无效")
-        user = users_col.find_one({"user_id": user_id, "status": 1})
+        user = load_active_user(user_id)
         if not user:
             raise HTTPException(status_code=401, detail="用户不存在或已禁用")
         return user
@@ -406,6 +417,7 @@ async def login_wechat(req: WechatLoginRequest):
     if not user:
         raise HTTPException(status_code=401, detail="未授权用户，请联系管理员")
     users_col.update_one({"_id": user["_id"]}, {"$inc": {"login_count": 1}, "$set": {"last_login": get_beijing_time()}})
+    principal_cache.invalidate(user["user_id"])
     token = create_access_token({"user_id": user["user_id"], "roles": user["roles"]})
     return {"access_token": token}
 
@@ -509,6 +521,7 @@ async def login_user(req: UserLoginRequest):
             "$set": {"last_login": get_beijing_time()}
         }
     )
+    principal_cache.invalidate(user["user_id"])
     
     # 生成token
     token = create_access_token({"user_id": user["user_id"], "roles": user["roles"]})
@@ -695,6 +708,7 @@ async def update_user_info(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="用户不存在")
+        principal_cache.invalidate(current_user["user_id"])
         
         # 获取更新后的用户信息
         updated_user = users_col.find_one({"user_id": current_user["user_id"]})
@@ -735,7 +749,7 @@ def record_module_call(module_name: str):
     def decorator(func):
         async def wrapper(*args, user=Depends(get_current_user), **kwargs):
             users_col.update_one(
-                {"_id": user["_id"]},
+                {"user_id": user["user_id"]},
                 {"$inc": {"module_call_count": 1, f"module_call_detail.{module_name}": 1}}
             )
             return await func(*args, user=user, **kwargs)
@@ -795,6 +809,7 @@ async def update_user_status(user_id: str, status: int, current_user: dict = Dep
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="用户不存在")
+    principal_cache.invalidate(user_id)
     
     return {"success": True, "message": f"用户状态已更新为{'启用' if status == 1 else '禁用'}"}
 
@@ -871,6 +886,7 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
         
         # 7. 最后删除用户记录
         result = users_col.delete_one({"user_id": user_id})
+        principal_cache.invalidate(user_id)
         
         return {
             "success": True, 
@@ -1014,6 +1030,7 @@ async def update_user_roles(user_id: str, roles: List[str], current_user: dict =
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="用户不存在")
+    principal_cache.invalidate(user_id)
     
     return {"success": True, "message": "用户角色已更新"}
 
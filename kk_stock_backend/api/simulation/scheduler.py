@@ -14,6 +14,7 @@ from apscheduler.triggers.cron import CronTrigger
 from .service import simulation_service
 from .database import simulation_db
 from api.db_handler import get_db_handler
+from api.utils.mongo_monitoring import track_operations
 
 
 logger = logging.getLogger(__name__)
@@ -131,6 +132,7 @@ class SimulationScheduler:
         
         logger.info("定时任务已添加完成")
     
+    @track_operations("simulation:process_daily_settlement")
     async def process_daily_settlement(self):
         """处理每日T+1交割"""
         try:
@@ -144,6 +146,7 @@ class SimulationScheduler:
         except Exception as e:
             logger.error(f"T+1交割处理失败: {e}")
     
+    @track_operations("simulation:create_daily_snapshots")
     async def create_daily_snapshots(self):
         """创建每日账户快照"""
         try:
@@ -167,6 +170,7 @@ class SimulationScheduler:
         except Exception as e:
             logger.error(f"创建每日快照失败: {e}")
     
+    @track_operations("simulation:update_position_prices")
     async def update_position_prices(self):
         """更新持仓价格"""
         try:
@@ -258,6 +262,7 @@ class SimulationScheduler:
             fallback_previous = current_date - timedelta(days=2)
             return fallback_latest, fallback_previous
 
+    @track_operations("simulation:update_daily_returns")
     async def update_daily_returns(self):
         """更新每日收益 - 基于持仓股价变化计算"""
         try:
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可断点续传的增量同步引擎
+把源库（本地）集合增量复制到目标库（云端），供 DBHandler.manual_sync_to_cloud 使用。
+
+- 水位：时间序列集合按日期字段（trade_date 等）逐日推进，其余集合按 _id 区间推进；
+  每完成一个日期/批次就把水位写入源库的 sync_watermarks 集合，失败后从水位处继续。
+- 幂等写入：按集合的唯一索引键（没有则按 _id）ReplaceOne upsert，重复同步不会产生重复数据。
+- 多个集合并发同步。
+- 可选 change stream 持续跟随（需要副本集，见 database/docker-compose.replica.yml），
+  resume token 同样保存在水位中。
+
+命令行（可用两个本地mongod验证）:
+    python -m api.sync_engine --source mongodb://127.0.0.1:27017 --target mongodb://127.0.0.1:27018 \
+        --db quant_analysis --collections stock_kline_daily,stock_basic [--follow]
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DeleteOne, MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_COLLECTION = "sync_watermarks"
+# 按日期推进时尝试的日期字段（按顺序）
+DATE_FIELDS = ['trade_date', 'cal_date', 'ann_date', 'pub_date', 'end_date']
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", 1000))
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", 4))
+# 不参与同步的集合
+# （upsert_content_hashes 为 DBHandler.stream_upsert 的本地写入哈希，只对本地库有意义）
+EXCLUDED_COLLECTIONS = {WATERMARK_COLLECTION, "upsert_content_hashes", "system.profile", "system.views"}
+
+
+class SyncEngine:
+    """源库 → 目标库 的增量同步"""
+
+    def __init__(self, source_db, target_db, target_name: str = "cloud",
+                 batch_size: int = SYNC_BATCH_SIZE, concurrency: int = SYNC_CONCURRENCY):
+        """
+        Args:
+            source_db: 源库 pymongo Database（水位保存在源库）
+            target_db: 目标库 pymongo Database
+            target_name: 目标标识，同一源库可以同步到多个目标，各自维护水位
+            batch_size: 每次写入的文档数
+            concurrency: 并发同步的集合数
+        """
+        self.source_db = source_db
+        self.target_db = target_db
+        self.target_name = target_name
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.watermarks = source_db[WATERMARK_COLLECTION]
+
+    # ==================== 水位 ====================
+
+    def _watermark_id(self, collection_name: str) -> str:
+        return f"{self.target_name}:{collection_name}"
+
+    def get_watermark(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        return self.watermarks.find_one({"_id": self._watermark_id(collection_name)})
+
+    def _save_watermark(self, collection_name: str, **fields) -> None:
+        fields["updated_at"] = datetime.now()
+        self.watermarks.update_one(
+            {"_id": self._watermark_id(collection_name)},
+            {"$set": {"collection": collection_name, "target": self.target_name, **fields}},
+            upsert=True
+        )
+
+    def reset_watermark(self, collection_name: str) -> None:
+        """清除水位，下次同步从头开始"""
+        self.watermarks.delete_one({"_id": self._watermark_id(collection_name)})
+
+    def list_watermarks(self) -> List[Dict[str, Any]]:
+        return list(self.watermarks.find({"target": self.target_name}))
+
+    # ==================== 同步策略 ====================
+
+    def _detect_date_field(self, collection) -> Optional[str]:
+        for field in DATE_FIELDS:
+            if collection.find_one({field: {"$exists": True}}, {"_id": 1}):
+                return field
+        return None
+
+    def _detect_key_fields(self, collection) -> List[str]:
+        """写入目标库时的匹配键：源集合的唯一索引键，没有则用 _id"""
+        for name, info in collection.index_information().items():
+            if name != "_id_" and info.get("unique"):
+                return [field for field, _ in info["key"]]
+        return ["_id"]
+
+    def _write_batch(self, target, docs: List[Dict[str, Any]], key_fields: List[str]) -> Tuple[int, int]:
+        """幂等写入一批文档，返回 (写入数, 错误数)"""
+        if not docs:
+            return 0, 0
+        operations = []
+        for doc in docs:
+            if key_fields == ["_id"]:
+                operations.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+            else:
+                # 按业务键匹配时不复制_id，避免与目标库中已有文档的_id冲突
+                replacement = {key: value for key, value in doc.items() if key != "_id"}
+                operations.append(ReplaceOne({field: doc.get(field) for field in key_fields}, replacement, upsert=True))
+        try:
+            result = target.bulk_write(operations, ordered=False)
+            return result.upserted_count + result.matched_count, 0
+        except BulkWriteError as bwe:
+            errors = len(bwe.details.get("writeErrors", []))
+            logger.warning(f"批次同步部分失败: {errors} 个错误")
+            return len(docs) - errors, errors
+
+    def _sync_by_date(self, name: str, date_field: str, key_fields: List[str],
+                      start_date: Optional[str], end_date: Optional[str], resume: bool) -> Dict[str, Any]:
+        """按日期逐日同步，每完成一日推进水位（从水位日期本身开始，覆盖写入中途的部分数据）"""
+        source, target = self.source_db[name], self.target_db[name]
+        watermark = self.get_watermark(name) if resume else None
+        lower = start_date
+        if watermark and watermark.get("mode") == "date" and not start_date:
+            lower = watermark.get("value")
+
+        date_filter: Dict[str, Any] = {}
+        if lower:
+            date_filter["$gte"] = lower
+        if end_date:
+            date_filter["$lte"] = end_date
+        dates = sorted(source.distinct(date_field, {date_field: date_filter} if date_filter else {}))
+
+        # 起始日期晚于已有水位（或尚无水位）时，中间的日期没有同步过，水位不能越过它们
+        stored = watermark if resume else self.get_watermark(name)
+        stored_value = stored.get("value") if stored and stored.get("mode") == "date" else None
+        can_advance = not start_date or (stored_value is not None and str(start_date) <= str(stored_value))
+
+        synced = errors = 0
+        # 某日有写入失败后水位不再前进，续传时从失败的日期重新同步
+        watermark_blocked = False
+        for date_value in dates:
+            date_written = date_failed = 0
+            batch = []
+            for doc in source.find({date_field: date_value}).sort("_id", ASCENDING):
+                batch.append(doc)
+                if len(batch) >= self.batch_size:
+                    written, failed = self._write_batch(target, batch, key_fields)
+                    date_written, date_failed, batch = date_written + written, date_failed + failed, []
+            written, failed = self._write_batch(target, batch, key_fields)
+            date_written, date_failed = date_written + written, date_failed + failed
+            synced, errors = synced + date_written, errors + date_failed
+            if date_failed:
+                if not watermark_blocked:
+                    logger.warning(f"集合 {name} 日期 {date_value} 有 {date_failed} 条写入失败，水位停留在该日期之前")
+                watermark_blocked = True
+            if watermark_blocked or not can_advance:
+                continue
+            # 只在水位前进时更新（指定历史区间补同步不会回退水位）
+            current = self.get_watermark(name)
+            if not current or current.get("mode") != "date" or str(current.get("value") or "") <= str(date_value):
+                self._save_watermark(name, mode="date", field=date_field, value=date_value,
+                                     status="running", synced=(current or {}).get("synced", 0) + date_written)
+        return {"mode": "date", "field": date_field, "dates": len(dates), "synced": synced, "errors": errors}
+
+    def _sync_by_id(self, name: str, key_fields: List[str], resume: bool) -> Dict[str, Any]:
+        """按 _id 区间递增同步（只能发现新增文档，更新需依赖 change stream 或日期水位）"""
+        source, target = self.source_db[name], self.target_db[name]
+        watermark = self.get_watermark(name) if resume else None
+        last_id = watermark.get("value") if watermark and watermark.get("mode") == "id" else None
+
+        synced = errors = 0
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = list(source.find(query).sort("_id", ASCENDING).limit(self.batch_size))
+            if not batch:
+                break
+            written, failed = self._write_batch(target, batch, key_fields)
+            synced, errors = synced + written, errors + failed
+            if failed:
+                # 水位不越过失败的批次，续传时从该批次重新同步
+                logger.warning(f"集合 {name} 批次写入失败 {failed} 条，停止推进_id水位")
+                break
+            last_id = batch[-1]["_id"]
+            self._save_watermark(name, mode="id", field="_id", value=last_id, status="running",
+                                 synced=(watermark or {}).get("synced", 0) + synced)
+        return {"mode": "id", "field": "_id", "synced": synced, "errors": errors}
+
+    def sync_collection(self, name: str, start_date: Optional[str] = None,
+                        end_date: Optional[str] = None, resume: bool = True) -> Dict[str, Any]:
+        """同步单个集合"""
+        started = time.perf_counter()
+        source = self.source_db[name]
+        date_field = self._detect_date_field(source)
+        key_fields = self._detect_key_fields(source)
+        self._save_watermark(name, status="running", started_at=datetime.now(), error=None)
+        print(f"🔄 开始同步集合: {name} ({'日期字段 ' + date_field if date_field else '_id区间'}, 匹配键 {key_fields})")
+        try:
+            if date_field:
+                result = self._sync_by_date(name, date_field, key_fields, start_date, end_date, resume)
+            else:
+                result = self._sync_by_id(name, key_fields, resume)
+        except Exception as e:
+            self._save_watermark(name, status="failed", error=str(e))
+            logger.error(f"同步集合 {name} 失败: {e}")
+            print(f"   ❌ 集合 {name} 同步失败（已保存水位，可续传）: {e}")
+            return {"collection": name, "success": False, "error": str(e)}
+
+        result.update({
+            "collection": name,
+            "success": result["errors"] == 0,
+            "seconds": round(time.perf_counter() - started, 2)
+        })
+        if result["errors"]:
+            # 部分写入失败：水位停在首个失败的日期/批次之前，续传会重新同步
+            self._save_watermark(name, status="partial", error=f"{result['errors']} 条写入失败")
+            print(f"   ⚠️ 集合 {name} 部分同步: {result['synced']:,} 条成功，{result['errors']:,} 条失败（可续传）")
+            return result
+        self._save_watermark(name, status="completed", completed_at=datetime.now())
+        print(f"   ✅ 集合 {name} 同步完成: {result['synced']:,} 条，用时 {result['seconds']}s")
+        return result
+
+    def sync(self, collection_names: Optional[Iterable[str]] = None, start_date: Optional[str] = None,
+             end_date: Optional[str] = None, resume: bool = True) -> Dict[str, Any]:
+        """
+        并发同步多个集合
+
+        Args:
+            collection_names: 集合列表，None为源库全部集合
+            start_date / end_date: 日期区间（YYYYMMDD），只作用于有日期字段的集合
+            resume: 是否从已保存的水位继续
+
+        Returns:
+            {"success": bool, "collections": {name: 结果}}
+        """
+        if collection_names is None:
+            collection_names = self.source_db.list_collection_names()
+        names = [name for name in collection_names if name not in EXCLUDED_COLLECTIONS]
+        print(f"📋 {len(names)} 个集合待同步，并发 {self.concurrency}")
+
+        results: Dict[str, Any] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sync") as executor:
+            futures = {
+                executor.submit(self.sync_collection, name, start_date, end_date, resume): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = {"collection": name, "success": False, "error": str(e)}
+
+        success_count = sum(1 for result in results.values() if result.get("success"))
+        print(f"\n📊 同步完成: {success_count}/{len(names)} 个集合同步成功")
+        return {"success": success_count == len(names), "collections": results}
+
+    # ==================== change stream 跟随 ====================
+
+    def follow(self, collection_names: Optional[Iterable[str]] = None,
+               stop_event: Optional[threading.Event] = None, max_await_ms: int = 1000) -> None:
+        """
+        通过 change stream 持续把源库变更应用到目标库（源库需为副本集）
+
+        resume token 保存在源库水位集合中，重启后从上次位置继续。
+        按业务键同步的集合无法仅凭 _id 定位目标文档，删除事件会被跳过。
+        """
+        stop_event = stop_event or threading.Event()
+        names = set(collection_names) if collection_names else None
+        token_doc = self.watermarks.find_one({"_id": f"{self.target_name}:__change_stream__"}) or {}
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        if names:
+            pipeline[0]["$match"]["ns.coll"] = {"$in": sorted(names)}
+
+        key_cache: Dict[str, List[str]] = {}
+        print(f"👂 开始跟随变更流 → {self.target_name}")
+        with self.source_db.watch(pipeline, full_document="updateLookup",
+                                  resume_after=token_doc.get("resume_token"),
+                                  max_await_time_ms=max_await_ms) as stream:
+            while not stop_event.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    continue
+                name = change["ns"]["coll"]
+                if name in EXCLUDED_COLLECTIONS:
+                    continue
+                if name not in key_cache:
+                    key_cache[name] = self._detect_key_fields(self.source_db[name])
+                key_fields = key_cache[name]
+                target = self.target_db[name]
+                try:
+                    if change["operationType"] == "delete":
+                        if key_fields == ["_id"]:
+                            target.bulk_write([DeleteOne({"_id": change["documentKey"]["_id"]})])
+                    elif change.get("fullDocument") is not None:
+                        self._write_batch(target, [change["fullDocument"]], key_fields)
+                except PyMongoError as e:
+                    logger.error(f"应用变更失败 {name}: {e}")
+                    continue
+                self.watermarks.update_one(
+                    {"_id": f"{self.target_name}:__change_stream__"},
+                    {"$set": {"resume_token": stream.resume_token, "target": self.target_name,
+                              "collection": "__change_stream__", "updated_at": datetime.now()}},
+                    upsert=True
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="增量同步两个MongoDB库")
+    parser.add_argument("--source", required=True, help="源库URI")
+    parser.add_argument("--target", required=True, help="目标库URI")
+    parser.add_argument("--db", default=os.getenv("DB_NAME", "quant_analysis"), help="数据库名")
+    parser.add_argument("--target-name", default="cloud", help="目标标识（水位按目标区分）")
+    parser.add_argument("--collections", default="", help="逗号分隔的集合名，默认全部")
+    parser.add_argument("--start-date", default=None)
+    parser.add_argument("--end-date", default=None)
+    parser.add_argument("--concurrency", type=int, default=SYNC_CONCURRENCY)
+    parser.add_argument("--no-resume", action="store_true", help="忽略已保存的水位")
+    parser.add_argument("--follow", action="store_true", help="同步完成后持续跟随变更流")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    source_db = MongoClient(args.source)[args.db]
+    target_db = MongoClient(args.target)[args.db]
+    engine = SyncEngine(source_db, target_db, target_name=args.target_name, concurrency=args.concurrency)
+    collections = [name for name in args.collections.split(",") if name] or None
+    engine.sync(collections, args.start_date, args.end_date, resume=not args.no_resume)
+    if args.follow:
+        try:
+            engine.follow(collections)
+        except KeyboardInterrupt:
+            print("🛑 已停止跟随")
+
+
+if __name__ == "__main__":
+    main()
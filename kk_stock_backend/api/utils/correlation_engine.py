@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化相关性计算引擎
+把多只股票的行情文档透视为 日期×股票 矩阵，用NumPy一次性计算完整相关系数矩阵。
+缺失值按"成对完整观测"处理：每一对股票只使用两者都有数据的交易日。
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 计算相关系数所需的最少共同数据点
+DEFAULT_MIN_PERIODS = 5
+
+
+def build_panel(docs: Iterable[Dict], codes: List[str], field: str) -> Tuple[List[str], np.ndarray]:
+    """
+    将行情文档透视为 日期×股票 矩阵
+
+    Args:
+        docs: 含 ts_code、trade_date 与 field 的文档
+        codes: 股票代码顺序（矩阵列顺序）
+        field: 取值字段
+
+    Returns:
+        (升序日期列表, 形状为 (日期数, 股票数) 的矩阵，缺失为NaN)
+    """
+    col_index = {code: i for i, code in enumerate(codes)}
+    cells = []
+    dates = set()
+    for doc in docs:
+        col = col_index.get(doc.get("ts_code"))
+        value = doc.get(field)
+        if col is None or value is None:
+            continue
+        trade_date = doc["trade_date"]
+        dates.add(trade_date)
+        cells.append((trade_date, col, value))
+
+    sorted_dates = sorted(dates)
+    row_index = {trade_date: i for i, trade_date in enumerate(sorted_dates)}
+    matrix = np.full((len(sorted_dates), len(codes)), np.nan, dtype=float)
+    if cells:
+        rows = np.fromiter((row_index[c[0]] for c in cells), dtype=np.int64, count=len(cells))
+        cols = np.fromiter((c[1] for c in cells), dtype=np.int64, count=len(cells))
+        values = np.fromiter((c[2] for c in cells), dtype=float, count=len(cells))
+        matrix[rows, cols] = values
+    return sorted_dates, matrix
+
+
+def _average_ranks(values: np.ndarray) -> np.ndarray:
+    """一维无缺失数组的平均秩（并列取平均），从1开始"""
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(values.size, dtype=float)
+    ranks[order] = np.arange(1, values.size + 1, dtype=float)
+    # 并列值取平均秩
+    uniques, inverse = np.unique(values, return_inverse=True)
+    if uniques.size < values.size:
+        sums = np.bincount(inverse, weights=ranks)
+        counts = np.bincount(inverse)
+        ranks = (sums / counts)[inverse]
+    return ranks
+
+
+def rank_columns(matrix: np.ndarray) -> np.ndarray:
+    """
+    按列计算平均秩（并列取平均），NaN保持为NaN
+
+    每列只在自身有效值上排名；两列缺失位置不同时，这组秩不等于共同样本上的秩，
+    pairwise_correlation 会对这类股票对在共同样本上重新排名。
+    """
+    ranked = np.full(matrix.shape, np.nan, dtype=float)
+    for col in range(matrix.shape[1]):
+        column = matrix[:, col]
+        valid = ~np.isnan(column)
+        if valid.any():
+            ranked[valid, col] = _average_ranks(column[valid])
+    return ranked
+
+
+def _pearson_pairwise(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """成对完整观测的Pearson相关系数与共同样本数（未做裁剪和最少样本过滤）"""
+    mask = (~np.isnan(matrix)).astype(float)
+    x = np.where(mask > 0, matrix, 0.0)
+
+    n = mask.T @ mask                 # 共同样本数
+    sum_x = x.T @ mask                # [i, j]: 共同样本上 i 的和
+    sum_x2 = (x * x).T @ mask         # [i, j]: 共同样本上 i 的平方和
+    sum_xy = x.T @ x                  # [i, j]: 共同样本上 i*j 的和
+    sum_y = sum_x.T
+    sum_y2 = sum_x2.T
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        numerator = n * sum_xy - sum_x * sum_y
+        denominator = np.sqrt((n * sum_x2 - sum_x * sum_x) * (n * sum_y2 - sum_y * sum_y))
+        corr = numerator / denominator
+    return corr, n
+
+
+def _rerank_partial_pairs(matrix: np.ndarray, corr: np.ndarray, n: np.ndarray, min_periods: int) -> None:
+    """
+    Spearman：对缺失位置不同的股票对，在共同样本上重新排名后计算相关系数（原地修改 corr）
+
+    两列的有效样本集合相同时按列排名已是共同样本上的秩，只有共同样本少于任一列有效样本数的股票对需要重算。
+    """
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=0)
+    partial = (n < counts[:, None]) | (n < counts[None, :])
+    rows, cols = np.nonzero(np.triu(partial & (n >= min_periods), k=1))
+    for i, j in zip(rows, cols):
+        common = valid[:, i] & valid[:, j]
+        x = _average_ranks(matrix[common, i])
+        y = _average_ranks(matrix[common, j])
+        x -= x.mean()
+        y -= y.mean()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = (x @ y) / np.sqrt((x @ x) * (y @ y))
+        corr[i, j] = corr[j, i] = value
+
+
+def pairwise_correlation(matrix: np.ndarray,
+                         method: str = "pearson",
+                         min_periods: int = DEFAULT_MIN_PERIODS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算成对完整观测的相关系数矩阵
+
+    通过掩码矩阵乘法一次得到每对股票共同样本上的 n、Σx、Σy、Σx²、Σy²、Σxy，
+    复杂度 O(日期数 × 股票数²)，全部在BLAS中完成。
+    Spearman 先按列排名，缺失位置不同的股票对再在共同样本上重新排名，结果与逐对计算一致。
+
+    Args:
+        matrix: 日期×股票 矩阵，缺失为NaN
+        method: pearson 或 spearman
+        min_periods: 共同数据点少于该值时结果为NaN
+
+    Returns:
+        (相关系数矩阵, 共同数据点数矩阵)
+    """
+    if method == "spearman":
+        corr, n = _pearson_pairwise(rank_columns(matrix))
+        _rerank_partial_pairs(matrix, corr, n, min_periods)
+    elif method == "pearson":
+        corr, n = _pearson_pairwise(matrix)
+    else:
+        raise ValueError(f"不支持的相关性方法: {method}")
+
+    corr[(n < min_periods) | ~np.isfinite(corr)] = np.nan
+    corr = np.clip(corr, -1.0, 1.0)
+    np.fill_diagonal(corr, 1.0)
+    return corr, n.astype(np.int64)
+
+
+def rolling_average_correlation(matrix: np.ndarray,
+                                window: int,
+                                method: str = "pearson",
+                                min_periods: int = DEFAULT_MIN_PERIODS) -> List[Optional[float]]:
+    """
+    滚动窗口内的平均两两相关系数（衡量股票池整体联动程度）
+
+    Args:
+        matrix: 日期×股票 矩阵
+        window: 窗口长度（交易日）
+        method: pearson 或 spearman
+        min_periods: 每对股票在窗口内的最少共同数据点
+
+    Returns:
+        与日期对齐的序列，前 window-1 个位置为None
+    """
+    num_dates, num_codes = matrix.shape
+    result: List[Optional[float]] = [None] * num_dates
+    if num_codes < 2 or window > num_dates:
+        return result
+
+    upper = np.triu_indices(num_codes, k=1)
+    for end in range(window, num_dates + 1):
+        corr, _ = pairwise_correlation(matrix[end - window:end], method=method, min_periods=min_periods)
+        values = corr[upper]
+        values = values[~np.isnan(values)]
+        result[end - 1] = float(values.mean()) if values.size else None
+    return result
+
+
+def matrix_to_nested_dict(codes: List[str], corr: np.ndarray, digits: int = 4) -> Dict[str, Dict[str, Optional[float]]]:
+    """把相关系数矩阵转为 {code1: {code2: value}}，NaN转为None"""
+    rounded = np.round(corr, digits)
+    return {
+        code1: {
+            code2: (None if np.isnan(rounded[i, j]) else float(rounded[i, j]))
+            for j, code2 in enumerate(codes)
+        }
+        for i, code1 in enumerate(codes)
+    }
+
+
+def matrix_to_rows(corr: np.ndarray, digits: int = 4) -> List[List[Optional[float]]]:
+    """把相关系数矩阵转为二维列表，NaN转为None"""
+    rounded = np.round(corr, digits)
+    return [[None if np.isnan(v) else float(v) for v in row] for row in rounded]
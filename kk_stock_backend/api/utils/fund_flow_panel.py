@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资金追踪面板引擎
+一次性载入全市场最近N个交易日的两融、个股资金流向与行业资金流向数据（每个数据源一次查询），
+以 ts_code 分组的向量化运算计算各项资金追踪评分，结果按交易日缓存：
+- /strategy/fund-flow-tracking 选股与 fund_flow_tracking_adapter 回测共用
+- 评分口径与 FundFlowAnalyzer 的逐只计算保持一致
+
+用法:
+    from api.utils.fund_flow_panel import get_fund_flow_panel_engine
+    panel = get_fund_flow_panel_engine().get_panel()
+    top = panel.sort_values("fund_tracking_score", ascending=False).head(20)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from api.global_db import db_handler
+
+# 回看窗口（自然日）与每只股票参与计算的记录条数，与 FundFlowAnalyzer 一致
+MARGIN_WINDOW_DAYS = 15
+MARGIN_RECORDS = 10
+MONEY_FLOW_WINDOW_DAYS = 10
+MONEY_FLOW_RECORDS = 5
+INDUSTRY_WINDOW_DAYS = 3
+INDUSTRY_RECORDS = 50
+
+# 面板缓存：保留的交易日数量与有效期（秒）
+PANEL_CACHE_SIZE = int(os.getenv("FUND_FLOW_PANEL_CACHE_SIZE", "5"))
+PANEL_CACHE_TTL = int(os.getenv("FUND_FLOW_PANEL_CACHE_TTL", "1800"))
+
+MARGIN_FIELDS = ["rzmre", "rzye", "rzche", "rqmcl", "rqchl"]
+MONEY_FLOW_FIELDS = ["buy_lg_amount", "sell_lg_amount", "buy_elg_amount", "sell_elg_amount"]
+PRICE_FIELDS = ["close", "pct_chg", "total_mv"]
+
+# 面板列 -> analyze_fund_flow 返回结构中的分组
+MARGIN_COLUMNS = ["margin_buy_trend", "margin_balance_growth", "margin_activity_score", "short_sell_trend"]
+FUND_COLUMNS = ["large_order_net_inflow", "super_large_net_inflow", "fund_flow_continuity", "institutional_fund_ratio"]
+INDUSTRY_COLUMNS = ["industry_fund_rank", "industry_fund_strength", "sector_rotation_score"]
+
+
+def _shift_date(trade_date: str, days: int) -> str:
+    return (datetime.strptime(trade_date, "%Y%m%d") - timedelta(days=days)).strftime("%Y%m%d")
+
+
+def _recent_records(docs: List[Dict[str, Any]], fields: List[str], records: int) -> pd.DataFrame:
+    """按股票取最近 records 条记录，附带 rank（0 为最新）"""
+    frame = pd.DataFrame(docs, columns=["ts_code", "trade_date", *fields])
+    for field in fields:
+        frame[field] = pd.to_numeric(frame[field], errors="coerce").fillna(0.0)
+    frame = frame.sort_values(["ts_code", "trade_date"], ascending=[True, False], kind="mergesort")
+    frame["rank"] = frame.groupby("ts_code").cumcount()
+    return frame[frame["rank"] < records]
+
+
+def _window_mean(frame: pd.DataFrame, field: str, start: int, stop: int) -> pd.Series:
+    """每只股票第 [start, stop) 条记录的均值"""
+    window = frame[(frame["rank"] >= start) & (frame["rank"] < stop)]
+    return window.groupby("ts_code")[field].mean()
+
+
+class FundFlowPanelEngine:
+    """全市场资金追踪面板：按交易日构建并缓存"""
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else db_handler.db
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+
+    # ---------- 对外接口 ----------
+
+    def latest_trade_date(self) -> str:
+        """两融数据的最新交易日（面板按此日期对齐）"""
+        latest = self.db["margin_detail"].find_one({}, {"trade_date": 1}, sort=[("trade_date", -1)])
+        return latest["trade_date"] if latest else datetime.now().strftime("%Y%m%d")
+
+    def get_panel(self, trade_date: Optional[str] = None) -> pd.DataFrame:
+        """获取指定交易日（默认最新）的资金追踪面板，以 ts_code 为索引"""
+        trade_date = trade_date or self.latest_trade_date()
+        cached = self._cached(trade_date)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(trade_date, threading.Lock())
+        # 同一交易日只构建一次，并发请求等待首个构建完成
+        with build_lock:
+            cached = self._cached(trade_date)
+            if cached is not None:
+                return cached
+            start = time.time()
+            panel = self.build_panel(trade_date)
+            print(f"📊 资金追踪面板构建完成 {trade_date}: {len(panel)}只股票, 耗时{time.time() - start:.2f}s")
+            with self._lock:
+                self._cache[trade_date] = (time.time(), panel)
+                self._cache.move_to_end(trade_date)
+                while len(self._cache) > PANEL_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+                self._build_locks.pop(trade_date, None)
+            return panel
+
+    def analyze(self, ts_code: str, trade_date: Optional[str] = None) -> Dict[str, Any]:
+        """单只股票的资金追踪分析，返回结构与 FundFlowAnalyzer.analyze_fund_flow 相同"""
+        panel = self.get_panel(trade_date)
+        if ts_code not in panel.index:
+            return {}
+        row = panel.loc[ts_code]
+        return {
+            "margin_analysis": {column: float(row[column]) for column in MARGIN_COLUMNS},
+            "fund_analysis": {column: float(row[column]) for column in FUND_COLUMNS},
+            "industry_analysis": {
+                "industry_fund_rank": int(row["industry_fund_rank"]),
+                "industry_fund_strength": float(row["industry_fund_strength"]),
+                "sector_rotation_score": float(row["sector_rotation_score"]),
+            },
+            "fund_tracking_score": float(row["fund_tracking_score"]),
+        }
+
+    def invalidate(self, trade_date: Optional[str] = None) -> None:
+        """清除指定交易日（默认全部）的面板缓存"""
+        with self._lock:
+            if trade_date is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(trade_date, None)
+
+    def _cached(self, trade_date: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._cache.get(trade_date)
+            if entry and time.time() - entry[0] < PANEL_CACHE_TTL:
+                self._cache.move_to_end(trade_date)
+                return entry[1]
+        return None
+
+    # ---------- 面板构建 ----------
+
+    def build_panel(self, trade_date: str) -> pd.DataFrame:
+        """载入各数据源并计算全部评分"""
+        basic_docs = list(self.db["infrastructure_stock_basic"].find(
+            {}, {"_id": 0, "ts_code": 1, "name": 1, "industry": 1}
+        ))
+        panel = pd.DataFrame(basic_docs, columns=["ts_code", "name", "industry"])
+        panel = panel.drop_duplicates("ts_code").set_index("ts_code")
+
+        margin = self._margin_scores(trade_date).reindex(panel.index)
+        fund = self._money_flow_scores(trade_date).reindex(panel.index)
+        industry = self._industry_scores(trade_date, panel["industry"])
+        price = self._price_snapshot(trade_date).reindex(panel.index)
+
+        # 无数据的股票按逐只分析的默认值补齐（无两融记录时 FundFlowAnalyzer 四项均为0）
+        margin = margin.fillna({
+            "margin_buy_trend": 0.0, "margin_balance_growth": 0.0,
+            "margin_activity_score": 0.0, "short_sell_trend": 0.0,
+            "margin_records": 0,
+        })
+        fund = fund.fillna({column: 0.0 for column in FUND_COLUMNS})
+        panel = pd.concat([panel, margin, fund, industry, price], axis=1)
+        panel["fund_tracking_score"] = self._tracking_score(panel)
+        return panel
+
+    def _margin_scores(self, trade_date: str) -> pd.DataFrame:
+        """两融评分：最近10条记录内的买入趋势、余额增长、活跃度、融券趋势"""
+        docs = list(self.db["margin_detail"].find(
+            {"trade_date": {"$gte": _shift_date(trade_date, MARGIN_WINDOW_DAYS), "$lte": trade_date}},
+            {"_id": 0, "ts_code": 1, "trade_date": 1, **{field: 1 for field in MARGIN_FIELDS}}
+        ))
+        frame = _recent_records(docs, MARGIN_FIELDS, MARGIN_RECORDS)
+        grouped = frame.groupby("ts_code")
+        count = grouped.size()
+        result = pd.DataFrame(index=count.index)
+        result["margin_records"] = count
+
+        # 融资买入趋势：最近3条均值 vs 第4~6条均值
+        recent_buy = _window_mean(frame, "rzmre", 0, 3).reindex(count.index)
+        baseline_buy = _window_mean(frame, "rzmre", 3, 6).reindex(count.index)
+        buy_change = (recent_buy - baseline_buy) / baseline_buy.replace(0, np.nan)
+        result["margin_buy_trend"] = np.where(
+            (count < 3) | baseline_buy.isna(), 0.0,
+            np.where(baseline_buy == 0, 50.0, (50 + buy_change * 100).clip(0, 100))
+        )
+        # 原始百分比（适配器展示用）：基准为正时才有意义
+        result["margin_buy_trend_pct"] = (buy_change * 100).where((count >= 3) & (baseline_buy > 0)).round(2)
+
+        # 融资余额增长：最新一条 vs 窗口内最早一条
+        latest_balance = grouped["rzye"].first()
+        earliest_balance = grouped["rzye"].last()
+        balance_change = (latest_balance - earliest_balance) / earliest_balance.replace(0, np.nan) * 100
+        result["margin_balance_growth"] = np.where(
+            (count < 2) | (earliest_balance == 0), 0.0, (50 + balance_change * 2).clip(0, 100)
+        )
+        result["margin_balance_growth_pct"] = balance_change.where((count >= 2) & (earliest_balance > 0)).round(2)
+
+        # 两融活跃度：日均（融资买入+融资偿还+融券卖出+融券偿还），1000万为50分
+        activity = frame["rzmre"] + frame["rzche"] + frame["rqmcl"] + frame["rqchl"]
+        avg_activity = activity.groupby(frame["ts_code"]).mean()
+        result["margin_activity_score"] = (avg_activity / 10000000 * 50).clip(upper=100)
+
+        # 融券卖出趋势：融券增加为负面信号
+        recent_short = _window_mean(frame, "rqmcl", 0, 3).reindex(count.index)
+        baseline_short = _window_mean(frame, "rqmcl", 3, 6).reindex(count.index)
+        short_change = (recent_short - baseline_short) / baseline_short.replace(0, np.nan)
+        result["short_sell_trend"] = np.where(
+            (count < 3) | baseline_short.isna() | (baseline_short == 0), 50.0,
+            (50 - short_change * 100).clip(0, 100)
+        )
+        return result
+
+    def _money_flow_scores(self, trade_date: str) -> pd.DataFrame:
+        """资金流向评分：最近5条记录内的大单/超大单净流入、流入连续性、机构占比"""
+        docs = list(self.db["stock_money_flow"].find(
+            {"trade_date": {"$gte": _shift_date(trade_date, MONEY_FLOW_WINDOW_DAYS), "$lte": trade_date}},
+            {"_id": 0, "ts_code": 1, "trade_date": 1, **{field: 1 for field in MONEY_FLOW_FIELDS}}
+        ))
+        frame = _recent_records(docs, MONEY_FLOW_FIELDS, MONEY_FLOW_RECORDS)
+        large_net = frame["buy_lg_amount"] - frame["sell_lg_amount"]
+        super_net = frame["buy_elg_amount"] - frame["sell_elg_amount"]
+        by_code = frame["ts_code"]
+
+        result = pd.DataFrame({
+            "large_order_net_inflow": large_net.groupby(by_code).sum() / 10000,
+            "super_large_net_inflow": super_net.groupby(by_code).sum() / 10000,
+            "fund_flow_continuity": ((large_net + super_net) > 0).groupby(by_code).mean() * 100,
+        })
+        total_buy = (frame["buy_lg_amount"] + frame["buy_elg_amount"]).groupby(by_code).sum()
+        institutional_buy = frame["buy_elg_amount"].groupby(by_code).sum()
+        result["institutional_fund_ratio"] = (
+            (institutional_buy / total_buy.replace(0, np.nan) * 100).clip(upper=100).where(total_buy > 0, 0.0)
+        )
+        return result
+
+    def _industry_scores(self, trade_date: str, industries: pd.Series) -> pd.DataFrame:
+        """行业轮动评分：每个行业只匹配一次，再按股票所属行业展开"""
+        docs = list(self.db["money_flow_industry"].find(
+            {"trade_date": {"$gte": _shift_date(trade_date, INDUSTRY_WINDOW_DAYS), "$lte": trade_date},
+             "content_type": "行业"},
+            {"_id": 0, "name": 1, "rank": 1, "net_amount": 1}
+        ).sort("trade_date", -1).limit(INDUSTRY_RECORDS))
+
+        defaults = {"industry_fund_rank": 999, "industry_fund_strength": 0.0, "sector_rotation_score": 0.0}
+        by_industry = {}
+        for industry in industries.dropna().unique():
+            if not industry:
+                continue
+            target = next((item for item in docs if industry in item.get("name", "")), None)
+            if not target:
+                continue
+            try:
+                rank = target.get("rank", 999)
+                net_amount = float(target.get("net_amount", 0))
+                by_industry[industry] = {
+                    "industry_fund_rank": rank,
+                    "industry_fund_strength": max(0, min(100, net_amount / 100000000 * 100)),
+                    "sector_rotation_score": max(0, 100 - rank),
+                }
+            except (TypeError, ValueError):
+                continue
+
+        rows = [by_industry.get(industry, defaults) for industry in industries]
+        return pd.DataFrame(rows, index=industries.index, columns=INDUSTRY_COLUMNS)
+
+    def _price_snapshot(self, trade_date: str) -> pd.DataFrame:
+        """截至交易日的最新价格截面（收盘价、涨跌幅、总市值）"""
+        latest = self.db["stock_factor_pro"].find_one(
+            {"trade_date": {"$lte": trade_date}}, {"trade_date": 1}, sort=[("trade_date", -1)]
+        )
+        docs = []
+        if latest:
+            docs = list(self.db["stock_factor_pro"].find(
+                {"trade_date": latest["trade_date"]},
+                {"_id": 0, "ts_code": 1, **{field: 1 for field in PRICE_FIELDS}}
+            ))
+        frame = pd.DataFrame(docs, columns=["ts_code", *PRICE_FIELDS]).drop_duplicates("ts_code").set_index("ts_code")
+        for field in PRICE_FIELDS:
+            frame[field] = pd.to_numeric(frame[field], errors="coerce")
+        return frame
+
+    @staticmethod
+    def _tracking_score(panel: pd.DataFrame) -> pd.Series:
+        """综合评分：两融40% + 资金流向35% + 行业轮动25%"""
+        margin_score = (
+            panel["margin_buy_trend"] * 0.3
+            + panel["margin_balance_growth"] * 0.3
+            + panel["margin_activity_score"] * 0.2
+            + panel["short_sell_trend"] * 0.2
+        )
+        large = panel["large_order_net_inflow"]
+        super_large = panel["super_large_net_inflow"]
+        fund_score = (
+            (large / 1000000 * 10).clip(upper=30).where(large > 0, 0.0)
+            + (super_large / 5000000 * 10).clip(upper=30).where(super_large > 0, 0.0)
+            + panel["fund_flow_continuity"] * 0.2
+            + panel["institutional_fund_ratio"] * 0.2
+        ).clip(upper=100)
+        industry_score = panel["industry_fund_strength"] * 0.6 + panel["sector_rotation_score"] * 0.4
+        total = margin_score * 0.4 + fund_score * 0.35 + industry_score * 0.25
+        return total.clip(0, 100)
+
+
+_fund_flow_panel_engine: Optional[FundFlowPanelEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_fund_flow_panel_engine() -> FundFlowPanelEngine:
+    """获取进程级资金追踪面板引擎单例"""
+    global _fund_flow_panel_engine
+    if _fund_flow_panel_engine is None:
+        with _engine_lock:
+            if _fund_flow_panel_engine is None:
+                _fund_flow_panel_engine = FundFlowPanelEngine()
+    return _fund_flow_panel_engine
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MongoDB索引注册表
+各模块在导入时声明自己查询形状所需的索引，启动时（或通过命令行）统一校验并补建，
+并可从数据库profiler中找出仍在全表扫描的查询。
+
+声明:
+    from api.utils.index_registry import declare_indexes
+    declare_indexes("stock_kline_daily", [
+        {"keys": [("ts_code", 1), ("trade_date", -1)], "reason": "单股K线区间查询"},
+    ], owner=__name__)
+
+命令行:
+    python -m api.utils.index_registry            # 只校验
+    python -m api.utils.index_registry --create   # 校验并补建缺失索引
+    python -m api.utils.index_registry --collscans --enable-profiler
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from api.utils.mongo_monitoring import describe_command
+
+logger = logging.getLogger(__name__)
+
+# 声明了索引的模块，加载注册表时依次导入
+DECLARING_MODULES = [
+    "api.config.index_specs",
+    "api.precompute.sentiment_daily",
+    "api.precompute.market_rankings",
+    "api.precompute.strategy_screens",
+]
+
+# profiler 慢操作阈值（毫秒）
+DEFAULT_PROFILE_SLOWMS = 100
+
+IndexKeys = Tuple[Tuple[str, Any], ...]
+
+
+class IndexSpec:
+    """单个索引声明"""
+
+    __slots__ = ("collection", "keys", "unique", "sparse", "name", "reason", "owner")
+
+    def __init__(self, collection: str, keys: Sequence[Tuple[str, Any]], unique: bool = False,
+                 sparse: bool = False, name: Optional[str] = None, reason: str = "", owner: str = ""):
+        self.collection = collection
+        self.keys: IndexKeys = tuple((field, direction) for field, direction in keys)
+        self.unique = unique
+        self.sparse = sparse
+        self.name = name or "_".join(f"{field}_{direction}" for field, direction in self.keys)
+        self.reason = reason
+        self.owner = owner
+
+    def is_satisfied_by(self, existing_keys: IndexKeys, existing_unique: bool) -> bool:
+        """
+        已有索引以本声明的键为前缀即可覆盖同样的查询（唯一索引需字段完全一致）
+        方向全部相反的索引可反向遍历，末尾字段（范围/排序字段）的方向不影响等值+排序查询，均视为等价
+        """
+        if self.unique and (not existing_unique or len(existing_keys) != len(self.keys)):
+            return False
+        prefix = existing_keys[:len(self.keys)]
+        if len(prefix) != len(self.keys) or [field for field, _ in prefix] != [field for field, _ in self.keys]:
+            return False
+        return _directions_equivalent(self.keys, prefix)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection,
+            "name": self.name,
+            "keys": [list(key) for key in self.keys],
+            "unique": self.unique,
+            "reason": self.reason,
+            "owner": self.owner
+        }
+
+
+def _directions_equivalent(declared: IndexKeys, existing: IndexKeys) -> bool:
+    """字段相同的两组索引键方向是否等价（非升降序索引如text/2dsphere需完全一致）"""
+    directions = [direction for _, direction in declared + existing]
+    if not all(isinstance(direction, (int, float)) and direction != 0 for direction in directions):
+        return declared == existing
+    declared_head = [direction > 0 for _, direction in declared[:-1]]
+    existing_head = [direction > 0 for _, direction in existing[:-1]]
+    return existing_head == declared_head or existing_head == [not ascending for ascending in declared_head]
+
+
+_registry: Dict[str, List[IndexSpec]] = {}
+_registry_lock = threading.Lock()
+_declarations_loaded = False
+
+
+def declare_indexes(collection: str, specs: List[Dict[str, Any]], owner: str = "") -> None:
+    """
+    声明集合所需索引（重复声明相同键会被忽略）
+
+    Args:
+        collection: 集合名
+        specs: [{"keys": [(字段, 方向), ...], "unique": bool, "sparse": bool, "reason": str}, ...]
+        owner: 声明方模块名
+    """
+    with _registry_lock:
+        declared = _registry.setdefault(collection, [])
+        for spec in specs:
+            index_spec = IndexSpec(
+                collection, spec["keys"],
+                unique=spec.get("unique", False),
+                sparse=spec.get("sparse", False),
+                name=spec.get("name"),
+                reason=spec.get("reason", ""),
+                owner=owner
+            )
+            if any(item.keys == index_spec.keys for item in declared):
+                continue
+            declared.append(index_spec)
+
+
+def load_declarations() -> Dict[str, List[IndexSpec]]:
+    """导入所有声明模块并返回注册表"""
+    global _declarations_loaded
+    if not _declarations_loaded:
+        for module_name in DECLARING_MODULES:
+            try:
+                importlib.import_module(module_name)
+            except Exception as e:
+                logger.warning(f"⚠️ 加载索引声明失败 {module_name}: {e}")
+        _declarations_loaded = True
+    with _registry_lock:
+        return {collection: list(specs) for collection, specs in _registry.items()}
+
+
+def _existing_indexes(collection) -> List[Tuple[str, IndexKeys, bool]]:
+    existing = []
+    for name, info in collection.index_information().items():
+        keys = tuple((field, direction) for field, direction in info["key"])
+        existing.append((name, keys, bool(info.get("unique", False))))
+    return existing
+
+
+def ensure_indexes(db, create: bool = True) -> Dict[str, Any]:
+    """
+    校验注册表中的索引，可选补建缺失索引
+
+    Args:
+        db: pymongo Database
+        create: 是否创建缺失的索引
+
+    Returns:
+        {"ok": [...], "created": [...], "missing": [...], "failed": [...]}
+    """
+    report: Dict[str, List[Dict[str, Any]]] = {"ok": [], "created": [], "missing": [], "failed": []}
+    existing_collections = set(db.list_collection_names())
+
+    for collection_name, specs in sorted(load_declarations().items()):
+        collection = db[collection_name]
+        existing = _existing_indexes(collection) if collection_name in existing_collections else []
+        for spec in specs:
+            match = next(
+                (name for name, keys, unique in existing if spec.is_satisfied_by(keys, unique)),
+                None
+            )
+            if match:
+                report["ok"].append({**spec.to_dict(), "existing_index": match})
+                continue
+            if not create:
+                report["missing"].append(spec.to_dict())
+                continue
+            try:
+                options = {"name": spec.name, "background": True}
+                if spec.unique:
+                    options["unique"] = True
+                if spec.sparse:
+                    options["sparse"] = True
+                collection.create_index(list(spec.keys), **options)
+                report["created"].append(spec.to_dict())
+                logger.info(f"🔧 已创建索引 {collection_name}.{spec.name}")
+            except Exception as e:
+                report["failed"].append({**spec.to_dict(), "error": str(e)})
+                logger.error(f"❌ 创建索引失败 {collection_name}.{spec.name}: {e}")
+    return report
+
+
+def set_profiling(db, level: int = 1, slowms: int = DEFAULT_PROFILE_SLOWMS) -> Dict[str, Any]:
+    """设置数据库profiler级别（1: 只记录慢操作，0: 关闭）"""
+    result = db.command("profile", level, slowms=slowms)
+    return {"previous_level": result.get("was"), "level": level, "slowms": slowms}
+
+
+def collscan_report(db, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    从 system.profile 汇总全表扫描的查询，按集合与查询形状分组
+
+    需要先用 set_profiling 开启profiler；返回按累计耗时倒序的形状列表，并标出注册表中是否有对应集合的声明。
+    """
+    declared = load_declarations()
+    groups: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    cursor = db["system.profile"].find(
+        {"planSummary": {"$regex": "COLLSCAN"}},
+        {"ns": 1, "op": 1, "command": 1, "millis": 1, "docsExamined": 1, "nreturned": 1, "ts": 1}
+    )
+    for entry in cursor:
+        command = entry.get("command") or {}
+        command_name = next(iter(command), entry.get("op", ""))
+        collection_name = entry.get("ns", "").split(".", 1)[-1]
+        try:
+            _, shape = describe_command(command_name, command)
+        except Exception:
+            shape = ""
+        key = (collection_name, command_name, shape)
+        group = groups.setdefault(key, {
+            "collection": collection_name,
+            "command": command_name,
+            "shape": shape,
+            "count": 0,
+            "total_ms": 0,
+            "docs_examined": 0,
+            "declared_indexes": [spec.name for spec in declared.get(collection_name, [])]
+        })
+        group["count"] += 1
+        group["total_ms"] += entry.get("millis", 0)
+        group["docs_examined"] += entry.get("docsExamined", 0)
+        if entry.get("ts") is not None:
+            group["last_seen"] = entry["ts"].isoformat()
+    rows = sorted(groups.values(), key=lambda item: item["total_ms"], reverse=True)
+    return rows[:limit]
+
+
+def verify_indexes_on_startup(db_handler) -> Optional[Dict[str, Any]]:
+    """
+    启动时校验并补建索引（本地库优先，其次云端库）
+
+    Returns:
+        索引报告；数据库不可用时返回None
+    """
+    db = db_handler.local_db if db_handler.local_available else db_handler.cloud_db
+    if db is None:
+        return None
+    try:
+        report = ensure_indexes(db, create=True)
+    except Exception as e:
+        logger.error(f"❌ 索引校验失败: {e}")
+        return None
+    logger.info(
+        f"📇 索引校验完成: 已存在 {len(report['ok'])}, 新建 {len(report['created'])}, "
+        f"失败 {len(report['failed'])}"
+    )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="校验/补建MongoDB索引并查看全表扫描")
+    parser.add_argument("--create", action="store_true", help="创建缺失的索引")
+    parser.add_argument("--collscans", action="store_true", help="输出profiler中的全表扫描查询")
+    parser.add_argument("--enable-profiler", action="store_true", help="开启profiler（慢操作级别）")
+    parser.add_argument("--slowms", type=int, default=DEFAULT_PROFILE_SLOWMS, help="profiler慢操作阈值（毫秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    from api.global_db import db_handler
+    db = db_handler.local_db if db_handler.local_available else db_handler.cloud_db
+    if db is None:
+        print("❌ 数据库不可用")
+        return
+
+    if args.enable_profiler:
+        print(f"🔍 profiler: {set_profiling(db, 1, args.slowms)}")
+
+    report = ensure_indexes(db, create=args.create)
+    for status in ("ok", "created", "missing", "failed"):
+        print(f"\n[{status}] {len(report[status])}")
+        for item in report[status]:
+            keys = ", ".join(f"{field}:{direction}" for field, direction in item["keys"])
+            print(f"  {item['collection']}.{item['name']} ({keys}) {item.get('error', '')}")
+
+    if args.collscans:
+        print("\n全表扫描查询:")
+        for row in collscan_report(db):
+            print(json.dumps(row, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
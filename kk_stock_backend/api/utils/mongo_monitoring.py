@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MongoDB命令监控
+通过pymongo命令监听器统计每个请求（或后台任务）内的Mongo操作次数与耗时，
+并记录慢查询（按过滤条件形状聚合）和同一作用域内重复同形状查询（N+1）。
+
+用法:
+    token = begin_operation_scope("GET /stock/kline/{ts_code}")
+    try:
+        ...  # 期间发出的Mongo命令都会记入该作用域
+    finally:
+        scope = end_operation_scope(token)
+
+    # 后台任务
+    @track_operations("simulation:update_daily_returns")
+    async def update_daily_returns(self): ...
+
+作用域保存在contextvar中；在线程池中执行的同步查询需通过 contextvars.copy_context() 传递。
+"""
+
+import copy
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# 慢查询阈值（毫秒）
+SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", 200))
+# 同一作用域内同形状查询次数达到该值视为N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("MONGO_N_PLUS_ONE_THRESHOLD", 10))
+# 查询洞察写入Redis的间隔（秒）
+INSIGHTS_FLUSH_INTERVAL = 30
+INSIGHTS_REDIS_PREFIX = "stock_api:query_insights:"
+# 形状描述最大长度
+MAX_SHAPE_LENGTH = 300
+
+# 不计入统计的内部命令
+IGNORED_COMMANDS = {
+    "ismaster", "isMaster", "hello", "ping", "buildInfo", "saslStart", "saslContinue",
+    "getnonce", "authenticate", "endSessions", "killCursors", "explain"
+}
+# 不参与形状统计的命令（游标续取、插入没有查询条件）
+UNSHAPED_COMMANDS = {"getMore", "insert"}
+# 可以执行explain的命令
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# explain时需要从原命令中剔除的会话/驱动字段
+_DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "$db",
+                  "$clusterTime", "$readPreference", "$readConcern"}
+
+
+class OperationScope:
+    """单个请求/任务内的Mongo操作统计"""
+
+    __slots__ = ("name", "started_at", "mongo_ops", "mongo_time_ms", "failed_ops", "shape_counts")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.mongo_ops = 0
+        self.mongo_time_ms = 0.0
+        self.failed_ops = 0
+        self.shape_counts: Dict[str, int] = {}
+
+    def record(self, duration_ms: float, failed: bool = False, shape_key: Optional[str] = None) -> None:
+        self.mongo_ops += 1
+        self.mongo_time_ms += duration_ms
+        if failed:
+            self.failed_ops += 1
+        if shape_key:
+            self.shape_counts[shape_key] = self.shape_counts.get(shape_key, 0) + 1
+
+
+_current_scope: ContextVar[Optional[OperationScope]] = ContextVar("mongo_operation_scope", default=None)
+
+
+def begin_operation_scope(name: str) -> Token:
+    """开始一个统计作用域"""
+    return _current_scope.set(OperationScope(name))
+
+
+def end_operation_scope(token: Token) -> Optional[OperationScope]:
+    """结束统计作用域并返回统计结果（同时检查N+1）"""
+    scope = _current_scope.get()
+    _current_scope.reset(token)
+    if scope is not None:
+        query_insights.check_n_plus_one(scope)
+    return scope
+
+
+@contextmanager
+def operation_scope(name: str):
+    """后台任务的统计作用域"""
+    token = begin_operation_scope(name)
+    try:
+        yield _current_scope.get()
+    finally:
+        end_operation_scope(token)
+
+
+def track_operations(name: str) -> Callable:
+    """装饰器：为同步或异步任务函数建立统计作用域"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with operation_scope(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with operation_scope(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _shape(value: Any) -> Any:
+    """把查询条件中的具体取值替换为占位符，只保留字段与操作符结构"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [_shape(item) for item in value]
+        return "[?]"
+    return "?"
+
+
+def describe_command(command_name: str, command: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    提取命令的集合名与查询形状
+
+    Returns:
+        (集合名, 形状描述)
+    """
+    collection = command.get(command_name)
+    collection = collection if isinstance(collection, str) else ""
+    shape: Dict[str, Any] = {}
+    if command_name == "find":
+        shape["filter"] = _shape(command.get("filter", {}))
+        if command.get("sort"):
+            shape["sort"] = list(command["sort"].keys())
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline", [])
+        shape["stages"] = [next(iter(stage), "") for stage in pipeline]
+        if pipeline and "$match" in pipeline[0]:
+            shape["match"] = _shape(pipeline[0]["$match"])
+    elif command_name in ("count", "findAndModify"):
+        shape["query"] = _shape(command.get("query", {}))
+    elif command_name == "distinct":
+        shape["key"] = command.get("key")
+        shape["query"] = _shape(command.get("query", {}))
+    elif command_name == "update":
+        updates = command.get("updates") or [{}]
+        shape["q"] = _shape(updates[0].get("q", {}))
+        shape["n"] = "many" if len(updates) > 1 else "one"
+    elif command_name == "delete":
+        deletes = command.get("deletes") or [{}]
+        shape["q"] = _shape(deletes[0].get("q", {}))
+    description = json.dumps(shape, sort_keys=True, default=str, ensure_ascii=False)
+    return collection, description[:MAX_SHAPE_LENGTH]
+
+
+class QueryInsights:
+    """慢查询与N+1记录（进程内累计，定期汇总到Redis）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 形状键 -> 慢查询统计
+        self.slow_shapes: Dict[str, Dict[str, Any]] = {}
+        # 形状键 -> 最近一次慢查询的原始命令（用于explain，只保存在本进程）
+        self.slow_samples: Dict[str, Dict[str, Any]] = {}
+        self.recent_slow = deque(maxlen=200)
+        # (作用域, 形状键) -> N+1统计
+        self.n_plus_one: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._pending_slow: Dict[str, Dict[str, float]] = {}
+        self._pending_n1: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._shape_info: Dict[str, Dict[str, str]] = {}
+        self._last_flush = time.time()
+
+    def record_slow(self, shape_key: str, collection: str, command_name: str, shape: str,
+                    duration_ms: float, command: Dict[str, Any], scope_name: Optional[str]) -> None:
+        logger.warning(
+            f"🐢 慢查询 {duration_ms:.1f}ms [{scope_name or '-'}] {collection}.{command_name} {shape}"
+        )
+        with self._lock:
+            stats = self.slow_shapes.setdefault(shape_key, {
+                "collection": collection, "command": command_name, "shape": shape,
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0
+            })
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if command_name in EXPLAINABLE_COMMANDS:
+                self.slow_samples[shape_key] = {
+                    "collection": collection,
+                    "command_name": command_name,
+                    "command": copy.deepcopy(command),
+                    "duration_ms": duration_ms
+                }
+            self.recent_slow.append({
+                "collection": collection,
+                "command": command_name,
+                "shape": shape,
+                "duration_ms": round(duration_ms, 2),
+                "scope": scope_name,
+                "time": datetime.now().isoformat()
+            })
+            pending = self._pending_slow.setdefault(shape_key, {"count": 0, "total_ms": 0.0})
+            pending["count"] += 1
+            pending["total_ms"] += duration_ms
+            self._shape_info[shape_key] = {"collection": collection, "command": command_name, "shape": shape}
+
+    def check_n_plus_one(self, scope: OperationScope) -> None:
+        """作用域结束时检查重复同形状查询"""
+        for shape_key, count in scope.shape_counts.items():
+            if count < N_PLUS_ONE_THRESHOLD:
+                continue
+            collection, command_name, shape = _split_shape_key(shape_key)
+            logger.warning(
+                f"🔁 疑似N+1查询 [{scope.name}] {collection}.{command_name} 重复 {count} 次: {shape}"
+            )
+            key = (scope.name, shape_key)
+            with self._lock:
+                stats = self.n_plus_one.setdefault(key, {
+                    "scope": scope.name, "collection": collection, "command": command_name,
+                    "shape": shape, "occurrences": 0, "total_repeats": 0, "max_repeats": 0
+                })
+                stats["occurrences"] += 1
+                stats["total_repeats"] += count
+                stats["max_repeats"] = max(stats["max_repeats"], count)
+                stats["last_seen"] = datetime.now().isoformat()
+                pending = self._pending_n1.setdefault(key, {"occurrences": 0, "total_repeats": 0, "max_repeats": 0})
+                pending["occurrences"] += 1
+                pending["total_repeats"] += count
+                pending["max_repeats"] = max(pending["max_repeats"], count)
+                self._shape_info[shape_key] = {"collection": collection, "command": command_name, "shape": shape}
+        if time.time() - self._last_flush >= INSIGHTS_FLUSH_INTERVAL:
+            self.flush()
+
+    def _get_redis_client(self):
+        try:
+            from cache_manager import get_cache_manager
+        except ImportError:
+            return None
+        cache_manager = get_cache_manager()
+        if cache_manager and cache_manager.redis_client is not None:
+            return cache_manager.redis_client
+        return None
+
+    def flush(self) -> bool:
+        """把慢查询与N+1增量累加到Redis，汇总多个worker的数据"""
+        with self._lock:
+            pending_slow, self._pending_slow = self._pending_slow, {}
+            pending_n1, self._pending_n1 = self._pending_n1, {}
+            shape_info = dict(self._shape_info)
+            self._last_flush = time.time()
+        if not pending_slow and not pending_n1:
+            return True
+
+        client = self._get_redis_client()
+        if client is None:
+            return False
+        try:
+            pipe = client.pipeline(transaction=False)
+            for shape_key, stats in pending_slow.items():
+                pipe.hincrby(INSIGHTS_REDIS_PREFIX + "slow:count", shape_key, int(stats["count"]))
+                pipe.hincrbyfloat(INSIGHTS_REDIS_PREFIX + "slow:total_ms", shape_key, stats["total_ms"])
+                pipe.hset(INSIGHTS_REDIS_PREFIX + "shapes", shape_key, json.dumps(shape_info.get(shape_key, {})))
+            for (scope_name, shape_key), stats in pending_n1.items():
+                field = f"{scope_name}|{shape_key}"
+                pipe.hincrby(INSIGHTS_REDIS_PREFIX + "n1:occurrences", field, int(stats["occurrences"]))
+                pipe.hincrby(INSIGHTS_REDIS_PREFIX + "n1:total_repeats", field, int(stats["total_repeats"]))
+                pipe.hset(INSIGHTS_REDIS_PREFIX + "shapes", shape_key, json.dumps(shape_info.get(shape_key, {})))
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ 写入查询洞察失败: {e}")
+            return False
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        """
+        查询洞察报告：优先使用Redis中跨worker汇总的数据，不可用时使用本进程数据
+        """
+        self.flush()
+        client = self._get_redis_client()
+        if client is not None:
+            try:
+                return self._report_from_redis(client, limit)
+            except Exception as e:
+                logger.warning(f"⚠️ 读取查询洞察失败，使用本进程数据: {e}")
+
+        with self._lock:
+            slow = sorted(self.slow_shapes.values(), key=lambda item: item["total_ms"], reverse=True)[:limit]
+            n1 = sorted(self.n_plus_one.values(), key=lambda item: item["total_repeats"], reverse=True)[:limit]
+            recent = list(self.recent_slow)[-limit:]
+        return {
+            "source": "local",
+            "slow_shapes": [_format_slow(item) for item in slow],
+            "n_plus_one": n1,
+            "recent_slow": list(reversed(recent))
+        }
+
+    def _report_from_redis(self, client, limit: int) -> Dict[str, Any]:
+        counts = client.hgetall(INSIGHTS_REDIS_PREFIX + "slow:count")
+        totals = client.hgetall(INSIGHTS_REDIS_PREFIX + "slow:total_ms")
+        shapes = {key: json.loads(value) for key, value in client.hgetall(INSIGHTS_REDIS_PREFIX + "shapes").items()}
+        slow = []
+        for shape_key, count in counts.items():
+            info = shapes.get(shape_key, {})
+            with self._lock:
+                local_max = self.slow_shapes.get(shape_key, {}).get("max_ms")
+            slow.append({
+                **info,
+                "count": int(count),
+                "total_ms": float(totals.get(shape_key, 0)),
+                "max_ms": local_max
+            })
+        slow.sort(key=lambda item: item["total_ms"], reverse=True)
+
+        occurrences = client.hgetall(INSIGHTS_REDIS_PREFIX + "n1:occurrences")
+        repeats = client.hgetall(INSIGHTS_REDIS_PREFIX + "n1:total_repeats")
+        n1 = []
+        for field, occurred in occurrences.items():
+            scope_name, shape_key = field.split("|", 1)
+            n1.append({
+                "scope": scope_name,
+                **shapes.get(shape_key, {}),
+                "occurrences": int(occurred),
+                "total_repeats": int(repeats.get(field, 0)),
+                "avg_repeats": round(int(repeats.get(field, 0)) / max(int(occurred), 1), 1)
+            })
+        n1.sort(key=lambda item: item["total_repeats"], reverse=True)
+
+        with self._lock:
+            recent = list(self.recent_slow)[-limit:]
+        return {
+            "source": "redis",
+            "slow_shapes": [_format_slow(item) for item in slow[:limit]],
+            "n_plus_one": n1[:limit],
+            "recent_slow": list(reversed(recent))
+        }
+
+    def worst_samples(self, top: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """按累计耗时取最慢的若干形状的样本命令"""
+        with self._lock:
+            ranked = sorted(self.slow_shapes.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            return [
+                (shape_key, self.slow_samples[shape_key])
+                for shape_key, _ in ranked if shape_key in self.slow_samples
+            ][:top]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.slow_shapes.clear()
+            self.slow_samples.clear()
+            self.recent_slow.clear()
+            self.n_plus_one.clear()
+            self._pending_slow.clear()
+            self._pending_n1.clear()
+        client = self._get_redis_client()
+        if client is not None:
+            client.delete(*[INSIGHTS_REDIS_PREFIX + suffix for suffix in (
+                "slow:count", "slow:total_ms", "shapes", "n1:occurrences", "n1:total_repeats"
+            )])
+
+
+def _make_shape_key(collection: str, command_name: str, shape: str) -> str:
+    return f"{collection}\x1f{command_name}\x1f{shape}"
+
+
+def _split_shape_key(shape_key: str) -> Tuple[str, str, str]:
+    collection, command_name, shape = shape_key.split("\x1f", 2)
+    return collection, command_name, shape
+
+
+def _format_slow(item: Dict[str, Any]) -> Dict[str, Any]:
+    count = item.get("count", 0) or 1
+    return {
+        "collection": item.get("collection"),
+        "command": item.get("command"),
+        "shape": item.get("shape"),
+        "count": item.get("count", 0),
+        "total_ms": round(item.get("total_ms", 0.0), 2),
+        "avg_ms": round(item.get("total_ms", 0.0) / count, 2),
+        "max_ms": round(item["max_ms"], 2) if item.get("max_ms") is not None else None
+    }
+
+
+query_insights = QueryInsights()
+
+
+def build_explain_command(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """由原始命令构造explain命令（保持命令名在第一个键）"""
+    inner = {key: value for key, value in command.items() if key not in _DRIVER_FIELDS}
+    return {"explain": inner, "verbosity": "queryPlanner"}
+
+
+def summarize_plan(explain_result: Dict[str, Any]) -> Dict[str, Any]:
+    """提取执行计划中的阶段链与是否全表扫描"""
+    planner = explain_result.get("queryPlanner")
+    if planner is None:
+        # 聚合的explain结构：stages[0].$cursor.queryPlanner
+        for stage in explain_result.get("stages", []):
+            cursor = stage.get("$cursor")
+            if cursor and "queryPlanner" in cursor:
+                planner = cursor["queryPlanner"]
+                break
+    planner = planner or {}
+    stages = []
+    node = planner.get("winningPlan", {})
+    # 新版本查询引擎把计划包在 queryPlan 中
+    node = node.get("queryPlan", node)
+    index_names = []
+    while node:
+        stages.append(node.get("stage"))
+        if node.get("indexName"):
+            index_names.append(node["indexName"])
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0]
+    return {
+        "stages": [stage for stage in stages if stage],
+        "indexes": index_names,
+        "collscan": "COLLSCAN" in stages
+    }
+
+
+def get_current_scope() -> Optional[OperationScope]:
+    return _current_scope.get()
+
+
+# 保存执行计划的本地集合
+EXPLAIN_COLLECTION = "system_query_explains"
+
+
+def capture_explains(db, top: int = 5) -> List[Dict[str, Any]]:
+    """
+    对累计耗时最高的慢查询形状执行explain，并把执行计划保存到本地集合
+
+    Args:
+        db: pymongo Database（应为本地库，explain会对其执行）
+        top: 处理的形状数量
+
+    Returns:
+        保存的执行计划摘要
+    """
+    captured = []
+    for shape_key, sample in query_insights.worst_samples(top):
+        collection, command_name, shape = _split_shape_key(shape_key)
+        record = {
+            "collection": collection,
+            "command": command_name,
+            "shape": shape,
+            "sample_duration_ms": round(sample["duration_ms"], 2),
+            "captured_at": datetime.now()
+        }
+        try:
+            result = db.command(build_explain_command(command_name, sample["command"]))
+            record.update(summarize_plan(result))
+            record["raw_plan"] = json.loads(json.dumps(result, default=str))
+        except Exception as e:
+            record["error"] = str(e)
+        try:
+            db[EXPLAIN_COLLECTION].replace_one(
+                {"collection": collection, "command": command_name, "shape": shape},
+                record, upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ 保存执行计划失败: {e}")
+        record.pop("raw_plan", None)
+        record["captured_at"] = record["captured_at"].isoformat()
+        captured.append(record)
+    return captured
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    统计Mongo命令次数与耗时；无作用域的命令（后台任务、motor线程）计入全局未归属统计。
+    同时计算查询形状，用于慢查询记录与N+1检测。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total_ops = 0
+        self.total_time_ms = 0.0
+        self.unattributed_ops = 0
+        self.failed_ops = 0
+        self.by_command: Dict[str, int] = {}
+        # (connection_id, request_id) -> (形状键, 集合, 形状, 原始命令)
+        self._inflight: Dict[Tuple[Any, int], Tuple[str, str, str, Dict[str, Any]]] = {}
+
+    def started(self, event) -> None:
+        command_name = event.command_name
+        if command_name in IGNORED_COMMANDS or command_name in UNSHAPED_COMMANDS:
+            return
+        try:
+            collection, shape = describe_command(command_name, event.command)
+        except Exception:
+            return
+        shape_key = _make_shape_key(collection, command_name, shape)
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (shape_key, collection, shape, event.command)
+
+    def _record(self, event, failed: bool) -> None:
+        command_name = event.command_name
+        if command_name in IGNORED_COMMANDS:
+            return
+        duration_ms = event.duration_micros / 1000.0
+        with self._lock:
+            started = self._inflight.pop((event.connection_id, event.request_id), None)
+        shape_key = started[0] if started else None
+        scope = _current_scope.get()
+        if scope is not None:
+            scope.record(duration_ms, failed, shape_key)
+        if started and duration_ms >= SLOW_QUERY_MS:
+            _, collection, shape, command = started
+            query_insights.record_slow(
+                shape_key, collection, command_name, shape, duration_ms, command,
+                scope.name if scope is not None else None
+            )
+        with self._lock:
+            self.total_ops += 1
+            self.total_time_ms += duration_ms
+            self.by_command[command_name] = self.by_command.get(command_name, 0) + 1
+            if scope is None:
+                self.unattributed_ops += 1
+            if failed:
+                self.failed_ops += 1
+
+    def succeeded(self, event) -> None:
+        self._record(event, failed=False)
+
+    def failed(self, event) -> None:
+        self._record(event, failed=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_ops": self.total_ops,
+                "total_time_ms": round(self.total_time_ms, 2),
+                "unattributed_ops": self.unattributed_ops,
+                "failed_ops": self.failed_ops,
+                "by_command": dict(self.by_command)
+            }
+
+
+command_metrics_listener = CommandMetricsListener()
+
+
+def get_command_listeners() -> List[monitoring.CommandListener]:
+    """创建MongoClient时传入的命令监听器列表"""
+    return [command_metrics_listener]
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+认证主体缓存
+get_current_user 每次请求都要查询 users 集合，SSE 重连和回测进度轮询尤其频繁。
+这里提供 进程内 + Redis 两级短TTL缓存，按 user_id 存放已脱敏的用户文档；
+管理接口修改角色/状态/删除用户时需显式调用 invalidate。
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 进程内缓存TTL较短：其它worker的失效只能通过Redis传播，这里决定了最长的滞后时间
+LOCAL_TTL_SECONDS = 5
+REDIS_TTL_SECONDS = 60
+MAX_LOCAL_ENTRIES = 10000
+
+# 不允许进入缓存的敏感字段
+_SENSITIVE_FIELDS = ("password_hash",)
+
+
+def _get_cache_manager():
+    """获取全局Redis缓存管理器（未初始化或不可用时返回None）"""
+    try:
+        from cache_manager import get_cache_manager
+    except ImportError:
+        return None
+    cache_manager = get_cache_manager()
+    if cache_manager and cache_manager.redis_client is not None:
+        return cache_manager
+    return None
+
+
+class PrincipalCache:
+    """
+    认证主体两级缓存
+
+    - L1: 进程内字典，TTL LOCAL_TTL_SECONDS
+    - L2: Redis，TTL REDIS_TTL_SECONDS，所有worker共享
+    """
+
+    def __init__(self,
+                 local_ttl: int = LOCAL_TTL_SECONDS,
+                 redis_ttl: int = REDIS_TTL_SECONDS,
+                 max_entries: int = MAX_LOCAL_ENTRIES):
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.max_entries = max_entries
+        self._local: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, user_id: str) -> str:
+        return f"stock_api:principal:{user_id}"
+
+    @staticmethod
+    def _sanitize(user: Dict[str, Any]) -> Dict[str, Any]:
+        """去除敏感字段，并把ObjectId转为字符串以便序列化"""
+        principal = {k: v for k, v in user.items() if k not in _SENSITIVE_FIELDS}
+        if "_id" in principal:
+            principal["_id"] = str(principal["_id"])
+        return principal
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取缓存的用户主体
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            用户文档副本，未命中返回None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is not None:
+                expires_at, principal = entry
+                if expires_at > now:
+                    self.hits += 1
+                    return dict(principal)
+                del self._local[user_id]
+
+        cache_manager = _get_cache_manager()
+        if cache_manager is not None:
+            try:
+                raw = cache_manager.redis_client.get(self._redis_key(user_id))
+                if raw:
+                    principal = json.loads(raw)
+                    self._set_local(user_id, principal)
+                    self.redis_hits += 1
+                    return dict(principal)
+            except Exception as e:
+                logger.warning(f"读取认证主体缓存失败 {user_id}: {e}")
+
+        self.misses += 1
+        return None
+
+    def set(self, user_id: str, user: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        写入用户主体缓存
+
+        Args:
+            user_id: 用户ID
+            user: users 集合中的原始文档
+
+        Returns:
+            脱敏后的用户主体
+        """
+        principal = self._sanitize(user)
+        self._set_local(user_id, principal)
+
+        cache_manager = _get_cache_manager()
+        if cache_manager is not None:
+            try:
+                cache_manager.redis_client.setex(
+                    self._redis_key(user_id),
+                    self.redis_ttl,
+                    json.dumps(principal, ensure_ascii=False, default=str)
+                )
+            except Exception as e:
+                logger.warning(f"写入认证主体缓存失败 {user_id}: {e}")
+        return dict(principal)
+
+    def _set_local(self, user_id: str, principal: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self._local) >= self.max_entries and user_id not in self._local:
+                # 超出容量时淘汰最早写入的条目
+                self._local.pop(next(iter(self._local)))
+            self._local[user_id] = (time.monotonic() + self.local_ttl, principal)
+
+    def invalidate(self, user_id: str) -> None:
+        """
+        使指定用户的缓存失效（角色、状态变更或删除用户后调用）
+
+        Args:
+            user_id: 用户ID
+        """
+        with self._lock:
+            self._local.pop(user_id, None)
+
+        cache_manager = _get_cache_manager()
+        if cache_manager is not None:
+            try:
+                cache_manager.redis_client.delete(self._redis_key(user_id))
+            except Exception as e:
+                logger.warning(f"删除认证主体缓存失败 {user_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        total = self.hits + self.redis_hits + self.misses
+        return {
+            "local_entries": len(self._local),
+            "local_hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.redis_hits) / total if total else 0.0
+        }
+
+
+# 全局单例
+principal_cache = PrincipalCache()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+策略选股结果共享缓存
+
+选股结果只取决于 (策略, 参数, 股票池, 数据交易日)，与请求用户无关：
+- 缓存键 = 策略作用域 + 数据版本（最新交易日）+ 规范化参数的哈希，跨用户、跨worker共享（Redis）
+- 用户相关参数（current_user、保存到股票池等）不参与缓存键，由 overlay 在共享结果之上按用户叠加
+- 数据版本随盘后数据入库自动变化，旧结果不会被读到，无需主动失效
+
+用法:
+    @router.post("/value-investment")
+    @screening_cache("value_investment", user_params=("current_user", "save_to_pool", "pool_name"),
+                     overlay=_stock_pool_overlay)
+    async def value_investment_screening(...): ...
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import time
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from cache_manager import get_cache_manager
+from cache_config import get_ttl_for_data_type, get_cache_key_prefix
+
+logger = logging.getLogger(__name__)
+
+SCREENING_DATA_TYPE = "strategy_screening"
+
+# 数据版本在进程内的复用时间（秒），避免每次请求都查询最新交易日
+DATA_VERSION_TTL = 60
+_data_version: Dict[str, Any] = {"value": None, "expires_at": 0.0}
+
+
+async def get_data_version() -> str:
+    """选股数据版本：stock_factor_pro 的最新交易日"""
+    now = time.time()
+    if _data_version["value"] and now < _data_version["expires_at"]:
+        return _data_version["value"]
+
+    from api.precompute.strategy_screens import latest_screen_date
+    try:
+        version = await latest_screen_date() or "none"
+    except Exception as e:
+        logger.warning(f"获取选股数据版本失败: {e}")
+        return _data_version["value"] or "none"
+    _data_version.update(value=version, expires_at=now + DATA_VERSION_TTL)
+    return version
+
+
+def canonical_params_hash(params: Dict[str, Any]) -> str:
+    """参数规范化（键排序、紧凑JSON）后取哈希，参数顺序和请求来源不影响结果"""
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:24]
+
+
+def screening_cache_key(scope: str, params: Dict[str, Any], data_version: str) -> str:
+    """共享选股缓存键"""
+    return f"{get_cache_key_prefix(SCREENING_DATA_TYPE)}:{scope}:{data_version}:{canonical_params_hash(params)}"
+
+
+def screening_cache(scope: str,
+                    user_params: Sequence[str] = ("current_user",),
+                    overlay: Optional[Callable[[Any, Dict[str, Any]], Awaitable[Any]]] = None,
+                    ttl: Optional[int] = None):
+    """
+    选股接口共享缓存装饰器
+
+    Args:
+        scope: 缓存作用域（通常为策略名）
+        user_params: 不参与缓存键的用户相关参数
+        overlay: 用户叠加处理 async (result, user_args) -> result，命中与未命中都会执行
+        ttl: 缓存时间（秒），默认取 strategy_screening 数据类型的TTL
+    """
+    def decorator(func):
+        sig = inspect.signature(func)
+        return_annotation = func.__annotations__.get('return')
+
+        async def apply_overlay(result, user_args):
+            if overlay is None or result is None:
+                return result
+            return await overlay(result, user_args)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound_args = sig.bind(*args, **kwargs)
+            bound_args.apply_defaults()
+            arguments = dict(bound_args.arguments)
+            user_args = {name: arguments.pop(name) for name in user_params if name in arguments}
+
+            cache_manager = get_cache_manager()
+            if not cache_manager or not cache_manager.is_available():
+                return await apply_overlay(await func(*args, **kwargs), user_args)
+
+            cache_key = screening_cache_key(scope, arguments, await get_data_version())
+            cached_result = await cache_manager.async_get(cache_key)
+            if cached_result is not None:
+                logger.debug(f"选股缓存命中: {cache_key}")
+                result = cached_result
+                if isinstance(cached_result, dict) and hasattr(return_annotation, 'model_validate'):
+                    try:
+                        result = return_annotation.model_validate(cached_result)
+                    except Exception:
+                        pass
+                return await apply_overlay(result, user_args)
+
+            # 共享结果不含用户叠加部分
+            result = await func(*args, **kwargs)
+            if result is not None:
+                cache_data = result.model_dump() if hasattr(result, 'model_dump') else result
+                await cache_manager.async_set(cache_key, cache_data, ttl or get_ttl_for_data_type(SCREENING_DATA_TYPE))
+            return await apply_overlay(result, user_args)
+
+        return wrapper
+
+    return decorator
@@ -15,6 +15,9 @@ from api.global_db import db_handler
 
 # 使用全局数据库处理器
 
+# comprehensive_screening 每批处理的股票数量（每批每个数据源一次 $in 查询）
+SCREENING_BATCH_SIZE = 200
+
 # ==================== 数据类定义 ====================
 
 @dataclass
@@ -151,6 +154,44 @@ class SpecialFeatures:
 
 # ==================== 技术面分析 - 性能优化版 ====================
 
+# ==================== 批量查询工具 ====================
+
+def _latest_documents(collection, ts_codes: List[str], date_field: str,
+                      date_value: Optional[str] = None) -> Dict[str, dict]:
+    """
+    批量获取每只股票的记录：先按指定日期一次 $in 查询，
+    缺失的股票再用一次聚合回退到各自最新一条（与单只查询的回退逻辑一致）
+    """
+    docs: Dict[str, dict] = {}
+    if not ts_codes:
+        return docs
+    if date_value:
+        for doc in collection.find({"ts_code": {"$in": ts_codes}, date_field: date_value}):
+            docs.setdefault(doc["ts_code"], doc)
+    missing = [code for code in ts_codes if code not in docs]
+    if missing:
+        pipeline = [
+            {"$match": {"ts_code": {"$in": missing}}},
+            {"$sort": {"ts_code": 1, date_field: -1}},
+            {"$group": {"_id": "$ts_code", "doc": {"$first": "$$ROOT"}}},
+        ]
+        for row in collection.aggregate(pipeline, allowDiskUse=True):
+            docs[row["_id"]] = row["doc"]
+    return docs
+
+
+def _load_stock_basic(db, ts_codes: List[str]) -> Dict[str, dict]:
+    """批量获取股票基本信息，按 ts_code 返回"""
+    if not ts_codes:
+        return {}
+    return {doc["ts_code"]: doc for doc in db["infrastructure_stock_basic"].find({"ts_code": {"$in": ts_codes}})}
+
+
+def _load_stock_names(db, ts_codes: List[str]) -> Dict[str, str]:
+    """批量获取股票名称"""
+    return {code: doc.get("name", "") for code, doc in _load_stock_basic(db, ts_codes).items()}
+
+
 class TechnicalAnalyzer:
     """技术面分析器 - 使用预计算数据，性能提升100-600倍"""
     
@@ -207,6 +248,33 @@ class TechnicalAnalyzer:
             print(f"获取技术指标失败 {ts_code}: {str(e)}")
             return None
     
+    async def get_batch_technical_indicators(
+        self, ts_codes: List[str], trade_date: str = None, names: Dict[str, str] = None
+    ) -> Dict[str, TechnicalIndicators]:
+        """
+        批量获取技术指标
+        指定交易日一次 $in 查询，缺失的股票按各自最新记录补齐，返回 {ts_code: 技术指标}
+        """
+        from api.async_db_handler import run_sync
+        try:
+            return await run_sync(self._load_batch_indicators, ts_codes, trade_date, names)
+        except Exception as e:
+            print(f"批量获取技术指标失败: {str(e)}")
+            return {}
+
+    def _load_batch_indicators(self, ts_codes: List[str], trade_date: Optional[str],
+                               names: Optional[Dict[str, str]]) -> Dict[str, TechnicalIndicators]:
+        """批量技术指标的同步实现"""
+        if not trade_date:
+            trade_date = self.get_latest_trade_date()
+        factor_docs = _latest_documents(self.db["stock_factor_pro"], ts_codes, "trade_date", trade_date)
+        if names is None:
+            names = _load_stock_names(self.db, list(factor_docs))
+        return {
+            code: self._map_factor_data_to_indicators(doc, names.get(code, ""))
+            for code, doc in factor_docs.items()
+        }
+
     def _map_factor_data_to_indicators(self, factor_data: dict, name: str) -> TechnicalIndicators:
         """将预计算数据映射到技术指标对象"""
         
@@ -509,6 +577,33 @@ class FundamentalAnalyzer:
             print(f"获取基本面评分失败 {ts_code}: {str(e)}")
             return None
     
+    async def get_batch_fundamental_scores(
+        self, ts_codes: List[str], period: str = None, names: Dict[str, str] = None
+    ) -> Dict[str, FundamentalScores]:
+        """
+        批量获取基本面评分
+        指定报告期一次 $in 查询，缺失的股票按各自最新报告期补齐，返回 {ts_code: 基本面评分}
+        """
+        from api.async_db_handler import run_sync
+        try:
+            return await run_sync(self._load_batch_scores, ts_codes, period, names)
+        except Exception as e:
+            print(f"批量获取基本面评分失败: {str(e)}")
+            return {}
+
+    def _load_batch_scores(self, ts_codes: List[str], period: Optional[str],
+                           names: Optional[Dict[str, str]]) -> Dict[str, FundamentalScores]:
+        """批量基本面评分的同步实现"""
+        if not period:
+            period = self.get_latest_report_period()
+        fina_docs = _latest_documents(self.db["stock_fina_indicator"], ts_codes, "end_date", period)
+        if names is None:
+            names = _load_stock_names(self.db, list(fina_docs))
+        return {
+            code: self._map_fina_data_to_scores(doc, names.get(code, ""))
+            for code, doc in fina_docs.items()
+        }
+
     def _map_fina_data_to_scores(self, fina_data: dict, name: str) -> FundamentalScores:
         """将预计算财务数据映射到基本面评分对象"""
         
@@ -647,22 +742,7 @@ class SpecialDataAnalyzer:
                 sort=[("trade_date", -1)]
             )
             
-            if not limit_step:
-                return None
-            
-            limit_days = limit_step.get("step", 0)
-            
-            # 计算连板强度（基于连板天数和市场表现）
-            if limit_days > 0:
-                # 简单的强度计算：连板天数越多，强度越高
-                limit_strength = min(100, limit_days * 20)  # 最高100分
-            else:
-                limit_strength = 0
-            
-            return {
-                "limit_days": limit_days,
-                "limit_strength": limit_strength
-            }
+            return self._limit_features(limit_step)
             
         except Exception as e:
             print(f"获取连板数据失败 {ts_code}: {str(e)}")
@@ -681,17 +761,7 @@ class SpecialDataAnalyzer:
             
             hot_money_records = list(cursor)
             
-            if not hot_money_records:
-                return None
-            
-            # 计算游资活跃度评分
-            score = min(100, len(hot_money_records) * 10)  # 每次上榜10分，最高100分
-            rank = len(hot_money_records)  # 简化排名
-            
-            return {
-                "rank": rank,
-                "score": score
-            }
+            return self._hot_money_features(len(hot_money_records))
             
         except Exception as e:
             print(f"获取游资数据失败 {ts_code}: {str(e)}")
@@ -706,22 +776,7 @@ class SpecialDataAnalyzer:
                 sort=[("trade_date", -1)]
             )
             
-            if not money_flow:
-                return None
-            
-            net_inflow = money_flow.get("net_mf_amount", 0)
-            
-            # 计算资金流入强度（相对于成交额的比例）
-            trade_amount = money_flow.get("trade_amount", 1)
-            if trade_amount > 0:
-                inflow_strength = abs(net_inflow) / trade_amount * 100
-            else:
-                inflow_strength = 0
-            
-            return {
-                "net_inflow": net_inflow,
-                "inflow_strength": min(100, inflow_strength)  # 最高100分
-            }
+            return self._money_flow_features(money_flow)
             
         except Exception as e:
             print(f"获取资金流向数据失败 {ts_code}: {str(e)}")
@@ -738,17 +793,157 @@ class SpecialDataAnalyzer:
                 "trade_date": {"$gte": recent_date}
             })
             
-            # 计算机构关注度评分
-            attention_score = min(100, dragon_tiger_count * 5)  # 每次上榜5分，最高100分
-            
-            return {
-                "attention_score": attention_score,
-                "dragon_tiger_count": dragon_tiger_count
-            }
+            return self._institution_features(dragon_tiger_count)
             
         except Exception as e:
             print(f"获取机构关注度失败 {ts_code}: {str(e)}")
             return None
+    
+    # ---------- 单条记录到特色指标的换算（单只与批量查询共用） ----------
+    
+    @staticmethod
+    def _limit_features(limit_step: Optional[dict]) -> Optional[Dict[str, Any]]:
+        """连板记录 -> 连板天数与强度"""
+        if not limit_step:
+            return None
+        
+        limit_days = limit_step.get("step", 0)
+        
+        # 计算连板强度（基于连板天数和市场表现）
+        if limit_days > 0:
+            # 简单的强度计算：连板天数越多，强度越高
+            limit_strength = min(100, limit_days * 20)  # 最高100分
+        else:
+            limit_strength = 0
+        
+        return {
+            "limit_days": limit_days,
+            "limit_strength": limit_strength
+        }
+    
+    @staticmethod
+    def _hot_money_features(record_count: int) -> Optional[Dict[str, Any]]:
+        """近30天龙虎榜次数 -> 游资活跃度"""
+        if not record_count:
+            return None
+        
+        # 计算游资活跃度评分
+        score = min(100, record_count * 10)  # 每次上榜10分，最高100分
+        rank = record_count  # 简化排名
+        
+        return {
+            "rank": rank,
+            "score": score
+        }
+    
+    @staticmethod
+    def _money_flow_features(money_flow: Optional[dict]) -> Optional[Dict[str, Any]]:
+        """最新资金流向记录 -> 净流入与流入强度"""
+        if not money_flow:
+            return None
+        
+        net_inflow = money_flow.get("net_mf_amount", 0)
+        
+        # 计算资金流入强度（相对于成交额的比例）
+        trade_amount = money_flow.get("trade_amount", 1)
+        if trade_amount > 0:
+            inflow_strength = abs(net_inflow) / trade_amount * 100
+        else:
+            inflow_strength = 0
+        
+        return {
+            "net_inflow": net_inflow,
+            "inflow_strength": min(100, inflow_strength)  # 最高100分
+        }
+    
+    @staticmethod
+    def _institution_features(dragon_tiger_count: int) -> Dict[str, Any]:
+        """近3个月龙虎榜次数 -> 机构关注度"""
+        # 计算机构关注度评分
+        attention_score = min(100, dragon_tiger_count * 5)  # 每次上榜5分，最高100分
+        
+        return {
+            "attention_score": attention_score,
+            "dragon_tiger_count": dragon_tiger_count
+        }
+    
+    # ---------- 批量查询 ----------
+    
+    async def get_batch_special_features(
+        self, ts_codes: List[str], names: Dict[str, str] = None
+    ) -> Dict[str, SpecialFeatures]:
+        """
+        批量获取特色数据
+        连板、资金流向、龙虎榜三个数据源各一次批量查询并发执行，返回 {ts_code: 特色数据}
+        """
+        import asyncio
+        from api.async_db_handler import run_sync
+        
+        try:
+            if names is None:
+                names = await run_sync(_load_stock_names, self.db, ts_codes)
+            
+            results = await asyncio.gather(
+                run_sync(_latest_documents, self.db["limit_step"], ts_codes, "trade_date"),
+                run_sync(_latest_documents, self.db["stock_money_flow"], ts_codes, "trade_date"),
+                run_sync(self._batch_top_list_counts, ts_codes),
+                return_exceptions=True
+            )
+            limit_docs, flow_docs, top_counts = [
+                {} if isinstance(result, Exception) else result for result in results
+            ]
+            
+            features_map = {}
+            for ts_code in ts_codes:
+                try:
+                    features = SpecialFeatures(ts_code=ts_code, name=names.get(ts_code, ""))
+                    count_30, count_90 = top_counts.get(ts_code, (0, 0))
+                
+                    limit_data = self._limit_features(limit_docs.get(ts_code))
+                    if limit_data:
+                        features.limit_days = limit_data.get("limit_days")
+                        features.limit_strength = limit_data.get("limit_strength")
+                
+                    hot_money_data = self._hot_money_features(count_30)
+                    if hot_money_data:
+                        features.hot_money_rank = hot_money_data.get("rank")
+                        features.hot_money_score = hot_money_data.get("score")
+                
+                    money_flow_data = self._money_flow_features(flow_docs.get(ts_code))
+                    if money_flow_data:
+                        features.net_inflow = money_flow_data.get("net_inflow")
+                        features.inflow_strength = money_flow_data.get("inflow_strength")
+                
+                    institution_data = self._institution_features(count_90)
+                    features.institution_attention = institution_data.get("attention_score")
+                    features.dragon_tiger_count = institution_data.get("dragon_tiger_count")
+                
+                    features_map[ts_code] = features
+                except Exception as e:
+                    print(f"处理特色数据失败 {ts_code}: {str(e)}")
+            
+            return features_map
+            
+        except Exception as e:
+            print(f"批量获取特色数据失败: {str(e)}")
+            return {}
+    
+    def _batch_top_list_counts(self, ts_codes: List[str]) -> Dict[str, Tuple[int, int]]:
+        """一次聚合统计近30天/近3个月的龙虎榜上榜次数"""
+        recent_30 = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+        recent_90 = (datetime.now() - timedelta(days=90)).strftime('%Y%m%d')
+        pipeline = [
+            {"$match": {"ts_code": {"$in": ts_codes}, "trade_date": {"$gte": recent_90}}},
+            {"$group": {
+                "_id": "$ts_code",
+                "count_30": {"$sum": {"$cond": [{"$gte": ["$trade_date", recent_30]}, 1, 0]}},
+                "count_90": {"$sum": 1},
+            }},
+        ]
+        return {
+            row["_id"]: (row["count_30"], row["count_90"])
+            for row in self.db["top_list"].aggregate(pipeline)
+        }
 
 # ==================== 资金追踪分析器 ====================
 
@@ -759,7 +954,20 @@ class FundFlowAnalyzer:
         self.db = db_handler.db
     
     async def analyze_fund_flow(self, ts_code: str) -> Dict[str, Any]:
-        """综合资金流向分析 - 重新设计版"""
+        """
+        综合资金流向分析
+        从按交易日缓存的全市场资金追踪面板中取值，首次调用时一次性构建面板
+        """
+        from api.async_db_handler import run_sync
+        from api.utils.fund_flow_panel import get_fund_flow_panel_engine
+        try:
+            return await run_sync(get_fund_flow_panel_engine().analyze, ts_code)
+        except Exception as e:
+            print(f"资金流向分析失败 {ts_code}: {str(e)}")
+            return {}
+    
+    async def analyze_fund_flow_single(self, ts_code: str) -> Dict[str, Any]:
+        """综合资金流向分析 - 逐只查询版（面板口径的参照实现）"""
         try:
             # 获取股票基本信息
             stock_info = self.db["infrastructure_stock_basic"].find_one({"ts_code": ts_code})
@@ -1168,6 +1376,386 @@ class FundFlowAnalyzer:
 
 # ==================== 策略选股引擎 ====================
 
+# ==================== 集合化选股引擎 ====================
+
+# 技术指标字段映射（stock_factor_pro 字段 -> TechnicalIndicators 属性，口径同 TechnicalAnalyzer）
+FACTOR_FIELD_MAP = {
+    "close": "close", "vol": "volume",
+    "ma_qfq_5": "ma5", "ma_qfq_10": "ma10", "ma_qfq_20": "ma20", "ma_qfq_60": "ma60",
+    "macd_qfq": "macd", "macd_dea_qfq": "macd_signal", "macd_dif_qfq": "macd_hist",
+    "rsi_qfq_6": "rsi_6", "rsi_qfq_12": "rsi_12", "rsi_qfq_24": "rsi_24",
+    "kdj_k_qfq": "kdj_k", "kdj_d_qfq": "kdj_d", "kdj_qfq": "kdj_j",
+    "boll_upper_qfq": "bb_upper", "boll_mid_qfq": "bb_middle", "boll_lower_qfq": "bb_lower",
+    "volume_ratio": "volume_ratio", "pe": "pe", "pb": "pb", "pct_chg": "pct_chg", "total_mv": "total_mv",
+}
+
+# 财务指标字段映射（stock_fina_indicator 字段 -> FundamentalScores 属性，口径同 FundamentalAnalyzer）
+FINA_FIELD_MAP = {
+    "or_yoy": "revenue_growth", "profit_dedt": "profit_growth",
+    "roe": "roe", "roa": "roa", "grossprofit_margin": "gross_margin",
+    "pe": "pe", "pb": "pb", "ps": "ps",
+    "debt_to_assets": "debt_ratio", "current_ratio": "current_ratio", "quick_ratio": "quick_ratio",
+}
+
+# 条件 -> (列, 比较方式)。min/max 条件在该列缺失时视为通过；positive 条件要求列存在且大于0
+TECHNICAL_CONDITION_RULES = {
+    "rsi_min": ("tech_rsi", "min"),
+    "rsi_max": ("tech_rsi", "max"),
+    "macd_positive": ("tech_macd", "positive"),
+    "volume_ratio_min": ("tech_volume_ratio", "min"),
+    "kdj_k_min": ("tech_kdj_k", "min"),
+}
+FUNDAMENTAL_CONDITION_RULES = {
+    "total_score_min": ("fund_total_score", "min"),
+    "roe_min": ("fund_roe", "min"),
+    "pe_max": ("fund_pe", "max"),
+    "pb_max": ("fund_pb", "max"),
+    "growth_score_min": ("fund_growth_score", "min"),
+    "profitability_score_min": ("fund_profitability_score", "min"),
+    "debt_ratio_max": ("fund_debt_ratio", "max"),
+}
+SPECIAL_CONDITION_RULES = {
+    "limit_days_min": ("spec_limit_days", "min"),
+    "net_inflow_positive": ("spec_net_inflow", "positive"),
+    "hot_money_score_min": ("spec_hot_money_score", "min"),
+}
+
+# 选股默认市场范围
+SCREENING_MARKETS = ["主板", "创业板", "科创板"]
+
+
+def _linear_score(values: pd.Series, low: float, high: float, reverse: bool = False) -> pd.Series:
+    """把 [low, high] 线性映射到 0~100 分（reverse 时反向），NaN 保持为 NaN"""
+    score = (values - low) / (high - low) * 100
+    if reverse:
+        score = 100 - score
+    return score.clip(0, 100)
+
+
+def _row_mean(parts: List[pd.Series]) -> pd.Series:
+    """逐行对非缺失分项取平均，全部缺失时为 NaN"""
+    frame = pd.concat(parts, axis=1)
+    return frame.mean(axis=1, skipna=True)
+
+
+def _weighted_mean(parts: List[Tuple[pd.Series, float]]) -> pd.Series:
+    """逐行按权重对非缺失分项加权平均（权重在非缺失分项间归一化），全部缺失时为 NaN"""
+    total = None
+    weight_sum = None
+    for values, weight in parts:
+        present = values.notna()
+        contribution = values.fillna(0) * weight
+        weights = present.astype(float) * weight
+        total = contribution if total is None else total + contribution
+        weight_sum = weights if weight_sum is None else weight_sum + weights
+    return (total / weight_sum.replace(0, np.nan)).where(weight_sum > 0)
+
+
+def _apply_rules(frame: pd.DataFrame, conditions: Dict[str, Any], rules: Dict[str, Tuple[str, str]]) -> pd.Series:
+    """按条件规则生成布尔掩码"""
+    mask = pd.Series(True, index=frame.index)
+    for key, value in conditions.items():
+        rule = rules.get(key)
+        if rule is None or value is None:
+            continue
+        column, kind = rule
+        values = frame[column]
+        if kind == "min":
+            mask &= ~(values < value)
+        elif kind == "max":
+            mask &= ~(values > value)
+        elif kind == "positive" and value:
+            mask &= values > 0
+    return mask
+
+
+def _numeric_frame(docs: List[Dict[str, Any]], key: str, field_map: Dict[str, str]) -> pd.DataFrame:
+    """Mongo文档转为以代码为索引的数值表，字段按映射重命名（无文档时返回带全部列的空表）"""
+    frame = pd.DataFrame(docs, columns=[key, *field_map]).drop_duplicates(key).set_index(key)
+    for column in frame.columns:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    frame.index.name = "ts_code"
+    return frame.rename(columns=field_map)
+
+
+def _clean(value: Any) -> Any:
+    """NaN 转 None，numpy 标量转 Python 标量"""
+    if value is None:
+        return None
+    if isinstance(value, (float, np.floating)) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class CrossSectionScreener:
+    """
+    集合化选股引擎
+    每个数据源按全市场截面各查询一次，合并为一张以 ts_code 为索引的表，
+    条件与评分都以向量化的布尔掩码/列运算完成，结果覆盖整个股票池而不受遍历顺序影响。
+    """
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else db_handler.db
+
+    # ---------- 截面加载 ----------
+
+    def load_universe(self, stock_pool: Optional[List[str]] = None) -> pd.DataFrame:
+        """股票池基本信息（name/industry/market）"""
+        query: Dict[str, Any] = {"ts_code": {"$in": list(stock_pool)}} if stock_pool else {"market": {"$in": SCREENING_MARKETS}}
+        docs = list(self.db["infrastructure_stock_basic"].find(
+            query, {"_id": 0, "ts_code": 1, "name": 1, "industry": 1, "market": 1}
+        ))
+        frame = pd.DataFrame(docs, columns=["ts_code", "name", "industry", "market"])
+        frame = frame.drop_duplicates("ts_code").set_index("ts_code")
+        if stock_pool:
+            # 基本信息缺失的代码仍参与选股（名称为空），与逐只选股一致
+            frame = frame.reindex(list(dict.fromkeys(stock_pool)))
+        return frame
+
+    def load_technical(self, ts_codes: List[str]) -> pd.DataFrame:
+        """最新交易日的技术指标截面"""
+        latest = self.db["stock_factor_pro"].find_one({}, {"trade_date": 1}, sort=[("trade_date", -1)])
+        docs = []
+        if latest:
+            projection = {"_id": 0, "ts_code": 1, **{field: 1 for field in FACTOR_FIELD_MAP}}
+            docs = list(self.db["stock_factor_pro"].find(
+                {"trade_date": latest["trade_date"], "ts_code": {"$in": ts_codes}}, projection
+            ))
+        frame = _numeric_frame(docs, "ts_code", FACTOR_FIELD_MAP)
+
+        frame["rsi"] = frame["rsi_12"]
+        band = frame["bb_upper"] - frame["bb_lower"]
+        frame["bb_width"] = (band / frame["bb_middle"] * 100).where(
+            (frame["bb_upper"] != 0) & (frame["bb_lower"] != 0) & (frame["bb_middle"] != 0)
+        )
+        frame["price_position"] = ((frame["close"] - frame["bb_lower"]) / band * 100).where(
+            (band > 0) & (frame["close"] != 0) & (frame["bb_lower"] != 0)
+        )
+        frame["volume"] = frame["volume"].fillna(0)
+        return frame.add_prefix("tech_")
+
+    def load_fundamental(self, ts_codes: List[str]) -> pd.DataFrame:
+        """每只股票最近一期财务指标及各项评分"""
+        latest = self.db["stock_fina_indicator"].find_one({}, {"end_date": 1}, sort=[("end_date", -1)])
+        docs = []
+        if latest:
+            # 只回看两年的报告期，利用 (ts_code, end_date) 索引取每只股票的最新一期
+            window_start = f"{int(str(latest['end_date'])[:4]) - 2}0101"
+            pipeline = [
+                {"$match": {"ts_code": {"$in": ts_codes}, "end_date": {"$gte": window_start}}},
+                {"$sort": {"ts_code": 1, "end_date": -1}},
+                {"$group": {"_id": "$ts_code", **{field: {"$first": f"${field}"} for field in FINA_FIELD_MAP}}},
+            ]
+            docs = list(self.db["stock_fina_indicator"].aggregate(pipeline, allowDiskUse=True))
+        frame = _numeric_frame(docs, "_id", FINA_FIELD_MAP)
+
+        frame["growth_score"] = _row_mean([
+            _linear_score(frame["revenue_growth"], -20, 50),
+            _linear_score(frame["profit_growth"], -30, 100),
+        ])
+        frame["profitability_score"] = _row_mean([
+            _linear_score(frame["roe"], -10, 30),
+            _linear_score(frame["roa"], -5, 15),
+            _linear_score(frame["gross_margin"], 0, 80),
+        ])
+        frame["valuation_score"] = _row_mean([
+            _linear_score(frame["pe"].where(frame["pe"] > 0), 5, 100, reverse=True),
+            _linear_score(frame["pb"].where(frame["pb"] > 0), 0.5, 10, reverse=True),
+            _linear_score(frame["ps"].where(frame["ps"] > 0), 0.5, 20, reverse=True),
+        ])
+        frame["financial_health_score"] = _row_mean([
+            _linear_score(frame["debt_ratio"], 0, 80, reverse=True),
+            _linear_score(frame["current_ratio"], 0.5, 3),
+            _linear_score(frame["quick_ratio"], 0.3, 2),
+        ])
+        frame["total_score"] = _weighted_mean([
+            (frame["growth_score"], 0.3),
+            (frame["profitability_score"], 0.35),
+            (frame["valuation_score"], 0.25),
+            (frame["financial_health_score"], 0.1),
+        ])
+        return frame.add_prefix("fund_")
+
+    def load_special(self, ts_codes: List[str]) -> pd.DataFrame:
+        """连板、龙虎榜、资金流向特色数据截面（口径同 SpecialDataAnalyzer）"""
+        frame = pd.DataFrame(index=pd.Index(ts_codes, name="ts_code"))
+
+        limit_docs = list(self.db["limit_step"].aggregate([
+            {"$match": {"ts_code": {"$in": ts_codes}}},
+            {"$sort": {"ts_code": 1, "trade_date": -1}},
+            {"$group": {"_id": "$ts_code", "step": {"$first": "$step"}}},
+        ], allowDiskUse=True))
+        limit_days = pd.Series({doc["_id"]: doc.get("step") or 0 for doc in limit_docs}, dtype=float)
+        frame["limit_days"] = limit_days.reindex(frame.index)
+        frame["limit_strength"] = (
+            (frame["limit_days"] * 20).clip(upper=100).where(frame["limit_days"] > 0, 0).where(frame["limit_days"].notna())
+        )
+
+        # 龙虎榜：近30天上榜次数（游资活跃度）与近90天上榜次数（机构关注度）一次聚合
+        now = datetime.now()
+        recent_30 = (now - timedelta(days=30)).strftime('%Y%m%d')
+        recent_90 = (now - timedelta(days=90)).strftime('%Y%m%d')
+        top_docs = list(self.db["top_list"].aggregate([
+            {"$match": {"ts_code": {"$in": ts_codes}, "trade_date": {"$gte": recent_90}}},
+            {"$group": {
+                "_id": "$ts_code",
+                "count_90": {"$sum": 1},
+                "count_30": {"$sum": {"$cond": [{"$gte": ["$trade_date", recent_30]}, 1, 0]}},
+            }},
+        ]))
+        counts = pd.DataFrame(top_docs, columns=["_id", "count_30", "count_90"]).set_index("_id").astype(float)
+        count_30 = counts["count_30"].reindex(frame.index).fillna(0)
+        count_90 = counts["count_90"].reindex(frame.index).fillna(0)
+        frame["hot_money_rank"] = count_30.where(count_30 > 0)
+        frame["hot_money_score"] = (count_30 * 10).clip(upper=100).where(count_30 > 0)
+        frame["dragon_tiger_count"] = count_90
+        frame["institution_attention"] = (count_90 * 5).clip(upper=100)
+
+        latest_flow = self.db["stock_money_flow"].find_one({}, {"trade_date": 1}, sort=[("trade_date", -1)])
+        flow_docs = []
+        if latest_flow:
+            flow_docs = list(self.db["stock_money_flow"].find(
+                {"trade_date": latest_flow["trade_date"], "ts_code": {"$in": ts_codes}},
+                {"_id": 0, "ts_code": 1, "net_mf_amount": 1, "trade_amount": 1}
+            ))
+        flows = _numeric_frame(flow_docs, "ts_code", {"net_mf_amount": "net_mf_amount", "trade_amount": "trade_amount"})
+        has_flow = pd.Series(frame.index.isin(flows.index), index=frame.index)
+        flows = flows.reindex(frame.index)
+        net_inflow = flows["net_mf_amount"].fillna(0)
+        trade_amount = flows["trade_amount"].fillna(1)
+        frame["net_inflow"] = net_inflow.where(has_flow)
+        frame["inflow_strength"] = (
+            (net_inflow.abs() / trade_amount * 100).where(trade_amount > 0, 0).clip(upper=100).where(has_flow)
+        )
+        return frame.add_prefix("spec_")
+
+    # ---------- 评分 ----------
+
+    @staticmethod
+    def composite_score(frame: pd.DataFrame, use_technical: bool, use_fundamental: bool,
+                        use_special: bool) -> pd.Series:
+        """向量化计算综合评分（口径同 StrategyScreeningEngine._calculate_composite_score）"""
+        parts: List[Tuple[pd.Series, float]] = []
+
+        if use_technical:
+            rsi = frame["tech_rsi"]
+            rsi_score = pd.Series(np.select([rsi < 30, rsi <= 70], [90, 70], 30), index=frame.index).where(rsi.notna())
+            macd_present = frame["tech_macd"].notna() & frame["tech_macd_signal"].notna()
+            macd_score = pd.Series(
+                np.where(frame["tech_macd"] > frame["tech_macd_signal"], 80, 40), index=frame.index
+            ).where(macd_present)
+            ma_score = pd.Series(
+                np.where(frame["tech_close"] > frame["tech_ma20"], 70, 30), index=frame.index
+            ).where(frame["tech_ma20"].notna())
+            tech_score = _row_mean([rsi_score, macd_score, ma_score]).where(frame["has_technical"])
+            parts.append((tech_score, 0.3))
+
+        if use_fundamental:
+            parts.append((frame["fund_total_score"], 0.4))
+
+        if use_special:
+            special_score = _row_mean([
+                frame["spec_limit_strength"], frame["spec_hot_money_score"], frame["spec_inflow_strength"]
+            ])
+            parts.append((special_score, 0.3))
+
+        if not parts:
+            return pd.Series(np.nan, index=frame.index)
+        return _weighted_mean(parts).round(2)
+
+    # ---------- 选股 ----------
+
+    def screen(
+        self,
+        technical_conditions: Optional[Dict[str, Any]] = None,
+        fundamental_conditions: Optional[Dict[str, Any]] = None,
+        special_conditions: Optional[Dict[str, Any]] = None,
+        stock_pool: Optional[List[str]] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        全股票池集合化选股（同步，建议通过 run_sync 在线程池中调用）
+
+        Returns:
+            按综合评分降序的前 limit 条结果，格式与 StrategyScreeningEngine.screen_stocks 一致
+        """
+        frame = self.load_universe(stock_pool)
+        if frame.empty:
+            return []
+        ts_codes = list(frame.index)
+
+        mask = pd.Series(True, index=frame.index)
+        if technical_conditions:
+            technical = self.load_technical(ts_codes)
+            frame = frame.join(technical)
+            frame["has_technical"] = frame.index.isin(technical.index)
+            mask &= frame["has_technical"]
+            mask &= _apply_rules(frame, technical_conditions, TECHNICAL_CONDITION_RULES)
+            if technical_conditions.get("above_ma20"):
+                mask &= frame["tech_close"] > frame["tech_ma20"]
+
+        if fundamental_conditions:
+            fundamental = self.load_fundamental(ts_codes)
+            frame = frame.join(fundamental)
+            frame["has_fundamental"] = frame.index.isin(fundamental.index)
+            mask &= frame["has_fundamental"]
+            mask &= _apply_rules(frame, fundamental_conditions, FUNDAMENTAL_CONDITION_RULES)
+
+        if special_conditions:
+            frame = frame.join(self.load_special(ts_codes))
+            mask &= _apply_rules(frame, special_conditions, SPECIAL_CONDITION_RULES)
+
+        selected = frame[mask.fillna(False).astype(bool)].copy()
+        selected["score"] = self.composite_score(
+            selected, bool(technical_conditions), bool(fundamental_conditions), bool(special_conditions)
+        )
+        selected["_rank"] = selected["score"].fillna(0)
+        selected = selected.sort_values(["_rank"], ascending=False, kind="mergesort").head(limit)
+
+        return [self._to_result(ts_code, row, bool(technical_conditions), bool(fundamental_conditions),
+                                bool(special_conditions))
+                for ts_code, row in selected.iterrows()]
+
+    @staticmethod
+    def _to_result(ts_code: str, row: pd.Series, use_technical: bool, use_fundamental: bool,
+                   use_special: bool) -> Dict[str, Any]:
+        name = _clean(row.get("name")) or ""
+
+        def section(prefix: str, keys: List[str]) -> Dict[str, Any]:
+            return {key: _clean(row.get(f"{prefix}{key}")) for key in keys}
+
+        technical = None
+        if use_technical:
+            fields = [key for key in TechnicalIndicators.__dataclass_fields__ if key not in ("ts_code", "name")]
+            technical = TechnicalIndicators(ts_code=ts_code, name=name, **section("tech_", fields)).__dict__
+            technical["volume"] = int(technical["volume"] or 0)
+        fundamental = None
+        if use_fundamental:
+            fields = [key for key in FundamentalScores.__dataclass_fields__ if key not in ("ts_code", "name")]
+            fundamental = FundamentalScores(ts_code=ts_code, name=name, **section("fund_", fields)).__dict__
+        special = None
+        if use_special:
+            fields = ["limit_days", "limit_strength", "hot_money_rank", "hot_money_score", "net_inflow",
+                      "inflow_strength", "institution_attention", "dragon_tiger_count"]
+            values = section("spec_", fields)
+            for key in ("limit_days", "hot_money_rank", "dragon_tiger_count"):
+                if values[key] is not None:
+                    values[key] = int(values[key])
+            special = SpecialFeatures(ts_code=ts_code, name=name, **values).__dict__
+
+        return {
+            "ts_code": ts_code,
+            "name": name,
+            "technical": technical,
+            "fundamental": fundamental,
+            "special": special,
+            "score": _clean(row.get("score")),
+            "industry": _clean(row.get("industry")),
+            "market": _clean(row.get("market")),
+        }
+
 class StrategyScreeningEngine:
     """策略选股引擎"""
     
@@ -1176,6 +1764,7 @@ class StrategyScreeningEngine:
         self.fundamental_analyzer = FundamentalAnalyzer()
         self.special_analyzer = SpecialDataAnalyzer()
         self.fund_flow_analyzer = FundFlowAnalyzer()
+        self.cross_section_screener = CrossSectionScreener()
         self.db = db_handler.db
     
     async def comprehensive_screening(
@@ -1187,100 +1776,138 @@ class StrategyScreeningEngine:
         strategy_type: str = "comprehensive",
         limit: int = 50
     ) -> List[Dict[str, Any]]:
-        """综合选股"""
+        """
+        综合选股
+        按批处理股票池：每批先一次查询基本信息，再并发执行各数据源的批量查询，
+        最后在内存中逐只判断条件与评分
+        """
+        import asyncio
+        
         results = []
         
-        for ts_code in stock_pool:
+        # 与逐只判断的分支结构保持一致：技术面/资金追踪互斥，基本面/特色数据互斥
+        need_technical = strategy_type == "fund_flow" or (
+            strategy_type in ["technical", "comprehensive"] and bool(technical_conditions)
+        )
+        need_fundamental = strategy_type in ["fundamental", "comprehensive"] and bool(fundamental_conditions)
+        need_special = not need_fundamental and strategy_type in ["special", "comprehensive"] and bool(special_conditions)
+        
+        for start in range(0, len(stock_pool), SCREENING_BATCH_SIZE):
+            batch = stock_pool[start:start + SCREENING_BATCH_SIZE]
             try:
-                # 获取股票基本信息
-                stock_info = await self._get_stock_basic_info(ts_code)
-                if not stock_info:
-                    continue
+                basic_map = await self._get_stock_basic_info_batch(batch)
+                codes = [ts_code for ts_code in batch if ts_code in basic_map]
+                names = {ts_code: info.get("name", "") for ts_code, info in basic_map.items()}
                 
-                score = 0
-                technical_data = None
-                fundamental_data = None
-                special_data = None
-                fund_flow_data = None
-                
-                # 资金追踪策略分析
-                if strategy_type == "fund_flow":
-                    # 获取技术指标数据以获取基础股价信息
-                    technical_data = await self.technical_analyzer.get_stock_technical_indicators(ts_code)
-                    
-                    fund_flow_result = await self.fund_flow_analyzer.analyze_fund_flow(ts_code)
-                    if fund_flow_result:
-                        fund_tracking_score = fund_flow_result.get("fund_tracking_score", 0)
-                        
-                        # 创建增强的special_data包含资金追踪信息
-                        special_data = SpecialFeatures(
-                            ts_code=ts_code,
-                            name=stock_info.get('name', ''),
-                            close=technical_data.close if technical_data else None,
-                            # 两融数据
-                            margin_buy_trend=fund_flow_result.get("margin_analysis", {}).get("margin_buy_trend", 0),
-                            margin_balance_growth=fund_flow_result.get("margin_analysis", {}).get("margin_balance_growth", 0),
-                            margin_activity_score=fund_flow_result.get("margin_analysis", {}).get("margin_activity_score", 0),
-                            short_sell_trend=fund_flow_result.get("margin_analysis", {}).get("short_sell_trend", 0),
-                            # 资金流数据
-                            large_order_net_inflow=fund_flow_result.get("fund_analysis", {}).get("large_order_net_inflow", 0),
-                            super_large_net_inflow=fund_flow_result.get("fund_analysis", {}).get("super_large_net_inflow", 0),
-                            fund_flow_continuity=fund_flow_result.get("fund_analysis", {}).get("fund_flow_continuity", 0),
-                            institutional_fund_ratio=fund_flow_result.get("fund_analysis", {}).get("institutional_fund_ratio", 0),
-                            # 行业数据
-                            industry_fund_rank=fund_flow_result.get("industry_analysis", {}).get("industry_fund_rank", 999),
-                            industry_fund_strength=fund_flow_result.get("industry_analysis", {}).get("industry_fund_strength", 0),
-                            sector_rotation_score=fund_flow_result.get("industry_analysis", {}).get("sector_rotation_score", 0),
-                            fund_tracking_score=fund_tracking_score
-                        )
-                        
-                        # 检查资金追踪条件
-                        if self._check_fund_flow_conditions(special_data, special_conditions or {}):
-                            score = fund_tracking_score
-                        
-                        fund_flow_data = fund_flow_result
-                
-                # 技术面分析
-                elif strategy_type in ["technical", "comprehensive"] and technical_conditions:
-                    technical_data = await self.technical_analyzer.get_stock_technical_indicators(ts_code)
-                    if technical_data and self._check_technical_conditions(technical_data, technical_conditions):
-                        score += 30
-                
-                # 基本面分析
-                if strategy_type in ["fundamental", "comprehensive"] and fundamental_conditions:
-                    fundamental_data = await self.fundamental_analyzer.get_stock_fundamental_scores(ts_code)
-                    if fundamental_data and self._check_fundamental_conditions(fundamental_data, fundamental_conditions):
-                        score += 40
-                
-                # 特色数据分析
-                elif strategy_type in ["special", "comprehensive"] and special_conditions:
-                    special_data = await self.special_analyzer.get_stock_special_features(ts_code)
-                    if special_data and self._check_special_conditions(special_data, special_conditions):
-                        score += 30
-                
-                # 如果满足条件，加入结果
-                if score > 0 or strategy_type == "comprehensive":
-                    result = {
-                        'ts_code': ts_code,
-                        'name': stock_info.get('name', ''),
-                        'industry': stock_info.get('industry', ''),
-                        'market': stock_info.get('market', ''),
-                        'score': score,
-                        'technical': technical_data.__dict__ if technical_data else None,
-                        'fundamental': fundamental_data.__dict__ if fundamental_data else None,
-                        'special': special_data.__dict__ if special_data else None,
-                        'fund_flow': fund_flow_data
-                    }
-                    results.append(result)
-                    
+                # 各数据源批量查询并发执行
+                tasks = {}
+                if need_technical:
+                    tasks["technical"] = self.technical_analyzer.get_batch_technical_indicators(codes, names=names)
+                if need_fundamental:
+                    tasks["fundamental"] = self.fundamental_analyzer.get_batch_fundamental_scores(codes, names=names)
+                if need_special:
+                    tasks["special"] = self.special_analyzer.get_batch_special_features(codes, names=names)
+                fetched = dict(zip(tasks, await asyncio.gather(*tasks.values())))
             except Exception as e:
-                print(f"处理股票 {ts_code} 时出错: {e}")
+                print(f"批量获取选股数据失败: {e}")
                 continue
+            
+            technical_map = fetched.get("technical", {})
+            fundamental_map = fetched.get("fundamental", {})
+            special_map = fetched.get("special", {})
+            
+            for ts_code in codes:
+                try:
+                    stock_info = basic_map[ts_code]
+                    
+                    score = 0
+                    technical_data = technical_map.get(ts_code)
+                    fundamental_data = None
+                    special_data = None
+                    fund_flow_data = None
+                    
+                    # 资金追踪策略分析
+                    if strategy_type == "fund_flow":
+                        fund_flow_result = await self.fund_flow_analyzer.analyze_fund_flow(ts_code)
+                        if fund_flow_result:
+                            fund_tracking_score = fund_flow_result.get("fund_tracking_score", 0)
+                            
+                            # 创建增强的special_data包含资金追踪信息
+                            special_data = SpecialFeatures(
+                                ts_code=ts_code,
+                                name=stock_info.get('name', ''),
+                                close=technical_data.close if technical_data else None,
+                                # 两融数据
+                                margin_buy_trend=fund_flow_result.get("margin_analysis", {}).get("margin_buy_trend", 0),
+                                margin_balance_growth=fund_flow_result.get("margin_analysis", {}).get("margin_balance_growth", 0),
+                                margin_activity_score=fund_flow_result.get("margin_analysis", {}).get("margin_activity_score", 0),
+                                short_sell_trend=fund_flow_result.get("margin_analysis", {}).get("short_sell_trend", 0),
+                                # 资金流数据
+                                large_order_net_inflow=fund_flow_result.get("fund_analysis", {}).get("large_order_net_inflow", 0),
+                                super_large_net_inflow=fund_flow_result.get("fund_analysis", {}).get("super_large_net_inflow", 0),
+                                fund_flow_continuity=fund_flow_result.get("fund_analysis", {}).get("fund_flow_continuity", 0),
+                                institutional_fund_ratio=fund_flow_result.get("fund_analysis", {}).get("institutional_fund_ratio", 0),
+                                # 行业数据
+                                industry_fund_rank=fund_flow_result.get("industry_analysis", {}).get("industry_fund_rank", 999),
+                                industry_fund_strength=fund_flow_result.get("industry_analysis", {}).get("industry_fund_strength", 0),
+                                sector_rotation_score=fund_flow_result.get("industry_analysis", {}).get("sector_rotation_score", 0),
+                                fund_tracking_score=fund_tracking_score
+                            )
+                            
+                            # 检查资金追踪条件
+                            if self._check_fund_flow_conditions(special_data, special_conditions or {}):
+                                score = fund_tracking_score
+                            
+                            fund_flow_data = fund_flow_result
+                    
+                    # 技术面分析
+                    elif need_technical:
+                        if technical_data and self._check_technical_conditions(technical_data, technical_conditions):
+                            score += 30
+                    
+                    # 基本面分析
+                    if need_fundamental:
+                        fundamental_data = fundamental_map.get(ts_code)
+                        if fundamental_data and self._check_fundamental_conditions(fundamental_data, fundamental_conditions):
+                            score += 40
+                    
+                    # 特色数据分析
+                    elif need_special:
+                        special_data = special_map.get(ts_code)
+                        if special_data and self._check_special_conditions(special_data, special_conditions):
+                            score += 30
+                    
+                    # 如果满足条件，加入结果
+                    if score > 0 or strategy_type == "comprehensive":
+                        result = {
+                            'ts_code': ts_code,
+                            'name': stock_info.get('name', ''),
+                            'industry': stock_info.get('industry', ''),
+                            'market': stock_info.get('market', ''),
+                            'score': score,
+                            'technical': technical_data.__dict__ if technical_data else None,
+                            'fundamental': fundamental_data.__dict__ if fundamental_data else None,
+                            'special': special_data.__dict__ if special_data else None,
+                            'fund_flow': fund_flow_data
+                        }
+                        results.append(result)
+                        
+                except Exception as e:
+                    print(f"处理股票 {ts_code} 时出错: {e}")
+                    continue
         
         # 按评分排序并限制数量
         results.sort(key=lambda x: x['score'], reverse=True)
         return results[:limit]
     
+    async def _get_stock_basic_info_batch(self, ts_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取股票基本信息"""
+        from api.async_db_handler import run_sync
+        try:
+            return await run_sync(_load_stock_basic, self.db, ts_codes)
+        except Exception:
+            return {}
+    
     async def _get_stock_basic_info(self, ts_code: str) -> Optional[Dict[str, Any]]:
         """获取股票基本信息"""
         try:
@@ -1382,82 +2009,20 @@ class StrategyScreeningEngine:
         stock_pool: Optional[List[str]] = None,
         limit: int = 100
     ) -> List[Dict[str, Any]]:
-        """综合选股（保持向后兼容）"""
+        """
+        综合选股（保持向后兼容）
+        由集合化引擎对整个股票池一次性评估条件与评分，结果不再受遍历顺序与处理数量上限影响
+        """
         try:
-            # 获取股票池
-            if stock_pool:
-                ts_codes = stock_pool
-            else:
-                # 获取所有A股股票
-                cursor = self.db["infrastructure_stock_basic"].find(
-                    {"market": {"$in": ["主板", "创业板", "科创板"]}},
-                    {"ts_code": 1}
-                )
-                ts_codes = [doc["ts_code"] for doc in cursor]
-            
-            results = []
-            processed = 0
-            
-            for ts_code in ts_codes:
-                if processed >= limit * 3:  # 最多处理3倍数量，避免超时
-                    break
-                
-                try:
-                    # 获取各类指标
-                    technical_data = None
-                    fundamental_data = None
-                    special_data = None
-                    
-                    if technical_conditions:
-                        technical_data = await self.technical_analyzer.get_stock_technical_indicators(ts_code)
-                        if not self._check_technical_conditions(technical_data, technical_conditions):
-                            processed += 1
-                            continue
-                    
-                    if fundamental_conditions:
-                        fundamental_data = await self.fundamental_analyzer.get_stock_fundamental_scores(ts_code)
-                        if not self._check_fundamental_conditions(fundamental_data, fundamental_conditions):
-                            processed += 1
-                            continue
-                    
-                    if special_conditions:
-                        special_data = await self.special_analyzer.get_stock_special_features(ts_code)
-                        if not self._check_special_conditions(special_data, special_conditions):
-                            processed += 1
-                            continue
-                    
-                    # 构建结果
-                    result = {
-                        "ts_code": ts_code,
-                        "name": "",
-                        "technical": technical_data.__dict__ if technical_data else None,
-                        "fundamental": fundamental_data.__dict__ if fundamental_data else None,
-                        "special": special_data.__dict__ if special_data else None,
-                        "score": self._calculate_composite_score(technical_data, fundamental_data, special_data)
-                    }
-                    
-                    # 获取股票名称
-                    stock_basic = self.db["infrastructure_stock_basic"].find_one({"ts_code": ts_code})
-                    if stock_basic:
-                        result["name"] = stock_basic["name"]
-                        result["industry"] = stock_basic.get("industry")
-                        result["market"] = stock_basic.get("market")
-                    
-                    results.append(result)
-                    
-                    if len(results) >= limit:
-                        break
-                    
-                except Exception as e:
-                    print(f"处理股票 {ts_code} 时出错: {str(e)}")
-                
-                processed += 1
-            
-            # 按综合评分排序
-            results.sort(key=lambda x: x["score"] or 0, reverse=True)
-            
-            return results[:limit]
-            
+            from api.async_db_handler import run_sync
+            return await run_sync(
+                self.cross_section_screener.screen,
+                technical_conditions=technical_conditions,
+                fundamental_conditions=fundamental_conditions,
+                special_conditions=special_conditions,
+                stock_pool=stock_pool,
+                limit=limit
+            )
         except Exception as e:
             print(f"选股失败: {str(e)}")
             return []
@@ -26,6 +26,11 @@ from .performance_analyzer import PerformanceAnalyzer
 from backtrader_strategies.config import Config
 
 
+class BacktestCancelled(Exception):
+    """回测被取消"""
+    pass
+
+
 class StrategyInterface(ABC):
     """
     策略接口基类
@@ -127,6 +132,8 @@ class BacktestEngine:
         
         # 实时数据回调
         self.realtime_callback = None
+        # 取消检查函数，返回True时在下一个交易日前终止回测
+        self.cancel_checker = None
         
         # 创建输出目录
         os.makedirs(self.config.backtest.output_dir, exist_ok=True)
@@ -164,6 +171,15 @@ class BacktestEngine:
         self.realtime_callback = callback
         self.logger.info("实时数据回调函数已设置")
     
+    def set_cancel_checker(self, checker: Callable[[], bool]):
+        """
+        设置取消检查函数
+        
+        Args:
+            checker: 无参函数，返回True表示请求取消回测
+        """
+        self.cancel_checker = checker
+    
     def load_data(self, stock_codes: Optional[List[str]] = None, max_stocks: int = 50):
         """
         加载回测数据
@@ -326,6 +342,10 @@ class BacktestEngine:
             for i, trade_date in enumerate(self.trading_dates):
                 self.current_date = trade_date
                 
+                # 协作式取消
+                if self.cancel_checker and self.cancel_checker():
+                    raise BacktestCancelled(f"回测在 {trade_date} 被取消")
+                
                 # 更新进度
                 if (i + 1) % 50 == 0:
                     progress = (i + 1) / len(self.trading_dates) * 100
@@ -340,6 +360,9 @@ class BacktestEngine:
             self.logger.info("回测完成!")
             return result
             
+        except BacktestCancelled:
+            self.logger.info(f"回测已取消: {self.current_date}")
+            raise
         except Exception as e:
             self.logger.error(f"回测过程中发生错误: {e}")
             import traceback
@@ -860,7 +883,9 @@ def run_strategy_backtest(strategy: StrategyInterface,
                          stock_codes: Optional[List[str]] = None,
                          max_stocks: int = 50,
                          task_id: Optional[str] = None,
-                         active_tasks: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+                         active_tasks: Optional[Dict[str, Dict[str, Any]]] = None,
+                         progress_callback: Optional[Callable[[str, Dict[str, Any], List[Dict]], None]] = None,
+                         cancel_checker: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
     """
     运行策略回测的便利函数
     
@@ -869,6 +894,10 @@ def run_strategy_backtest(strategy: StrategyInterface,
         config: 配置对象
         stock_codes: 股票代码列表
         max_stocks: 最大股票数量
+        task_id: 任务ID（配合active_tasks使用）
+        active_tasks: 任务状态字典，回测中原地写入实时数据
+        progress_callback: 实时数据回调，提供时优先于active_tasks
+        cancel_checker: 取消检查函数，每个交易日调用一次
         
     Returns:
         回测结果
@@ -888,8 +917,10 @@ def run_strategy_backtest(strategy: StrategyInterface,
     # 加载数据
     engine.load_data(stock_codes, max_stocks)
     
-    # 如果提供了任务ID和active_tasks，在引擎中设置实时更新回调
-    if task_id and active_tasks:
+    # 如果提供了实时回调，直接交给引擎；否则使用任务ID和active_tasks原地更新
+    if progress_callback:
+        engine.set_realtime_callback(progress_callback)
+    elif task_id and active_tasks:
         def update_realtime_callback(current_date: str, portfolio_data: Dict[str, Any], trades_data: List[Dict]):
             """回测过程中的实时数据更新回调"""
             try:
@@ -965,6 +996,9 @@ def run_strategy_backtest(strategy: StrategyInterface,
         # 设置回调函数到引擎
         engine.set_realtime_callback(update_realtime_callback)
     
+    if cancel_checker:
+        engine.set_cancel_checker(cancel_checker)
+    
     # 运行回测
     result = engine.run_backtest()
     
@@ -17,8 +17,118 @@ import logging
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from api.global_db import db_handler
+from api.market_data_store import get_market_data_store
 from backtrader_strategies.config import DatabaseConfig
 
+# 回测需要加载的技术指标字段（基于全量数据库字段映射）
+INDICATOR_FIELD_NAMES = [
+    # ==================== 基础市场数据 ====================
+    'change', 'pct_chg', 'adj_factor',
+
+    # ==================== 复权价格数据 ====================
+    'open_hfq', 'high_hfq', 'low_hfq', 'close_hfq',
+    'open_qfq', 'high_qfq', 'low_qfq', 'close_qfq',
+
+    # ==================== 市值和估值指标 ====================
+    'total_mv', 'circ_mv', 'pe', 'pe_ttm', 'pb', 'ps', 'ps_ttm',
+    'dv_ratio', 'dv_ttm', 'total_share', 'float_share', 'free_share',
+
+    # ==================== 成交量和流动性指标 ====================
+    'turnover_rate', 'turnover_rate_f', 'volume_ratio',
+
+    # ==================== 移动平均线系列 ====================
+    # 简单移动平均(SMA) - 不复权
+    'ma5', 'ma10', 'ma20', 'ma30', 'ma60', 'ma90', 'ma250',  # 移除ma120(不存在)
+    # 简单移动平均(SMA) - 后复权  
+    'ma5_hfq', 'ma10_hfq', 'ma20_hfq', 'ma30_hfq', 'ma60_hfq', 'ma90_hfq', 'ma250_hfq',
+    # 简单移动平均(SMA) - 前复权
+    'ma5_qfq', 'ma10_qfq', 'ma20_qfq', 'ma30_qfq', 'ma60_qfq', 'ma90_qfq', 'ma250_qfq',
+    # 指数移动平均(EMA) - 不复权
+    'ema5', 'ema10', 'ema20', 'ema30', 'ema60', 'ema90', 'ema250',
+    # 指数移动平均(EMA) - 后复权
+    'ema5_hfq', 'ema10_hfq', 'ema20_hfq', 'ema30_hfq', 'ema60_hfq', 'ema90_hfq', 'ema250_hfq',
+    # 指数移动平均(EMA) - 前复权  
+    'ema5_qfq', 'ema10_qfq', 'ema20_qfq', 'ema30_qfq', 'ema60_qfq', 'ema90_qfq', 'ema250_qfq',
+    # EXPMA指数移动平均
+    'expma12', 'expma50', 'expma12_hfq', 'expma50_hfq', 'expma12_qfq', 'expma50_qfq',
+
+    # ==================== RSI相对强弱指标系列 ====================
+    'rsi6', 'rsi12', 'rsi24',
+    'rsi6_hfq', 'rsi12_hfq', 'rsi24_hfq',
+    'rsi6_qfq', 'rsi12_qfq', 'rsi24_qfq',
+
+    # ==================== MACD指标系列 ====================
+    'macd_dif', 'macd_dea', 'macd_macd',
+    'macd_dif_hfq', 'macd_dea_hfq', 'macd_macd_hfq',
+    'macd_dif_qfq', 'macd_dea_qfq', 'macd_macd_qfq',
+
+    # ==================== 布林带指标系列 ====================
+    'boll_upper', 'boll_mid', 'boll_lower',
+    'boll_upper_hfq', 'boll_mid_hfq', 'boll_lower_hfq',
+    'boll_upper_qfq', 'boll_mid_qfq', 'boll_lower_qfq',
+
+    # ==================== KDJ随机指标系列 ====================
+    'kdj_k', 'kdj_d', 'kdj_j',
+    'kdj_k_hfq', 'kdj_d_hfq', 'kdj_j_hfq',
+    'kdj_k_qfq', 'kdj_d_qfq', 'kdj_j_qfq',
+
+    # ==================== 威廉指标系列 ====================
+    'wr', 'wr1',
+    'wr_hfq', 'wr1_hfq',
+    'wr_qfq', 'wr1_qfq',
+
+    # ==================== BIAS乖离率指标系列 ====================
+    'bias1', 'bias2', 'bias3',
+    'bias1_hfq', 'bias2_hfq', 'bias3_hfq',
+    'bias1_qfq', 'bias2_qfq', 'bias3_qfq',
+
+    # ==================== DMI趋向指标系列 ====================
+    'dmi_pdi', 'dmi_mdi', 'dmi_adx', 'dmi_adxr',
+    'dmi_pdi_hfq', 'dmi_mdi_hfq', 'dmi_adx_hfq', 'dmi_adxr_hfq',
+    'dmi_pdi_qfq', 'dmi_mdi_qfq', 'dmi_adx_qfq', 'dmi_adxr_qfq',
+
+    # ==================== BRAR人气意愿指标系列 ====================
+    'brar_ar', 'brar_br',
+    'brar_ar_hfq', 'brar_br_hfq',
+    'brar_ar_qfq', 'brar_br_qfq',
+
+    # ==================== 其他重要技术指标 ====================
+    'cci', 'cci_hfq', 'cci_qfq',                      # CCI商品通道指数
+    'atr', 'atr_hfq', 'atr_qfq',                      # ATR真实波幅
+    'roc', 'roc_hfq', 'roc_qfq',                      # ROC变动率
+    'mtm', 'mtm_hfq', 'mtm_qfq',                      # MTM动量指标
+    'psy', 'psy_hfq', 'psy_qfq',                      # PSY心理线
+    'psyma', 'psyma_hfq', 'psyma_qfq',                # PSYMA心理线移动平均
+    'obv', 'obv_hfq', 'obv_qfq',                      # OBV累积能量
+    'emv', 'emv_hfq', 'emv_qfq',                      # EMV简易波动
+    'mfi', 'mfi_hfq', 'mfi_qfq',                      # MFI资金流量
+    'vr', 'vr_hfq', 'vr_qfq',                         # VR成交量变异率
+    'mass', 'mass_hfq', 'mass_qfq',                   # MASS梅斯线
+    'ma_mass', 'ma_mass_hfq', 'ma_mass_qfq',          # MA_MASS梅斯线移动平均
+    'cr', 'cr_hfq', 'cr_qfq',                         # CR指标
+    'asi', 'asit', 'asi_hfq', 'asit_hfq', 'asi_qfq', 'asit_qfq', # ASI振动升降指标
+    'trix', 'trix_hfq', 'trix_qfq',                   # TRIX三重指数平滑
+    'dpo', 'dpo_hfq', 'dpo_qfq',                      # DPO去趋势价格震荡
+    'bbi', 'bbi_hfq', 'bbi_qfq',                      # BBI多空指标
+
+    # ==================== 高级技术指标 ====================
+    'dfma_dif', 'dfma_difma',                         # DFMA动态平均
+    'dfma_dif_hfq', 'dfma_difma_hfq',
+    'dfma_dif_qfq', 'dfma_difma_qfq',
+    'ktn_upper', 'ktn_mid', 'ktn_down',               # KTN肯特纳通道
+    'ktn_upper_hfq', 'ktn_mid_hfq', 'ktn_down_hfq',
+    'ktn_upper_qfq', 'ktn_mid_qfq', 'ktn_down_qfq',
+    'taq_up', 'taq_mid', 'taq_down',                  # TAQ抛物线指标
+    'taq_up_hfq', 'taq_mid_hfq', 'taq_down_hfq',
+    'taq_up_qfq', 'taq_mid_qfq', 'taq_down_qfq',
+    'xsii_td1', 'xsii_td2', 'xsii_td3', 'xsii_td4',  # XSII小时四度空间指标
+    'xsii_td1_hfq', 'xsii_td2_hfq', 'xsii_td3_hfq', 'xsii_td4_hfq',
+    'xsii_td1_qfq', 'xsii_td2_qfq', 'xsii_td3_qfq', 'xsii_td4_qfq',
+
+    # ==================== 涨跌统计指标 ====================
+    'updays', 'downdays', 'topdays', 'lowdays',
+]
+
 
 class DataManager:
     """
@@ -35,6 +145,7 @@ class DataManager:
         """
         self.db_config = db_config or DatabaseConfig()
         self.db_handler = db_handler
+        self.market_data_store = get_market_data_store()
         self.data_cache = {}  # 数据缓存
         self.stock_universe = []  # 股票池
         
@@ -154,46 +265,32 @@ class DataManager:
             return self.data_cache[cache_key].copy()
         
         try:
-            collection = self.db_handler.get_collection(self.db_config.factor_collection)
-            
-            # 转换日期格式
-            start_date_str = start_date.replace('-', '')
-            end_date_str = end_date.replace('-', '')
+            # 从共享行情仓库读取（与缠论、道氏、Qlib等模块共用缓存）
+            bars = self.market_data_store.get_factors(
+                [stock_code], start_date, end_date, fields=self._factor_fields(include_indicators),
+                collection=self.db_config.factor_collection
+            )[stock_code]
             
-            # 构建查询条件
-            query = {
-                'ts_code': stock_code,
-                'trade_date': {
-                    '$gte': start_date_str,
-                    '$lte': end_date_str
-                }
-            }
-            
-            # 查询数据
-            cursor = collection.find(query).sort('trade_date', 1)
-            data_list = list(cursor)
-            
-            if not data_list:
+            if len(bars) == 0:
                 self.logger.warning(f"未找到股票 {stock_code} 在 {start_date} 到 {end_date} 期间的数据")
                 return pd.DataFrame()
             
             # 调试输出：检查WR指标是否存在
-            if stock_code in ['002003.SZ', '600761.SH'] and data_list:
-                sample_data = data_list[0]
+            if stock_code in ['002003.SZ', '600761.SH']:
                 field_mapping = self.db_config.field_mapping
                 wr1_source = field_mapping.get('wr1', 'wr1_bfq')
                 wr2_source = field_mapping.get('wr2', 'wr_bfq')
                 
                 print(f"🔍 {stock_code} WR指标检查:")
-                print(f"   wr1字段: {wr1_source} ({'存在' if wr1_source in sample_data else '不存在'})")
-                print(f"   wr2字段: {wr2_source} ({'存在' if wr2_source in sample_data else '不存在'})")
-                if wr1_source in sample_data:
-                    print(f"   wr1样本值: {sample_data.get(wr1_source)}")
-                if wr2_source in sample_data:
-                    print(f"   wr2样本值: {sample_data.get(wr2_source)}")
+                print(f"   wr1字段: {wr1_source} ({'存在' if wr1_source in bars.columns else '不存在'})")
+                print(f"   wr2字段: {wr2_source} ({'存在' if wr2_source in bars.columns else '不存在'})")
+                if wr1_source in bars.columns:
+                    print(f"   wr1样本值: {bars[wr1_source][0]}")
+                if wr2_source in bars.columns:
+                    print(f"   wr2样本值: {bars[wr2_source][0]}")
             
             # 转换为DataFrame
-            df = pd.DataFrame(data_list)
+            df = bars.to_frame()
             
             # 处理日期列
             df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
@@ -225,114 +322,7 @@ class DataManager:
             
             # 添加技术指标
             if include_indicators:
-                # 需要加载的技术指标字段（基于全量数据库字段映射） 
-                indicator_field_names = [
-                    # ==================== 基础市场数据 ====================
-                    'change', 'pct_chg', 'adj_factor',
-                    
-                    # ==================== 复权价格数据 ====================
-                    'open_hfq', 'high_hfq', 'low_hfq', 'close_hfq',
-                    'open_qfq', 'high_qfq', 'low_qfq', 'close_qfq',
-                    
-                    # ==================== 市值和估值指标 ====================
-                    'total_mv', 'circ_mv', 'pe', 'pe_ttm', 'pb', 'ps', 'ps_ttm',
-                    'dv_ratio', 'dv_ttm', 'total_share', 'float_share', 'free_share',
-                    
-                    # ==================== 成交量和流动性指标 ====================
-                    'turnover_rate', 'turnover_rate_f', 'volume_ratio',
-                    
-                    # ==================== 移动平均线系列 ====================
-                    # 简单移动平均(SMA) - 不复权
-                    'ma5', 'ma10', 'ma20', 'ma30', 'ma60', 'ma90', 'ma250',  # 移除ma120(不存在)
-                    # 简单移动平均(SMA) - 后复权  
-                    'ma5_hfq', 'ma10_hfq', 'ma20_hfq', 'ma30_hfq', 'ma60_hfq', 'ma90_hfq', 'ma250_hfq',
-                    # 简单移动平均(SMA) - 前复权
-                    'ma5_qfq', 'ma10_qfq', 'ma20_qfq', 'ma30_qfq', 'ma60_qfq', 'ma90_qfq', 'ma250_qfq',
-                    # 指数移动平均(EMA) - 不复权
-                    'ema5', 'ema10', 'ema20', 'ema30', 'ema60', 'ema90', 'ema250',
-                    # 指数移动平均(EMA) - 后复权
-                    'ema5_hfq', 'ema10_hfq', 'ema20_hfq', 'ema30_hfq', 'ema60_hfq', 'ema90_hfq', 'ema250_hfq',
-                    # 指数移动平均(EMA) - 前复权  
-                    'ema5_qfq', 'ema10_qfq', 'ema20_qfq', 'ema30_qfq', 'ema60_qfq', 'ema90_qfq', 'ema250_qfq',
-                    # EXPMA指数移动平均
-                    'expma12', 'expma50', 'expma12_hfq', 'expma50_hfq', 'expma12_qfq', 'expma50_qfq',
-                    
-                    # ==================== RSI相对强弱指标系列 ====================
-                    'rsi6', 'rsi12', 'rsi24',
-                    'rsi6_hfq', 'rsi12_hfq', 'rsi24_hfq',
-                    'rsi6_qfq', 'rsi12_qfq', 'rsi24_qfq',
-                    
-                    # ==================== MACD指标系列 ====================
-                    'macd_dif', 'macd_dea', 'macd_macd',
-                    'macd_dif_hfq', 'macd_dea_hfq', 'macd_macd_hfq',
-                    'macd_dif_qfq', 'macd_dea_qfq', 'macd_macd_qfq',
-                    
-                    # ==================== 布林带指标系列 ====================
-                    'boll_upper', 'boll_mid', 'boll_lower',
-                    'boll_upper_hfq', 'boll_mid_hfq', 'boll_lower_hfq',
-                    'boll_upper_qfq', 'boll_mid_qfq', 'boll_lower_qfq',
-                    
-                    # ==================== KDJ随机指标系列 ====================
-                    'kdj_k', 'kdj_d', 'kdj_j',
-                    'kdj_k_hfq', 'kdj_d_hfq', 'kdj_j_hfq',
-                    'kdj_k_qfq', 'kdj_d_qfq', 'kdj_j_qfq',
-                    
-                    # ==================== 威廉指标系列 ====================
-                    'wr', 'wr1',
-                    'wr_hfq', 'wr1_hfq',
-                    'wr_qfq', 'wr1_qfq',
-                    
-                    # ==================== BIAS乖离率指标系列 ====================
-                    'bias1', 'bias2', 'bias3',
-                    'bias1_hfq', 'bias2_hfq', 'bias3_hfq',
-                    'bias1_qfq', 'bias2_qfq', 'bias3_qfq',
-                    
-                    # ==================== DMI趋向指标系列 ====================
-                    'dmi_pdi', 'dmi_mdi', 'dmi_adx', 'dmi_adxr',
-                    'dmi_pdi_hfq', 'dmi_mdi_hfq', 'dmi_adx_hfq', 'dmi_adxr_hfq',
-                    'dmi_pdi_qfq', 'dmi_mdi_qfq', 'dmi_adx_qfq', 'dmi_adxr_qfq',
-                    
-                    # ==================== BRAR人气意愿指标系列 ====================
-                    'brar_ar', 'brar_br',
-                    'brar_ar_hfq', 'brar_br_hfq',
-                    'brar_ar_qfq', 'brar_br_qfq',
-                    
-                    # ==================== 其他重要技术指标 ====================
-                    'cci', 'cci_hfq', 'cci_qfq',                      # CCI商品通道指数
-                    'atr', 'atr_hfq', 'atr_qfq',                      # ATR真实波幅
-                    'roc', 'roc_hfq', 'roc_qfq',                      # ROC变动率
-                    'mtm', 'mtm_hfq', 'mtm_qfq',                      # MTM动量指标
-                    'psy', 'psy_hfq', 'psy_qfq',                      # PSY心理线
-                    'psyma', 'psyma_hfq', 'psyma_qfq',                # PSYMA心理线移动平均
-                    'obv', 'obv_hfq', 'obv_qfq',                      # OBV累积能量
-                    'emv', 'emv_hfq', 'emv_qfq',                      # EMV简易波动
-                    'mfi', 'mfi_hfq', 'mfi_qfq',                      # MFI资金流量
-                    'vr', 'vr_hfq', 'vr_qfq',                         # VR成交量变异率
-                    'mass', 'mass_hfq', 'mass_qfq',                   # MASS梅斯线
-                    'ma_mass', 'ma_mass_hfq', 'ma_mass_qfq',          # MA_MASS梅斯线移动平均
-                    'cr', 'cr_hfq', 'cr_qfq',                         # CR指标
-                    'asi', 'asit', 'asi_hfq', 'asit_hfq', 'asi_qfq', 'asit_qfq', # ASI振动升降指标
-                    'trix', 'trix_hfq', 'trix_qfq',                   # TRIX三重指数平滑
-                    'dpo', 'dpo_hfq', 'dpo_qfq',                      # DPO去趋势价格震荡
-                    'bbi', 'bbi_hfq', 'bbi_qfq',                      # BBI多空指标
-                    
-                    # ==================== 高级技术指标 ====================
-                    'dfma_dif', 'dfma_difma',                         # DFMA动态平均
-                    'dfma_dif_hfq', 'dfma_difma_hfq',
-                    'dfma_dif_qfq', 'dfma_difma_qfq',
-                    'ktn_upper', 'ktn_mid', 'ktn_down',               # KTN肯特纳通道
-                    'ktn_upper_hfq', 'ktn_mid_hfq', 'ktn_down_hfq',
-                    'ktn_upper_qfq', 'ktn_mid_qfq', 'ktn_down_qfq',
-                    'taq_up', 'taq_mid', 'taq_down',                  # TAQ抛物线指标
-                    'taq_up_hfq', 'taq_mid_hfq', 'taq_down_hfq',
-                    'taq_up_qfq', 'taq_mid_qfq', 'taq_down_qfq',
-                    'xsii_td1', 'xsii_td2', 'xsii_td3', 'xsii_td4',  # XSII小时四度空间指标
-                    'xsii_td1_hfq', 'xsii_td2_hfq', 'xsii_td3_hfq', 'xsii_td4_hfq',
-                    'xsii_td1_qfq', 'xsii_td2_qfq', 'xsii_td3_qfq', 'xsii_td4_qfq',
-                    
-                    # ==================== 涨跌统计指标 ====================
-                    'updays', 'downdays', 'topdays', 'lowdays',
-                ]
+                indicator_field_names = INDICATOR_FIELD_NAMES
                 
                 # 使用field_mapping加载指标数据
                 for target_field in indicator_field_names:
@@ -432,7 +422,18 @@ class DataManager:
         self.logger.info(f"开始加载 {len(selected_stocks)} 只股票的历史数据...")
         
         success_count = 0
+        fields = self._factor_fields(include_indicators=True)
+        batch_size = self._prefetch_batch_size(len(fields), start_date, end_date)
         for i, stock_code in enumerate(selected_stocks):
+            # 按批预取到共享缓存，逐只加载时直接命中，避免每只股票一次查询
+            if i % batch_size == 0:
+                try:
+                    self.market_data_store.prefetch(
+                        selected_stocks[i:i + batch_size], start_date, end_date, fields=fields,
+                        collection=self.db_config.factor_collection
+                    )
+                except Exception as e:
+                    self.logger.warning(f"批量预取数据失败，改为逐只加载: {e}")
             try:
                 df = self.load_stock_data(
                     stock_code=stock_code,
@@ -457,6 +458,28 @@ class DataManager:
         self.logger.info(f"数据加载完成，成功: {success_count}/{len(selected_stocks)}")
         return market_data
     
+    def _factor_fields(self, include_indicators: bool) -> List[str]:
+        """load_stock_data 需要从因子集合读取的数据库字段（按 field_mapping 映射）"""
+        field_mapping = self.db_config.field_mapping
+        targets = ['open', 'high', 'low', 'close', 'volume', 'amount', 'pre_close', 'circ_mv']
+        if include_indicators:
+            targets += [name for name in INDICATOR_FIELD_NAMES if name != 'volume_ma20']
+        defaults = {'volume': 'vol', 'wr1': 'wr1_bfq', 'wr2': 'wr_bfq'}
+        fields = [field_mapping.get(name, defaults.get(name, name)) for name in targets]
+        fields += [field_mapping.get('wr1', 'wr1_bfq'), field_mapping.get('wr2', 'wr_bfq')]
+        return list(dict.fromkeys(fields))
+
+    def _prefetch_batch_size(self, field_count: int, start_date: str, end_date: str) -> int:
+        """
+        预取批次大小：一批的单元格数不超过行情仓库缓存上限的一半，
+        否则批内先加载的股票会在逐只读取前被LRU淘汰，每只股票被查询两次
+        """
+        days = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days + 1
+        # 交易日约占自然日的 245/365
+        cells_per_stock = max(1, field_count * max(1, days * 245 // 365))
+        budget = self.market_data_store.max_cells // 2
+        return max(1, min(self.market_data_store.batch_size, budget // cells_per_stock))
+
     def get_trading_dates(self, start_date: str, end_date: str) -> List[str]:
         """
         获取指定期间的交易日列表
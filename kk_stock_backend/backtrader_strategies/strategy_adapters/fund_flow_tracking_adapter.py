@@ -16,6 +16,7 @@ import os
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import asyncio
+import pandas as pd
 
 # 添加项目根目录到路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -198,71 +199,24 @@ class FundFlowTrackingAdapter:
             return []
 
     async def _calculate_final_scores(self, stock_codes: List[str]) -> List[Dict[str, Any]]:
-        """计算最终综合评分并获取完整数据（原始策略逻辑）"""
+        """计算最终综合评分并获取完整数据（原始策略逻辑），指标取自按交易日缓存的全市场资金追踪面板"""
+        from api.async_db_handler import run_sync
+        from api.utils.fund_flow_panel import get_fund_flow_panel_engine
+        
+        panel = await run_sync(get_fund_flow_panel_engine().get_panel)
+        candidates = panel.reindex([code for code in stock_codes if code in panel.index])
         results = []
         
-        for ts_code in stock_codes:
+        for ts_code, row in candidates.iterrows():
             try:
-                # 获取基本信息
-                stock_info = self.db_handler.get_collection('infrastructure_stock_basic').find_one(
-                    {"ts_code": ts_code},
-                    {"name": 1, "industry": 1, "_id": 0}
-                )
-                
-                if not stock_info:
-                    continue
-                
-                # 获取最新价格数据 - 只查询必要字段
-                price_data = self.db_handler.get_collection('stock_factor_pro').find_one(
-                    {"ts_code": ts_code},
-                    {"close": 1, "pct_chg": 1, "total_mv": 1, "_id": 0},
-                    sort=[("trade_date", -1)]
-                )
-                
-                # 获取融资融券数据（最近7天）
-                margin_cursor = self.db_handler.get_collection('margin_detail').find(
-                    {"ts_code": ts_code},
-                    {"rzmre": 1, "rzye": 1, "trade_date": 1, "_id": 0}
-                ).sort("trade_date", -1).limit(10)
-                
-                margin_list = list(margin_cursor)
-                
-                # 计算融资买入趋势和余额增长
+                # 融资买入趋势（最近3天vs前3天）与融资余额增长率（最新vs一周前），至少3条两融记录
                 margin_buy_trend = None
                 margin_balance_growth = None
-                
-                if len(margin_list) >= 3:
-                    try:
-                        # 计算融资买入趋势（最近3天vs前3天）
-                        recent_buy = []
-                        for i in range(min(3, len(margin_list))):
-                            buy_amount = float(margin_list[i].get("rzmre", 0))
-                            recent_buy.append(buy_amount)
-                        
-                        baseline_buy = []
-                        for i in range(3, min(6, len(margin_list))):
-                            buy_amount = float(margin_list[i].get("rzmre", 0))
-                            baseline_buy.append(buy_amount)
-                        
-                        if recent_buy and baseline_buy:
-                            recent_avg = sum(recent_buy) / len(recent_buy)
-                            baseline_avg = sum(baseline_buy) / len(baseline_buy)
-                            
-                            if baseline_avg > 0:
-                                growth_rate = (recent_avg - baseline_avg) / baseline_avg * 100
-                                margin_buy_trend = round(growth_rate, 2)  # 直接返回实际趋势百分比
-                        
-                        # 计算融资余额增长率（最新vs一周前）
-                        if len(margin_list) >= 2:
-                            latest_balance = float(margin_list[0].get("rzye", 0))
-                            week_ago_balance = float(margin_list[-1].get("rzye", 0))
-                            
-                            if week_ago_balance > 0:
-                                growth_rate = (latest_balance - week_ago_balance) / week_ago_balance * 100
-                                margin_balance_growth = round(growth_rate, 2)  # 直接返回实际增长率
-                                
-                    except (ValueError, TypeError, ZeroDivisionError):
-                        pass
+                if row['margin_records'] >= 3:
+                    if pd.notna(row['margin_buy_trend_pct']):
+                        margin_buy_trend = float(row['margin_buy_trend_pct'])  # 直接返回实际趋势百分比
+                    if pd.notna(row['margin_balance_growth_pct']):
+                        margin_balance_growth = float(row['margin_balance_growth_pct'])  # 直接返回实际增长率
                 
                 # 动态评分计算 - 基于融资买入趋势和余额增长
                 base_score = 50  # 基础分
@@ -283,12 +237,12 @@ class FundFlowTrackingAdapter:
                 # 精简结果对象，只包含前端表格需要的字段
                 result = {
                     'ts_code': ts_code,
-                    'name': stock_info.get('name', ''),
-                    'industry': stock_info.get('industry', ''),
+                    'name': row['name'] or '',
+                    'industry': row['industry'] or '',
                     'score': base_score,
-                    'close': float(price_data.get('close', 0)) if price_data and price_data.get('close') else None,
-                    'pct_chg': float(price_data.get('pct_chg', 0)) if price_data and price_data.get('pct_chg') else None,
-                    'total_mv': float(price_data.get('total_mv', 0)) if price_data and price_data.get('total_mv') else None,
+                    'close': float(row['close']) if pd.notna(row['close']) and row['close'] else None,
+                    'pct_chg': float(row['pct_chg']) if pd.notna(row['pct_chg']) and row['pct_chg'] else None,
+                    'total_mv': float(row['total_mv']) if pd.notna(row['total_mv']) and row['total_mv'] else None,
                     'margin_buy_trend': margin_buy_trend,
                     'margin_balance_growth': margin_balance_growth,
                     'fund_tracking_score': base_score
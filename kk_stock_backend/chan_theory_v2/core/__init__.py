@@ -5,6 +5,7 @@
 """
 
 from .kline_processor import KlineProcessor
+from .result_cache import ChanResultCache, data_fingerprint
 # from .fenxing_identifier import FenXingIdentifier
 # from .bi_builder import BiBuilder
 # from .seg_identifier import SegIdentifier
@@ -22,6 +23,8 @@ from .trading_calendar import (
 
 __all__ = [
     'KlineProcessor',
+    'ChanResultCache',
+    'data_fingerprint',
     # 'FenXingIdentifier', 
     # 'BiBuilder',
     # 'SegIdentifier',
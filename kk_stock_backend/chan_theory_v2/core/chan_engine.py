@@ -15,8 +15,10 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple, Any, Union
 from enum import Enum
 
+import numpy as np
+
 # 形态学模块
-from models.kline import KLine, KLineList
+from models.kline import KLine, KLineList, KLineArray
 from models.fenxing import FenXing, FenXingList
 from models.bi import Bi, BiList, BiBuilder, BiConfig
 from models.seg import Seg, SegList, SegBuilder, SegConfig
@@ -34,6 +36,7 @@ from models.chan_buy_sell_points import ChanBuySellPointAnalyzer, MultiLevelCont
 
 # 核心处理器
 from core.kline_processor import KlineProcessor
+from core.result_cache import ChanResultCache, data_fingerprint
 from config.chan_config import ChanConfig
 
 
@@ -120,6 +123,67 @@ class ChanAnalysisResult:
                 any(p.reliability > 0.5 for p in self.buy_sell_points))
 
 
+# 增量更新：保留倒数第N根线段之前的结构，只重算其后的K线尾部
+INCREMENTAL_TAIL_SEGS = 2
+# 线段不足时按倒数第N笔确定尾部起点
+INCREMENTAL_TAIL_BIS = 3
+# 尾部重算时向前多取的处理后K线数量（分型识别需要左侧K线）
+INCREMENTAL_LOOKBACK_BARS = 3
+
+
+@dataclass
+class ChanStructureDelta:
+    """增量更新产生的结构变化"""
+    symbol: str
+    time_level: TimeLevel
+    result: ChanAnalysisResult
+    new_bar_count: int = 0               # 新增（或更新）的原始K线数
+    reprocessed_bar_count: int = 0       # 本次重新处理的原始K线数
+    full_rebuild: bool = False           # 是否全量重算
+    
+    added_fenxings: List[FenXing] = field(default_factory=list)
+    removed_fenxings: List[FenXing] = field(default_factory=list)
+    added_bis: List[Bi] = field(default_factory=list)
+    removed_bis: List[Bi] = field(default_factory=list)
+    added_segs: List[Seg] = field(default_factory=list)
+    removed_segs: List[Seg] = field(default_factory=list)
+    added_zhongshus: List[ZhongShu] = field(default_factory=list)
+    removed_zhongshus: List[ZhongShu] = field(default_factory=list)
+    added_buy_sell_points: List[BuySellPoint] = field(default_factory=list)
+    removed_buy_sell_points: List[BuySellPoint] = field(default_factory=list)
+    
+    def has_changes(self) -> bool:
+        """结构是否有变化"""
+        return any([self.added_fenxings, self.removed_fenxings, self.added_bis, self.removed_bis,
+                    self.added_segs, self.removed_segs, self.added_zhongshus, self.removed_zhongshus,
+                    self.added_buy_sell_points, self.removed_buy_sell_points])
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """变化统计"""
+        return {
+            'symbol': self.symbol,
+            'time_level': self.time_level.value,
+            'new_bar_count': self.new_bar_count,
+            'reprocessed_bar_count': self.reprocessed_bar_count,
+            'full_rebuild': self.full_rebuild,
+            'fenxings': {'added': len(self.added_fenxings), 'removed': len(self.removed_fenxings)},
+            'bis': {'added': len(self.added_bis), 'removed': len(self.removed_bis)},
+            'segs': {'added': len(self.added_segs), 'removed': len(self.removed_segs)},
+            'zhongshus': {'added': len(self.added_zhongshus), 'removed': len(self.removed_zhongshus)},
+            'buy_sell_points': {'added': len(self.added_buy_sell_points),
+                                'removed': len(self.removed_buy_sell_points)},
+        }
+
+
+def _structure_diff(old_items: List[Any], new_items: List[Any], key) -> Tuple[List[Any], List[Any]]:
+    """按结构键比较新旧结构，返回(新增, 移除)"""
+    old_keys = {key(item) for item in old_items}
+    new_keys = {key(item) for item in new_items}
+    added = [item for item in new_items if key(item) not in old_keys]
+    removed = [item for item in old_items if key(item) not in new_keys]
+    return added, removed
+
+
 class ChanEngine:
     """
     缠论分析引擎
@@ -128,13 +192,15 @@ class ChanEngine:
     
     def __init__(self, 
                  chan_config: Optional[ChanConfig] = None,
-                 dynamics_config: Optional[DynamicsConfig] = None):
+                 dynamics_config: Optional[DynamicsConfig] = None,
+                 result_cache: Optional[ChanResultCache] = None):
         """
         初始化缠论引擎
         
         Args:
             chan_config: 缠论基础配置
             dynamics_config: 动力学分析配置
+            result_cache: 分析结果缓存（默认仅进程内有界LRU）
         """
         self.chan_config = chan_config or ChanConfig()
         self.dynamics_config = dynamics_config or DynamicsConfig()
@@ -153,26 +219,36 @@ class ChanEngine:
         # 初始化缠论买卖点分析器
         self.chan_bsp_analyzer = ChanBuySellPointAnalyzer()
         
-        # 分析历史缓存
-        self._analysis_cache: Dict[str, ChanAnalysisResult] = {}
+        # 分析结果缓存（有界LRU，可选持久化第二级）
+        self._analysis_cache = result_cache or ChanResultCache()
+        
+        # 增量分析状态：symbol_level -> 最近一次分析结果
+        self._incremental_states: Dict[str, ChanAnalysisResult] = {}
     
     def analyze(self, 
-               data: Union[List[Dict], KLineList],
+               data: Union[List[Dict], KLineList, KLineArray],
                symbol: str,
                time_level: TimeLevel,
-               analysis_level: AnalysisLevel = AnalysisLevel.STANDARD) -> ChanAnalysisResult:
+               analysis_level: AnalysisLevel = AnalysisLevel.STANDARD,
+               use_cache: bool = True) -> ChanAnalysisResult:
         """
         执行缠论分析
         
         Args:
-            data: K线数据或KLineList对象
+            data: K线数据（MongoDB文档列表）或KLineList/KLineArray对象
             symbol: 股票代码
             time_level: 时间级别
             analysis_level: 分析级别
+            use_cache: 是否使用结果缓存（相同K线数据直接返回缓存结果，调用方不应修改）
             
         Returns:
             分析结果
         """
+        fingerprint = data_fingerprint(data) if use_cache else None
+        cached = self._analysis_cache.get(symbol, time_level, analysis_level, fingerprint)
+        if cached is not None:
+            return cached
+        
         # 创建结果对象
         result = ChanAnalysisResult(
             symbol=symbol,
@@ -182,7 +258,7 @@ class ChanEngine:
         
         # 数据预处理
         if isinstance(data, list):
-            result.klines = KLineList.from_mongo_data(data, time_level)
+            result.klines = KLineArray.from_mongo_data(data, time_level)
         else:
             result.klines = data
         
@@ -193,6 +269,16 @@ class ChanEngine:
         self._perform_morphology_analysis(result)
         
         # 根据分析级别执行相应分析
+        self._perform_level_analysis(result)
+        
+        # 缓存结果
+        self._analysis_cache.put(symbol, time_level, analysis_level, fingerprint, result)
+        
+        return result
+    
+    def _perform_level_analysis(self, result: ChanAnalysisResult) -> None:
+        """按分析级别执行形态学之后的分析"""
+        analysis_level = result.analysis_level
         if analysis_level in [AnalysisLevel.STANDARD, AnalysisLevel.ADVANCED, AnalysisLevel.COMPLETE]:
             self._perform_dynamics_analysis(result)
         
@@ -202,15 +288,216 @@ class ChanEngine:
         
         if analysis_level == AnalysisLevel.COMPLETE:
             self._perform_comprehensive_analysis(result)
+    
+    # ==================== 增量分析 ====================
+    
+    def update(self,
+               symbol: str,
+               new_bars: Union[List[Dict], KLineList, KLineArray],
+               time_level: TimeLevel,
+               analysis_level: AnalysisLevel = AnalysisLevel.STANDARD) -> ChanStructureDelta:
+        """
+        增量更新缠论分析
         
-        # 缓存结果
-        cache_key = f"{symbol}_{time_level.value}_{analysis_level.value}"
-        self._analysis_cache[cache_key] = result
+        首次调用（无状态）时new_bars应包含完整历史并执行全量分析；之后只传入新到的K线：
+        倒数第INCREMENTAL_TAIL_SEGS根线段（未完成结构）之前的K线处理结果和分型保持不变，
+        只重新处理其后的原始K线尾部，再由全部分型重建笔、线段、中枢和买卖点。
+        与最后一根K线时间相同的新K线视为盘中更新并替换，早于最后一根的K线被忽略。
         
-        return result
+        Args:
+            symbol: 股票代码
+            new_bars: 新K线（MongoDB文档列表或KLineList/KLineArray）
+            time_level: 时间级别
+            analysis_level: 分析级别
+            
+        Returns:
+            结构变化（含更新后的完整分析结果）
+        """
+        state_key = f"{symbol}_{time_level.value}"
+        new_klines = self._to_kline_array(new_bars, time_level)
+        previous = self._incremental_states.get(state_key)
+        
+        if previous is None or previous.analysis_level != analysis_level:
+            result = self.analyze(new_klines, symbol, time_level, analysis_level)
+            self._incremental_states[state_key] = result
+            delta = ChanStructureDelta(symbol=symbol, time_level=time_level, result=result,
+                                       new_bar_count=len(new_klines), reprocessed_bar_count=len(new_klines),
+                                       full_rebuild=True)
+            self._fill_structure_delta(delta, None, result)
+            return delta
+        
+        raw_klines, new_bar_count = self._merge_new_bars(previous.klines, new_klines)
+        if new_bar_count == 0:
+            return ChanStructureDelta(symbol=symbol, time_level=time_level, result=previous)
+        
+        result, reprocessed = self._incremental_analyze(previous, raw_klines)
+        full_rebuild = result is None
+        if full_rebuild:
+            result = self.analyze(raw_klines, symbol, time_level, analysis_level)
+            reprocessed = len(raw_klines)
+        else:
+            self._analysis_cache.put(symbol, time_level, analysis_level, data_fingerprint(raw_klines), result)
+        
+        self._incremental_states[state_key] = result
+        delta = ChanStructureDelta(symbol=symbol, time_level=time_level, result=result,
+                                   new_bar_count=new_bar_count, reprocessed_bar_count=reprocessed,
+                                   full_rebuild=full_rebuild)
+        self._fill_structure_delta(delta, previous, result)
+        return delta
+    
+    def drop_state(self, symbol: str, time_level: Optional[TimeLevel] = None) -> None:
+        """移除增量分析状态（不指定级别时移除该股票所有级别）"""
+        prefix = f"{symbol}_{time_level.value}" if time_level else f"{symbol}_"
+        for key in [key for key in self._incremental_states
+                    if key == prefix or (time_level is None and key.startswith(prefix))]:
+            del self._incremental_states[key]
+    
+    @staticmethod
+    def _to_kline_array(data: Union[List[Dict], KLineList, KLineArray], time_level: TimeLevel) -> KLineArray:
+        """统一转换为按时间排序的列式K线"""
+        if isinstance(data, KLineArray):
+            klines = data
+        elif isinstance(data, KLineList):
+            klines = KLineArray.from_klines(data.klines, data.level or time_level)
+        else:
+            klines = KLineArray.from_mongo_data(data, time_level)
+        
+        timestamps = klines.timestamps
+        if len(timestamps) > 1 and (np.diff(timestamps) < np.timedelta64(0)).any():
+            klines = klines.take(np.argsort(timestamps, kind='stable'))
+        return klines
+    
+    @staticmethod
+    def _merge_new_bars(raw_klines: KLineArray, new_klines: KLineArray) -> Tuple[KLineArray, int]:
+        """
+        合并新K线到原始K线序列
+        
+        Returns:
+            (合并后的K线, 新增或更新的K线数)
+        """
+        if new_klines.is_empty():
+            return raw_klines, 0
+        if raw_klines.is_empty():
+            return new_klines, len(new_klines)
+        
+        last_time = raw_klines.timestamps[-1]
+        new_klines = new_klines.take(new_klines.timestamps >= last_time)
+        if new_klines.is_empty():
+            return raw_klines, 0
+        
+        # 与最后一根时间相同：盘中未完成K线的更新
+        if new_klines.timestamps[0] == last_time:
+            raw_klines = raw_klines.take(slice(0, len(raw_klines) - 1))
+        return KLineArray.concat([raw_klines, new_klines], raw_klines.level), len(new_klines)
+    
+    def _find_stable_anchor(self, result: ChanAnalysisResult) -> Optional[int]:
+        """
+        已确定结构与未完成尾部的分界
+        
+        Returns:
+            分界分型在处理后K线中的索引，结构不足以确定分界时返回None
+        """
+        if len(result.segs) >= INCREMENTAL_TAIL_SEGS:
+            anchor_fx = result.segs.segs[-INCREMENTAL_TAIL_SEGS].start_fenxing
+        elif len(result.bis) >= INCREMENTAL_TAIL_BIS:
+            anchor_fx = result.bis.bis[-INCREMENTAL_TAIL_BIS].start_fenxing
+        else:
+            return None
+        if anchor_fx is None:
+            return None
+        
+        processed = result.processed_klines
+        index = processed.locate(anchor_fx.timestamp, hint=anchor_fx.index)
+        if index >= len(processed) or processed[index].timestamp != anchor_fx.timestamp:
+            return None
+        return index
+    
+    def _incremental_analyze(self, previous: ChanAnalysisResult,
+                             raw_klines: KLineArray) -> Tuple[Optional[ChanAnalysisResult], int]:
+        """
+        只重新处理未完成尾部的K线
+        
+        Returns:
+            (新的分析结果, 重新处理的原始K线数)；无法增量处理时结果为None，由调用方全量重算
+        """
+        processed = previous.processed_klines
+        anchor = self._find_stable_anchor(previous)
+        if not isinstance(processed, KLineArray) or anchor is None or anchor <= INCREMENTAL_LOOKBACK_BARS:
+            return None, 0
+        
+        # 尾部从分界前几根处理后K线开始，保证分界分型左侧有完整窗口
+        tail_start = anchor - INCREMENTAL_LOOKBACK_BARS
+        boundary_time = processed.timestamps[tail_start - 1]
+        tail_raw = raw_klines.take(raw_klines.timestamps > boundary_time)
+        tail_processed, tail_fenxings = self.kline_processor.process_klines(tail_raw)
+        if not isinstance(tail_processed, KLineArray) or tail_processed.is_empty():
+            return None, 0
+        
+        # 尾部重新合并后，回看部分到分界K线必须与上次结果一致，否则拼接后的索引与分型会错位
+        stable_count = anchor - tail_start + 1
+        if len(tail_processed) < stable_count:
+            return None, 0
+        previous_stable = processed.take(slice(tail_start, anchor + 1))
+        reprocessed_stable = tail_processed.take(slice(0, stable_count))
+        if not (np.array_equal(previous_stable.timestamps, reprocessed_stable.timestamps) and
+                np.array_equal(previous_stable.highs, reprocessed_stable.highs) and
+                np.array_equal(previous_stable.lows, reprocessed_stable.lows)):
+            return None, 0
+        
+        result = ChanAnalysisResult(
+            symbol=previous.symbol,
+            time_level=previous.time_level,
+            analysis_level=previous.analysis_level
+        )
+        result.klines = raw_klines
+        result.processed_klines = KLineArray.concat([processed.take(slice(0, tail_start)), tail_processed],
+                                                    processed.level)
+        result.processed_klines._is_processed = True
+        
+        # 分界K线之前的分型保留，之后的取尾部重新识别的结果（按时间拼接，索引换算到拼接后的序列）
+        anchor_time = processed[anchor].timestamp
+        fenxings = [fx for fx in previous.fenxings if fx.timestamp < anchor_time]
+        for fx in tail_fenxings:
+            if fx.timestamp >= anchor_time:
+                fx.index += tail_start
+                fenxings.append(fx)
+        result.fenxings = FenXingList(fenxings, previous.fenxings.level or previous.time_level)
+        
+        self._build_structures(result)
+        self._perform_level_analysis(result)
+        return result, len(tail_raw)
+    
+    @staticmethod
+    def _fill_structure_delta(delta: ChanStructureDelta,
+                              previous: Optional[ChanAnalysisResult],
+                              result: ChanAnalysisResult) -> None:
+        """比较前后两次分析结果，填充结构变化"""
+        def fenxing_key(fx):
+            return (fx.timestamp, fx.fenxing_type)
+        
+        def stroke_key(item):
+            return (item.start_time, item.end_time, item.direction)
+        
+        def zhongshu_key(zs):
+            return (zs.start_time, zs.end_time, zs.high, zs.low)
+        
+        def point_key(point):
+            return (point.timestamp, point.point_type)
+        
+        pairs = [
+            ('fenxings', fenxing_key, previous.fenxings.fenxings if previous else [], result.fenxings.fenxings),
+            ('bis', stroke_key, previous.bis.bis if previous else [], result.bis.bis),
+            ('segs', stroke_key, previous.segs.segs if previous else [], result.segs.segs),
+            ('zhongshus', zhongshu_key, previous.zhongshus.zhongshus if previous else [], result.zhongshus.zhongshus),
+            ('buy_sell_points', point_key, previous.buy_sell_points if previous else [], result.buy_sell_points),
+        ]
+        for name, key, old_items, new_items in pairs:
+            added, removed = _structure_diff(old_items, new_items, key)
+            setattr(delta, f'added_{name}', added)
+            setattr(delta, f'removed_{name}', removed)
     
     def analyze_multi_level(self,
-                          level_data: Dict[TimeLevel, Union[List[Dict], KLineList]],
+                          level_data: Dict[TimeLevel, Union[List[Dict], KLineList, KLineArray]],
                           symbol: str) -> Dict[TimeLevel, ChanAnalysisResult]:
         """
         多级别分析
@@ -227,7 +514,8 @@ class ChanEngine:
         # 单独分析各个级别
         for level, data in level_data.items():
             try:
-                result = self.analyze(data, symbol, level, AnalysisLevel.STANDARD)
+                # 多级别买卖点分析会修改各级别结果，不与单级别分析共享缓存对象
+                result = self.analyze(data, symbol, level, AnalysisLevel.STANDARD, use_cache=False)
                 results[level] = result
             except Exception as e:
                 print(f"⚠️ {level.value}级别分析失败: {e}")
@@ -332,6 +620,12 @@ class ChanEngine:
         result.processed_klines = processed_klines  # KlineProcessor已返回KLineList
         result.fenxings = fenxings  # KlineProcessor已返回FenXingList
         
+        self._build_structures(result)
+    
+    def _build_structures(self, result: ChanAnalysisResult) -> None:
+        """由分型构建笔、线段和中枢"""
+        fenxings = result.fenxings
+        
         # 构建笔
         if len(fenxings) >= 2:
             bis = self.bi_builder.build_from_fenxings(fenxings.fenxings)  # 传递fenxing列表
@@ -615,13 +909,18 @@ class ChanEngine:
         
         return summary.strip()
     
+    @property
+    def result_cache(self) -> ChanResultCache:
+        """分析结果缓存"""
+        return self._analysis_cache
+    
     def clear_cache(self) -> None:
         """清空分析缓存"""
         self._analysis_cache.clear()
 
 
 # 便捷函数
-def quick_analyze(data: Union[List[Dict], KLineList], 
+def quick_analyze(data: Union[List[Dict], KLineList, KLineArray], 
                  symbol: str, 
                  time_level: TimeLevel) -> ChanAnalysisResult:
     """快速缠论分析"""
@@ -629,7 +928,7 @@ def quick_analyze(data: Union[List[Dict], KLineList],
     return engine.analyze(data, symbol, time_level, AnalysisLevel.STANDARD)
 
 
-def multi_level_analyze(level_data: Dict[TimeLevel, Union[List[Dict], KLineList]], 
+def multi_level_analyze(level_data: Dict[TimeLevel, Union[List[Dict], KLineList, KLineArray]], 
                        symbol: str) -> Dict[TimeLevel, ChanAnalysisResult]:
     """多级别缠论分析"""
     engine = ChanEngine()
@@ -6,14 +6,16 @@
 """
 
 import logging
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 from datetime import datetime
 
+import numpy as np
+
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.kline import KLine, KLineList
+from models.kline import KLine, KLineList, KLineArray
 from models.fenxing import FenXing, FenXingList
 from models.enums import TimeLevel, FenXingType
 from config.chan_config import ChanConfig, KlineConfig
@@ -38,16 +40,16 @@ class KlineProcessor:
         self.kline_config = config.kline
         self.fenxing_config = config.fenxing
         
-    def process_klines(self, klines: KLineList) -> Tuple[KLineList, FenXingList]:
+    def process_klines(self, klines: Union[KLineList, KLineArray]) -> Tuple[Union[KLineList, KLineArray], FenXingList]:
         """
         处理K线数据
         包括数据验证、清洗、包含关系处理和分型识别
         
         Args:
-            klines: 原始K线列表
+            klines: 原始K线列表（KLineList或列式KLineArray）
             
         Returns:
-            (处理后的K线列表, 分型列表)
+            (处理后的K线列表, 分型列表)，输入为KLineArray时处理结果也是KLineArray
         """
         if klines.is_empty():
             logger.warning("输入K线数据为空")
@@ -141,6 +143,9 @@ class KlineProcessor:
         if not self.kline_config.enable_data_clean:
             return klines
         
+        if isinstance(klines, KLineArray):
+            return self._clean_kline_array(klines)
+        
         cleaned = []
         removed_count = 0
         
@@ -169,6 +174,42 @@ class KlineProcessor:
         
         return KLineList(cleaned, klines.level)
     
+    def _clean_kline_array(self, klines: KLineArray) -> KLineArray:
+        """
+        向量化清洗列式K线，规则与逐根检查的_is_valid_kline/_is_abnormal_kline一致
+        
+        Args:
+            klines: 原始列式K线
+            
+        Returns:
+            清洗后的列式K线
+        """
+        opens, highs, lows, closes = klines.opens, klines.highs, klines.lows, klines.closes
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            valid = ((opens > 0) & (highs > 0) & (lows > 0) & (closes > 0) &
+                     (highs >= np.maximum(opens, closes)) &
+                     (lows <= np.minimum(opens, closes)) &
+                     (klines.volumes >= self.kline_config.min_volume_threshold))
+            
+            # 跳空比例按相邻原始K线计算
+            abnormal = np.zeros(len(klines), dtype=bool)
+            prev_closes = closes[:-1]
+            gap_ratios = np.abs(opens[1:] - prev_closes) / prev_closes
+            abnormal[1:] = (prev_closes > 0) & (gap_ratios > self.kline_config.max_gap_ratio)
+        abnormal &= valid
+        
+        for i in np.flatnonzero(abnormal):
+            logger.warning(f"发现异常K线: {klines[int(i)].timestamp}, 跳空比例过大")
+        
+        keep = valid & ~abnormal if self.kline_config.max_gap_ratio < 0.5 else valid  # 严格模式下移除异常数据
+        removed_count = len(klines) - int(keep.sum())
+        if removed_count > 0:
+            logger.info(f"数据清洗：移除{removed_count}根异常K线")
+            return klines.take(keep)
+        
+        return klines
+    
     def _is_valid_kline(self, kline: KLine) -> bool:
         """
         检查K线数据是否有效
@@ -309,7 +350,11 @@ class KlineProcessor:
         logger.debug("\n--- 执行最终完整性检查 ---")
         processed = self._final_include_check(processed)
         
-        result = KLineList(processed, klines.level)
+        if isinstance(klines, KLineArray):
+            # 合并结果写回列式存储，后续分型识别直接使用
+            result = KLineArray.from_klines(processed, klines.level)
+        else:
+            result = KLineList(processed, klines.level)
         result._is_processed = True
         
         logger.info(f"包含关系处理统计: {len(klines)} -> {len(processed)}根K线")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缠论分析结果缓存
+两级缓存，取代ChanEngine中无上限的结果字典：
+- L1：进程内LRU，按条目数和内存预算淘汰，保存完整的ChanAnalysisResult
+- L2：可选的持久化存储（如Redis CacheManager，get/set JSON），保存紧凑的序列化结果，跨worker共享
+缓存以K线数据指纹（首末K线时间+数量+末根K线OHLCV）区分版本，新K线到达或盘中末根K线刷新后指纹变化，旧结果自动失效
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# L1默认容量
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+# L2默认过期时间（秒）与键前缀
+DEFAULT_PERSISTENT_TTL = 3600
+DEFAULT_KEY_PREFIX = 'chan:analysis'
+
+# 内存估算：对象形式的单根K线、单个结构（分型/笔/线段/中枢/买卖点）约占字节数
+KLINE_OBJECT_BYTES = 600
+STRUCTURE_OBJECT_BYTES = 1024
+
+# K线文档中时间字段的候选名称（与KLineArray.from_mongo_data一致）
+_DOC_TIME_FIELDS = ('trade_date', 'datetime', 'timestamp', 'trade_time')
+_PRICE_FIELDS = ('open', 'high', 'low', 'close')
+
+
+def _time_token(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.strftime('%Y%m%d%H%M%S')
+    return str(value)
+
+
+def _doc_time(doc: Dict[str, Any]) -> Any:
+    for name in _DOC_TIME_FIELDS:
+        if doc.get(name):
+            return doc[name]
+    return None
+
+
+def _bar_token(bar: Any) -> str:
+    """末根K线OHLCV摘要：盘中刷新当前K线时时间与数量不变，只有价格和成交量变化"""
+    if isinstance(bar, dict):
+        volume = bar.get('vol', bar.get('volume'))
+        values = [bar.get(name) for name in _PRICE_FIELDS] + [volume]
+    else:
+        values = [getattr(bar, name, None) for name in _PRICE_FIELDS] + [getattr(bar, 'volume', None)]
+    # 统一为浮点数，文档中的整数成交量与KLine对象的浮点字段得到相同摘要
+    tokens = []
+    for value in values:
+        try:
+            tokens.append(repr(float(value)))
+        except (TypeError, ValueError):
+            tokens.append(str(value))
+    return hashlib.md5(','.join(tokens).encode('utf-8')).hexdigest()[:12]
+
+
+def _enum_value(value: Any) -> str:
+    return str(getattr(value, 'value', value))
+
+
+def data_fingerprint(data: Any) -> Optional[str]:
+    """
+    K线数据指纹：首根、末根K线时间，K线数量与末根K线OHLCV摘要
+
+    Args:
+        data: MongoDB文档列表（按时间升序）或KLineList/KLineArray
+
+    Returns:
+        指纹字符串，数据为空时返回None
+    """
+    if data is None or len(data) == 0:
+        return None
+    first, last = data[0], data[-1]
+    if isinstance(first, dict):
+        first_time, last_time = _doc_time(first), _doc_time(last)
+    else:
+        first_time, last_time = first.timestamp, last.timestamp
+    return f"{_time_token(first_time)}-{_time_token(last_time)}-{len(data)}-{_bar_token(last)}"
+
+
+def estimate_result_bytes(result: Any) -> int:
+    """估算一个ChanAnalysisResult占用的内存"""
+    total = 0
+    for klines in (result.klines, result.processed_klines):
+        nbytes = getattr(klines, 'nbytes', None)
+        total += nbytes if nbytes is not None else len(klines) * KLINE_OBJECT_BYTES
+    structure_count = (len(result.fenxings) + len(result.bis) + len(result.segs) + len(result.zhongshus) +
+                       len(result.buy_sell_points) + len(result.backchi_analyses))
+    return total + structure_count * STRUCTURE_OBJECT_BYTES
+
+
+class ChanResultCache:
+    """
+    缠论分析结果两级缓存
+    L1按 股票_级别_分析级别 保存最近一次结果及其数据指纹，指纹不一致即视为过期
+    """
+
+    def __init__(self,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                 store_provider: Optional[Callable[[], Any]] = None,
+                 persistent_ttl: int = DEFAULT_PERSISTENT_TTL,
+                 key_prefix: str = DEFAULT_KEY_PREFIX):
+        """
+        初始化结果缓存
+
+        Args:
+            max_entries: L1最大条目数
+            memory_budget_mb: L1内存预算（MB）
+            store_provider: 返回L2存储的函数（存储需提供 get(key)/set(key, value, ttl)），为None时只用L1
+            persistent_ttl: L2过期时间（秒）
+            key_prefix: L2键前缀
+        """
+        self.max_entries = max_entries
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.store_provider = store_provider
+        self.persistent_ttl = persistent_ttl
+        self.key_prefix = key_prefix
+
+        # key -> (数据指纹, 分析结果, 估算字节数)
+        self._entries: 'OrderedDict[str, Tuple[str, Any, int]]' = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ==================== L1：进程内LRU ====================
+
+    @staticmethod
+    def make_key(symbol: str, time_level: Any, analysis_level: Any) -> str:
+        return f"{symbol}_{_enum_value(time_level)}_{_enum_value(analysis_level)}"
+
+    def get(self, symbol: str, time_level: Any, analysis_level: Any, fingerprint: Optional[str]) -> Optional[Any]:
+        """读取与数据指纹一致的分析结果"""
+        if fingerprint is None:
+            return None
+        key = self.make_key(symbol, time_level, analysis_level)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != fingerprint:
+                if entry is not None:
+                    # 已有新K线，旧结果作废
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, symbol: str, time_level: Any, analysis_level: Any,
+            fingerprint: Optional[str], result: Any) -> None:
+        """保存分析结果，超出条目数或内存预算时淘汰最久未使用的结果"""
+        if fingerprint is None:
+            return
+        key = self.make_key(symbol, time_level, analysis_level)
+        size = estimate_result_bytes(result)
+        with self._lock:
+            self._remove(key)
+            if size > self.memory_budget:
+                logger.debug(f"分析结果过大({size}字节)，不进入内存缓存: {key}")
+                return
+            self._entries[key] = (fingerprint, result, size)
+            self._memory_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._memory_bytes > self.memory_budget):
+                evicted_key = next(iter(self._entries))
+                self._remove(evicted_key)
+
+    def invalidate(self, symbol: str, time_level: Any = None) -> None:
+        """移除某只股票（指定级别或全部级别）的内存缓存"""
+        prefix = f"{symbol}_{_enum_value(time_level)}_" if time_level is not None else f"{symbol}_"
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """清空内存缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ==================== L2：持久化紧凑结果 ====================
+
+    def _store(self) -> Optional[Any]:
+        if self.store_provider is None:
+            return None
+        try:
+            store = self.store_provider()
+        except Exception as e:
+            logger.warning(f"获取缠论结果持久化存储失败: {e}")
+            return None
+        if store is None or (hasattr(store, 'is_available') and not store.is_available()):
+            return None
+        return store
+
+    def persistent_key(self, scope: str, symbol: str, time_level: Any, analysis_level: Any, fingerprint: str) -> str:
+        return (f"{self.key_prefix}:{scope}:{symbol}:{_enum_value(time_level)}:"
+                f"{_enum_value(analysis_level)}:{fingerprint}")
+
+    def get_payload(self, scope: str, symbol: str, time_level: Any, analysis_level: Any,
+                    fingerprint: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        读取持久化的紧凑结果
+
+        Args:
+            scope: 结果类型（如 complete:90、signals:30，同一份分析的不同序列化形式分开保存）
+            fingerprint: 数据指纹，键中包含末根K线时间，新K线到达后自然不再命中
+        """
+        store = self._store()
+        if store is None or fingerprint is None:
+            return None
+        try:
+            return store.get(self.persistent_key(scope, symbol, time_level, analysis_level, fingerprint))
+        except Exception as e:
+            logger.warning(f"读取缠论持久化结果失败: {e}")
+            return None
+
+    def put_payload(self, scope: str, symbol: str, time_level: Any, analysis_level: Any,
+                    fingerprint: Optional[str], payload: Dict[str, Any]) -> bool:
+        """保存紧凑结果（需可JSON序列化）"""
+        store = self._store()
+        if store is None or fingerprint is None:
+            return False
+        try:
+            return bool(store.set(self.persistent_key(scope, symbol, time_level, analysis_level, fingerprint),
+                                  payload, self.persistent_ttl))
+        except Exception as e:
+            logger.warning(f"保存缠论持久化结果失败: {e}")
+            return False
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """缓存统计"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'memory_mb': round(self._memory_bytes / 1024 / 1024, 2),
+            'memory_budget_mb': round(self.memory_budget / 1024 / 1024, 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'persistent': self._store() is not None,
+        }
@@ -5,7 +5,7 @@
 """
 
 from .enums import TimeLevel, FenXingType, BiDirection, SegDirection, ZhongShuType
-from .kline import KLine, KLineList
+from .kline import KLine, KLineList, KLineView, KLineArray
 from .fenxing import FenXing, FenXingList
 from .bi import Bi, BiList
 from .seg import Seg, SegList
@@ -16,7 +16,7 @@ __all__ = [
     'TimeLevel', 'FenXingType', 'BiDirection', 'SegDirection', 'ZhongShuType',
     
     # 数据模型
-    'KLine', 'KLineList',
+    'KLine', 'KLineList', 'KLineView', 'KLineArray',
     'FenXing', 'FenXingList', 
     'Bi', 'BiList',
     'Seg', 'SegList',
@@ -6,10 +6,11 @@
 """
 
 from dataclasses import dataclass, field
+from bisect import bisect_left, bisect_right
 from datetime import datetime
-from typing import List, Optional, Dict, Any, Iterator
+from typing import List, Optional, Dict, Any, Iterator, Union
 from .enums import BiDirection, FenXingType, TimeLevel
-from .kline import KLine
+from .kline import KLine, KLineArray
 from .fenxing import FenXing
 
 
@@ -129,6 +130,16 @@ class Bi:
         """结束时间"""
         return self.end_fenxing.timestamp
     
+    @property
+    def start_index(self) -> int:
+        """起点在处理后K线序列中的索引"""
+        return self.start_fenxing.index
+    
+    @property
+    def end_index(self) -> int:
+        """终点在处理后K线序列中的索引"""
+        return self.end_fenxing.index
+    
     @property
     def duration(self) -> int:
         """持续时间（K线数量）"""
@@ -384,16 +395,18 @@ class BiBuilder:
         self.config = config or BiConfig()
         self._current_bis: List[Bi] = []
         self._temp_fenxings: List[FenXing] = []
-        self._all_klines: List[KLine] = []  # 存储完整的K线序列
+        self._all_klines: Union[List[KLine], KLineArray] = []  # 存储完整的K线序列
+        self._kline_times: List[datetime] = []  # 列表K线的时间索引（与_all_klines一一对应）
         
-    def build_from_fenxings(self, fenxings: List[FenXing], klines: Optional[List[KLine]] = None) -> List[Bi]:
+    def build_from_fenxings(self, fenxings: List[FenXing],
+                            klines: Optional[Union[List[KLine], KLineArray]] = None) -> List[Bi]:
         """
         从分型序列构建笔序列
         按照缠论标准定义：相邻的顶分型和底分型之间的连线构成笔
         
         Args:
             fenxings: 分型列表（按时间排序）
-            klines: 完整的K线序列（可选）
+            klines: 完整的K线序列（可选），KLineArray按时间有序，直接使用
             
         Returns:
             构建的笔列表
@@ -402,15 +415,25 @@ class BiBuilder:
             return []
         
         # 存储K线序列
-        if klines:
+        if isinstance(klines, KLineArray):
+            self._all_klines = klines
+        elif klines:
             self._all_klines = sorted(klines, key=lambda k: k.timestamp)
         else:
             self._all_klines = []
+            seen_times = set()
             for fx in fenxings:
-                if fx.kline not in self._all_klines:
+                if fx.timestamp not in seen_times:
+                    seen_times.add(fx.timestamp)
                     self._all_klines.append(fx.kline)
             self._all_klines.sort(key=lambda k: k.timestamp)
         
+        # 时间索引：分型与K线之间的定位都走二分查找
+        if isinstance(self._all_klines, KLineArray):
+            self._kline_times = []
+        else:
+            self._kline_times = [k.timestamp for k in self._all_klines]
+        
         # 按缠论标准构建笔：相邻不同类型分型直接连接
         bis = []
         
@@ -457,8 +480,7 @@ class BiBuilder:
         start_time = start_fx.timestamp
         end_time = end_fx.timestamp
         
-        bi_klines = [k for k in self._all_klines 
-                     if start_time <= k.timestamp <= end_time]
+        bi_klines = self._klines_in_time_range(start_time, end_time)
         
         if not bi_klines:
             return None
@@ -475,6 +497,29 @@ class BiBuilder:
         except Exception as e:
             return None
     
+    def _klines_in_time_range(self, start_time: datetime, end_time: datetime) -> List[KLine]:
+        """获取时间区间内（含两端）的K线，二分查找定位"""
+        if isinstance(self._all_klines, KLineArray):
+            start, end = self._all_klines.locate_range(start_time, end_time)
+        else:
+            start = bisect_left(self._kline_times, start_time)
+            end = bisect_right(self._kline_times, end_time)
+        return self._all_klines[start:end]
+    
+    def _kline_index_of(self, fx: FenXing) -> int:
+        """分型K线在完整K线序列中的索引，优先使用分型记录的index，找不到返回-1"""
+        if isinstance(self._all_klines, KLineArray):
+            index = self._all_klines.locate(fx.timestamp, hint=fx.index)
+            found = index < len(self._all_klines) and self._all_klines[index].timestamp == fx.timestamp
+            return index if found else -1
+        
+        if 0 <= fx.index < len(self._kline_times) and self._kline_times[fx.index] == fx.timestamp:
+            return fx.index
+        index = bisect_left(self._kline_times, fx.timestamp)
+        if index < len(self._kline_times) and self._kline_times[index] == fx.timestamp:
+            return index
+        return -1
+    
     def _optimize_consecutive_fenxings(self, fenxings: List[FenXing]) -> List[FenXing]:
         """
         优化连续同类型分型
@@ -707,15 +752,8 @@ class BiBuilder:
             return [start_fx.kline, end_fx.kline]
         
         # 找到分型对应的K线索引
-        start_index = -1
-        end_index = -1
-        
-        for i, kline in enumerate(self._all_klines):
-            if kline.timestamp == start_fx.timestamp:
-                start_index = i
-            elif kline.timestamp == end_fx.timestamp:
-                end_index = i
-                break
+        start_index = self._kline_index_of(start_fx)
+        end_index = self._kline_index_of(end_fx)
         
         # 如果找不到对应的K线，使用简化处理
         if start_index == -1 or end_index == -1 or start_index >= end_index:
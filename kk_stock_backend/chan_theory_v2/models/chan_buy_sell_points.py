@@ -188,7 +188,7 @@ class ChanBuySellPointAnalyzer:
                             else BuySellPointType.SELL_1)
                 
                 # 寻找对应K线
-                kline_index = self._find_kline_by_time(context.klines, current_seg.end_time)
+                kline_index = self._find_kline_by_time(context.klines, current_seg.end_time, current_seg.end_index)
                 
                 if kline_index >= 0:
                     bsp = BuySellPoint(
@@ -228,7 +228,7 @@ class ChanBuySellPointAnalyzer:
                     point_type = (BuySellPointType.BUY_2 if first_bsp.point_type.is_buy() 
                                 else BuySellPointType.SELL_2)
                     
-                    kline_index = self._find_kline_by_time(context.klines, pullback_seg.end_time)
+                    kline_index = self._find_kline_by_time(context.klines, pullback_seg.end_time, pullback_seg.end_index)
                     
                     if kline_index >= 0:
                         bsp = BuySellPoint(
@@ -271,7 +271,7 @@ class ChanBuySellPointAnalyzer:
                         point_type = (BuySellPointType.BUY_3 if leave_seg.direction == SegDirection.UP 
                                     else BuySellPointType.SELL_3)
                         
-                        kline_index = self._find_kline_by_time(context.klines, test_seg.end_time)
+                        kline_index = self._find_kline_by_time(context.klines, test_seg.end_time, test_seg.end_index)
                         
                         if kline_index >= 0:
                             bsp = BuySellPoint(
@@ -369,9 +369,6 @@ class ChanBuySellPointAnalyzer:
             # 向下离开后回试不破中枢下沿
             return test_seg.end_price < zhongshu.low * 1.02   # 允许2%误差
     
-    def _find_kline_by_time(self, klines: KLineList, timestamp: datetime) -> int:
-        """根据时间找到对应的K线索引"""
-        for i, kline in enumerate(klines):
-            if kline.timestamp >= timestamp:
-                return i
-        return len(klines) - 1
\ No newline at end of file
+    def _find_kline_by_time(self, klines: KLineList, timestamp: datetime, hint: Optional[int] = None) -> int:
+        """根据时间找到对应的K线索引（hint为线段端点分型记录的索引，命中时O(1)，否则二分查找）"""
+        return min(klines.locate(timestamp, hint), len(klines) - 1)
\ No newline at end of file
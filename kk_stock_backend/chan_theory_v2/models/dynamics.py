@@ -20,7 +20,7 @@ import numpy as np
 from abc import ABC, abstractmethod
 
 from .enums import TimeLevel, BiDirection, SegDirection, ZhongShuType
-from .kline import KLine, KLineList
+from .kline import KLine, KLineList, KLineArray
 from .bi import Bi, BiList
 from .seg import Seg, SegList  
 from .zhongshu import ZhongShu, ZhongShuList
@@ -240,7 +240,10 @@ class DynamicsAnalyzer:
             return []
         
         # 计算MACD数据
-        close_prices = [kline.close for kline in klines]
+        if isinstance(klines, KLineArray):
+            close_prices = klines.closes.tolist()
+        else:
+            close_prices = [kline.close for kline in klines]
         macd_data = self.macd_calculator.calculate(close_prices)
         
         if len(macd_data) < 20:
@@ -415,7 +418,7 @@ class DynamicsAnalyzer:
                     
                     # 找到对应的K线
                     seg_end_time = last_trend_seg.end_time
-                    kline_index = self._find_kline_index_by_time(klines, seg_end_time)
+                    kline_index = self._find_kline_index_by_time(klines, seg_end_time, last_trend_seg.end_index)
                     
                     if kline_index >= 0:
                         point = BuySellPoint(
@@ -454,7 +457,7 @@ class DynamicsAnalyzer:
                     point_type = (BuySellPointType.BUY_2 if first_point.point_type.is_buy() 
                                 else BuySellPointType.SELL_2)
                     
-                    kline_index = self._find_kline_index_by_time(klines, test_seg.end_time)
+                    kline_index = self._find_kline_index_by_time(klines, test_seg.end_time, test_seg.end_index)
                     
                     if kline_index >= 0:
                         point = BuySellPoint(
@@ -494,7 +497,7 @@ class DynamicsAnalyzer:
                         point_type = (BuySellPointType.BUY_3 if leaving_seg.direction == SegDirection.UP 
                                     else BuySellPointType.SELL_3)
                         
-                        kline_index = self._find_kline_index_by_time(klines, test_seg.end_time)
+                        kline_index = self._find_kline_index_by_time(klines, test_seg.end_time, test_seg.end_index)
                         
                         if kline_index >= 0:
                             point = BuySellPoint(
@@ -571,12 +574,9 @@ class DynamicsAnalyzer:
             # 向下离开后回试不能升破中枢下沿
             return test_seg.end_price < zhongshu.low
     
-    def _find_kline_index_by_time(self, klines: KLineList, timestamp) -> int:
-        """根据时间戳找到对应的K线索引"""
-        for i, kline in enumerate(klines):
-            if kline.timestamp >= timestamp:
-                return i
-        return len(klines) - 1  # 如果没找到，返回最后一个
+    def _find_kline_index_by_time(self, klines: KLineList, timestamp, hint: Optional[int] = None) -> int:
+        """根据时间戳找到对应的K线索引（hint为线段端点分型记录的索引，命中时O(1)，否则二分查找）"""
+        return min(klines.locate(timestamp, hint), len(klines) - 1)  # 如果没找到，返回最后一个
     
 
 
@@ -9,7 +9,7 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Optional, Dict, Any, Iterator
 from .enums import FenXingType, TimeLevel
-from .kline import KLine
+from .kline import KLine, KLineView
 
 
 @dataclass
@@ -45,7 +45,7 @@ class FenXing:
     
     def _validate(self) -> None:
         """数据有效性验证"""
-        if not isinstance(self.kline, KLine):
+        if not isinstance(self.kline, (KLine, KLineView)):
             raise ValueError("分型必须关联一个有效的K线")
         if self.index < 0:
             raise ValueError("分型索引不能为负数")
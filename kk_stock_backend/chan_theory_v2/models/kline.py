@@ -5,9 +5,10 @@
 参考Vespa314/chan.py的KLine设计，实现标准的K线数据结构
 """
 
+from bisect import bisect_left
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional, Dict, Any, Union, Iterator
+from typing import List, Optional, Dict, Any, Union, Iterator, Iterable
 from decimal import Decimal
 import pandas as pd
 import numpy as np
@@ -186,7 +187,7 @@ class KLine:
     
     def __eq__(self, other) -> bool:
         """相等比较"""
-        if not isinstance(other, KLine):
+        if not isinstance(other, (KLine, KLineView)):
             return False
         return (self.timestamp == other.timestamp and 
                 abs(self.open - other.open) < 1e-6 and
@@ -195,6 +196,118 @@ class KLine:
                 abs(self.close - other.close) < 1e-6)
 
 
+class KLineView:
+    """
+    列式K线容器(KLineArray)中单根K线的只读视图
+    仅在访问时创建，只保存所属容器和索引，接口与KLine一致
+    """
+    __slots__ = ('_array', '_index')
+
+    def __init__(self, array: 'KLineArray', index: int):
+        self._array = array
+        self._index = index
+
+    @property
+    def index(self) -> int:
+        """在所属容器中的索引"""
+        return self._index
+
+    @property
+    def timestamp(self) -> datetime:
+        return self._array._timestamps[self._index].item()
+
+    @property
+    def open(self) -> float:
+        return float(self._array._open[self._index])
+
+    @property
+    def high(self) -> float:
+        return float(self._array._high[self._index])
+
+    @property
+    def low(self) -> float:
+        return float(self._array._low[self._index])
+
+    @property
+    def close(self) -> float:
+        return float(self._array._close[self._index])
+
+    @property
+    def volume(self) -> int:
+        return int(self._array._volume[self._index])
+
+    @property
+    def amount(self) -> Optional[float]:
+        value = self._array._amount[self._index]
+        return None if np.isnan(value) else float(value)
+
+    @property
+    def turnover(self) -> Optional[float]:
+        value = self._array._turnover[self._index]
+        return None if np.isnan(value) else float(value)
+
+    @property
+    def level(self) -> Optional[TimeLevel]:
+        return self._array._level
+
+    @level.setter
+    def level(self, value: Optional[TimeLevel]) -> None:
+        # 级别属于整个容器，只允许为未设置级别的容器补充
+        if self._array._level is None:
+            self._array._level = value
+
+    @property
+    def original_count(self) -> int:
+        return int(self._array._original_count[self._index])
+
+    @property
+    def is_processed(self) -> bool:
+        return self.original_count > 1
+
+    @property
+    def indicators(self) -> Dict[str, float]:
+        return {name: float(values[self._index]) for name, values in self._array._indicators.items()}
+
+    # 派生属性与方法直接复用KLine的实现
+    is_up = KLine.is_up
+    is_down = KLine.is_down
+    is_doji = KLine.is_doji
+    body_size = KLine.body_size
+    upper_shadow = KLine.upper_shadow
+    lower_shadow = KLine.lower_shadow
+    range_size = KLine.range_size
+    mid_price = KLine.mid_price
+    typical_price = KLine.typical_price
+    contains = KLine.contains
+    is_contained_by = KLine.is_contained_by
+    has_include_relation = KLine.has_include_relation
+    merge_with = KLine.merge_with
+    to_dict = KLine.to_dict
+    __str__ = KLine.__str__
+    __eq__ = KLine.__eq__
+    __hash__ = None
+
+    def to_kline(self) -> KLine:
+        """物化为独立的KLine对象"""
+        return KLine(
+            timestamp=self.timestamp,
+            open=self.open,
+            high=self.high,
+            low=self.low,
+            close=self.close,
+            volume=self.volume,
+            amount=self.amount,
+            turnover=self.turnover,
+            level=self.level,
+            is_processed=self.is_processed,
+            original_count=self.original_count,
+            indicators=self.indicators
+        )
+
+    def __repr__(self) -> str:
+        return f"KLineView[{self._index}]{self}"
+
+
 class KLineList:
     """
     K线列表容器
@@ -212,6 +325,7 @@ class KLineList:
         self._klines: List[KLine] = klines or []
         self._level = level
         self._is_processed = False
+        self._times: Optional[List[datetime]] = None  # 时间索引缓存，按需构建
         
         # 设置K线级别
         if self._level:
@@ -252,6 +366,7 @@ class KLineList:
             kline.level = self._level
         self._klines.append(kline)
         self._is_processed = False  # 标记需要重新处理
+        self._times = None
     
     def extend(self, klines: List[KLine]) -> None:
         """批量添加K线"""
@@ -260,16 +375,35 @@ class KLineList:
                 kline.level = self._level
         self._klines.extend(klines)
         self._is_processed = False
+        self._times = None
     
     def clear(self) -> None:
         """清空K线"""
         self._klines.clear()
         self._is_processed = False
+        self._times = None
     
     def is_empty(self) -> bool:
         """是否为空"""
         return len(self._klines) == 0
     
+    def locate(self, timestamp: datetime, hint: Optional[int] = None) -> int:
+        """
+        按时间定位K线（K线按时间升序）
+        
+        Args:
+            timestamp: 目标时间
+            hint: 已知的候选索引（如分型记录的index），时间吻合时直接返回
+            
+        Returns:
+            第一根时间不早于timestamp的K线索引，都早于时返回len(self)
+        """
+        if hint is not None and 0 <= hint < len(self._klines) and self._klines[hint].timestamp == timestamp:
+            return hint
+        if self._times is None:
+            self._times = [kline.timestamp for kline in self._klines]
+        return bisect_left(self._times, timestamp)
+    
     def get_price_range(self) -> Optional[tuple]:
         """获取价格范围(最低价, 最高价)"""
         if self.is_empty():
@@ -427,4 +561,387 @@ class KLineList:
     def __str__(self) -> str:
         """字符串表示"""
         level_str = f"({self._level.value})" if self._level else ""
-        return f"KLineList{level_str}[{len(self._klines)} klines]"
\ No newline at end of file
+        return f"KLineList{level_str}[{len(self._klines)} klines]"
+
+# MongoDB K线文档中时间字段的候选名称（按优先级）
+KLINE_TIME_FIELDS = ('trade_date', 'datetime', 'timestamp', 'trade_time')
+
+
+class KLineArray:
+    """
+    列式K线容器
+    时间与OHLCV分别保存在NumPy数组中，单根K线以KLineView视图的形式按需创建，
+    用于多年5分钟级别等大数据量分析，避免每根K线一个Python对象
+    """
+
+    def __init__(self,
+                 timestamps: Any,
+                 open: Any,
+                 high: Any,
+                 low: Any,
+                 close: Any,
+                 volume: Any,
+                 amount: Any = None,
+                 turnover: Any = None,
+                 level: Optional[TimeLevel] = None,
+                 original_count: Any = None,
+                 indicators: Optional[Dict[str, Any]] = None):
+        """
+        初始化列式K线容器
+
+        Args:
+            timestamps: 时间数组
+            open/high/low/close: 价格数组
+            volume: 成交量数组
+            amount: 成交额数组（缺失为NaN）
+            turnover: 换手率数组（缺失为NaN）
+            level: 时间级别
+            original_count: 每根K线包含的原始K线数量（包含关系合并后>1）
+            indicators: 技术指标列 {名称: 数组}
+        """
+        self._timestamps = np.asarray(timestamps, dtype='datetime64[us]')
+        size = len(self._timestamps)
+        self._open = np.asarray(open, dtype=np.float64)
+        self._high = np.asarray(high, dtype=np.float64)
+        self._low = np.asarray(low, dtype=np.float64)
+        self._close = np.asarray(close, dtype=np.float64)
+        self._volume = np.asarray(volume, dtype=np.int64)
+        self._amount = np.full(size, np.nan) if amount is None else np.asarray(amount, dtype=np.float64)
+        self._turnover = np.full(size, np.nan) if turnover is None else np.asarray(turnover, dtype=np.float64)
+        self._original_count = (np.ones(size, dtype=np.int32) if original_count is None
+                                else np.asarray(original_count, dtype=np.int32))
+        self._indicators = {name: np.asarray(values, dtype=np.float64) for name, values in (indicators or {}).items()}
+        self._level = level
+        self._is_processed = False
+
+    @classmethod
+    def empty(cls, level: Optional[TimeLevel] = None) -> 'KLineArray':
+        """创建空容器"""
+        return cls([], [], [], [], [], [], level=level)
+
+    # ==================== 列访问 ====================
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps
+
+    @property
+    def opens(self) -> np.ndarray:
+        return self._open
+
+    @property
+    def highs(self) -> np.ndarray:
+        return self._high
+
+    @property
+    def lows(self) -> np.ndarray:
+        return self._low
+
+    @property
+    def closes(self) -> np.ndarray:
+        return self._close
+
+    @property
+    def volumes(self) -> np.ndarray:
+        return self._volume
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self._amount
+
+    @property
+    def original_counts(self) -> np.ndarray:
+        return self._original_count
+
+    @property
+    def nbytes(self) -> int:
+        """列数据占用的字节数"""
+        arrays = [self._timestamps, self._open, self._high, self._low, self._close, self._volume,
+                  self._amount, self._turnover, self._original_count, *self._indicators.values()]
+        return sum(array.nbytes for array in arrays)
+
+    @property
+    def klines(self) -> List[KLineView]:
+        """全部K线视图（兼容KLineList接口，会为每根K线创建视图）"""
+        return [KLineView(self, i) for i in range(len(self))]
+
+    @property
+    def level(self) -> Optional[TimeLevel]:
+        """获取时间级别"""
+        return self._level
+
+    @property
+    def is_processed(self) -> bool:
+        """是否已处理包含关系"""
+        return self._is_processed
+
+    # ==================== 容器接口 ====================
+
+    def __len__(self) -> int:
+        """K线数量"""
+        return len(self._timestamps)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[KLineView, List[KLineView]]:
+        """索引访问，切片与KLineList一致返回列表"""
+        if isinstance(index, slice):
+            return [KLineView(self, i) for i in range(*index.indices(len(self)))]
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("K线索引超出范围")
+        return KLineView(self, index)
+
+    def __iter__(self) -> Iterator[KLineView]:
+        """迭代器"""
+        for i in range(len(self)):
+            yield KLineView(self, i)
+
+    def is_empty(self) -> bool:
+        """是否为空"""
+        return len(self) == 0
+
+    def locate(self, timestamp: datetime, hint: Optional[int] = None) -> int:
+        """
+        按时间定位K线（二分查找有序时间数组）
+
+        Args:
+            timestamp: 目标时间
+            hint: 已知的候选索引（如分型记录的index），时间吻合时直接返回
+
+        Returns:
+            第一根时间不早于timestamp的K线索引，都早于时返回len(self)
+        """
+        target = np.datetime64(timestamp, 'us')
+        if hint is not None and 0 <= hint < len(self) and self._timestamps[hint] == target:
+            return hint
+        return int(self._timestamps.searchsorted(target, side='left'))
+
+    def locate_range(self, start_time: datetime, end_time: datetime) -> tuple:
+        """时间区间[start_time, end_time]对应的索引范围(start, end)，end不包含"""
+        start = int(self._timestamps.searchsorted(np.datetime64(start_time, 'us'), side='left'))
+        end = int(self._timestamps.searchsorted(np.datetime64(end_time, 'us'), side='right'))
+        return (start, end)
+
+    def take(self, indices: Any) -> 'KLineArray':
+        """按索引数组或布尔掩码选取K线，返回新的列式容器"""
+        return KLineArray(
+            self._timestamps[indices],
+            self._open[indices],
+            self._high[indices],
+            self._low[indices],
+            self._close[indices],
+            self._volume[indices],
+            amount=self._amount[indices],
+            turnover=self._turnover[indices],
+            level=self._level,
+            original_count=self._original_count[indices],
+            indicators={name: values[indices] for name, values in self._indicators.items()}
+        )
+
+    @classmethod
+    def concat(cls, arrays: List['KLineArray'], level: Optional[TimeLevel] = None) -> 'KLineArray':
+        """按顺序拼接多个列式容器（缺失的技术指标列以NaN补齐）"""
+        arrays = [array for array in arrays if not array.is_empty()]
+        if not arrays:
+            return cls.empty(level)
+
+        indicator_names = set()
+        for array in arrays:
+            indicator_names.update(array._indicators.keys())
+
+        def join(attr: str) -> np.ndarray:
+            return np.concatenate([getattr(array, attr) for array in arrays])
+
+        return cls(
+            join('_timestamps'), join('_open'), join('_high'), join('_low'), join('_close'), join('_volume'),
+            amount=join('_amount'),
+            turnover=join('_turnover'),
+            level=level or arrays[0].level,
+            original_count=join('_original_count'),
+            indicators={name: np.concatenate([array._indicators.get(name, np.full(len(array), np.nan))
+                                              for array in arrays])
+                        for name in indicator_names}
+        )
+
+    # ==================== 统计 ====================
+
+    def get_price_range(self) -> Optional[tuple]:
+        """获取价格范围(最低价, 最高价)"""
+        if self.is_empty():
+            return None
+        return (float(self._low.min()), float(self._high.max()))
+
+    def get_time_range(self) -> Optional[tuple]:
+        """获取时间范围(开始时间, 结束时间)"""
+        if self.is_empty():
+            return None
+        return (self._timestamps.min().item(), self._timestamps.max().item())
+
+    def get_volume_sum(self) -> int:
+        """获取总成交量"""
+        return int(self._volume.sum())
+
+    def get_amount_sum(self) -> float:
+        """获取总成交额"""
+        return float(np.nansum(self._amount))
+
+    def validate_data(self) -> List[str]:
+        """数据验证，返回错误信息列表"""
+        errors = []
+
+        if self.is_empty():
+            errors.append("K线数据为空")
+            return errors
+
+        steps = np.diff(self._timestamps)
+        if (steps < np.timedelta64(0)).any():
+            errors.append("K线时间顺序不正确")
+        if (steps == np.timedelta64(0)).any():
+            errors.append("存在重复的时间戳")
+
+        invalid = np.flatnonzero(~_valid_ohlcv_mask(self._open, self._high, self._low, self._close, self._volume))
+        for i in invalid:
+            errors.append(f"第{i+1}根K线数据无效: {self[int(i)]}")
+
+        return errors
+
+    # ==================== 转换 ====================
+
+    def to_kline_list(self) -> KLineList:
+        """物化为KLineList（每根K线一个KLine对象）"""
+        result = KLineList([view.to_kline() for view in self], self._level)
+        result._is_processed = self._is_processed
+        return result
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """转换为pandas DataFrame"""
+        if self.is_empty():
+            return pd.DataFrame()
+
+        df = pd.DataFrame({
+            'open': self._open,
+            'high': self._high,
+            'low': self._low,
+            'close': self._close,
+            'volume': self._volume,
+            'amount': self._amount,
+            'turnover': self._turnover,
+            **self._indicators
+        }, index=pd.DatetimeIndex(self._timestamps, name='timestamp'))
+        return df
+
+    @classmethod
+    def from_klines(cls, klines: List[Any], level: Optional[TimeLevel] = None) -> 'KLineArray':
+        """从KLine/KLineView序列创建（如包含关系处理后的结果）"""
+        if not klines:
+            return cls.empty(level)
+
+        indicator_names = set()
+        for kline in klines:
+            indicator_names.update(kline.indicators.keys())
+
+        return cls(
+            [kline.timestamp for kline in klines],
+            [kline.open for kline in klines],
+            [kline.high for kline in klines],
+            [kline.low for kline in klines],
+            [kline.close for kline in klines],
+            [kline.volume for kline in klines],
+            amount=[np.nan if kline.amount is None else kline.amount for kline in klines],
+            turnover=[np.nan if kline.turnover is None else kline.turnover for kline in klines],
+            level=level,
+            original_count=[kline.original_count for kline in klines],
+            indicators={name: [kline.indicators.get(name, np.nan) for kline in klines]
+                        for name in indicator_names}
+        )
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, level: Optional[TimeLevel] = None) -> 'KLineArray':
+        """从pandas DataFrame（时间索引）创建"""
+        if df.empty:
+            return cls.empty(level)
+
+        basic_cols = {'open', 'high', 'low', 'close', 'volume', 'amount', 'turnover'}
+        size = len(df)
+
+        def column(name: str, default: float) -> np.ndarray:
+            if name not in df.columns:
+                return np.full(size, default)
+            return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+
+        open_, high, low, close = (column(name, np.nan) for name in ('open', 'high', 'low', 'close'))
+        volume = np.nan_to_num(column('volume', 0))
+        if not _valid_ohlcv_mask(open_, high, low, close, volume).all():
+            raise ValueError("DataFrame中存在无效的OHLCV数据")
+
+        return cls(
+            pd.to_datetime(df.index).to_numpy(),
+            open_, high, low, close, volume.astype(np.int64),
+            amount=column('amount', np.nan),
+            turnover=column('turnover', np.nan),
+            level=level,
+            indicators={col: column(col, np.nan) for col in df.columns if col not in basic_cols}
+        )
+
+    @classmethod
+    def from_mongo_data(cls, data: Iterable[Dict[str, Any]], level: TimeLevel) -> 'KLineArray':
+        """
+        从MongoDB数据（文档列表或游标）向量化创建
+        字段适配与KLineList.from_mongo_data一致，无效行（时间缺失、价格异常）被跳过
+        """
+        records = data if isinstance(data, list) else list(data)
+        if not records:
+            return cls.empty(level)
+
+        df = pd.DataFrame.from_records(records)
+
+        # 时间字段：逐行取第一个非空的候选字段（各字段格式可能不同，分别解析后再合并）
+        timestamps = None
+        for name in KLINE_TIME_FIELDS:
+            if name not in df.columns or pd.api.types.is_numeric_dtype(df[name]):
+                continue
+            values = df[name].where(df[name].notna() & (df[name] != ''))
+            parsed = pd.to_datetime(values, errors='coerce')
+            timestamps = parsed if timestamps is None else timestamps.combine_first(parsed)
+        if timestamps is None:
+            return cls.empty(level)
+
+        def column(name: str, default: float = 0.0) -> pd.Series:
+            if name not in df.columns:
+                return pd.Series(default, index=df.index, dtype=np.float64)
+            return pd.to_numeric(df[name], errors='coerce')
+
+        open_, high, low, close = (column(name).to_numpy() for name in ('open', 'high', 'low', 'close'))
+        volume = column('vol', np.nan).combine_first(column('volume')).to_numpy()
+
+        # 成交额可能有不同字段名
+        amount = column('amount', np.nan)
+        amount = amount.where(amount != 0).combine_first(column('turnover_value', np.nan)).to_numpy()
+
+        mask = timestamps.notna().to_numpy() & _valid_ohlcv_mask(open_, high, low, close, volume)
+        if not mask.any():
+            return cls.empty(level)
+
+        return cls(
+            timestamps.to_numpy()[mask],
+            open_[mask], high[mask], low[mask], close[mask],
+            volume[mask].astype(np.int64),
+            amount=amount[mask],
+            level=level
+        )
+
+    def __str__(self) -> str:
+        """字符串表示"""
+        level_str = f"({self._level.value})" if self._level else ""
+        return f"KLineArray{level_str}[{len(self)} klines]"
+
+
+def _valid_ohlcv_mask(open_: np.ndarray, high: np.ndarray, low: np.ndarray,
+                      close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """向量化的K线有效性检查，规则与KLine._validate一致（NaN视为无效）"""
+    with np.errstate(invalid='ignore'):
+        return (~np.isnan(open_) & ~np.isnan(high) & ~np.isnan(low) & ~np.isnan(close) & ~np.isnan(volume) &
+                (high >= np.maximum(open_, close)) &
+                (low <= np.minimum(open_, close)) &
+                (volume >= 0))
@@ -164,6 +164,16 @@ class Seg:
         """结束时间"""
         return self.end_fenxing.timestamp if self.end_fenxing else datetime.min
     
+    @property
+    def start_index(self) -> Optional[int]:
+        """起点在处理后K线序列中的索引"""
+        return self.start_fenxing.index if self.start_fenxing else None
+    
+    @property
+    def end_index(self) -> Optional[int]:
+        """终点在处理后K线序列中的索引"""
+        return self.end_fenxing.index if self.end_fenxing else None
+    
     @property
     def duration(self) -> int:
         """持续时间（K线数量）"""
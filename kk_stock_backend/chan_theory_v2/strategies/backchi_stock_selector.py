@@ -5,10 +5,15 @@
 基于MACD红绿柱面积对比的实用背驰判断方法
 """
 
+import copy
 import sys
 import os
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import numpy as np
 import logging
 from dataclasses import dataclass
 from enum import Enum
@@ -19,13 +24,28 @@ sys.path.append(os.path.join(current_dir, '..', '..'))
 
 from chan_theory_v2.models.simple_backchi import SimpleBackchiAnalyzer
 from chan_theory_v2.models.dynamics import MacdCalculator
-from chan_theory_v2.models.kline import KLineList
+from chan_theory_v2.models.kline import KLineArray
 from chan_theory_v2.models.enums import TimeLevel
 from chan_theory_v2.core.trading_calendar import get_nearest_trading_date
 from api.db_handler import get_db_handler
+from api.market_data_store import get_market_data_store, KLINE_FIELDS
 
 logger = logging.getLogger(__name__)
 
+# 股票池流动性过滤：日线回看自然日数、参与过滤的最近K线数、最低平均成交量（手）
+POOL_LOOKBACK_DAYS = 30
+POOL_RECENT_BARS = 3
+MIN_AVG_VOLUME = 1000
+
+# 全市场选股时每批批量加载的股票数
+SELECTION_CHUNK_SIZE = 200
+# 分析进程数上限（默认CPU核数），每个进程允许排队的股票数
+MAX_SELECTION_WORKERS = int(os.getenv("CHAN_SELECTION_WORKERS", os.cpu_count() or 1))
+INFLIGHT_PER_WORKER = 4
+# 同一API进程内同时运行的选股进程池数，超出的请求排队等待（避免N个请求启动N×CPU个进程）
+MAX_CONCURRENT_SELECTIONS = max(1, int(os.getenv("CHAN_SELECTION_CONCURRENCY", 1)))
+_selection_slots = threading.BoundedSemaphore(MAX_CONCURRENT_SELECTIONS)
+
 
 class SignalStrength(Enum):
     """信号强度枚举"""
@@ -71,9 +91,18 @@ class StockSignal:
 class SimpleBackchiStockSelector:
     """简化的MACD背驰选股器"""
     
-    def __init__(self):
-        """初始化选股器"""
-        self.db_handler = get_db_handler()
+    def __init__(self, max_workers: Optional[int] = None, chunk_size: int = SELECTION_CHUNK_SIZE):
+        """
+        初始化选股器
+
+        Args:
+            max_workers: 分析进程数，None为MAX_SELECTION_WORKERS，1表示在当前进程串行分析（不超过MAX_SELECTION_WORKERS）
+            chunk_size: 每批批量加载K线的股票数
+        """
+        self._db_handler = None
+        # 资源相关参数不放在config中：config可被请求中的custom_config覆盖
+        self.max_workers = max(1, min(max_workers or MAX_SELECTION_WORKERS, MAX_SELECTION_WORKERS))
+        self.chunk_size = max(1, chunk_size)
         
         # 选股参数配置 - 与DynamicsAnalyzer保持一致
         self.config = {
@@ -93,6 +122,19 @@ class SimpleBackchiStockSelector:
         
         logger.info("🎯 简化MACD背驰选股器初始化完成")
     
+    def with_config(self, overrides: Optional[Dict[str, Any]] = None) -> 'SimpleBackchiStockSelector':
+        """返回应用了单次请求参数的副本（共享数据库连接与资源参数），不修改本选股器的配置"""
+        selector = copy.copy(self)
+        selector.config = {**self.config, **(overrides or {})}
+        return selector
+    
+    @property
+    def db_handler(self):
+        # 延迟获取：分析子进程只做计算，不需要数据库连接
+        if self._db_handler is None:
+            self._db_handler = get_db_handler()
+        return self._db_handler
+    
     def get_stock_pool(self) -> List[Dict[str, str]]:
         """获取股票池（全市场筛选）"""
         try:
@@ -108,67 +150,95 @@ class SimpleBackchiStockSelector:
             cursor = basic_collection.find(filter_condition)
             all_stocks = [{"symbol": doc["ts_code"], "name": doc["name"]} for doc in cursor]
             
-            # 进一步过滤：基于最新价格和成交量
-            filtered_stocks = []
-            daily_collection = self.db_handler.get_collection("stock_kline_daily")
-            
             # 获取最近交易日
             current_date = datetime.now().date()
             latest_trading_date = get_nearest_trading_date(current_date, direction='backward')
-            
+
             if not latest_trading_date:
                 logger.error("❌ 无法获取最近交易日")
                 return []
-            
+
             logger.info(f"📅 使用最近交易日: {latest_trading_date}")
-            
-            for stock in all_stocks:
+
+            # 进一步过滤：基于最新价格和成交量（日线分批批量加载，整体按数组过滤）
+            store = get_market_data_store()
+            start_date = latest_trading_date - timedelta(days=POOL_LOOKBACK_DAYS)
+            chunk_size = self.chunk_size
+            filtered_stocks = []
+            for offset in range(0, len(all_stocks), chunk_size):
+                chunk = all_stocks[offset:offset + chunk_size]
                 try:
-                    # 获取最近交易日的日线数据进行过滤
-                    latest_date_str = latest_trading_date.strftime("%Y%m%d")
-                    
-                    latest_data = daily_collection.find({
-                        "ts_code": stock["symbol"],
-                        "trade_date": {"$lte": latest_date_str}
-                    }).sort("trade_date", -1).limit(5)
-                    
-                    latest_list = list(latest_data)
-                    if len(latest_list) >= 3:
-                        latest = latest_list[0]
-                        
-                        # 价格过滤
-                        current_price = float(latest.get("close", 0))
-                        if (self.config["min_price"] <= current_price <= self.config["max_price"]):
-                            
-                            # 成交量过滤（检查是否有足够流动性）
-                            avg_volume = sum(float(item.get("vol", 0)) for item in latest_list[:3]) / 3
-                            if avg_volume > 1000:  # 至少1000手成交量
-                                filtered_stocks.append(stock)
-                                
-                except Exception:
-                    continue  # 跳过有问题的股票
-            
+                    frames = store.get_bars([stock["symbol"] for stock in chunk], start_date, latest_trading_date,
+                                            fields=["close", "vol"], freq="daily")
+                except Exception as e:
+                    logger.warning(f"⚠️ 批量获取日线失败，跳过 {len(chunk)} 只股票: {e}")
+                    continue
+                mask = self._liquidity_mask([frames[stock["symbol"]] for stock in chunk])
+                filtered_stocks.extend(stock for stock, keep in zip(chunk, mask) if keep)
+
             logger.info(f"📊 全市场股票池：{len(all_stocks)} → {len(filtered_stocks)} 只股票（经过流动性过滤）")
             return filtered_stocks
             
         except Exception as e:
             logger.error(f"❌ 获取股票池失败: {e}")
             return []
-    
+
+    def _liquidity_mask(self, frames: List[Any]) -> np.ndarray:
+        """
+        价格与流动性过滤：最近K线不少于3根、最新收盘价在价格区间内、最近3根平均成交量超过1000手
+
+        Args:
+            frames: 各股票的日线BarFrame（含close、vol）
+
+        Returns:
+            与frames等长的布尔数组
+        """
+        count = len(frames)
+        if count == 0:
+            return np.zeros(0, dtype=bool)
+
+        # 各股票最近3根K线的成交量拼成矩阵（不足3根的左侧补0），整体计算均值
+        lengths = np.fromiter((len(frame) for frame in frames), dtype=np.int64, count=count)
+        volumes = np.zeros((count, POOL_RECENT_BARS))
+        latest_close = np.full(count, np.nan)
+        for row in np.flatnonzero(lengths):
+            recent = frames[row]["vol"][-POOL_RECENT_BARS:]
+            volumes[row, POOL_RECENT_BARS - len(recent):] = recent
+            latest_close[row] = frames[row]["close"][-1]
+        avg_volume = np.nan_to_num(volumes, nan=0.0).sum(axis=1) / POOL_RECENT_BARS
+
+        with np.errstate(invalid='ignore'):
+            return ((lengths >= POOL_RECENT_BARS) &
+                    (latest_close >= self.config["min_price"]) &
+                    (latest_close <= self.config["max_price"]) &
+                    (avg_volume > MIN_AVG_VOLUME))
+
     def analyze_stock_backchi(self, symbol: str) -> Optional[StockSignal]:
         """分析单个股票的背驰情况"""
+        # 获取30分钟K线数据
+        data = self._fetch_stock_data(symbol, TimeLevel.MIN_30, self.config['days_30min'])
+        return self.analyze_stock_data(symbol, data)
+
+    def analyze_stock_data(self, symbol: str, data: Optional[List[Dict[str, Any]]],
+                           name: Optional[str] = None) -> Optional[StockSignal]:
+        """
+        基于已获取的30分钟K线分析背驰（不访问数据库时可在子进程中执行）
+
+        Args:
+            symbol: 股票代码
+            data: 30分钟K线记录（按时间升序）
+            name: 股票名称，为None时查询基础信息
+        """
         try:
-            # 获取30分钟K线数据
-            data = self._fetch_stock_data(symbol, TimeLevel.MIN_30, self.config['days_30min'])
             if not data or len(data) < 30:
                 logger.debug(f"📊 {symbol} 数据不足: {len(data) if data else 0}条")
                 return None
             
             # 转换数据格式
-            klines = KLineList.from_mongo_data(data, TimeLevel.MIN_30)
+            klines = KLineArray.from_mongo_data(data, TimeLevel.MIN_30)
             
             # 计算MACD
-            close_prices = [kline.close for kline in klines]
+            close_prices = klines.closes.tolist()
             macd_calculator = MacdCalculator()
             macd_data = macd_calculator.calculate(close_prices)
             
@@ -202,7 +272,7 @@ class SimpleBackchiStockSelector:
                 return None
             
             # 获取股票名称
-            stock_name = self._get_stock_name(symbol)
+            stock_name = name or self._get_stock_name(symbol)
             
             # 创建信号对象
             signal = StockSignal(
@@ -444,7 +514,7 @@ class SimpleBackchiStockSelector:
         else:
             return "观望"
     
-    def _calculate_key_prices(self, signal: StockSignal, klines: KLineList):
+    def _calculate_key_prices(self, signal: StockSignal, klines: KLineArray):
         """计算关键价位"""
         if len(klines) == 0:
             return
@@ -470,119 +540,152 @@ class SimpleBackchiStockSelector:
         """执行选股（基于简化MACD背驰算法）"""
         logger.info("🎯 开始执行简化MACD背驰选股")
         
-        stock_pool = self.get_stock_pool()
+        signals = list(self.iter_stock_selection())
+        
+        # 按评分排序
+        signals.sort(key=lambda x: x.overall_score, reverse=True)
+        
+        # 返回前N个结果
+        results = signals[:max_results]
+        
+        logger.info(f"🎯 选股完成: 发现 {len(signals)} 个信号，返回前 {len(results)} 个")
+        
+        return results
+    
+    def iter_stock_selection(self, stock_pool: Optional[List[Dict[str, str]]] = None) -> Iterator[StockSignal]:
+        """
+        流式选股：30分钟K线按批批量加载，逐只分析分发到进程池，信号按完成顺序返回
+        
+        Args:
+            stock_pool: 股票列表（含symbol、name），为None时使用全市场股票池
+            
+        Yields:
+            已评分的股票信号（调用方按overall_score排序即得排名）
+        """
+        if stock_pool is None:
+            stock_pool = self.get_stock_pool()
         if not stock_pool:
             logger.warning("⚠️ 股票池为空")
-            return []
-        
-        signals = []
-        processed_count = 0
+            return
         
         # 如果max_stocks_per_batch为0，则处理所有股票，否则按配置限制
         stock_limit = len(stock_pool) if self.config['max_stocks_per_batch'] == 0 else self.config['max_stocks_per_batch']
+        stocks = stock_pool[:stock_limit]
+        
+        date_range = self._analysis_date_range(self.config['days_30min'])
+        if date_range is None:
+            return
+        
+        processed_count = 0
+        signal_count = 0
+        for signal in self._iter_analysis_results(stocks, *date_range):
+            processed_count += 1
+            if signal:
+                signal_count += 1
+                yield signal
+            
+            # 每100只股票报告一次进度
+            if processed_count % 100 == 0:
+                logger.info(f"📈 已处理 {processed_count}/{len(stocks)} 只股票，发现 {signal_count} 个信号")
+        
+        logger.info(f"📊 背驰分析完成: 处理了 {processed_count} 只股票，发现 {signal_count} 个信号")
+    
+    def _iter_analysis_results(self, stocks: List[Dict[str, str]], start_date, end_date) -> Iterator[Optional[StockSignal]]:
+        """逐只返回分析结果（无信号为None），max_workers为1时在当前进程串行分析"""
+        chunks = self._iter_stock_chunks(stocks, start_date, end_date)
         
-        for stock in stock_pool[:stock_limit]:
+        if self.max_workers <= 1:
+            for chunk in chunks:
+                for stock, data in chunk:
+                    yield self.analyze_stock_data(stock['symbol'], data, stock['name'])
+            return
+        
+        # 并发的选股请求排队使用进程池配额
+        _selection_slots.acquire()
+        try:
+            # spawn启动：调用方通常是持有Mongo/Redis连接和后台线程的API进程，fork会复制这些状态
+            executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                           mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_init_selection_worker, initargs=(dict(self.config),))
+        except Exception:
+            _selection_slots.release()
+            raise
+        max_inflight = INFLIGHT_PER_WORKER * self.max_workers
+        try:
+            pending = {}
+            for chunk in chunks:
+                for stock, data in chunk:
+                    future = executor.submit(_analyze_stock_worker, stock['symbol'], stock['name'], data)
+                    pending[future] = stock['symbol']
+                # 排队的股票降到上限以下再加载下一批，期间先返回已完成的结果
+                while len(pending) >= max_inflight:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._future_result(future, pending.pop(future))
+                for future in [future for future in pending if future.done()]:
+                    yield self._future_result(future, pending.pop(future))
+            for future in as_completed(list(pending)):
+                yield self._future_result(future, pending.pop(future))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            _selection_slots.release()
+    
+    @staticmethod
+    def _future_result(future, symbol: str) -> Optional[StockSignal]:
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"❌ 处理股票 {symbol} 失败: {e}")
+            return None
+    
+    def _iter_stock_chunks(self, stocks: List[Dict[str, str]], start_date,
+                           end_date) -> Iterator[List[Tuple[Dict[str, str], Optional[List[Dict[str, Any]]]]]]:
+        """按chunk_size分批，每批一次性加载全部股票的30分钟K线"""
+        store = get_market_data_store()
+        chunk_size = self.chunk_size
+        for offset in range(0, len(stocks), chunk_size):
+            chunk = stocks[offset:offset + chunk_size]
             try:
-                symbol = stock['symbol']
-                name = stock['name']
-                
-                logger.debug(f"📊 分析股票: {symbol} - {name}")
-                
-                # 分析背驰信号
-                signal = self.analyze_stock_backchi(symbol)
-                
-                if signal:
-                    signals.append(signal)
-                
-                processed_count += 1
-                
-                # 每100只股票报告一次进度
-                if processed_count % 100 == 0:
-                    logger.info(f"📈 已处理 {processed_count}/{stock_limit} 只股票，发现 {len(signals)} 个信号")
-                
+                frames = store.get_bars([stock['symbol'] for stock in chunk], start_date, end_date,
+                                        fields=KLINE_FIELDS, freq="30min")
             except Exception as e:
-                logger.error(f"❌ 处理股票 {stock['symbol']} 失败: {e}")
+                logger.error(f"❌ 批量获取30分钟K线失败，跳过 {len(chunk)} 只股票: {e}")
+                yield [(stock, None) for stock in chunk]
                 continue
+            yield [(stock, _bars_to_records(frames[stock['symbol']])) for stock in chunk]
+    
+    def _analysis_date_range(self, days: int) -> Optional[Tuple[Any, Any]]:
+        """以最近交易日为结束日期，向前days天的查询区间"""
+        current_date = datetime.now().date()
+        end_trading_date = get_nearest_trading_date(current_date, direction='backward')
         
-        # 按评分排序
-        signals.sort(key=lambda x: x.overall_score, reverse=True)
-        
-        # 返回前N个结果
-        results = signals[:max_results]
-        
-        logger.info(f"🎯 选股完成: 处理了 {processed_count} 只股票，筛选出 {len(results)} 个信号")
+        if not end_trading_date:
+            logger.error(f"❌ 无法获取最近交易日")
+            return None
         
-        return results
+        return end_trading_date - timedelta(days=days), end_trading_date
     
     def _fetch_stock_data(self, symbol: str, time_level: TimeLevel, days: int):
         """获取股票数据（基于最近交易日）"""
         try:
             if time_level == TimeLevel.MIN_30:
-                collection_name = "stock_kline_30min"
+                freq = "30min"
             elif time_level == TimeLevel.MIN_5:
-                collection_name = "stock_kline_5min"
+                freq = "5min"
             else:
-                collection_name = "stock_kline_daily"
-            
-            collection = self.db_handler.get_collection(collection_name)
+                freq = "daily"
             
             # 获取最近的交易日作为结束日期
-            current_date = datetime.now().date()
-            end_trading_date = get_nearest_trading_date(current_date, direction='backward')
-            
-            if not end_trading_date:
-                logger.error(f"❌ 无法获取最近交易日")
+            date_range = self._analysis_date_range(days)
+            if date_range is None:
                 return None
-            
-            # 计算开始日期
-            start_date = end_trading_date - timedelta(days=days)
-            end_date = end_trading_date
+            start_date, end_date = date_range
             
             logger.debug(f"📅 查询数据范围: {start_date} 到 {end_date} (最近交易日)")
             
-            if time_level == TimeLevel.DAILY:
-                # 日线数据使用trade_date字段（YYYYMMDD格式）
-                cursor = collection.find({
-                    "ts_code": symbol,
-                    "trade_date": {
-                        "$gte": start_date.strftime("%Y%m%d"),
-                        "$lte": end_date.strftime("%Y%m%d")
-                    }
-                }).sort("trade_date", 1)
-            else:
-                # 分钟数据使用trade_time字段（YYYY-MM-DD HH:MM:SS格式）
-                start_datetime = datetime.combine(start_date, datetime.min.time())
-                end_datetime = datetime.combine(end_date, datetime.max.time())
-                
-                cursor = collection.find({
-                    "ts_code": symbol,
-                    "trade_time": {
-                        "$gte": start_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-                        "$lte": end_datetime.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                }).sort("trade_time", 1)
-            
-            # 转换为缠论引擎需要的格式
-            data = []
-            for doc in cursor:
-                try:
-                    # 根据时间级别处理不同的时间字段
-                    if time_level == TimeLevel.DAILY:
-                        timestamp = datetime.strptime(doc['trade_date'], '%Y%m%d')
-                    else:
-                        timestamp = datetime.strptime(doc['trade_time'], '%Y-%m-%d %H:%M:%S')
-                    
-                    kline_data = {
-                        'timestamp': timestamp,
-                        'open': float(doc['open']),
-                        'high': float(doc['high']),
-                        'low': float(doc['low']),
-                        'close': float(doc['close']),
-                        'volume': float(doc.get('vol', doc.get('volume', 0)))
-                    }
-                    data.append(kline_data)
-                except (ValueError, KeyError) as e:
-                    continue
+            # 日线按trade_date（YYYYMMDD）、分钟线按trade_time（YYYY-MM-DD HH:MM:SS）查询，由行情仓库统一处理
+            bars = get_market_data_store().get_bar(symbol, start_date, end_date, fields=KLINE_FIELDS, freq=freq)
+            data = _bars_to_records(bars)
             
             logger.debug(f"📊 {symbol} 获取到 {len(data)} 条{time_level.value}数据")
             return data
@@ -592,6 +695,43 @@ class SimpleBackchiStockSelector:
             return None
 
 
+def _bars_to_records(bars) -> List[Dict[str, Any]]:
+    """BarFrame转换为缠论引擎需要的记录格式（列式数据整体转换，无效行剔除）"""
+    if len(bars) == 0:
+        return []
+    timestamps = bars.timestamps().to_pydatetime()
+    opens, highs, lows, closes = bars["open"], bars["high"], bars["low"], bars["close"]
+    volumes = np.nan_to_num(bars.volumes(), nan=0.0)
+    valid = ~(np.isnan(opens) | np.isnan(highs) | np.isnan(lows) | np.isnan(closes))
+    return [
+        {
+            'timestamp': timestamps[i],
+            'open': float(opens[i]),
+            'high': float(highs[i]),
+            'low': float(lows[i]),
+            'close': float(closes[i]),
+            'volume': float(volumes[i])
+        }
+        for i in np.flatnonzero(valid)
+    ]
+
+
+# ==================== 进程池分析 ====================
+
+# 子进程内的选股器（由进程池initializer按主进程配置创建）
+_worker_selector: Optional[SimpleBackchiStockSelector] = None
+
+
+def _init_selection_worker(config: Dict[str, Any]) -> None:
+    global _worker_selector
+    _worker_selector = SimpleBackchiStockSelector()
+    _worker_selector.config.update(config)
+
+
+def _analyze_stock_worker(symbol: str, name: str, data: Optional[List[Dict[str, Any]]]) -> Optional[StockSignal]:
+    return _worker_selector.analyze_stock_data(symbol, data, name)
+
+
 # 向后兼容的类名
 BackchiStockSelector = SimpleBackchiStockSelector
 
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式K线一致性测试
+KLineArray.from_mongo_data 与 KlineProcessor._clean_kline_array 的结果
+应与逐行构建的 KLineList.from_mongo_data 及逐根清洗的 _clean_and_validate 一致
+
+使用确定性的合成文档，不依赖数据库
+"""
+
+import os
+import random
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+# 添加项目路径
+chan_theory_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(chan_theory_root)
+
+try:
+    from models.enums import TimeLevel
+    from models.kline import KLineList, KLineArray
+    from core.kline_processor import KlineProcessor
+    from config.chan_config import ChanConfig, KlineConfig
+
+    MODULES_AVAILABLE = True
+except Exception as e:
+    print(f"导入失败: {e}")
+    MODULES_AVAILABLE = False
+
+
+def make_documents(count=120, seed=11):
+    """
+    生成MongoDB风格的K线文档，轮换覆盖各种字段写法：
+    trade_date字符串 / 空trade_date回退到datetime / trade_time、vol与volume、amount与turnover_value，
+    并夹杂时间缺失、价格无法解析、最高价低于收盘价等无效行
+    """
+    rng = random.Random(seed)
+    start = datetime(2023, 3, 1)
+    docs = []
+    previous_close = 10.0
+    for i in range(count):
+        moment = start + timedelta(days=i)
+        close = max(0.5, previous_close * (1 + rng.uniform(-0.05, 0.05)))
+        open_price = previous_close * (1 + rng.uniform(-0.02, 0.02))
+        doc = {
+            'open': round(open_price, 3),
+            'high': round(max(open_price, close) + rng.uniform(0.01, 0.2), 3),
+            'low': round(min(open_price, close) - rng.uniform(0.01, 0.2), 3),
+            'close': round(close, 3),
+        }
+        previous_close = close
+
+        # 时间字段
+        kind = i % 4
+        if kind == 0:
+            doc['trade_date'] = moment.strftime('%Y%m%d')
+        elif kind == 1:
+            doc['trade_date'] = ''
+            doc['datetime'] = moment
+        elif kind == 2:
+            doc['trade_time'] = moment.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            doc['timestamp'] = moment
+
+        # 成交量字段
+        volume = rng.randint(0, 5000)
+        if i % 3 == 0:
+            doc['volume'] = volume
+        else:
+            doc['vol'] = float(volume)
+
+        # 成交额字段（amount为0时回退到turnover_value）
+        amount_kind = i % 5
+        if amount_kind == 0:
+            doc['amount'] = round(volume * close, 2)
+        elif amount_kind == 1:
+            doc['turnover_value'] = round(volume * close, 2)
+        elif amount_kind == 2:
+            doc['amount'] = 0
+            doc['turnover_value'] = round(volume * close, 2)
+        elif amount_kind == 3:
+            doc['amount'] = 0
+
+        # 无效行
+        if i % 17 == 5:
+            for name in ('trade_date', 'datetime', 'trade_time', 'timestamp'):
+                doc.pop(name, None)
+        elif i % 19 == 7:
+            doc['open'] = 'N/A'
+        elif i % 23 == 9:
+            doc['high'] = round(doc['close'] - 0.05, 3)
+
+        # 跳空与非正价格（供清洗测试使用，仍是有效的K线）
+        if i % 13 == 4:
+            doc['open'] = round(doc['open'] * 1.3, 3)
+            doc['high'] = round(max(doc['open'], doc['close']) + 0.01, 3)
+        elif i % 29 == 11:
+            doc['low'] = 0.0
+
+        docs.append(doc)
+    return docs
+
+
+def kline_tuples(klines):
+    """K线序列的可比较表示"""
+    return [(k.timestamp, k.open, k.high, k.low, k.close, k.volume, k.amount) for k in klines]
+
+
+class TestKLineArrayFromMongo(unittest.TestCase):
+    """测试列式构建与逐行构建一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        if not MODULES_AVAILABLE:
+            raise unittest.SkipTest("模块导入失败")
+        cls.docs = make_documents()
+
+    def test_matches_kline_list(self):
+        """字段回退、别名与无效行的处理与 KLineList.from_mongo_data 一致"""
+        expected = KLineList.from_mongo_data(self.docs, TimeLevel.DAILY)
+        actual = KLineArray.from_mongo_data(self.docs, TimeLevel.DAILY)
+
+        self.assertLess(len(expected), len(self.docs), "合成数据中没有被跳过的无效行")
+        self.assertEqual(kline_tuples(actual), kline_tuples(expected))
+        self.assertEqual(actual.level, TimeLevel.DAILY)
+
+    def test_accepts_cursor(self):
+        """传入游标（迭代器）与传入列表结果相同"""
+        from_list = KLineArray.from_mongo_data(self.docs, TimeLevel.DAILY)
+        from_cursor = KLineArray.from_mongo_data(iter(self.docs), TimeLevel.DAILY)
+        self.assertEqual(kline_tuples(from_cursor), kline_tuples(from_list))
+
+    def test_no_valid_rows(self):
+        """没有任何有效行时返回空容器"""
+        docs = [{'open': 1, 'high': 2, 'low': 0.5, 'close': 1.5, 'vol': 100},
+                {'trade_date': '20230301', 'open': 1, 'high': 0.8, 'low': 0.5, 'close': 1.5, 'vol': 100}]
+        self.assertTrue(KLineList.from_mongo_data(docs, TimeLevel.DAILY).is_empty())
+        self.assertTrue(KLineArray.from_mongo_data(docs, TimeLevel.DAILY).is_empty())
+        self.assertTrue(KLineArray.from_mongo_data([], TimeLevel.DAILY).is_empty())
+
+
+class TestCleanKLineArray(unittest.TestCase):
+    """测试向量化清洗与逐根清洗一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        if not MODULES_AVAILABLE:
+            raise unittest.SkipTest("模块导入失败")
+        docs = make_documents(count=200, seed=3)
+        cls.kline_list = KLineList.from_mongo_data(docs, TimeLevel.DAILY)
+        cls.kline_array = KLineArray.from_mongo_data(docs, TimeLevel.DAILY)
+
+    def assert_same_cleaning(self, max_gap_ratio):
+        processor = KlineProcessor(ChanConfig(kline=KlineConfig(max_gap_ratio=max_gap_ratio)))
+        expected = processor._clean_and_validate(self.kline_list)
+        actual = processor._clean_and_validate(self.kline_array)
+
+        self.assertIsInstance(actual, KLineArray)
+        self.assertLess(len(expected), len(self.kline_list), "合成数据中没有被清洗的K线")
+        self.assertEqual(kline_tuples(actual), kline_tuples(expected))
+
+    def test_strict_mode_removes_gaps(self):
+        """严格模式（max_gap_ratio<0.5）下跳空K线与无效K线一并移除"""
+        self.assert_same_cleaning(0.1)
+
+    def test_lenient_mode_keeps_gaps(self):
+        """宽松模式下只移除无效K线"""
+        self.assert_same_cleaning(0.6)
+
+    def test_clean_disabled(self):
+        """关闭数据清洗时原样返回"""
+        processor = KlineProcessor(ChanConfig(kline=KlineConfig(enable_data_clean=False)))
+        self.assertIs(processor._clean_and_validate(self.kline_array), self.kline_array)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
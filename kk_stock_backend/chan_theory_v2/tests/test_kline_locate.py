@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线时间定位一致性测试
+KLineList.locate、KLineArray.locate/locate_range 与 BiBuilder._klines_in_time_range 的二分查找
+应与逐根扫描的结果一致
+
+使用确定性的合成30分钟K线（含午休与隔夜的不等间隔），不依赖数据库
+"""
+
+import os
+import random
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+# 添加项目路径
+chan_theory_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(chan_theory_root)
+
+try:
+    from models.enums import TimeLevel
+    from models.kline import KLine, KLineList, KLineArray
+    from models.bi import BiBuilder
+
+    MODULES_AVAILABLE = True
+except Exception as e:
+    print(f"导入失败: {e}")
+    MODULES_AVAILABLE = False
+
+SESSION_TIMES = [(9, 30), (10, 0), (10, 30), (11, 0), (13, 30), (14, 0), (14, 30), (15, 0)]
+
+
+def make_klines(days=12, seed=2):
+    """生成按交易时段排列的30分钟K线（跳过周末）"""
+    rng = random.Random(seed)
+    klines = []
+    day = datetime(2023, 6, 1)
+    close = 10.0
+    while len(klines) < days * len(SESSION_TIMES):
+        if day.weekday() < 5:
+            for hour, minute in SESSION_TIMES:
+                open_price = close
+                close = round(open_price * (1 + rng.uniform(-0.01, 0.01)), 3)
+                klines.append(KLine(
+                    timestamp=day.replace(hour=hour, minute=minute),
+                    open=open_price,
+                    high=round(max(open_price, close) + 0.02, 3),
+                    low=round(min(open_price, close) - 0.02, 3),
+                    close=close,
+                    volume=rng.randint(1000, 5000),
+                    level=TimeLevel.MIN_30
+                ))
+        day += timedelta(days=1)
+    return klines
+
+
+def probe_times(klines):
+    """查询时间：每根K线的时间、前后偏移的时间，以及首根之前、末根之后"""
+    times = [klines[0].timestamp - timedelta(days=3), klines[-1].timestamp + timedelta(days=3)]
+    for kline in klines:
+        times.extend([kline.timestamp, kline.timestamp - timedelta(minutes=1), kline.timestamp + timedelta(minutes=1)])
+    return times
+
+
+def linear_locate(klines, timestamp):
+    """逐根扫描：第一根时间不早于timestamp的K线索引"""
+    for index, kline in enumerate(klines):
+        if kline.timestamp >= timestamp:
+            return index
+    return len(klines)
+
+
+def linear_range(klines, start_time, end_time):
+    """逐根扫描：时间区间内（含两端）的K线时间"""
+    return [kline.timestamp for kline in klines if start_time <= kline.timestamp <= end_time]
+
+
+class TestKLineLocate(unittest.TestCase):
+    """测试二分定位与逐根扫描一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        if not MODULES_AVAILABLE:
+            raise unittest.SkipTest("模块导入失败")
+        cls.klines = make_klines()
+        cls.kline_list = KLineList(list(cls.klines), TimeLevel.MIN_30)
+        cls.kline_array = KLineArray.from_klines(cls.klines, TimeLevel.MIN_30)
+        cls.times = probe_times(cls.klines)
+
+    def test_locate_without_hint(self):
+        """不带hint时返回第一根时间不早于目标的K线"""
+        for timestamp in self.times:
+            expected = linear_locate(self.klines, timestamp)
+            self.assertEqual(self.kline_list.locate(timestamp), expected, f"KLineList {timestamp}")
+            self.assertEqual(self.kline_array.locate(timestamp), expected, f"KLineArray {timestamp}")
+
+    def test_locate_with_hint(self):
+        """hint正确、错误或越界时结果都与逐根扫描一致"""
+        size = len(self.klines)
+        for timestamp in self.times:
+            expected = linear_locate(self.klines, timestamp)
+            for hint in (expected, expected - 1, expected + 1, 0, size, -1):
+                self.assertEqual(self.kline_list.locate(timestamp, hint=hint), expected,
+                                 f"KLineList {timestamp} hint={hint}")
+                self.assertEqual(self.kline_array.locate(timestamp, hint=hint), expected,
+                                 f"KLineArray {timestamp} hint={hint}")
+
+    def test_locate_after_append(self):
+        """KLineList追加K线后缓存的时间索引随之更新"""
+        kline_list = KLineList(list(self.klines[:40]), TimeLevel.MIN_30)
+        kline_list.locate(self.klines[10].timestamp)
+        kline_list.extend(self.klines[40:60])
+        for timestamp in probe_times(self.klines[:60]):
+            self.assertEqual(kline_list.locate(timestamp), linear_locate(self.klines[:60], timestamp))
+
+    def test_locate_range(self):
+        """KLineArray.locate_range 与逐根筛选的区间一致（含两端、区间为空）"""
+        rng = random.Random(9)
+        for _ in range(300):
+            start_time, end_time = rng.choice(self.times), rng.choice(self.times)
+            start, end = self.kline_array.locate_range(start_time, end_time)
+            actual = [kline.timestamp for kline in self.kline_array[start:end]]
+            self.assertEqual(actual, linear_range(self.klines, start_time, end_time), f"{start_time}~{end_time}")
+
+
+class TestBiKlinesInTimeRange(unittest.TestCase):
+    """测试笔构建时的K线区间查找与逐根筛选一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        if not MODULES_AVAILABLE:
+            raise unittest.SkipTest("模块导入失败")
+        cls.klines = make_klines()
+        cls.times = probe_times(cls.klines)
+
+    def make_builder(self, klines):
+        """按 build_from_fenxings 的方式准备K线序列与时间索引"""
+        builder = BiBuilder()
+        builder._all_klines = klines
+        builder._kline_times = [] if isinstance(klines, KLineArray) else [k.timestamp for k in klines]
+        return builder
+
+    def test_list_and_array_match_linear_filter(self):
+        """KLine列表与KLineArray两种输入都与逐根筛选一致"""
+        builders = {
+            'list': self.make_builder(list(self.klines)),
+            'array': self.make_builder(KLineArray.from_klines(self.klines, TimeLevel.MIN_30)),
+        }
+        rng = random.Random(4)
+        for _ in range(300):
+            start_time, end_time = sorted((rng.choice(self.times), rng.choice(self.times)))
+            expected = linear_range(self.klines, start_time, end_time)
+            for name, builder in builders.items():
+                actual = [kline.timestamp for kline in builder._klines_in_time_range(start_time, end_time)]
+                self.assertEqual(actual, expected, f"{name} {start_time}~{end_time}")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -24,6 +24,7 @@ from qlib.utils import init_instance_by_config
 
 # 项目导入
 from api.db_handler import DBHandler
+from api.market_data_store import get_market_data_store
 
 class QlibDataAdapter(BaseProvider):
     """
@@ -43,6 +44,7 @@ class QlibDataAdapter(BaseProvider):
         
         # 初始化数据库连接
         self.db_handler = DBHandler()
+        self.market_data_store = get_market_data_store()
         
         # 设置日志
         self.logger = get_module_logger("QlibDataAdapter")
@@ -129,43 +131,21 @@ class QlibDataAdapter(BaseProvider):
             if fields is None:
                 fields = ['open', 'high', 'low', 'close', 'volume', 'amount']
             
-            # 构建查询条件
-            query = {
-                "ts_code": stock_code,  # tushare使用ts_code
-                "trade_date": {         # tushare使用trade_date
-                    "$gte": start_date.replace('-', ''),  # tushare日期格式: 20230101
-                    "$lte": end_date.replace('-', '')
-                }
-            }
-            
-            # 查询数据
-            collection_name = "stock_kline_daily"  # 使用实际的集合名
-            cursor = self.db_handler.get_collection(collection_name).find(query).sort("trade_date", 1)
-            
-            # 转换为DataFrame
-            data = []
-            for doc in cursor:
-                row = {}
-                # tushare日期格式转换: 20230101 -> 2023-01-01
-                date_str = str(doc['trade_date'])
-                row['datetime'] = pd.to_datetime(date_str, format='%Y%m%d')
-                
-                # 映射字段
-                for field in fields:
-                    if field in self.field_mapping:
-                        db_field = self.field_mapping[field]
-                        row[field] = doc.get(db_field, np.nan)
-                    else:
-                        row[field] = doc.get(field, np.nan)
-                
-                data.append(row)
+            # 映射为数据库字段，从共享行情仓库读取（tushare日期格式: 20230101）
+            db_fields = {field: self.field_mapping.get(field, field) for field in fields}
+            bars = self.market_data_store.get_bar(
+                stock_code, start_date, end_date, fields=sorted(set(db_fields.values())), freq="daily"
+            )
             
-            if not data:
+            if len(bars) == 0:
                 self.logger.warning(f"未找到股票 {symbol} 的数据")
                 return pd.DataFrame()
             
-            df = pd.DataFrame(data)
-            df.set_index('datetime', inplace=True)
+            df = pd.DataFrame(
+                {field: bars[db_field].copy() for field, db_field in db_fields.items()},
+                index=bars.timestamps()
+            )
+            df.index.name = 'datetime'
             
             # 数据类型转换
             numeric_fields = ['open', 'high', 'low', 'close', 'volume', 'amount']
@@ -185,6 +165,11 @@ class QlibDataAdapter(BaseProvider):
         """获取多只股票数据"""
         all_data = []
         
+        # 批量预取到共享缓存，逐只读取时直接命中
+        self.market_data_store.prefetch(
+            [self._convert_from_qlib_format(symbol) for symbol in symbols], start_date, end_date
+        )
+        
         for symbol in symbols:
             # 获取单只股票数据
             stock_data = self.get_stock_data(symbol, start_date, end_date, fields)
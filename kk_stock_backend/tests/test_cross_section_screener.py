@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+集合化选股一致性测试
+CrossSectionScreener 的条件筛选与综合评分应与逐只选股的公式一致：
+TechnicalAnalyzer / FundamentalAnalyzer / SpecialDataAnalyzer 的单只换算、
+StrategyScreeningEngine 的条件检查与 _calculate_composite_score
+
+使用内存中的合成截面数据，不依赖数据库
+"""
+
+import os
+import random
+import sys
+import unittest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+
+try:
+    from api.utils.strategy_screening import (
+        CrossSectionScreener, FundamentalAnalyzer, SpecialDataAnalyzer, SpecialFeatures,
+        StrategyScreeningEngine, TechnicalAnalyzer
+    )
+
+    MODULES_AVAILABLE = True
+except Exception as e:
+    print(f"导入失败: {e}")
+    MODULES_AVAILABLE = False
+
+TRADE_DATE = "20240628"
+END_DATE = "20240331"
+
+# 两套逐只条件检查都支持的条件（StrategyScreeningEngine 中后定义的 _check_* 生效）
+TECHNICAL_CONDITIONS = {"rsi_max": 75, "macd_positive": True, "above_ma20": True, "volume_ratio_min": 0.8}
+FUNDAMENTAL_CONDITIONS = {"total_score_min": 40, "roe_min": 5, "pe_max": 60, "growth_score_min": 30}
+SPECIAL_CONDITIONS = {"net_inflow_positive": True, "limit_days_min": 1, "hot_money_score_min": 20}
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        value = doc.get(key)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$gte" in condition and (value is None or value < condition["$gte"]):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """只实现选股引擎用到的查询：find/find_one 按条件过滤，aggregate 返回预先给定的聚合结果"""
+
+    def __init__(self, docs=None, aggregate_result=None):
+        self.docs = docs or []
+        self.aggregate_result = aggregate_result or []
+
+    def find(self, query, projection=None):
+        return [dict(doc) for doc in self.docs if _matches(doc, query)]
+
+    def find_one(self, query, projection=None, sort=None):
+        docs = self.find(query)
+        if sort:
+            field, direction = sort[0]
+            docs.sort(key=lambda doc: doc.get(field), reverse=direction < 0)
+        return docs[0] if docs else None
+
+    def aggregate(self, pipeline, **kwargs):
+        return [dict(doc) for doc in self.aggregate_result]
+
+
+def maybe(rng, value, missing_rate=0.1):
+    """按比例把值置为缺失"""
+    return None if rng.random() < missing_rate else value
+
+
+def make_market(count=60, seed=11):
+    """生成基本信息、因子、财务、连板、龙虎榜、资金流向截面（部分股票缺少某类数据）"""
+    rng = random.Random(seed)
+    codes = [f"{600000 + i}.SH" for i in range(count)]
+    basics, factors, finas, limits, top_counts, flows = [], [], [], [], [], []
+    for i, ts_code in enumerate(codes):
+        basics.append({"ts_code": ts_code, "name": f"股票{i}", "industry": "测试", "market": "主板"})
+
+        if i % 9 != 0:
+            close = round(rng.uniform(5, 50), 2)
+            ma20 = round(close * rng.uniform(0.85, 1.15), 2)
+            middle = round(close * rng.uniform(0.95, 1.05), 2)
+            width = middle * rng.uniform(0.05, 0.2)
+            factors.append({
+                "ts_code": ts_code, "trade_date": TRADE_DATE, "close": close,
+                "vol": round(rng.uniform(1e4, 1e6), 1),
+                "ma_qfq_5": close, "ma_qfq_10": close, "ma_qfq_20": maybe(rng, ma20), "ma_qfq_60": close,
+                "macd_qfq": maybe(rng, round(rng.uniform(-1, 1), 3)),
+                "macd_dea_qfq": maybe(rng, round(rng.uniform(-1, 1), 3)),
+                "macd_dif_qfq": round(rng.uniform(-1, 1), 3),
+                "rsi_qfq_6": round(rng.uniform(10, 90), 2),
+                "rsi_qfq_12": maybe(rng, round(rng.uniform(10, 90), 2)),
+                "rsi_qfq_24": round(rng.uniform(10, 90), 2),
+                "kdj_k_qfq": round(rng.uniform(0, 100), 2), "kdj_d_qfq": round(rng.uniform(0, 100), 2),
+                "kdj_qfq": round(rng.uniform(-20, 120), 2),
+                "boll_upper_qfq": round(middle + width, 2), "boll_mid_qfq": middle,
+                "boll_lower_qfq": round(middle - width, 2),
+                "volume_ratio": maybe(rng, round(rng.uniform(0.3, 3), 2)),
+                "pe": round(rng.uniform(5, 80), 2), "pb": round(rng.uniform(0.5, 8), 2),
+                "pct_chg": round(rng.uniform(-10, 10), 2), "total_mv": round(rng.uniform(1e5, 1e7), 1),
+            })
+
+        if i % 7 != 0:
+            finas.append({
+                "ts_code": ts_code, "end_date": END_DATE,
+                "or_yoy": maybe(rng, round(rng.uniform(-40, 80), 2)),
+                "profit_dedt": maybe(rng, round(rng.uniform(-60, 150), 2)),
+                "roe": maybe(rng, round(rng.uniform(-15, 35), 2)),
+                "roa": maybe(rng, round(rng.uniform(-8, 20), 2)),
+                "grossprofit_margin": maybe(rng, round(rng.uniform(0, 90), 2)),
+                "pe": maybe(rng, round(rng.uniform(-20, 120), 2)),
+                "pb": maybe(rng, round(rng.uniform(-1, 12), 2)),
+                "ps": maybe(rng, round(rng.uniform(0.2, 25), 2)),
+                "debt_to_assets": maybe(rng, round(rng.uniform(5, 95), 2)),
+                "current_ratio": maybe(rng, round(rng.uniform(0.2, 4), 2)),
+                "quick_ratio": maybe(rng, round(rng.uniform(0.1, 3), 2)),
+            })
+
+        if i % 3 == 0:
+            limits.append({"ts_code": ts_code, "trade_date": TRADE_DATE, "step": rng.randint(0, 6)})
+        if i % 4 != 0:
+            count_30 = rng.randint(0, 5)
+            top_counts.append({"_id": ts_code, "count_30": count_30, "count_90": count_30 + rng.randint(0, 8)})
+        if i % 5 != 0:
+            flows.append({
+                "ts_code": ts_code, "trade_date": TRADE_DATE,
+                "net_mf_amount": round(rng.uniform(-5000, 5000), 2),
+                "trade_amount": round(rng.uniform(1000, 50000), 2),
+            })
+
+    db = {
+        "infrastructure_stock_basic": FakeCollection(basics),
+        "stock_factor_pro": FakeCollection(factors),
+        "stock_fina_indicator": FakeCollection(
+            finas, aggregate_result=[{"_id": doc["ts_code"], **doc} for doc in finas]
+        ),
+        "limit_step": FakeCollection(
+            limits, aggregate_result=[{"_id": doc["ts_code"], "step": doc["step"]} for doc in limits]
+        ),
+        "top_list": FakeCollection(aggregate_result=top_counts),
+        "stock_money_flow": FakeCollection(flows),
+    }
+    return codes, db
+
+
+class TestCrossSectionScreener(unittest.TestCase):
+    """测试集合化选股与逐只选股公式一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        if not MODULES_AVAILABLE:
+            raise unittest.SkipTest("模块导入失败")
+        cls.codes, cls.db = make_market()
+        cls.screener = CrossSectionScreener(db=cls.db)
+        # 只使用不访问数据库的逐只换算与检查方法
+        cls.technical_analyzer = TechnicalAnalyzer.__new__(TechnicalAnalyzer)
+        cls.fundamental_analyzer = FundamentalAnalyzer.__new__(FundamentalAnalyzer)
+        cls.engine = StrategyScreeningEngine.__new__(StrategyScreeningEngine)
+
+    def per_stock_data(self, ts_code):
+        """按逐只选股的换算得到 (技术指标, 基本面评分, 特色数据)"""
+        name = f"股票{self.codes.index(ts_code)}"
+        factor = next((doc for doc in self.db["stock_factor_pro"].docs if doc["ts_code"] == ts_code), None)
+        fina = next((doc for doc in self.db["stock_fina_indicator"].docs if doc["ts_code"] == ts_code), None)
+        technical = self.technical_analyzer._map_factor_data_to_indicators(factor, name) if factor else None
+        fundamental = self.fundamental_analyzer._map_fina_data_to_scores(fina, name) if fina else None
+
+        limit_doc = next((doc for doc in self.db["limit_step"].docs if doc["ts_code"] == ts_code), None)
+        flow_doc = next((doc for doc in self.db["stock_money_flow"].docs if doc["ts_code"] == ts_code), None)
+        counts = next((doc for doc in self.db["top_list"].aggregate_result if doc["_id"] == ts_code), None)
+        count_30, count_90 = (counts["count_30"], counts["count_90"]) if counts else (0, 0)
+
+        special = SpecialFeatures(ts_code=ts_code, name=name)
+        limit_data = SpecialDataAnalyzer._limit_features(limit_doc)
+        if limit_data:
+            special.limit_days = limit_data["limit_days"]
+            special.limit_strength = limit_data["limit_strength"]
+        hot_money = SpecialDataAnalyzer._hot_money_features(count_30)
+        if hot_money:
+            special.hot_money_rank = hot_money["rank"]
+            special.hot_money_score = hot_money["score"]
+        flow = SpecialDataAnalyzer._money_flow_features(flow_doc)
+        if flow:
+            special.net_inflow = flow["net_inflow"]
+            special.inflow_strength = flow["inflow_strength"]
+        institution = SpecialDataAnalyzer._institution_features(count_90)
+        special.institution_attention = institution["attention_score"]
+        special.dragon_tiger_count = institution["dragon_tiger_count"]
+        return technical, fundamental, special
+
+    def assert_close(self, actual, expected, label):
+        if expected is None:
+            self.assertIsNone(actual, label)
+        else:
+            self.assertIsNotNone(actual, label)
+            self.assertAlmostEqual(actual, expected, places=6, msg=label)
+
+    def test_derived_fields_match_per_stock_formulas(self):
+        """技术指标派生字段、基本面各项评分、特色数据换算与逐只计算一致"""
+        results = self.screener.screen(
+            technical_conditions={"rsi_min": 0}, fundamental_conditions={"total_score_min": 0},
+            special_conditions={"limit_days_min": 0}, stock_pool=self.codes, limit=len(self.codes)
+        )
+        self.assertTrue(results)
+        for result in results:
+            technical, fundamental, special = self.per_stock_data(result["ts_code"])
+            for key in ("close", "rsi", "bb_width", "price_position", "macd", "macd_signal", "ma20"):
+                self.assert_close(result["technical"][key], getattr(technical, key), f"{result['ts_code']}.{key}")
+            self.assertEqual(result["technical"]["volume"], technical.volume)
+            for key in ("growth_score", "profitability_score", "valuation_score",
+                        "financial_health_score", "total_score"):
+                self.assert_close(result["fundamental"][key], getattr(fundamental, key), f"{result['ts_code']}.{key}")
+            for key in ("limit_days", "limit_strength", "hot_money_rank", "hot_money_score",
+                        "net_inflow", "inflow_strength", "institution_attention", "dragon_tiger_count"):
+                self.assert_close(result["special"][key], getattr(special, key), f"{result['ts_code']}.{key}")
+
+    def test_selection_and_scores_match_per_stock_screening(self):
+        """筛选出的股票集合与综合评分与逐只检查条件、逐只评分一致"""
+        expected = {}
+        for ts_code in self.codes:
+            technical, fundamental, special = self.per_stock_data(ts_code)
+            if not self.engine._check_technical_conditions(technical, TECHNICAL_CONDITIONS):
+                continue
+            if not self.engine._check_fundamental_conditions(fundamental, FUNDAMENTAL_CONDITIONS):
+                continue
+            if not self.engine._check_special_conditions(special, SPECIAL_CONDITIONS):
+                continue
+            expected[ts_code] = self.engine._calculate_composite_score(technical, fundamental, special)
+
+        results = self.screener.screen(
+            technical_conditions=TECHNICAL_CONDITIONS, fundamental_conditions=FUNDAMENTAL_CONDITIONS,
+            special_conditions=SPECIAL_CONDITIONS, stock_pool=self.codes, limit=len(self.codes)
+        )
+        actual = {result["ts_code"]: result["score"] for result in results}
+
+        self.assertEqual(set(actual), set(expected))
+        for ts_code, score in expected.items():
+            if score is None:
+                self.assertIsNone(actual[ts_code], ts_code)
+            else:
+                self.assertAlmostEqual(actual[ts_code], score, delta=0.011, msg=ts_code)
+        scores = [result["score"] or 0 for result in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
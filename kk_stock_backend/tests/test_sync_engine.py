@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量同步引擎测试脚本
+需要两个本地mongod实例（例如 27017 与 27018），通过环境变量指定：
+
+SYNC_SOURCE_URI=mongodb://127.0.0.1:27017 SYNC_TARGET_URI=mongodb://127.0.0.1:27018 \
+    python tests/test_sync_engine.py
+
+测试内容：日期水位同步、失败后续传、写入失败时水位不前进、晚于水位的起始日期不推进水位、_id区间同步、重复同步幂等
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+
+from pymongo import MongoClient
+
+from api.sync_engine import SyncEngine
+
+SOURCE_URI = os.getenv("SYNC_SOURCE_URI", "mongodb://127.0.0.1:27017")
+TARGET_URI = os.getenv("SYNC_TARGET_URI", "mongodb://127.0.0.1:27018")
+TEST_DB = "sync_engine_test"
+FAIL_DB = "sync_engine_test_fail"
+GAP_DB = "sync_engine_test_gap"
+DAILY = "test_daily"
+PLAIN = "test_plain"
+
+
+def setup():
+    source_db = MongoClient(SOURCE_URI)[TEST_DB]
+    target_db = MongoClient(TARGET_URI)[TEST_DB]
+    for db in (source_db, target_db):
+        db.client.drop_database(TEST_DB)
+
+    base = datetime(2024, 1, 1)
+    source_db[DAILY].create_index([("ts_code", 1), ("trade_date", 1)], unique=True)
+    source_db[DAILY].insert_many([
+        {"ts_code": f"{i:06d}.SZ", "trade_date": (base + timedelta(days=d)).strftime("%Y%m%d"), "close": i + d}
+        for d in range(10) for i in range(50)
+    ])
+    source_db[PLAIN].insert_many([{"name": f"item_{i}", "value": i} for i in range(2500)])
+    return source_db, target_db
+
+
+def check_date_sync_and_resume(source_db, target_db):
+    print("🧪 测试日期水位同步与续传...")
+    # 每日50条、批次20条：每日两个整批加一个尾批
+    engine = SyncEngine(source_db, target_db, target_name="test", batch_size=20)
+
+    # 只同步前5天，模拟中途失败
+    result = engine.sync([DAILY], end_date="20240105")
+    assert result["collections"][DAILY]["synced"] == 250
+    assert target_db[DAILY].count_documents({}) == 250
+    assert engine.get_watermark(DAILY)["synced"] == 250
+    assert engine.get_watermark(DAILY)["value"] == "20240105"
+
+    # 续传：只从水位日期开始，补齐剩余日期
+    result = engine.sync([DAILY])
+    assert target_db[DAILY].count_documents({}) == 500
+    assert result["collections"][DAILY]["dates"] == 6
+    assert engine.get_watermark(DAILY)["value"] == "20240110"
+    print("   ✅ 通过")
+
+
+def check_failed_writes_keep_watermark(source_db):
+    print("🧪 测试写入失败时水位不前进...")
+    fail_db = MongoClient(TARGET_URI)[FAIL_DB]
+    fail_db.client.drop_database(FAIL_DB)
+    try:
+        # 目标库 close 唯一：第2天起部分文档与前一日冲突，写入失败
+        fail_db[DAILY].create_index("close", unique=True)
+        engine = SyncEngine(source_db, fail_db, target_name="test_fail", batch_size=20)
+        result = engine.sync([DAILY])["collections"][DAILY]
+        assert not result["success"] and result["errors"] > 0
+
+        watermark = engine.get_watermark(DAILY)
+        assert watermark["status"] == "partial"
+        assert watermark["value"] == "20240101"
+
+        # 去掉冲突索引后续传，从失败的日期重新同步并补齐
+        fail_db[DAILY].drop_index("close_1")
+        result = engine.sync([DAILY])["collections"][DAILY]
+        assert result["success"] and result["dates"] == 10
+        assert engine.get_watermark(DAILY)["status"] == "completed"
+        assert engine.get_watermark(DAILY)["value"] == "20240110"
+    finally:
+        fail_db.client.drop_database(FAIL_DB)
+    print("   ✅ 通过")
+
+
+def check_later_start_keeps_watermark(source_db):
+    print("🧪 测试起始日期晚于水位时水位不前进...")
+    gap_db = MongoClient(TARGET_URI)[GAP_DB]
+    gap_db.client.drop_database(GAP_DB)
+    try:
+        engine = SyncEngine(source_db, gap_db, target_name="test_gap", batch_size=20)
+        engine.sync([DAILY], end_date="20240101")
+        assert engine.get_watermark(DAILY)["value"] == "20240101"
+
+        # 从第5天开始同步：第2~4天未同步，水位不能越过它们
+        result = engine.sync([DAILY], start_date="20240105")["collections"][DAILY]
+        assert result["success"] and result["dates"] == 6
+        assert engine.get_watermark(DAILY)["value"] == "20240101"
+        assert gap_db[DAILY].count_documents({"trade_date": {"$gte": "20240102", "$lte": "20240104"}}) == 0
+
+        # 续传从水位继续，补齐第2~4天
+        engine.sync([DAILY])
+        assert gap_db[DAILY].count_documents({"trade_date": {"$gte": "20240102", "$lte": "20240104"}}) == 150
+        assert gap_db[DAILY].count_documents({}) == 500
+        assert engine.get_watermark(DAILY)["value"] == "20240110"
+    finally:
+        gap_db.client.drop_database(GAP_DB)
+    print("   ✅ 通过")
+
+
+def check_id_sync_and_idempotent(source_db, target_db):
+    print("🧪 测试_id区间同步与幂等...")
+    engine = SyncEngine(source_db, target_db, target_name="test", batch_size=1000)
+    engine.sync([PLAIN])
+    assert target_db[PLAIN].count_documents({}) == 2500
+
+    source_db[PLAIN].insert_many([{"name": f"new_{i}", "value": i} for i in range(10)])
+    result = engine.sync([PLAIN])
+    assert result["collections"][PLAIN]["synced"] == 10
+    assert target_db[PLAIN].count_documents({}) == 2510
+
+    # 忽略水位全量重跑不产生重复
+    engine.sync([PLAIN], resume=False)
+    assert target_db[PLAIN].count_documents({}) == 2510
+    print("   ✅ 通过")
+
+
+def main():
+    source_db, target_db = setup()
+    try:
+        check_date_sync_and_resume(source_db, target_db)
+        check_failed_writes_keep_watermark(source_db)
+        check_later_start_keeps_watermark(source_db)
+        check_id_sync_and_idempotent(source_db, target_db)
+        print("\n🎉 同步引擎测试全部通过")
+    finally:
+        source_db.client.drop_database(TEST_DB)
+        target_db.client.drop_database(TEST_DB)
+
+
+if __name__ == "__main__":
+    main()